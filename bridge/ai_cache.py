@@ -0,0 +1,93 @@
+"""
+Wi-Care AI 分析結果快取
+
+以量化後的視窗特徵 (平均值 / 最大值分箱、動作次數、閾值) 作為鍵：
+夜間安靜時段的視窗幾乎相同，直接重用先前的判讀，省下模型呼叫與延遲。
+
+  - 淘汰策略可設定：lru (命中時移到最新) / fifo (依寫入順序)
+  - TTL 到期的項目視為未命中並移除
+  - 提供 hits / misses / evictions / expirations 計數
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+POLICIES = ("lru", "fifo")
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    expirations: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class AnalysisCache:
+    """量化特徵簽章 → 分析結果 (執行緒安全)"""
+
+    def __init__(self, max_size: int = 256, ttl: float = 600.0, policy: str = "lru",
+                 mean_bin: float = 5.0, max_bin: float = 5.0):
+        if policy not in POLICIES:
+            raise ValueError(f"不支援的淘汰策略: {policy} (可用: {', '.join(POLICIES)})")
+        self.max_size = max_size
+        self.ttl = ttl
+        self.policy = policy
+        self.mean_bin = mean_bin
+        self.max_bin = max_bin
+        self.stats = CacheStats()
+        self._entries: OrderedDict[tuple, tuple[float, str]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def signature(self, window: dict) -> tuple:
+        """視窗的量化特徵簽章"""
+        return (
+            int(window["avg"] // self.mean_bin),
+            int(window["max"] // self.max_bin),
+            int(window["motions"]),
+            # 閾值為每設備自適應、連續變動，同樣分箱
+            int(float(window["threshold"]) // self.max_bin),
+        )
+
+    def get(self, window: dict) -> str | None:
+        key = self.signature(window)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats.misses += 1
+                return None
+            stored_at, text = entry
+            if self.ttl and now - stored_at > self.ttl:
+                del self._entries[key]
+                self.stats.expirations += 1
+                self.stats.misses += 1
+                return None
+            if self.policy == "lru":
+                self._entries.move_to_end(key)
+            self.stats.hits += 1
+            return text
+
+    def put(self, window: dict, text: str):
+        key = self.signature(window)
+        with self._lock:
+            if key in self._entries:
+                del self._entries[key]
+            self._entries[key] = (time.monotonic(), text)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.stats.evictions += 1
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,144 @@
+"""
+Wi-Care 背景 AI 分析工作者
+
+把 Gemini generate_content (數秒) 移出取樣熱路徑：
+  - 取樣迴圈只做 submit()，立即返回；模型呼叫在背景執行緒進行
+  - 佇列有上限，滿了直接丟棄 (分析結果本來就只是輔助資訊)
+  - 每台設備有速率限制，且同一設備同時只排一個請求 (合併)
+  - 每台設備保留「最新結果」欄位，推送時直接附上
+  - priority=True (跌倒事件) 略過速率限制並優先處理
+"""
+
+import itertools
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable
+
+
+@dataclass
+class AIWorkerStats:
+    submitted: int = 0
+    completed: int = 0
+    errors: int = 0
+    rate_limited: int = 0
+    coalesced: int = 0
+    dropped_full: int = 0
+    last_latency: float = 0.0
+    max_latency: float = 0.0
+
+
+@dataclass
+class AIResult:
+    text: str
+    timestamp: float
+    latency: float
+
+
+_STOP = object()
+
+
+class AIAnalysisWorker:
+    """背景 AI 分析：有界佇列 + 每設備速率限制 + 最新結果欄位"""
+
+    def __init__(
+        self,
+        analyze: Callable[[dict], str | None],
+        workers: int = 1,
+        max_queue: int = 100,
+        min_interval: float = 30.0,
+    ):
+        self.analyze = analyze
+        self.min_interval = min_interval
+        self.stats = AIWorkerStats()
+        self._queue: queue.PriorityQueue = queue.PriorityQueue(maxsize=max_queue)
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._pending: set[str] = set()
+        self._last_submit: dict[str, float] = {}
+        self._latest: dict[str, AIResult] = {}
+        self._threads = [
+            threading.Thread(target=self._run, name=f"wicare-ai-{i}", daemon=True)
+            for i in range(workers)
+        ]
+
+    def start(self):
+        for t in self._threads:
+            t.start()
+        return self
+
+    def submit(self, device_id: str, window: dict, priority: bool = False,
+               callback: Callable[[str, str | None], None] | None = None) -> bool:
+        """排入分析請求；被速率限制、合併或佇列已滿時回傳 False"""
+        now = time.monotonic()
+        with self._lock:
+            if not priority:
+                if device_id in self._pending:
+                    self.stats.coalesced += 1
+                    return False
+                last = self._last_submit.get(device_id)
+                if last is not None and now - last < self.min_interval:
+                    self.stats.rate_limited += 1
+                    return False
+            self._last_submit[device_id] = now
+            self._pending.add(device_id)
+
+        item = (0 if priority else 1, next(self._seq), device_id, window, callback)
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            with self._lock:
+                self._pending.discard(device_id)
+            self.stats.dropped_full += 1
+            return False
+        self.stats.submitted += 1
+        return True
+
+    def latest(self, device_id: str, max_age: float | None = None) -> str | None:
+        """取得設備最新的分析結果 (超過 max_age 秒視為過期)"""
+        result = self._latest.get(device_id)
+        if result is None:
+            return None
+        if max_age is not None and time.monotonic() - result.timestamp > max_age:
+            return None
+        return result.text
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def close(self, timeout: float = 5.0):
+        for _ in self._threads:
+            # 優先序 2：排在所有待處理請求之後
+            self._queue.put((2, next(self._seq), _STOP, None, None))
+        for t in self._threads:
+            t.join(timeout)
+
+    def _run(self):
+        while True:
+            _, _, device_id, window, callback = self._queue.get()
+            if device_id is _STOP:
+                break
+
+            started = time.monotonic()
+            text = None
+            try:
+                text = self.analyze(window)
+            except Exception as e:
+                self.stats.errors += 1
+                print(f"[AI] 分析失敗: {e}")
+            latency = time.monotonic() - started
+
+            with self._lock:
+                self._pending.discard(device_id)
+            if text:
+                self._latest[device_id] = AIResult(text, time.monotonic(), latency)
+                self.stats.completed += 1
+                self.stats.last_latency = latency
+                self.stats.max_latency = max(self.stats.max_latency, latency)
+            if callback:
+                try:
+                    callback(device_id, text)
+                except Exception as e:
+                    print(f"[AI] 回呼失敗: {e}")
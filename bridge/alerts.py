@@ -0,0 +1,331 @@
+"""
+Wi-Care 警報派送 (LINE)
+
+取代在主迴圈內同步 requests.post (逾時 5 秒會讓所有設備停止取樣)：
+  - enqueue() 只把警報交給派送執行緒，不做任何 I/O
+  - 派送執行緒先把警報寫入 alert_outbox 表 (重啟後未送出的警報會繼續派送)，
+    再交給工作者執行緒池 (每個工作者持有自己的 keep-alive Session) 呼叫 LINE API
+  - 每個收件者有最短推播間隔；冷卻期間累積的多台設備警報合併成一則訊息，
+    多個收件者以 multicast 一次送出
+  - 失敗以指數退避 + 抖動重試 (429 依 Retry-After)；4xx 視為永久失敗
+  - api_base 可指向本機假 LINE 伺服器做測試
+
+alert_outbox.status：pending → sending → sent / failed
+"""
+
+import json
+import queue
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from lazy import available, lazy_import
+
+# requests 載入約需 100+ ms：由派送執行緒第一次推播時才載入，不拖慢啟動
+HAS_REQUESTS = available("requests")
+requests = lazy_import("requests")
+
+LINE_API_BASE = "https://api.line.me"
+MAX_TEXT = 5000  # LINE 文字訊息上限
+
+CREATE_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS alert_outbox (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        device_id TEXT NOT NULL,
+        score REAL NOT NULL,
+        ai_analysis TEXT,
+        recipients TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'pending',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        next_attempt REAL NOT NULL,
+        last_error TEXT,
+        created_at REAL NOT NULL,
+        sent_at REAL
+    )
+"""
+CREATE_INDEX_SQL = "CREATE INDEX IF NOT EXISTS idx_alert_outbox_status ON alert_outbox(status, next_attempt)"
+
+
+def init_schema(db: sqlite3.Connection):
+    db.execute(CREATE_TABLE_SQL)
+    db.execute(CREATE_INDEX_SQL)
+
+
+@dataclass
+class Alert:
+    id: int
+    device_id: str
+    score: float
+    ai_analysis: str | None
+    created_at: float
+
+
+@dataclass
+class _Job:
+    recipients: tuple[str, ...]
+    alerts: list[Alert]
+
+
+@dataclass
+class AlertStats:
+    enqueued: int = 0
+    messages: int = 0          # 成功送出的 LINE 訊息數
+    delivered: int = 0         # 已送達的警報數 (合併後一則訊息可含多筆)
+    coalesced: int = 0         # 因合併而省下的訊息數
+    retries: int = 0
+    failed: int = 0            # 放棄的警報數
+    recovered: int = 0         # 啟動時從 outbox 接續派送的警報數
+    last_error: str | None = None
+    per_recipient_sent: dict = field(default_factory=dict)
+
+
+def format_message(alerts: list[Alert]) -> str:
+    """單筆沿用原本格式；多筆合併為一則摘要"""
+    if len(alerts) == 1:
+        a = alerts[0]
+        ts = datetime.fromtimestamp(a.created_at).strftime("%Y/%m/%d %H:%M:%S")
+        text = f"🚨 Wi-Care 跌倒警報\n時間: {ts}\n感測分數: {a.score:.1f}\n設備: {a.device_id}"
+        if a.ai_analysis:
+            text += f"\nAI 分析: {a.ai_analysis}"
+        return text[:MAX_TEXT]
+
+    devices = sorted({a.device_id for a in alerts})
+    lines = [f"🚨 Wi-Care 跌倒警報 ({len(devices)} 台設備 / {len(alerts)} 筆)"]
+    for a in sorted(alerts, key=lambda a: a.created_at):
+        ts = datetime.fromtimestamp(a.created_at).strftime("%H:%M:%S")
+        line = f"- {ts} {a.device_id} 分數 {a.score:.1f}"
+        if a.ai_analysis:
+            line += f" | AI: {a.ai_analysis}"
+        lines.append(line)
+    text = "\n".join(lines)
+    return text if len(text) <= MAX_TEXT else text[:MAX_TEXT - 1] + "…"
+
+
+class AlertDispatcher:
+    """LINE 警報派送：outbox + 工作者池 + 每收件者限速與合併"""
+
+    def __init__(self, db_path: str, token: str, recipients: list[str], api_base: str = LINE_API_BASE,
+                 workers: int = 2, min_interval: float = 1.0, max_attempts: int = 6,
+                 backoff_base: float = 1.0, backoff_max: float = 300.0, timeout: float = 5.0,
+                 max_batch: int = 20, on_send=None):
+        if not HAS_REQUESTS:
+            raise RuntimeError("LINE 推播需要 requests: pip install requests")
+        self.db_path = db_path
+        self.token = token
+        self.recipients = tuple(recipients)
+        self.api_base = api_base.rstrip("/")
+        self.min_interval = min_interval
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.max_batch = max_batch
+        self.on_send = on_send  # on_send(seconds, ok)：每次 API 呼叫後 (監控用)
+        self.stats = AlertStats()
+
+        self._events: queue.Queue = queue.Queue()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="wicare-line")
+        self._local = threading.local()
+        self._next_allowed: dict[str, float] = {}
+        self._inflight = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="wicare-alerts", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def enqueue(self, device_id: str, score: float, ai_analysis: str | None = None):
+        """排入一筆警報 (不阻塞)"""
+        self.stats.enqueued += 1
+        self._events.put(("alert", (device_id, float(score), ai_analysis, time.time())))
+
+    def close(self, timeout: float = 10.0):
+        """停止派送；等待進行中的請求，未送出的警報留在 outbox 下次啟動再送"""
+        self._stop.set()
+        self._events.put(("stop", None))
+        self._thread.join(timeout)
+        self._pool.shutdown(wait=True)
+
+    # ---------- 派送執行緒 ----------
+    def _run(self):
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("PRAGMA busy_timeout=5000")
+        init_schema(conn)
+        with conn:
+            # 上次關閉時未送出的警報 (含傳送中)：重新排入並立即重試，不沿用舊的退避時間
+            conn.execute("UPDATE alert_outbox SET status='pending', next_attempt=MIN(next_attempt, ?) "
+                         "WHERE status IN ('pending', 'sending')", (time.time(),))
+        self.stats.recovered = conn.execute(
+            "SELECT COUNT(*) FROM alert_outbox WHERE status='pending'").fetchone()[0]
+
+        wait = 0.0
+        while True:
+            try:
+                kind, payload = self._events.get(timeout=wait)
+            except queue.Empty:
+                kind, payload = None, None
+            # 一次消化所有已到達的事件，再做一次派送排程
+            events = [(kind, payload)] if kind else []
+            while True:
+                try:
+                    events.append(self._events.get_nowait())
+                except queue.Empty:
+                    break
+
+            stopping = False
+            new_alerts = []
+            for kind, payload in events:
+                if kind == "alert":
+                    new_alerts.append(payload)
+                elif kind == "result":
+                    self._on_result(conn, *payload)
+                elif kind == "stop":
+                    stopping = True
+            if new_alerts:
+                self._persist(conn, new_alerts)
+
+            if stopping:
+                self._drain_inflight(conn)
+                break
+            wait = self._schedule(conn)
+        conn.close()
+
+    def _persist(self, conn: sqlite3.Connection, alerts: list[tuple]):
+        recipients = json.dumps(self.recipients)
+        now = time.time()
+        with conn:
+            conn.executemany(
+                "INSERT INTO alert_outbox (device_id, score, ai_analysis, recipients, next_attempt, created_at) "
+                "VALUES (?,?,?,?,?,?)",
+                [(dev, score, ai, recipients, now, created) for dev, score, ai, created in alerts])
+
+    def _schedule(self, conn: sqlite3.Connection) -> float:
+        """派送到期且收件者未在冷卻中的警報；回傳距離下一個事件的秒數"""
+        now = time.time()
+        rows = conn.execute(
+            "SELECT id, device_id, score, ai_analysis, created_at, recipients, next_attempt "
+            "FROM alert_outbox WHERE status='pending' ORDER BY id").fetchall()
+        if not rows:
+            return 1.0
+
+        groups: dict[tuple, list[Alert]] = {}
+        wake = now + 1.0
+        for aid, dev, score, ai, created, recipients, next_attempt in rows:
+            if next_attempt > now:
+                wake = min(wake, next_attempt)
+                continue
+            groups.setdefault(tuple(json.loads(recipients)), []).append(Alert(aid, dev, score, ai, created))
+
+        for recipients, alerts in groups.items():
+            ready_at = max((self._next_allowed.get(r, 0.0) for r in recipients), default=0.0)
+            if ready_at > now:
+                # 冷卻中：繼續累積，冷卻結束時合併送出
+                wake = min(wake, ready_at)
+                continue
+            for i in range(0, len(alerts), self.max_batch):
+                chunk = alerts[i:i + self.max_batch]
+                with conn:
+                    conn.executemany("UPDATE alert_outbox SET status='sending' WHERE id=?",
+                                     [(a.id,) for a in chunk])
+                self._inflight += 1
+                self._pool.submit(self._send, _Job(recipients, chunk))
+            for r in recipients:
+                self._next_allowed[r] = now + self.min_interval
+        return max(0.0, wake - time.time())
+
+    def _on_result(self, conn: sqlite3.Connection, job: _Job, ok: bool, retry_after: float | None,
+                   permanent: bool, error: str | None):
+        self._inflight -= 1
+        ids = [(a.id,) for a in job.alerts]
+        now = time.time()
+        if ok:
+            self.stats.messages += 1
+            self.stats.delivered += len(job.alerts)
+            self.stats.coalesced += len(job.alerts) - 1
+            for r in job.recipients:
+                self.stats.per_recipient_sent[r] = self.stats.per_recipient_sent.get(r, 0) + 1
+            with conn:
+                conn.executemany("UPDATE alert_outbox SET status='sent', sent_at=?, "
+                                 "attempts=attempts+1, last_error=NULL WHERE id=?",
+                                 [(now, i) for (i,) in ids])
+            return
+
+        self.stats.last_error = error
+        with conn:
+            conn.executemany("UPDATE alert_outbox SET attempts=attempts+1, last_error=? WHERE id=?",
+                             [(error, i) for (i,) in ids])
+            for (aid,) in ids:
+                attempts = conn.execute("SELECT attempts FROM alert_outbox WHERE id=?", (aid,)).fetchone()[0]
+                if permanent or attempts >= self.max_attempts:
+                    conn.execute("UPDATE alert_outbox SET status='failed' WHERE id=?", (aid,))
+                    self.stats.failed += 1
+                    print(f"[LINE] ❌ 警報放棄 (#{aid}, {attempts} 次): {error}")
+                else:
+                    delay = retry_after if retry_after is not None else min(
+                        self.backoff_max, self.backoff_base * 2 ** (attempts - 1))
+                    delay *= random.uniform(0.8, 1.2)
+                    conn.execute("UPDATE alert_outbox SET status='pending', next_attempt=? WHERE id=?",
+                                 (now + delay, aid))
+                    self.stats.retries += 1
+        if retry_after is not None:
+            for r in job.recipients:
+                self._next_allowed[r] = max(self._next_allowed.get(r, 0.0), now + retry_after)
+
+    def _drain_inflight(self, conn: sqlite3.Connection):
+        deadline = time.monotonic() + self.timeout + 1
+        while self._inflight and time.monotonic() < deadline:
+            try:
+                kind, payload = self._events.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if kind == "result":
+                self._on_result(conn, *payload)
+            elif kind == "alert":
+                self._persist(conn, [payload])
+
+    # ---------- 工作者 ----------
+    def _session(self) -> "requests.Session":
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+            session.mount("https://", requests.adapters.HTTPAdapter(pool_maxsize=2))
+            session.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=2))
+            session.headers.update({"Authorization": f"Bearer {self.token}",
+                                    "Content-Type": "application/json"})
+        return session
+
+    def _send(self, job: _Job):
+        messages = [{"type": "text", "text": format_message(job.alerts)}]
+        if len(job.recipients) == 1:
+            url, body = f"{self.api_base}/v2/bot/message/push", {"to": job.recipients[0], "messages": messages}
+        else:
+            url, body = f"{self.api_base}/v2/bot/message/multicast", {"to": list(job.recipients), "messages": messages}
+
+        started = time.monotonic()
+        ok, retry_after, permanent, error = False, None, False, None
+        try:
+            r = self._session().post(url, json=body, timeout=self.timeout)
+            if r.status_code < 300:
+                ok = True
+            elif r.status_code == 429:
+                error = "429 rate limited"
+                try:
+                    retry_after = float(r.headers.get("Retry-After", ""))
+                except ValueError:
+                    retry_after = None
+            else:
+                error = f"{r.status_code} {r.text[:200]}"
+                permanent = 400 <= r.status_code < 500
+        except Exception as e:  # 連線錯誤等；結果一定要回報給派送執行緒
+            error = str(e)
+        finally:
+            if self.on_send:
+                self.on_send(time.monotonic() - started, ok)
+        if ok:
+            print(f"[LINE] ✅ 推播成功 ({len(job.alerts)} 筆警報)")
+        self._events.put(("result", (job, ok, retry_after, permanent, error)))
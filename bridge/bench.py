@@ -0,0 +1,848 @@
+"""
+Wi-Care Bridge 錄製 / 重播與效能基準測試
+
+錄製真實 ESP32 輸出 (HTTP /status 回應或序列埠原始行)，或以固定種子產生模擬數據，
+再以虛擬時鐘 (不 sleep) 餵進完整的 WiCareBridge 管線，量測：
+  - 吞吐量 (samples/s)
+  - 各階段延遲百分位：parse / buffer / db (排入批次寫入器) / push (排入推送管線) / detect / total
+  - 收尾時間：批次寫入器與推送管線清空所需時間
+  - 記憶體 (RSS 峰值)
+
+後端可使用內建的本機替身 (stub，與後端相同以 seq 去重)、不可用的位址 (none，讀數留在本機待補送)，或指定 URL。
+結果可存成 JSON，並與先前的基準比較，吞吐量或 total p99 退步超過容忍比例時以非零狀態結束。
+
+使用範例：
+  python bench.py record --mode http --duration 60 --out rec.jsonl
+  python bench.py record --mode serial --serial-port /dev/ttyUSB0 --out rec.jsonl
+  python bench.py run                                  # 1 / 10 / 500 台模擬設備
+  python bench.py run --replay rec.jsonl --devices 1,10
+  python bench.py run --json base.json                 # 存下基準
+  python bench.py run --baseline base.json --tolerance 0.2
+  python bench.py startup --runs 10 --max-ms 200     # 啟動到第一筆樣本的時間
+  python bench.py fleet --devices 1000 --duration 30 --profile wifi  # 經 HTTP 輪詢模擬設備群
+  python bench.py shards --workers 1,2,4,8           # 分片偵測吞吐量隨核心數的擴展
+  python bench.py csi --devices 1,10,50               # 橋接器端 CSI 訊號處理吞吐量 (1 kHz / 台)
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import bridge as wicare
+import csi_dsp
+import emulator
+import shards
+from detector import DetectorConfig, FallDetector
+from serial_reader import parse_line
+
+STAGES = ("parse", "buffer", "db", "push", "detect", "total")
+RECORD_FORMAT = "wicare-rec"
+
+
+# ============================
+# 虛擬時鐘
+# ============================
+class VirtualClock:
+    """可手動推進的時鐘 (提供 time / monotonic / sleep，sleep 只推進時間)"""
+
+    def __init__(self, start: float = 1_700_000_000.0):
+        self._now = start
+        self._start = start
+
+    def time(self) -> float:
+        return self._now
+
+    def monotonic(self) -> float:
+        return self._now - self._start
+
+    def sleep(self, seconds: float):
+        self._now += max(0.0, seconds)
+
+    def advance_to(self, t: float):
+        self._now = max(self._now, t)
+
+
+# ============================
+# 延遲統計
+# ============================
+class StageTimer:
+    """各階段耗時 (奈秒)"""
+
+    def __init__(self):
+        self.samples: dict[str, list[int]] = {name: [] for name in STAGES}
+
+    def wrap(self, stage: str, fn):
+        record = self.samples[stage].append
+        clock = time.perf_counter_ns
+
+        def timed(*args, **kwargs):
+            t0 = clock()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                record(clock() - t0)
+        return timed
+
+    def summary(self) -> dict:
+        out = {}
+        for stage, values in self.samples.items():
+            if not values:
+                continue
+            values = sorted(values)
+            n = len(values)
+            pick = lambda q: values[min(n - 1, int(q * n))] / 1000  # noqa: E731 (μs)
+            out[stage] = {
+                "count": n,
+                "mean_us": round(sum(values) / n / 1000, 2),
+                "p50_us": round(pick(0.50), 2),
+                "p95_us": round(pick(0.95), 2),
+                "p99_us": round(pick(0.99), 2),
+                "max_us": round(values[-1] / 1000, 2),
+            }
+        return out
+
+
+class _TimedBuffer:
+    """RingBuffer 代理：只計時 append"""
+
+    def __init__(self, buf, timed_append):
+        self._buf = buf
+        self.append = timed_append
+
+    def __len__(self):
+        return len(self._buf)
+
+    def __getattr__(self, name):
+        return getattr(self._buf, name)
+
+
+def instrument(b: "wicare.WiCareBridge", timer: StageTimer):
+    """在橋接器實例上掛上計時包裝 (不修改類別)"""
+    proxies = {}
+    real_buffer = b._buffer
+
+    def timed_buffer(device_id=None):
+        buf = real_buffer(device_id)
+        proxy = proxies.get(id(buf))
+        if proxy is None:
+            proxy = proxies[id(buf)] = _TimedBuffer(buf, timer.wrap("buffer", buf.append))
+        return proxy
+
+    b._buffer = timed_buffer
+    b._push_to_backend = timer.wrap("push", b._push_to_backend)
+    b._detect = timer.wrap("detect", b._detect)
+    # 批次寫入的所有呼叫端 (sensor_data、彙總 upsert、CSI 索引) 都計入 db
+    write = timer.wrap("db", b.writer.write)
+    b.writer.write = write
+    if b.rollup:
+        b.rollup.write = write
+    if b.csi_store:
+        b.csi_store.index_write = write
+
+
+# ============================
+# 本機後端替身
+# ============================
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    received = 0
+    duplicates = 0
+    hwm: dict = {}
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        try:
+            readings = json.loads(body).get("readings", [])
+        except ValueError:
+            readings = []
+        # 與後端 /push-batch 相同：seq 不大於該設備高水位即為重送
+        cls, n, dup = type(self), 0, 0
+        for r in readings:
+            seq = r.get("seq")
+            if seq is not None and seq <= cls.hwm.get(r.get("device_id"), -1):
+                dup += 1
+                continue
+            if seq is not None:
+                cls.hwm[r.get("device_id")] = seq
+            n += 1
+        cls.received += n
+        cls.duplicates += dup
+        out = json.dumps({"success": True, "accepted": n, "duplicates": dup}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(out)))
+        self.end_headers()
+        self.wfile.write(out)
+
+    def log_message(self, *args):
+        pass
+
+
+@contextlib.contextmanager
+def stub_backend():
+    """啟動本機替身後端，回傳 URL"""
+    handler = type("StubHandler", (_StubHandler,), {"received": 0, "duplicates": 0, "hwm": {}})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}", handler
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+# ============================
+# 資料來源
+# ============================
+def load_recording(path: str) -> tuple[dict, list[tuple[float, bytes]]]:
+    """讀取錄製檔：回傳 (檔頭, [(相對時間, 原始內容)])"""
+    with open(path, encoding="utf-8") as f:
+        header = json.loads(f.readline())
+        if header.get("format") != RECORD_FORMAT:
+            raise ValueError(f"不是 Wi-Care 錄製檔: {path}")
+        frames = [(rec["t"], rec["raw"].encode()) for rec in map(json.loads, f) if rec]
+    return header, frames
+
+
+def simulated_frames(seed: int, count: int, interval: float) -> list[tuple[float, bytes]]:
+    """以固定種子產生模擬 /status 回應 (與 read_simulation 相同的分布)"""
+    clock = VirtualClock()
+    gen = _SimSource(seed, clock)
+    frames = []
+    for k in range(count):
+        clock.advance_to(clock._start + k * interval)
+        frames.append((k * interval, json.dumps(gen.read()).encode()))
+    return frames
+
+
+class _SimSource:
+    """只借用 read_simulation (不建立資料庫等資源)"""
+
+    def __init__(self, seed: int, clock: VirtualClock):
+        self.config = {"fall_threshold": wicare.DEFAULT_CONFIG["fall_threshold"]}
+        self.clock = clock
+        self.rng = random.Random(seed)
+
+    read = wicare.WiCareBridge.read_simulation
+
+
+def make_parser(kind: str):
+    """錄製格式對應的解析器 (http: JSON 回應；serial: ESPectre / JSON 行)"""
+    if kind == "serial":
+        return parse_line
+    return json.loads
+
+
+# ============================
+# 執行基準
+# ============================
+def _rss_mb() -> float:
+    # Linux 為 KB，macOS 為 bytes
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def run_scenario(devices: int, frames: list[tuple[float, bytes]], kind: str, interval: float,
+                 backend: str, seed: int, config_overrides: dict | None = None) -> dict:
+    """以虛擬時鐘將 frames 依序重播給 devices 台設備，回傳結果摘要"""
+    parse = make_parser(kind)
+    timer = StageTimer()
+    timed_parse = timer.wrap("parse", parse)
+
+    with tempfile.TemporaryDirectory(prefix="wicare-bench-") as tmp, contextlib.ExitStack() as stack:
+        stub = None
+        if backend == "stub":
+            backend_url, stub = stack.enter_context(stub_backend())
+        elif backend == "none":
+            backend_url = "http://127.0.0.1:9"  # discard port：連線被拒，讀數留在本機待補送
+        else:
+            backend_url = backend
+
+        config = dict(wicare.DEFAULT_CONFIG,
+                      db_path=os.path.join(tmp, "wicare.db"),
+                      csi_dir=os.path.join(tmp, "csi"),
+                      backend_url=backend_url,
+                      gemini_api_key="", line_token="",
+                      sim_seed=seed, poll_interval=interval, metrics_port=0)
+        config.update(config_overrides or {})
+        ids = [config["device_id"]] if devices == 1 else [f"BENCH-{i:04d}" for i in range(devices)]
+
+        clock = VirtualClock()
+        devnull = stack.enter_context(open(os.devnull, "w"))
+        with contextlib.redirect_stdout(devnull):
+            b = wicare.WiCareBridge(config, mode="sim", clock=clock)
+        instrument(b, timer)
+        total = timer.samples["total"].append
+        process = b.process_sample
+
+        rss_before = _rss_mb()
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(devnull):
+            for t, raw in frames:
+                clock.advance_to(clock._start + t)
+                for device_id in ids:
+                    t0 = time.perf_counter_ns()
+                    data = timed_parse(raw)
+                    if data is not None:
+                        process(device_id, data)
+                    total(time.perf_counter_ns() - t0)
+        elapsed = time.perf_counter() - started
+
+        # 收尾：背景寫入器與推送管線清空
+        drain_started = time.perf_counter()
+        with contextlib.redirect_stdout(devnull):
+            b.writer.flush()
+        db_drain = time.perf_counter() - drain_started
+        pusher = b.pusher
+        drain_started = time.perf_counter()
+        with contextlib.redirect_stdout(devnull):
+            b.cleanup()
+        close_time = time.perf_counter() - drain_started
+
+        samples = len(frames) * devices
+        result = {
+            "devices": devices,
+            "samples": samples,
+            "source": kind,
+            "backend": backend if backend in ("stub", "none") else "url",
+            "elapsed_s": round(elapsed, 4),
+            "throughput": round(samples / elapsed, 1) if elapsed else 0.0,
+            "stages": timer.summary(),
+            "db_rows": b.writer.stats.rows_written,
+            "db_drain_ms": round(db_drain * 1000, 2),
+            "shutdown_ms": round(close_time * 1000, 2),
+            "rss_mb": round(_rss_mb(), 1),
+            "rss_growth_mb": round(_rss_mb() - rss_before, 1),
+        }
+        if pusher:
+            ps = pusher.stats
+            result["push"] = {"sent": ps.sent, "pending": pusher.queue_depth, "duplicates": ps.duplicates,
+                              "received": stub.received if stub else None}
+        return result
+
+
+def print_result(r: dict):
+    print(f"\n[BENCH] {r['devices']} 台設備 / {r['samples']} 筆 ({r['source']}, 後端={r['backend']})")
+    print(f"  吞吐量: {r['throughput']:,.0f} samples/s  (耗時 {r['elapsed_s']:.2f}s)")
+    print(f"  {'階段':<8}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}  (μs)")
+    for stage in STAGES:
+        s = r["stages"].get(stage)
+        if s:
+            print(f"  {stage:<8}{s['p50_us']:>10.1f}{s['p95_us']:>10.1f}{s['p99_us']:>10.1f}{s['max_us']:>10.1f}")
+    print(f"  DB: {r['db_rows']} 列，清空 {r['db_drain_ms']:.0f}ms；關閉 {r['shutdown_ms']:.0f}ms")
+    if "push" in r:
+        p = r["push"]
+        print(f"  推送: 送出={p['sent']} 未確認={p['pending']} 重複={p['duplicates']}")
+    print(f"  記憶體: RSS 峰值 {r['rss_mb']:.1f}MB (本輪增加 {r['rss_growth_mb']:.1f}MB)")
+
+
+def compare(results: list[dict], baseline: dict, tolerance: float) -> list[str]:
+    """與基準比較；回傳退步項目"""
+    previous = {r["devices"]: r for r in baseline.get("results", [])}
+    regressions = []
+    for r in results:
+        old = previous.get(r["devices"])
+        if not old:
+            continue
+        if r["throughput"] < old["throughput"] * (1 - tolerance):
+            regressions.append(f"{r['devices']} 台: 吞吐量 {old['throughput']:.0f} → {r['throughput']:.0f} samples/s")
+        old_p99 = old["stages"].get("total", {}).get("p99_us")
+        new_p99 = r["stages"].get("total", {}).get("p99_us")
+        if old_p99 and new_p99 and new_p99 > old_p99 * (1 + tolerance):
+            regressions.append(f"{r['devices']} 台: total p99 {old_p99:.1f} → {new_p99:.1f} μs")
+    return regressions
+
+
+# ============================
+# 錄製
+# ============================
+def record(args):
+    """錄製 ESP32 原始輸出 (HTTP 回應內容或序列埠行) 到 JSONL"""
+    config = dict(wicare.DEFAULT_CONFIG)
+    if args.esp32_ip: config["esp32_ip"] = args.esp32_ip
+    if args.esp32_port: config["esp32_port"] = args.esp32_port
+    if args.serial_port: config["serial_port"] = args.serial_port
+
+    if args.mode == "http":
+        if not wicare.HAS_REQUESTS:
+            print("[ERROR] 需要 requests 套件: pip install requests")
+            return 1
+        session = wicare.requests.Session()
+        url = f"http://{config['esp32_ip']}:{config['esp32_port']}/status"
+
+        def read() -> bytes | None:
+            try:
+                r = session.get(url, timeout=3)
+                return r.content if r.status_code == 200 else None
+            except wicare.requests.RequestException as e:
+                print(f"[HTTP] 連線失敗: {e}")
+                return None
+    else:
+        if not wicare.HAS_SERIAL:
+            print("[ERROR] 需要 pyserial 套件: pip install pyserial")
+            return 1
+        port = wicare.serial.Serial(config["serial_port"], config["serial_baud"], timeout=1)
+
+        def read() -> bytes | None:
+            return port.readline().strip() or None
+
+    count = 0
+    start = time.monotonic()
+    with open(args.out, "w", encoding="utf-8") as f:
+        f.write(json.dumps({"format": RECORD_FORMAT, "version": 1, "kind": args.mode,
+                            "interval": args.interval, "recorded_at": time.time()}) + "\n")
+        try:
+            while time.monotonic() - start < args.duration:
+                tick = time.monotonic()
+                raw = read()
+                if raw:
+                    f.write(json.dumps({"t": round(tick - start, 4),
+                                        "raw": raw.decode("utf-8", errors="replace")}) + "\n")
+                    count += 1
+                if args.mode == "http":
+                    time.sleep(max(0.0, args.interval - (time.monotonic() - tick)))
+        except KeyboardInterrupt:
+            pass
+    print(f"[BENCH] 已錄製 {count} 筆 → {args.out}")
+    return 0
+
+
+# ============================
+# 啟動時間
+# ============================
+BRIDGE_SCRIPT = str(Path(__file__).with_name("bridge.py"))
+FIRST_SAMPLE_MARK = b"score="
+
+
+def time_to_first_sample(args: list[str], env: dict, timeout: float = 30.0) -> float | None:
+    """啟動 bridge.py 子程序，量測到輸出第一筆樣本 (狀態列) 的毫秒數；逾時回傳 None"""
+    started = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, BRIDGE_SCRIPT, *args], env=env,
+                            stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    seen = b""
+    elapsed = None
+    try:
+        deadline = started + timeout
+        while time.perf_counter() < deadline:
+            chunk = os.read(proc.stdout.fileno(), 4096)
+            if not chunk:
+                break
+            seen = seen[-64:] + chunk
+            if FIRST_SAMPLE_MARK in seen:
+                elapsed = (time.perf_counter() - started) * 1000
+                break
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(5)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+        proc.stdout.close()
+    return elapsed
+
+
+def startup(args) -> int:
+    """重複冷啟動 bridge.py --mode sim，回報到第一筆樣本的時間分佈"""
+    results = []
+    with tempfile.TemporaryDirectory(prefix="wicare-startup-") as tmp:
+        env = dict(os.environ, PYTHONUNBUFFERED="1", DB_PATH=os.path.join(tmp, "wicare.db"),
+                   CSI_DIR=os.path.join(tmp, "csi"), METRICS_PORT=str(args.metrics_port))
+        # 直譯器本身的啟動成本 (下限參考)
+        started = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "pass"], env=env, check=True)
+        interpreter_ms = (time.perf_counter() - started) * 1000
+
+        for i in range(args.runs):
+            ms = time_to_first_sample(["--mode", args.mode, *args.bridge_args], env)
+            if ms is None:
+                print(f"[BENCH] 第 {i + 1} 次：逾時，未取得樣本")
+                return 1
+            results.append(ms)
+            print(f"[BENCH] 第 {i + 1} 次：{ms:.0f} ms")
+
+    median = statistics.median(results)
+    print(f"\n[BENCH] 啟動到第一筆樣本 ({args.mode}, {args.runs} 次): "
+          f"min={min(results):.0f} median={median:.0f} max={max(results):.0f} ms "
+          f"(直譯器 {interpreter_ms:.0f} ms)")
+    if args.max_ms and median > args.max_ms:
+        print(f"[BENCH] ❌ 超過目標 {args.max_ms:.0f} ms")
+        return 1
+    if args.max_ms:
+        print(f"[BENCH] ✅ 低於目標 {args.max_ms:.0f} ms")
+    return 0
+
+
+# ============================
+# 模擬設備群 (HTTP 擷取)
+# ============================
+class _TappedHistogram:
+    """Histogram 代理：另外保留原始觀測值以計算精確百分位"""
+
+    def __init__(self, hist):
+        self._hist = hist
+        self.values = []
+
+    def observe(self, value: float):
+        self.values.append(value)
+        self._hist.observe(value)
+
+    def __getattr__(self, name):
+        return getattr(self._hist, name)
+
+
+def run_fleet(devices: int, duration: float, interval: float, profile: str = "lan", seed: int = 42,
+              shared: bool = True, backend: str = "stub", device_list: list[dict] | None = None,
+              config_overrides: dict | None = None) -> dict:
+    """
+    以真實 HTTP 路徑 (AsyncIngestionEngine + HttpStatusReader) 輪詢模擬設備群 duration 秒
+
+    device_list 為 None 時在本程序的背景執行緒啟動模擬器 (與橋接器共用 GIL)；
+    傳入外部模擬器的設備清單 (emulator.py --write-devices) 可避免互相干擾。
+    """
+    fleet = None
+    if device_list is None:
+        fleet = emulator.Fleet.build(devices, profile, seed, prefix="BENCH")
+
+    with tempfile.TemporaryDirectory(prefix="wicare-fleet-") as tmp, contextlib.ExitStack() as stack:
+        stub = None
+        if backend == "stub":
+            backend_url, stub = stack.enter_context(stub_backend())
+        elif backend == "none":
+            backend_url = "http://127.0.0.1:9"
+        else:
+            backend_url = backend
+        if fleet:
+            stack.enter_context(emulator.running_fleet(fleet, port=0 if shared else None,
+                                                       base_port=None if shared else 0))
+            device_list = fleet.device_list()
+
+        config = dict(wicare.DEFAULT_CONFIG,
+                      db_path=os.path.join(tmp, "wicare.db"),
+                      csi_dir=os.path.join(tmp, "csi"),
+                      backend_url=backend_url,
+                      gemini_api_key="", line_token="",
+                      poll_interval=interval, metrics_port=0, quiet=True)
+        config.update(config_overrides or {})
+        devnull = stack.enter_context(open(os.devnull, "w"))
+        with contextlib.redirect_stdout(devnull):
+            b = wicare.WiCareBridge(config, mode="http")
+        reads = b.h_read = _TappedHistogram(b.h_read)
+
+        rss_before = _rss_mb()
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(devnull):
+            b.run_async(device_list, duration)
+        elapsed = time.perf_counter() - started
+
+        st = b.engine.stats
+        expected = len(device_list) * duration / interval
+        values = sorted(reads.values)
+
+        def pick(q):
+            return round(values[min(len(values) - 1, int(q * len(values)))] * 1000, 2) if values else 0.0
+
+        result = {
+            "devices": len(device_list),
+            "profile": profile if fleet else "external",
+            "duration_s": duration,
+            "interval_s": interval,
+            "samples": st.samples,
+            "coverage": round(st.samples / expected, 3) if expected else 0.0,   # 實際 / 排程應有的樣本數
+            "throughput": round(st.samples / elapsed, 1) if elapsed else 0.0,
+            "failures": st.failures,
+            "timeouts": st.timeouts,
+            "late_ticks": st.late_ticks,
+            "max_lag_ms": round(st.max_lag * 1000, 1),
+            "probes": st.probes,
+            "boosted_polls": st.boosted_polls,
+            "read_ms": {"p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99),
+                        "max": round(values[-1] * 1000, 2) if values else 0.0},
+            "db_rows": b.writer.stats.rows_written,
+            "rss_mb": round(_rss_mb(), 1),
+            "rss_growth_mb": round(_rss_mb() - rss_before, 1),
+        }
+        if fleet:
+            fs = fleet.stats
+            result["emulator"] = {"requests": fs.requests, "connections": fs.connections, "errors": fs.errors,
+                                  "hangs": fs.hangs, "resets": fs.resets}
+        if stub:
+            result["push_received"] = stub.received
+        return result
+
+
+def print_fleet_result(r: dict):
+    print(f"\n[BENCH] {r['devices']} 台模擬設備 ({r['profile']}) / {r['duration_s']:.0f}s / 每 {r['interval_s']}s 輪詢")
+    print(f"  樣本: {r['samples']} (排程覆蓋率 {r['coverage']:.1%})  吞吐量: {r['throughput']:,.0f} samples/s")
+    print(f"  失敗={r['failures']} 逾時={r['timeouts']} 落後={r['late_ticks']} 最大排程延遲={r['max_lag_ms']:.0f}ms")
+    print(f"  退避探測={r['probes']} 加速輪詢={r['boosted_polls']}")
+    rd = r["read_ms"]
+    print(f"  讀取延遲 (ms): p50={rd['p50']:.1f} p95={rd['p95']:.1f} p99={rd['p99']:.1f} max={rd['max']:.1f}")
+    if "emulator" in r:
+        e = r["emulator"]
+        print(f"  模擬器: 請求={e['requests']} 連線={e['connections']} 500={e['errors']} "
+              f"不回應={e['hangs']} 斷線={e['resets']}")
+    print(f"  DB: {r['db_rows']} 列；記憶體: RSS 峰值 {r['rss_mb']:.1f}MB (增加 {r['rss_growth_mb']:.1f}MB)")
+
+
+def fleet(args) -> int:
+    device_list = wicare.ingest.load_device_specs(args.external) if args.external else None
+    results = []
+    for n in (int(x) for x in args.devices.split(",") if x.strip()):
+        r = run_fleet(n, args.duration, args.interval, args.profile, args.seed, not args.per_port,
+                      args.backend, device_list)
+        print_fleet_result(r)
+        results.append(r)
+        if device_list:
+            break
+    if args.json:
+        Path(args.json).write_text(json.dumps({"python": sys.version.split()[0], "seed": args.seed,
+                                               "fleet": results}, indent=2, ensure_ascii=False), encoding="utf-8")
+        print(f"\n[BENCH] 結果已寫入 {args.json}")
+    if args.min_coverage and any(r["coverage"] < args.min_coverage for r in results):
+        print(f"\n[BENCH] ❌ 排程覆蓋率低於 {args.min_coverage:.0%}")
+        return 1
+    return 0
+
+
+# ============================
+# 分片偵測擴展性
+# ============================
+def run_shards(devices: int, samples: int, workers: list[int], batch_size: int = 256, seed: int = 42) -> dict:
+    """
+    以相同的讀數流量測偵測吞吐量：主程序 FallDetector.evaluate vs ShardPool (各子程序數)
+
+    只量偵測本身 (讀數事先產生)；主程序端的成本是排入批次與收回結果，
+    parent_us 為主程序每筆的 CPU 時間，1e6 / parent_us 即子程序再多也無法超過的吞吐量上限。
+    """
+    rng = random.Random(seed)
+    stream = [(f"BENCH-{i:04d}", rng.uniform(60, 100) if rng.random() < 0.01 else rng.uniform(0, 20))
+              for _ in range(samples) for i in range(devices)]
+    detector = FallDetector(DetectorConfig())
+    w = detector.cfg.window
+
+    windows = {}
+    started = time.perf_counter()
+    for dev, score in stream:
+        window = windows.setdefault(dev, [])
+        window.append(score)
+        if len(window) > w:
+            del window[0]
+        detector.evaluate(window, 70.0)
+    single = len(stream) / (time.perf_counter() - started)
+
+    runs = []
+    for n in workers:
+        alerts = []
+        pool = shards.ShardPool(n, detector.cfg, detector.model, batch_size=batch_size,
+                                on_result=lambda ctx, det: alerts.append(ctx)).start()
+        started, cpu = time.perf_counter(), time.process_time()
+        for k, (dev, score) in enumerate(stream):
+            pool.submit(dev, score, 70.0, k)
+            if k % batch_size == 0:
+                pool.poll()
+        pool.flush()
+        while pool.pending:
+            pool.poll(0.1)
+        elapsed, cpu = time.perf_counter() - started, time.process_time() - cpu
+        stats = pool.stats
+        pool.close()
+        rate = stats.results / elapsed
+        runs.append({"workers": n, "throughput": round(rate, 1), "speedup": round(rate / single, 2),
+                     "efficiency": round(rate / single / n, 2), "stalls": stats.stalls,
+                     "parent_us": round(cpu / stats.results * 1e6, 2), "callbacks": len(alerts)})
+    return {"devices": devices, "samples": len(stream), "cpus": os.cpu_count(),
+            "single_process": round(single, 1), "sharded": runs}
+
+
+def print_shards_result(r: dict):
+    print(f"\n[BENCH] 分片偵測：{r['devices']} 台設備 / {r['samples']} 筆讀數 (CPU {r['cpus']} 核)")
+    print(f"  主程序: {r['single_process']:>12,.0f} samples/s")
+    for run in r["sharded"]:
+        print(f"  {run['workers']:>2} 子程序: {run['throughput']:>10,.0f} samples/s  "
+              f"加速 {run['speedup']:.2f}x  效率 {run['efficiency']:.0%}  背壓等待={run['stalls']}  "
+              f"主程序 {run['parent_us']:.1f}µs/筆 (上限 {1e6 / run['parent_us']:,.0f}/s)")
+
+
+def shards_cmd(args) -> int:
+    workers = [int(x) for x in args.workers.split(",") if x.strip()]
+    r = run_shards(args.devices, args.samples, workers, args.batch, args.seed)
+    print_shards_result(r)
+    if args.json:
+        Path(args.json).write_text(json.dumps(r, indent=2, ensure_ascii=False), encoding="utf-8")
+        print(f"\n[BENCH] 結果已寫入 {args.json}")
+    return 0
+
+
+# ============================
+# 橋接器端 CSI 訊號處理
+# ============================
+def run_csi(devices: int, seconds: float, rate: float = 1000.0, n_sub: int = 64, block: int = 50,
+            seed: int = 42) -> dict:
+    """
+    N 台設備各以 rate Hz 送出 CSI 批次訊框 (block 個訊框一批，與 UDP csi_iq 相同)，量測 CsiDsp 吞吐量
+
+    realtime 為處理速度 / 即時需求 (N × rate)；大於 1 表示單核心跟得上。
+    """
+    frames = int(seconds * rate)
+    amplitude = csi_dsp.synthetic_csi(frames, n_sub, rate, motion=((seconds / 2, seconds),), seed=seed)
+    iq = csi_dsp.np.zeros((frames, 2 * n_sub), dtype=csi_dsp.np.int8)
+    iq[:, 0::2] = csi_dsp.np.clip(amplitude.round(), 0, 127)
+    batches = [iq[i:i + block].tobytes() for i in range(0, frames, block)]
+
+    dsp = csi_dsp.CsiDsp(csi_dsp.DspConfig(rate=rate))
+    scores = 0
+    started = time.perf_counter()
+    for batch in batches:
+        for i in range(devices):
+            scores += len(dsp.feed(f"CSI-{i:03d}", {"csi_iq": batch, "n_sub": n_sub}))
+    elapsed = time.perf_counter() - started
+    throughput = dsp.frames / elapsed
+    return {"devices": devices, "frames": dsp.frames, "n_sub": n_sub, "block": block, "scores": scores,
+            "throughput": round(throughput, 1), "realtime": round(throughput / (devices * rate), 2),
+            "us_per_frame": round(elapsed / dsp.frames * 1e6, 2)}
+
+
+def print_csi_result(r: dict):
+    print(f"  {r['devices']:>4} 台: {r['throughput']:>10,.0f} frames/s  {r['us_per_frame']:.1f}µs/訊框  "
+          f"即時倍數 {r['realtime']:.2f}x  分數 {r['scores']} 筆 ({r['n_sub']} 子載波, 每批 {r['block']})")
+
+
+def csi_cmd(args) -> int:
+    if not csi_dsp.HAS_NUMPY:
+        print("[BENCH] CSI 訊號處理需要 numpy")
+        return 1
+    print(f"\n[BENCH] 橋接器端 CSI 訊號處理 ({args.rate:g} Hz / 台)")
+    results = []
+    for n in (int(x) for x in args.devices.split(",") if x.strip()):
+        r = run_csi(n, args.seconds, args.rate, args.subcarriers, args.block, args.seed)
+        print_csi_result(r)
+        results.append(r)
+    if args.json:
+        Path(args.json).write_text(json.dumps({"python": sys.version.split()[0], "csi": results}, indent=2,
+                                              ensure_ascii=False), encoding="utf-8")
+        print(f"\n[BENCH] 結果已寫入 {args.json}")
+    return 0
+
+
+# ============================
+# 命令列
+# ============================
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Wi-Care Bridge 錄製 / 重播基準測試")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    rec = sub.add_parser("record", help="錄製 ESP32 輸出")
+    rec.add_argument("--mode", choices=["http", "serial"], default="http")
+    rec.add_argument("--out", required=True, help="輸出 JSONL 檔")
+    rec.add_argument("--duration", type=float, default=60, help="錄製秒數")
+    rec.add_argument("--interval", type=float, default=wicare.DEFAULT_CONFIG["poll_interval"], help="HTTP 輪詢間隔")
+    rec.add_argument("--esp32-ip", default=None)
+    rec.add_argument("--esp32-port", type=int, default=None)
+    rec.add_argument("--serial-port", default=None)
+
+    run = sub.add_parser("run", help="執行基準測試")
+    run.add_argument("--replay", default=None, help="重播錄製檔 (預設為固定種子模擬)")
+    run.add_argument("--devices", default="1,10,500", help="設備數量，以逗號分隔")
+    run.add_argument("--samples", type=int, default=200, help="每台設備的取樣數 (模擬時)")
+    run.add_argument("--interval", type=float, default=1.0, help="取樣間隔 (虛擬秒，模擬時)")
+    run.add_argument("--seed", type=int, default=42)
+    run.add_argument("--backend", default="stub", help="stub (本機替身) / none (不可用) / 後端 URL")
+    run.add_argument("--json", default=None, help="結果輸出 JSON 檔")
+    run.add_argument("--baseline", default=None, help="先前的結果 JSON，用於回歸比較")
+    run.add_argument("--tolerance", type=float, default=0.2, help="容許退步比例")
+    run.add_argument("--quiet", action="store_true", help="以安靜模式執行 (不逐筆輸出狀態列)")
+
+    st = sub.add_parser("startup", help="量測冷啟動到第一筆樣本的時間")
+    st.add_argument("--mode", default="sim", help="bridge.py 模式")
+    st.add_argument("--runs", type=int, default=10)
+    st.add_argument("--max-ms", type=float, default=200, help="中位數目標 (毫秒，0 = 不檢查)")
+    st.add_argument("--metrics-port", type=int, default=wicare.DEFAULT_CONFIG["metrics_port"],
+                    help="/metrics 監控埠 (0 = 停用)")
+    st.add_argument("bridge_args", nargs=argparse.REMAINDER, help="傳給 bridge.py 的其他參數")
+
+    fl = sub.add_parser("fleet", help="經 HTTP 輪詢模擬設備群 (emulator.py)")
+    fl.add_argument("--devices", default="100,1000", help="設備數量，以逗號分隔")
+    fl.add_argument("--duration", type=float, default=20, help="每輪秒數")
+    fl.add_argument("--interval", type=float, default=wicare.DEFAULT_CONFIG["poll_interval"], help="輪詢間隔")
+    fl.add_argument("--profile", default="lan", help="模擬器故障設定檔 (見 emulator.py --help)")
+    fl.add_argument("--per-port", action="store_true", help="每台設備一埠 (預設共用單一埠)")
+    fl.add_argument("--external", default=None, help="改用外部模擬器的設備清單 JSON")
+    fl.add_argument("--seed", type=int, default=42)
+    fl.add_argument("--backend", default="stub", help="stub (本機替身) / none (不可用) / 後端 URL")
+    fl.add_argument("--min-coverage", type=float, default=0.0, help="排程覆蓋率低於此值時以非零狀態結束")
+    fl.add_argument("--json", default=None, help="結果輸出 JSON 檔")
+
+    sh = sub.add_parser("shards", help="分片偵測吞吐量 (shards.py)")
+    sh.add_argument("--devices", type=int, default=500)
+    sh.add_argument("--samples", type=int, default=400, help="每台設備的讀數")
+    sh.add_argument("--workers", default="1,2,4,8", help="子程序數，以逗號分隔")
+    sh.add_argument("--batch", type=int, default=256, help="每批讀數上限")
+    sh.add_argument("--seed", type=int, default=42)
+    sh.add_argument("--json", default=None, help="結果輸出 JSON 檔")
+
+    cs = sub.add_parser("csi", help="橋接器端 CSI 訊號處理吞吐量 (csi_dsp.py)")
+    cs.add_argument("--devices", default="1,10,50", help="設備數量，以逗號分隔")
+    cs.add_argument("--seconds", type=float, default=5, help="每台設備的 CSI 秒數")
+    cs.add_argument("--rate", type=float, default=1000, help="CSI 取樣率 (Hz)")
+    cs.add_argument("--subcarriers", type=int, default=64)
+    cs.add_argument("--block", type=int, default=50, help="每批訊框數")
+    cs.add_argument("--seed", type=int, default=42)
+    cs.add_argument("--json", default=None, help="結果輸出 JSON 檔")
+    args = parser.parse_args(argv)
+
+    if args.command == "record":
+        return record(args)
+    if args.command == "startup":
+        return startup(args)
+    if args.command == "fleet":
+        return fleet(args)
+    if args.command == "shards":
+        return shards_cmd(args)
+    if args.command == "csi":
+        return csi_cmd(args)
+
+    if args.replay:
+        header, frames = load_recording(args.replay)
+        kind, interval = header.get("kind", "http"), header.get("interval", 1.0)
+    else:
+        kind, interval = "http", args.interval
+        frames = simulated_frames(args.seed, args.samples, interval)
+
+    results = []
+    for n in (int(x) for x in args.devices.split(",") if x.strip()):
+        r = run_scenario(n, frames, kind, interval, args.backend, args.seed, {"quiet": args.quiet})
+        print_result(r)
+        results.append(r)
+
+    report = {"python": sys.version.split()[0], "seed": args.seed, "results": results}
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+        print(f"\n[BENCH] 結果已寫入 {args.json}")
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print("\n[BENCH] ❌ 效能退步:")
+            for line in regressions:
+                print(f"  - {line}")
+            return 1
+        print(f"\n[BENCH] ✅ 未超過容忍範圍 ({args.tolerance:.0%})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
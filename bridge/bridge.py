@@ -4,53 +4,94 @@ ESP32 ↔ SQLite ↔ Node.js 的資料橋接器
 
 支援模式：
   1. HTTP  - 輪詢 ESP32 HTTP /status 端點（預設）
+     --stream sse / udp 改由設備推送 (SSE /stream 或 UDP 訊框)，讀數到達即偵測；串流中斷時自動改回輪詢
   2. SERIAL - 讀取 ESP32 USB 序列輸出
+     SERIAL-STREAM - 背景執行緒整塊讀取序列埠 (ESPectre 100+ 行/秒)
   3. SIM    - 模擬模式（無硬體開發用）
+  4. 多設備 - 以 asyncio 在單一程序中同時輪詢多台 ESP32 (--devices / --sim-devices)
+     偵測可分片到多個子程序 (--detector-workers)，I/O 與資料庫寫入仍在主程序
 
 功能：
   - 讀取 ESP32 movement_score 感測數據
-  - 寫入 SQLite sensor_data 資料表
-  - 推送到 Node.js 後端 (POST /api/sensor-data/push)
+  - 寫入 SQLite sensor_data 資料表 (原始 CSI 訊框另存為二進位分段檔)
+  - 可選：橋接器端 CSI 訊號處理 (--csi-dsp)，從原始子載波 CSI 計算 movement_score (見 csi_dsp.py)
+  - 批次推送到 Node.js 後端 (POST /api/sensor-data/push-batch，斷線時暫存到磁碟)
   - 可選：Gemini AI 跌倒分析
   - 可選：LINE 推播通知
+  - 自適應輪詢：連續失敗的設備指數退避並改以 /health 探測，分數接近閾值的設備加速輪詢
+  - 監控指標：本機 /metrics 端點 (Prometheus 格式)，安靜模式定期輸出摘要
+  - 可選：即時讀數發布到共享記憶體環，本機程序次毫秒讀取 (--live-ring)
 
 使用範例：
   python bridge.py                     # HTTP 模式
   python bridge.py --mode serial       # 序列埠模式
+  python bridge.py --mode serial-stream  # 高速序列埠模式
   python bridge.py --mode sim          # 模擬模式
   python bridge.py --esp32-ip 192.168.1.100  # 指定 IP
+  python bridge.py --stream sse              # 設備推送 (SSE)，不支援的韌體自動改用輪詢
+  python bridge.py --mode serial-stream --csi-dsp  # esp-csi CSI_DATA 原始 CSI → 橋接器計算分數
+  python bridge.py --devices devices.json    # 多設備 (JSON 設備清單)
+  python bridge.py --mode sim --sim-devices 500  # 500 台模擬設備
+  python bridge.py --mode sim --seed 42      # 可重現的模擬數據
+  python bridge.py --quiet                   # 定期摘要取代逐筆輸出；監控: http://127.0.0.1:9108/metrics
+  python bridge.py --mode sim --live-ring    # 本機程序經共享記憶體讀取即時讀數 (見 live_ring.py)
+  python bridge.py --mode sim --sim-devices 500 --detector-workers 8  # 8 核心閘道器分片偵測 (見 shards.py)
+  python bench.py run                        # 效能基準測試 (見 bench.py)
+  python rescore.py --thresholds 60,70,80    # 以歷史數據離線重新評分 (見 rescore.py)
 """
 
 import argparse
-import json
+import math
 import os
-import re
+import queue
+import random
 import sqlite3
 import sys
+import threading
 import time
 from datetime import datetime
 from pathlib import Path
 
-# ---------- 可選依賴 ----------
-try:
-    import requests
-    HAS_REQUESTS = True
-except ImportError:
-    HAS_REQUESTS = False
+from ai_cache import AnalysisCache
+from ai_worker import AIAnalysisWorker
+import alerts
+from alerts import AlertDispatcher
+import csi_store
+from csi_store import CsiStore
+from detector import AMBIGUOUS, FALL, HAS_NUMPY, DetectorConfig, FallDetector
+import device_state
+from device_state import DeviceStateStore
+import live_ring
+from live_ring import LiveRingWriter
+from lazy import available, lazy_import
+from metrics import MetricsServer, Registry, SummaryReporter
+from poll_policy import DeviceHealth, PollPolicy
+import push_client
+from push_client import PushClient, SequenceAllocator
+from ring_buffer import RingBuffer
+import rollup
+from rollup import RetentionJob, RetentionPolicy, RollupAggregator
+import schema
+from serial_reader import SerialStreamReader, parse_line
+from writer import BatchWriter
+
+# ---------- 可選依賴 (延遲載入) ----------
+# 只檢查是否安裝；requests / pyserial / Gemini SDK / asyncio 多設備引擎 / 分片偵測在第一次用到時才載入，
+# sim 模式不必為用不到的套件付出數百毫秒的啟動時間
+HAS_REQUESTS = available("requests")
+if not HAS_REQUESTS:
     print("[WARN] requests 未安裝，無法推送到後端。執行: pip install requests")
+requests = lazy_import("requests")
 
-try:
-    import serial
-    import serial.tools.list_ports
-    HAS_SERIAL = True
-except ImportError:
-    HAS_SERIAL = False
+HAS_SERIAL = available("serial")
+serial = lazy_import("serial")
+
+HAS_GEMINI = available("google.generativeai")
 
-try:
-    import google.generativeai as genai
-    HAS_GEMINI = True
-except ImportError:
-    HAS_GEMINI = False
+asyncio = lazy_import("asyncio")
+ingest = lazy_import("ingest")
+csi_dsp = lazy_import("csi_dsp")
+shards = lazy_import("shards")
 
 # ---------- 設定 ----------
 DEFAULT_CONFIG = {
@@ -61,32 +102,261 @@ DEFAULT_CONFIG = {
     "serial_port": os.getenv("SERIAL_PORT", ""),
     "serial_baud": int(os.getenv("SERIAL_BAUD", "115200")),
     "poll_interval": float(os.getenv("POLL_INTERVAL", "2.0")),
-    "db_path": str(Path(__file__).parent.parent / "data" / "wicare.db"),
+    "poll_jitter": float(os.getenv("POLL_JITTER", "0.1")),
+    "poll_timeout": float(os.getenv("POLL_TIMEOUT", "3.0")),
+    "poll_backoff_after": int(os.getenv("POLL_BACKOFF_AFTER", "3")),    # 連續失敗幾次後退避 + /health 探測
+    "poll_backoff_max": float(os.getenv("POLL_BACKOFF_MAX", "60")),     # 退避間隔上限 (秒)
+    "probe_timeout": float(os.getenv("PROBE_TIMEOUT", "1.0")),          # /health 探測與 TCP 連線逾時 (秒)
+    "poll_elevated_ratio": float(os.getenv("POLL_ELEVATED_RATIO", "0.7")),  # 分數達閾值此比例時加速輪詢
+    "poll_fast_factor": float(os.getenv("POLL_FAST_FACTOR", "0.25")),   # 加速時的間隔倍數
+    "poll_min_interval": float(os.getenv("POLL_MIN_INTERVAL", "0.2")),
+    "poll_boost_hold": float(os.getenv("POLL_BOOST_HOLD", "10")),       # 分數回落後維持加速的秒數
+    "stream": os.getenv("STREAM", "off"),              # 推送串流：off / sse / udp (失敗時改用輪詢)
+    "stream_path": os.getenv("STREAM_PATH", "/stream"),  # SSE 端點
+    "stream_idle": float(os.getenv("STREAM_IDLE", "5.0")),    # 超過此秒數沒有資料視為中斷
+    "stream_retry": float(os.getenv("STREAM_RETRY", "30")),   # 改用輪詢後多久再試串流 (秒)
+    "udp_host": os.getenv("UDP_HOST", "0.0.0.0"),
+    "udp_port": int(os.getenv("UDP_PORT", "9109")),    # UDP 訊框接收埠 (所有設備共用)
+    "sim_seed": int(os.getenv("SIM_SEED")) if os.getenv("SIM_SEED") else None,  # 固定亂數種子 (可重現的模擬)
+    "db_path": os.getenv("DB_PATH", str(Path(__file__).parent.parent / "data" / "wicare.db")),
+    "db_batch_size": int(os.getenv("DB_BATCH_SIZE", "500")),
+    "db_flush_ms": float(os.getenv("DB_FLUSH_MS", "250")),
+    "db_queue_size": int(os.getenv("DB_QUEUE_SIZE", "20000")),
+    "csi_dir": os.getenv("CSI_DIR", str(Path(__file__).parent.parent / "data" / "csi")),
+    "csi_dsp": os.getenv("CSI_DSP", "").lower() in ("1", "true", "yes"),  # 由原始 CSI 計算 movement_score
+    "csi_rate": float(os.getenv("CSI_RATE", "1000")),          # 原始 CSI 取樣率 (Hz)
+    "csi_score_hz": float(os.getenv("CSI_SCORE_HZ", "20")),    # 計算出的 movement_score 頻率
+    "csi_score_scale": float(os.getenv("CSI_SCORE_SCALE", "20")),  # 主成分變異等於此值時分數為 50
+    "csi_block": int(os.getenv("CSI_BLOCK", "50")),            # 單一訊框來源累積幾個訊框處理一次
+    "raw_retention_days": float(os.getenv("RAW_RETENTION_DAYS", "30")),      # 原始數據保留天數
+    "rollup_1m_retention_days": float(os.getenv("ROLLUP_1M_RETENTION_DAYS", "90")),
+    "rollup_1h_retention_days": float(os.getenv("ROLLUP_1H_RETENTION_DAYS", "730")),
+    "csi_retention_days": float(os.getenv("CSI_RETENTION_DAYS", "7")),       # 原始 CSI 分段檔保留天數
+    "csi_max_mb": float(os.getenv("CSI_MAX_MB", "2048")),                    # 原始 CSI 分段檔總大小上限 (0 = 不限)
+    "retention_interval": float(os.getenv("RETENTION_INTERVAL", "3600")),    # 清理間隔 (秒)
     "gemini_api_key": os.getenv("GEMINI_API_KEY", ""),
+    "push_batch_size": int(os.getenv("PUSH_BATCH_SIZE", "2000")),    # 每次請求最多筆數 (斷線補送時用滿)
+    "push_max_bytes": int(os.getenv("PUSH_MAX_BYTES", "1000000")),   # 每次請求的 JSON 上限 (後端限制 2 MB)
+    "push_flush_ms": float(os.getenv("PUSH_FLUSH_MS", "500")),        # 沒有新提交時的輪詢間隔
+    "live_ring": os.getenv("LIVE_RING", ""),  # 即時讀數共享記憶體環路徑 (空白 = 停用)
+    "live_ring_slots": int(os.getenv("LIVE_RING_SLOTS", "256")),        # 最多設備數
+    "live_ring_capacity": int(os.getenv("LIVE_RING_CAPACITY", "1024")),  # 每台設備保留筆數
     "line_token": os.getenv("LINE_CHANNEL_TOKEN", ""),
-    "line_user_id": os.getenv("LINE_USER_ID", ""),
+    "line_user_id": os.getenv("LINE_USER_ID", ""),  # 多個收件者以逗號分隔 (multicast)
+    "line_api_base": os.getenv("LINE_API_BASE", "https://api.line.me"),
+    "line_workers": int(os.getenv("LINE_WORKERS", "2")),
+    "line_min_interval": float(os.getenv("LINE_MIN_INTERVAL", "1.0")),  # 每收件者最短推播間隔 (秒)
+    "line_max_attempts": int(os.getenv("LINE_MAX_ATTEMPTS", "6")),
+    # 跌倒閾值：預設所有設備固定使用 FALL_THRESHOLD。
+    # ADAPTIVE_THRESHOLD=1 改為每設備自適應 (噪音底 + ADAPTIVE_K 個標準差，限制在 THRESHOLD_MIN..MAX；
+    # 暖機前仍用 FALL_THRESHOLD)。需選擇性開啟：會隨環境噪音改變實際警報閾值
     "fall_threshold": float(os.getenv("FALL_THRESHOLD", "70.0")),
+    "fall_cooldown": float(os.getenv("FALL_COOLDOWN", "30")),       # 每設備警報冷卻 (秒)
+    "adaptive_threshold": os.getenv("ADAPTIVE_THRESHOLD", "0").lower() in ("1", "true", "yes"),
+    "adaptive_k": float(os.getenv("ADAPTIVE_K", "3.0")),            # 閾值 = 噪音底平均 + k 個標準差
+    "adaptive_window": int(os.getenv("ADAPTIVE_WINDOW", "300")),    # EWMA 有效樣本數
+    "adaptive_warmup": int(os.getenv("ADAPTIVE_WARMUP", "30")),
+    "threshold_min": float(os.getenv("THRESHOLD_MIN", "40")),
+    "threshold_max": float(os.getenv("THRESHOLD_MAX", "95")),
+    "state_flush_interval": float(os.getenv("STATE_FLUSH_INTERVAL", "30")),  # 設備狀態寫回間隔 (秒)
+    "quiet": os.getenv("QUIET", "").lower() in ("1", "true", "yes"),  # 不逐筆輸出，改為定期摘要
+    "summary_interval": float(os.getenv("SUMMARY_INTERVAL", "10")),    # 摘要間隔 (秒)
+    "metrics_host": os.getenv("METRICS_HOST", "127.0.0.1"),
+    "metrics_port": int(os.getenv("METRICS_PORT", "9108")),            # 0 = 停用 /metrics
+    "detector": os.getenv("DETECTOR", "local"),  # local (閾值底線 + NumPy 特徵評分模型升級) / threshold (只用閾值)
+    "detector_baseline": int(os.getenv("DETECTOR_BASELINE", "10")),
+    "detector_impact": int(os.getenv("DETECTOR_IMPACT", "3")),
+    "detector_post": int(os.getenv("DETECTOR_POST", "2")),
+    "detector_workers": int(os.getenv("DETECTOR_WORKERS", "0")),  # 分片偵測子程序數 (0 = 在主程序偵測)
+    "detector_batch": int(os.getenv("DETECTOR_BATCH", "256")),    # 每批送往子程序的讀數上限
+    "buffer_size": int(os.getenv("BUFFER_SIZE", "30")),  # 每台設備保留的樣本數
+    "ai_window": int(os.getenv("AI_WINDOW", "20")),      # AI 分析視窗 (最近 N 筆)
+    "ai_workers": int(os.getenv("AI_WORKERS", "1")),
+    "ai_queue_size": int(os.getenv("AI_QUEUE_SIZE", "100")),
+    "ai_rate_limit": float(os.getenv("AI_RATE_LIMIT", "30")),  # 每設備最短分析間隔 (秒)
+    "ai_result_ttl": float(os.getenv("AI_RESULT_TTL", "120")),  # 最新結果有效期 (秒)
+    "ai_cache_size": int(os.getenv("AI_CACHE_SIZE", "256")),
+    "ai_cache_ttl": float(os.getenv("AI_CACHE_TTL", "600")),
+    "ai_cache_policy": os.getenv("AI_CACHE_POLICY", "lru"),  # lru / fifo
+    "ai_cache_bin": float(os.getenv("AI_CACHE_BIN", "5.0")),  # 平均值/最大值分箱寬度
 }
 
 
 class WiCareBridge:
     """ESP32 資料橋接器"""
 
-    def __init__(self, config: dict, mode: str = "http"):
+    SERIAL_SKIP_LINES = 20  # 單次讀取最多略過的無法解析行 (開機訊息)
+
+    def __init__(self, config: dict, mode: str = "http", clock=None):
         self.config = config
         self.mode = mode
+        # 時間來源 (需提供 time() / monotonic())；基準測試注入虛擬時鐘
+        self.clock = clock or time
+        self.rng = random.Random(config.get("sim_seed"))
         self.running = False
         self.db = None
+        self.writer = None
+        self.csi_store = None
+        self.dsp = None
+        self.rollup = None
+        self.retention = None
+        self.pusher = None
+        self.sequences = None
+        self.alerts = None
+        self.live = None
         self.serial_conn = None
+        self.serial_stream = None
         self.gemini_model = None
-        self.data_buffer = []  # 最近 N 筆數據用於 AI 分析
-        self.buffer_size = 30
-        self.last_fall_time = 0
-        self.fall_cooldown = 30  # 秒
-
+        self.gemini_thread = None
+        self.ai_worker = None
+        self.ai_cache = AnalysisCache(
+            max_size=config.get("ai_cache_size", 256),
+            ttl=config.get("ai_cache_ttl", 600),
+            policy=config.get("ai_cache_policy", "lru"),
+            mean_bin=config.get("ai_cache_bin", 5.0),
+            max_bin=config.get("ai_cache_bin", 5.0),
+        )
+        self.data_buffers: dict[str, RingBuffer] = {}  # 每台設備最近 N 筆數據用於 AI 分析
+        self.buffer_size = config.get("buffer_size", 30)
+        self.detector = None
+        # 每設備自適應閾值 + 冷卻狀態機 (於 _init_db 從 SQLite 還原)
+        self.device_state = DeviceStateStore(
+            default_threshold=config["fall_threshold"],
+            cooldown=config.get("fall_cooldown", 30),
+            k=config.get("adaptive_k", 3.0),
+            window=config.get("adaptive_window", 300),
+            warmup=config.get("adaptive_warmup", 30),
+            threshold_min=config.get("threshold_min", 40),
+            threshold_max=config.get("threshold_max", 95),
+            adaptive=config.get("adaptive_threshold", False),
+        )
+        self._state_flush_at = 0.0
+        self.quiet = config.get("quiet", False)
+        self.engine = None
+        self.shards = None  # 多程序分片偵測 (run_async + detector_workers > 0)
+        # AI 複核判定跌倒的結果 (AI 執行緒產生)：排入佇列，由取樣執行緒 / 事件迴圈在 _detect 中套用
+        self._ai_alerts: queue.SimpleQueue = queue.SimpleQueue()
+        self._loop = None   # run_async 執行中的事件迴圈 (有結果時立即喚醒套用)
+        self.udp_hub = None  # UDP 推送接收器 (run_async + stream=udp)
+        self.read_failures = 0  # 連續讀取失敗次數 (單設備模式)
+        self.metrics_server = None
+        self.metrics_thread = None
+        self.summary = None
+
+        self._init_metrics()
         self._init_db()
+        self._init_detector()
+        self._init_csi_dsp()
+        self._start_live_ring()
         if config["gemini_api_key"] and HAS_GEMINI:
-            self._init_gemini()
+            # Gemini SDK 載入與初始化需要數秒：於背景進行，完成前的樣本照常偵測 (不做 AI 分析)
+            self.gemini_thread = threading.Thread(target=self._init_gemini, name="wicare-gemini", daemon=True)
+            self.gemini_thread.start()
+        if HAS_REQUESTS:
+            self._start_pusher()
+            self._start_alerts()
+
+    # ============================
+    # 監控指標
+    # ============================
+    def _init_metrics(self):
+        """建立指標；佇列深度等狀態以回呼 Gauge 於抓取時讀取"""
+        m = self.metrics = Registry()
+        self.m_samples = m.counter("wicare_samples_total", "已處理的感測樣本數")
+        self.m_read_failures = m.counter("wicare_read_failures_total", "讀取失敗次數")
+        self.m_stream_fallbacks = m.counter("wicare_stream_fallbacks_total", "推送串流中斷改用輪詢的次數")
+        self.m_fall_alerts = m.counter("wicare_fall_alerts_total", "發出的跌倒警報數")
+        self.m_csi_frames = m.counter("wicare_csi_frames_total", "橋接器端 DSP 處理的 CSI 訊框數")
+        self.m_db_rows = m.counter("wicare_db_rows_total", "批次寫入的資料列", ("result",))
+        self.m_push = m.counter("wicare_push_readings_total", "推送到後端的讀數", ("result",))
+        self.m_ai = m.counter("wicare_ai_calls_total", "Gemini 呼叫次數", ("result",))
+        self.m_line = m.counter("wicare_line_pushes_total", "LINE 推播次數", ("result",))
+        stage = m.histogram("wicare_stage_seconds", "各階段耗時 (秒)", ("stage",))
+        self.h_read = stage.labels("read")
+        self.h_db = stage.labels("db_commit")
+        self.h_push = stage.labels("push")
+        self.h_ai = stage.labels("ai")
+        self.h_line = stage.labels("line")
+
+        fails = m.gauge("wicare_consecutive_failures", "連續失敗次數", ("source",))
+        fails.labels("read").set_function(self._consecutive_read_failures)
+        fails.labels("push").set_function(lambda: self.pusher.consecutive_failures if self.pusher else 0)
+        depth = m.gauge("wicare_queue_depth", "佇列深度", ("queue",))
+        depth.labels("db").set_function(lambda: self.writer.queue_depth if self.writer else 0)
+        depth.labels("push").set_function(lambda: self.pusher.queue_depth if self.pusher else 0)
+        depth.labels("ai").set_function(lambda: self.ai_worker.queue_depth if self.ai_worker else 0)
+        depth.labels("alerts").set_function(lambda: self._pending_alerts())
+        depth.labels("serial").set_function(lambda: self.serial_stream.queue_depth if self.serial_stream else 0)
+        depth.labels("shards").set_function(lambda: self.shards.pending if self.shards else 0)
+        m.gauge("wicare_devices_backing_off", "連續失敗而退避 (只做 /health 探測) 的設備數",
+                fn=lambda: self.engine.backing_off if self.engine else int(self.read_failures >= self._backoff_after))
+        m.gauge("wicare_push_cursor_lag", "尚未被後端確認的讀數 (sensor_data.id 差)",
+                fn=lambda: self.pusher.queue_depth if self.pusher else 0)
+        m.gauge("wicare_backend_up", "後端是否可用 (1/0)",
+                fn=lambda: 1 if self.pusher and self.pusher.backend_up else 0)
+        m.gauge("wicare_devices", "有資料的設備數", fn=lambda: len(self.data_buffers))
+        m.gauge("wicare_ai_cache_hit_ratio", "AI 結果快取命中率", fn=lambda: self.ai_cache.stats.hit_rate)
+
+    def _pending_alerts(self) -> int:
+        if not self.alerts:
+            return 0
+        st = self.alerts.stats
+        return st.enqueued + st.recovered - st.delivered - st.failed
+
+    @property
+    def _backoff_after(self) -> int:
+        return self.config.get("poll_backoff_after", 3)
+
+    def _consecutive_read_failures(self) -> int:
+        if self.engine:
+            return max(self.engine.stats.per_device_failures.values(), default=0)
+        return self.read_failures
+
+    def _on_db_commit(self, rows: int, seconds: float, ok: bool, dropped: int = 0):
+        self.h_db.observe(seconds)
+        self.m_db_rows.labels("ok").inc(rows)
+        if dropped:
+            self.m_db_rows.labels("error").inc(dropped)
+        if rows and self.pusher:
+            self.pusher.notify()
+
+    def _on_push(self, readings: int, seconds: float, ok: bool):
+        self.h_push.observe(seconds)
+        self.m_push.labels("ok" if ok else "failed").inc(readings)
+
+    def _start_monitoring(self):
+        """啟動 /metrics 端點與 (安靜模式) 定期摘要"""
+        if self.config.get("metrics_port", 0) and not self.metrics_thread:
+            # 於背景啟動 (http.server 載入需數十毫秒)，不延後第一筆取樣
+            self.metrics_thread = threading.Thread(target=self._start_metrics_server,
+                                                   name="wicare-metrics-init", daemon=True)
+            self.metrics_thread.start()
+        if self.quiet and not self.summary:
+            self._summary_last = (time.monotonic(), self.m_samples.value)
+            self.summary = SummaryReporter(self._print_summary, self.config.get("summary_interval", 10)).start()
+
+    def _start_metrics_server(self):
+        host = self.config.get("metrics_host", "127.0.0.1")
+        port = self.config["metrics_port"]
+        try:
+            self.metrics_server = MetricsServer(self.metrics, host, port).start()
+            print(f"[METRICS] http://{host}:{self.metrics_server.port}/metrics")
+        except OSError as e:
+            print(f"[METRICS] 無法啟動監控端點 ({host}:{port}): {e}")
+
+    def _print_summary(self):
+        """安靜模式的定期摘要 (取代逐筆狀態列)"""
+        now = time.monotonic()
+        samples = self.m_samples.value
+        last_t, last_n = self._summary_last
+        rate = (samples - last_n) / (now - last_t) if now > last_t else 0.0
+        self._summary_last = (now, samples)
+        ms = lambda h: h.quantile(0.95) * 1000  # noqa: E731
+        print(f"[SUMMARY] {datetime.now():%H:%M:%S} 樣本={samples:.0f} ({rate:.1f}/s) "
+              f"設備={len(self.data_buffers)} 讀取失敗={self.m_read_failures.value:.0f} "
+              f"警報={self.m_fall_alerts.value:.0f} "
+              f"佇列 DB={self.writer.queue_depth} 推送={self.pusher.queue_depth if self.pusher else 0} "
+              f"p95 讀取={ms(self.h_read):.0f}ms DB={ms(self.h_db):.0f}ms 推送={ms(self.h_push):.0f}ms")
 
     # ============================
     # 資料庫
@@ -102,69 +372,169 @@ class WiCareBridge:
         self.db.execute("PRAGMA journal_mode=WAL")
         self.db.execute("PRAGMA foreign_keys=ON")
 
-        # 確認 sensor_data 資料表存在
-        self.db.execute("""
-            CREATE TABLE IF NOT EXISTS sensor_data (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                device_id TEXT NOT NULL,
-                movement_score REAL NOT NULL,
-                motion_detected INTEGER DEFAULT 0,
-                threshold REAL,
-                raw_csi TEXT,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        self.db.execute("""
-            CREATE TABLE IF NOT EXISTS events (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                elderly_id INTEGER,
-                device_id TEXT,
-                type TEXT NOT NULL,
-                severity TEXT DEFAULT 'info',
-                message TEXT,
-                ai_analysis TEXT,
-                data TEXT DEFAULT '{}',
-                is_false_alarm INTEGER DEFAULT 0,
-                resolved_at DATETIME,
-                resolved_by INTEGER,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
+        schema.init_schema(self.db)
+        csi_store.init_schema(self.db)
+        rollup.init_schema(self.db)
+        alerts.init_schema(self.db)
+        device_state.init_schema(self.db)
+        push_client.init_schema(self.db)
+        for change in schema.ensure_indexes(self.db):
+            print(f"[DB] 索引: {change}")
         self.db.commit()
+        self.sequences = SequenceAllocator(db_path, self.clock)
+        restored = self.device_state.load(self.db)
+        if restored:
+            print(f"[DB] 已還原 {restored} 台設備的偵測狀態")
+
+        # 感測數據由專屬執行緒批次寫入 (group commit)
+        self.writer = BatchWriter(
+            db_path,
+            batch_size=self.config.get("db_batch_size", 500),
+            flush_interval=self.config.get("db_flush_ms", 250) / 1000,
+            max_queue=self.config.get("db_queue_size", 20000),
+            on_commit=self._on_db_commit,
+        ).start()
+
+        # 原始 CSI 訊框：二進位分段檔 + csi_frames 索引 (索引跟著批次寫入)
+        if csi_store.HAS_NUMPY:
+            self.csi_store = CsiStore(self.config["csi_dir"], self.writer.write)
+
+        # 1 分鐘 / 1 小時彙總隨資料增量維護；過期資料由背景執行緒分批淘汰
+        self.rollup = RollupAggregator(self.writer.write)
+        self.retention = RetentionJob(db_path, RetentionPolicy(
+            raw_days=self.config.get("raw_retention_days", 30),
+            rollup_1m_days=self.config.get("rollup_1m_retention_days", 90),
+            rollup_1h_days=self.config.get("rollup_1h_retention_days", 730),
+            csi_days=self.config.get("csi_retention_days", 7),
+            csi_max_bytes=int(self.config.get("csi_max_mb", 2048) * 1024 * 1024),
+            interval=self.config.get("retention_interval", 3600),
+        ), csi_dir=self.config["csi_dir"] if self.csi_store else None).start()
         print(f"[DB] 已連接: {db_path}")
 
     def save_sensor_data(self, device_id: str, score: float, motion: bool, threshold: float = None):
-        """儲存感測器數據到 SQLite"""
-        self.db.execute(
-            "INSERT INTO sensor_data (device_id, movement_score, motion_detected, threshold) VALUES (?,?,?,?)",
-            (device_id, score, 1 if motion else 0, threshold)
+        """儲存感測器數據到 SQLite (排入批次寫入器)；推送執行緒提交後從資料表送出"""
+        now = self.clock.time()
+        seq = self.sequences.next(device_id)
+        self.writer.write(
+            "INSERT INTO sensor_data (device_id, movement_score, motion_detected, threshold, timestamp, seq) "
+            "VALUES (?,?,?,?,?,?)",
+            # 擷取時間 (UTC)；本機與後端兩邊的讀數時間一致
+            (device_id, score, 1 if motion else 0, threshold, time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(now)), seq)
         )
-        self.db.commit()
+        self.rollup.add(device_id, now, score, motion)
 
-        # 推送到 Node.js 後端
-        self._push_to_backend(device_id, score, motion, threshold)
+        self._push_to_backend(device_id, seq)
 
-    def _push_to_backend(self, device_id: str, score: float, motion: bool, threshold: float = None):
-        """推送數據到 Node.js 後端"""
-        if not HAS_REQUESTS:
+    def _init_detector(self):
+        """初始化本地跌倒偵測引擎 (需要 numpy；否則退回閾值判定)"""
+        if self.config.get("detector", "local") != "local":
+            return
+        if not HAS_NUMPY:
+            print("[WARN] numpy 未安裝，跌倒偵測退回閾值模式。執行: pip install numpy")
             return
+        self.detector = FallDetector(DetectorConfig(
+            baseline=self.config.get("detector_baseline", 10),
+            impact=self.config.get("detector_impact", 3),
+            post=self.config.get("detector_post", 2),
+        ))
+        # 緩衝區至少要容納一個偵測視窗
+        self.buffer_size = max(self.buffer_size, self.detector.cfg.window)
+
+    def _init_csi_dsp(self):
+        if not self.config.get("csi_dsp"):
+            return
+        if not csi_dsp.HAS_NUMPY:
+            print("[WARN] CSI 訊號處理需要 numpy，改用設備回報的 movement_score")
+            return
+        c = self.config
+        self.dsp = csi_dsp.CsiDsp(csi_dsp.DspConfig(rate=c.get("csi_rate", 1000.0),
+                                                    score_hz=c.get("csi_score_hz", 20.0),
+                                                    score_scale=c.get("csi_score_scale", 20.0)),
+                                  block=c.get("csi_block", 50))
+
+    def process_csi(self, device_id: str, data: dict):
+        """
+        原始 CSI 讀數：單一訊框照常存檔；開啟 DSP 時由橋接器計算 movement_score，
+        每個算出的分數當作一筆一般讀數處理 (儲存、推送、偵測)。
+        高頻批次訊框 (csi_iq) 不逐框存檔，只保留算出的分數。
+        """
+        if "raw_csi" in data:
+            self.save_csi_frame(device_id, data)
+        if not self.dsp:
+            return
+        before = self.dsp.frames
         try:
-            url = f"{self.config['backend_url']}/api/sensor-data/push"
-            payload = {
-                "device_id": device_id,
-                "movement_score": score,
-                "motion_detected": motion,
-                "threshold": threshold,
-            }
-            # AI 分析結果 (如果有)
-            if self.data_buffer and len(self.data_buffer) >= 10:
-                ai = self.analyze_with_ai()
-                if ai:
-                    payload["ai_analysis"] = ai
-
-            requests.post(url, json=payload, timeout=3)
-        except requests.RequestException:
-            pass  # 後端可能未啟動，靜默失敗
+            scores = self.dsp.feed(device_id, data)
+        except (ValueError, TypeError) as e:
+            print(f"[CSI] 訊號處理失敗 ({device_id}): {e}")
+            return
+        self.m_csi_frames.inc(self.dsp.frames - before)
+        for score in scores:
+            self.process_sample(device_id, {"movement_score": score, "motion_detected": False})
+
+    def save_csi_frame(self, device_id: str, data: dict):
+        """
+        儲存原始 CSI 訊框 (二進位，不經 JSON)
+
+        raw_csi: ESP-IDF 原生 int8 I/Q 陣列 (imag, real 交錯)
+        csi_amplitude / csi_phase: 已換算的振幅與相位 (弧度)
+        """
+        if not self.csi_store:
+            return
+        ts = data.get("csi_timestamp") or self.clock.time()
+        try:
+            if data.get("raw_csi") is not None:
+                self.csi_store.append_iq(device_id, ts, data["raw_csi"])
+            elif data.get("csi_amplitude") is not None:
+                self.csi_store.append_amp_phase(device_id, ts, data["csi_amplitude"],
+                                                data.get("csi_phase") or [0.0] * len(data["csi_amplitude"]))
+        except (ValueError, TypeError, OSError) as e:
+            print(f"[CSI] 訊框儲存失敗: {e}")
+
+    def _buffer(self, device_id: str = None) -> RingBuffer:
+        """取得設備的環形緩衝區 (未指定時為預設設備)"""
+        device_id = device_id or self.config["device_id"]
+        buf = self.data_buffers.get(device_id)
+        if buf is None:
+            buf = self.data_buffers[device_id] = RingBuffer(
+                self.buffer_size, self.config.get("ai_window", 20))
+        return buf
+
+    def _start_live_ring(self):
+        """本機即時讀數發布 (mmap 環形檔，見 live_ring.py)"""
+        path = self.config.get("live_ring")
+        if not path:
+            return
+        try:
+            self.live = LiveRingWriter(path, slots=self.config.get("live_ring_slots", 256),
+                                       capacity=self.config.get("live_ring_capacity", 1024)).open()
+            print(f"[LIVE] 即時讀數發布: {path}")
+        except OSError as e:
+            print(f"[LIVE] 無法建立即時環形檔 ({path}): {e}")
+
+    def _start_pusher(self):
+        """啟動推送管線 (從 sensor_data 依游標送出，exactly-once)"""
+        self.pusher = PushClient(
+            self.config["backend_url"],
+            self.config["db_path"],
+            batch_size=self.config.get("push_batch_size", 2000),
+            max_body=self.config.get("push_max_bytes", 1_000_000),
+            flush_interval=self.config.get("push_flush_ms", 500) / 1000,
+            legacy_spool_dir=os.path.join(os.path.dirname(self.config["db_path"]), "push_spool"),
+            on_post=self._on_push,
+        ).start()
+
+    def _push_to_backend(self, device_id: str, seq: int):
+        """讀數本身由推送執行緒從 sensor_data 送出；這裡只附上 AI 分析"""
+        if not self.pusher or not self.ai_worker:
+            return
+        # AI 分析：背景排程 (受速率限制)，推送時附上最新結果
+        window = self._ai_window(device_id)
+        if window:
+            self.ai_worker.submit(device_id, window)
+        ai = self.ai_worker.latest(device_id, max_age=self.config.get("ai_result_ttl"))
+        if ai:
+            self.pusher.annotate(device_id, seq, {"ai_analysis": ai})
 
     # ============================
     # ESP32 資料讀取
@@ -177,85 +547,86 @@ class WiCareBridge:
 
         url = f"http://{self.config['esp32_ip']}:{self.config['esp32_port']}/status"
         try:
-            r = requests.get(url, timeout=3)
+            # 連線逾時較短：設備離線時 (IP 無回應) 不必等滿整個讀取逾時
+            r = requests.get(url, timeout=(self.config.get("probe_timeout", 1.0), self.config["poll_timeout"]))
             if r.status_code == 200:
                 return r.json()
         except requests.RequestException as e:
-            print(f"[HTTP] 連線失敗: {e}")
+            if not self.quiet:
+                print(f"[HTTP] 連線失敗: {e}")
         return None
 
+    def probe_http(self) -> bool:
+        """HTTP 模式：退避期間以 /health 確認設備是否恢復 (回應小、逾時短)"""
+        url = f"http://{self.config['esp32_ip']}:{self.config['esp32_port']}/health"
+        try:
+            return requests.get(url, timeout=self.config.get("probe_timeout", 1.0)).status_code == 200
+        except requests.RequestException:
+            return False
+
+    def _open_serial(self, timeout: float) -> bool:
+        """開啟 (或自動偵測) ESP32 序列埠"""
+        port = self.config["serial_port"]
+        if not port:
+            # 自動偵測
+            import serial.tools.list_ports
+            ports = serial.tools.list_ports.comports()
+            for p in ports:
+                if "CP210" in (p.description or "") or "CH340" in (p.description or "") or "USB" in (p.description or ""):
+                    port = p.device
+                    break
+            if not port:
+                print("[SERIAL] 找不到 ESP32 序列埠")
+                return False
+
+        try:
+            self.serial_conn = serial.Serial(port, self.config["serial_baud"], timeout=timeout)
+            print(f"[SERIAL] 已連接: {port} @ {self.config['serial_baud']} baud")
+            return True
+        except serial.SerialException as e:
+            print(f"[SERIAL] 連接失敗: {e}")
+            return False
+
     def read_serial(self) -> dict | None:
         """Serial 模式：讀取 USB 序列"""
         if not HAS_SERIAL:
             print("[ERROR] 需要 pyserial 套件: pip install pyserial")
             return None
 
-        if not self.serial_conn:
-            port = self.config["serial_port"]
-            if not port:
-                # 自動偵測
-                ports = serial.tools.list_ports.comports()
-                for p in ports:
-                    if "CP210" in (p.description or "") or "CH340" in (p.description or "") or "USB" in (p.description or ""):
-                        port = p.device
-                        break
-                if not port:
-                    print("[SERIAL] 找不到 ESP32 序列埠")
+        # 不固定等待 ESP32 開機：開埠後直接讀，開機訊息無法解析而略過，第一筆數據即可使用
+        if not self.serial_conn and not self._open_serial(timeout=2):
+            return None
+
+        try:
+            for _ in range(self.SERIAL_SKIP_LINES):
+                line = self.serial_conn.readline().strip()
+                if not line:
                     return None
 
-            try:
-                self.serial_conn = serial.Serial(port, self.config["serial_baud"], timeout=2)
-                print(f"[SERIAL] 已連接: {port} @ {self.config['serial_baud']} baud")
-                time.sleep(2)  # 等待開機
-            except serial.SerialException as e:
-                print(f"[SERIAL] 連接失敗: {e}")
-                return None
+                # ESPectre 文字格式或 JSON 行
+                # 格式: [timestamp][espectre:045]: Movement: 0.234 | Motion: ON | Threshold: 1.40
+                data = parse_line(line)
+                if data is not None:
+                    if "raw" not in data:
+                        data["raw"] = line.decode("utf-8", errors="ignore")
+                    return data
 
-        try:
-            line = self.serial_conn.readline().decode("utf-8", errors="ignore").strip()
-            if not line:
-                return None
-
-            # 嘗試解析 ESPectre 輸出格式
-            # 格式: [timestamp][espectre:045]: Movement: 0.234 | Motion: ON | Threshold: 1.40
-            match = re.search(r"Movement:\s*([\d.]+)", line)
-            if match:
-                score = float(match.group(1))
-                motion = "Motion: ON" in line or "Motion: YES" in line
-                threshold_match = re.search(r"Threshold:\s*([\d.]+)", line)
-                threshold = float(threshold_match.group(1)) if threshold_match else None
-                return {
-                    "movement_score": score,
-                    "motion_detected": motion,
-                    "threshold": threshold,
-                    "status": "fall" if motion else "safe",
-                    "raw": line,
-                }
-
-            # 嘗試解析 JSON 格式
-            if line.startswith("{"):
-                data = json.loads(line)
-                return data
-
-        except (serial.SerialException, json.JSONDecodeError) as e:
+        except serial.SerialException as e:
             print(f"[SERIAL] 讀取錯誤: {e}")
         return None
 
     def read_simulation(self) -> dict:
-        """模擬模式：產生測試數據"""
-        import math
-        import random
-
-        t = time.time()
+        """模擬模式：產生測試數據 (設定 sim_seed 時可重現)"""
+        t = self.clock.time()
         # 基礎正弦波 + 隨機噪音
         base = math.sin(t * 0.5) * 20 + 30
-        noise = random.gauss(0, 5)
+        noise = self.rng.gauss(0, 5)
         score = max(0, min(100, base + noise))
 
         # 隨機跌倒事件 (約每 2 分鐘一次)
-        is_fall = random.random() < 0.008
+        is_fall = self.rng.random() < 0.008
         if is_fall:
-            score = random.uniform(75, 98)
+            score = self.rng.uniform(75, 98)
 
         return {
             "movement_score": round(score, 2),
@@ -268,40 +639,86 @@ class WiCareBridge:
     # Gemini AI 分析
     # ============================
     def _init_gemini(self):
-        """初始化 Gemini AI"""
+        """初始化 Gemini AI (背景執行緒)；成功後啟動 AI 分析工作者"""
+        started = time.monotonic()
         try:
+            import google.generativeai as genai
             genai.configure(api_key=self.config["gemini_api_key"])
-            self.gemini_model = genai.GenerativeModel("gemini-2.0-flash")
-            print("[AI] Gemini AI 已初始化")
+            model = genai.GenerativeModel("gemini-2.0-flash")
         except Exception as e:
             print(f"[AI] Gemini 初始化失敗: {e}")
-            self.gemini_model = None
-
-    def analyze_with_ai(self) -> str | None:
-        """使用 Gemini AI 分析最近的感測數據"""
-        if not self.gemini_model or len(self.data_buffer) < 10:
+            return
+        self.gemini_model = model
+        self._start_ai_worker()
+        print(f"[AI] Gemini AI 已初始化 ({(time.monotonic() - started) * 1000:.0f} ms)")
+
+    def _start_ai_worker(self):
+        """啟動背景 AI 分析工作者"""
+        self.ai_worker = AIAnalysisWorker(
+            self._analyze_window,
+            workers=self.config.get("ai_workers", 1),
+            max_queue=self.config.get("ai_queue_size", 100),
+            min_interval=self.config.get("ai_rate_limit", 30),
+        ).start()
+
+    def _ai_window(self, device_id: str = None) -> dict | None:
+        """擷取最近的數據視窗摘要 (供 AI 分析；資料不足時回傳 None)"""
+        buffer = self._buffer(device_id)
+        if len(buffer) < 10:
             return None
+        # 視窗統計由環形緩衝區增量維護，O(1)
+        return {
+            "scores": buffer.last(10),
+            "count": buffer.window_len,
+            "avg": buffer.mean,
+            "max": buffer.max,
+            "motions": buffer.motion_count,
+            "threshold": self.device_state.threshold(device_id or self.config["device_id"]),
+        }
 
-        try:
-            scores = [d["movement_score"] for d in self.data_buffer[-20:]]
-            motions = sum(1 for d in self.data_buffer[-20:] if d.get("motion_detected"))
-            avg = sum(scores) / len(scores)
-            mx = max(scores)
+    def _analyze_window(self, window: dict) -> str | None:
+        """呼叫 Gemini 分析一個數據視窗 (於背景執行緒執行；相似視窗重用快取結果)"""
+        if not self.gemini_model:
+            return None
+        cached = self.ai_cache.get(window)
+        if cached is not None:
+            return cached
 
-            prompt = f"""你是一個 WiFi CSI 感測跌倒偵測 AI 助手。分析以下 movement_score 序列，判斷是否有跌倒風險。
+        scores = window["scores"]
+        prompt = f"""你是一個 WiFi CSI 感測跌倒偵測 AI 助手。分析以下 movement_score 序列，判斷是否有跌倒風險。
 回覆格式：一行簡短結論 + 風險等級 (低/中/高/危險)
 
 資料摘要：
-- 最近 {len(scores)} 筆 movement_score: {scores[-10:]}
-- 平均值: {avg:.2f}
-- 最大值: {mx:.2f}
-- 偵測到動作次數: {motions}
-- 跌倒閾值: {self.config['fall_threshold']}
+- 最近 {window['count']} 筆 movement_score: {scores}
+- 平均值: {window['avg']:.2f}
+- 最大值: {window['max']:.2f}
+- 偵測到動作次數: {window['motions']}
+- 跌倒閾值: {window['threshold']}
 
 請分析："""
 
+        started = time.monotonic()
+        try:
             response = self.gemini_model.generate_content(prompt)
-            return response.text.strip()
+        except Exception:
+            self.m_ai.labels("error").inc()
+            raise
+        finally:
+            self.h_ai.observe(time.monotonic() - started)
+        self.m_ai.labels("ok").inc()
+        text = response.text.strip()
+        if text:
+            self.ai_cache.put(window, text)
+        return text
+
+    def analyze_with_ai(self, device_id: str = None) -> str | None:
+        """使用 Gemini AI 分析最近的感測數據 (同步呼叫)"""
+        window = self._ai_window(device_id)
+        if not self.gemini_model or not window:
+            return None
+
+        try:
+            return self._analyze_window(window)
         except Exception as e:
             print(f"[AI] 分析失敗: {e}")
             return None
@@ -309,39 +726,239 @@ class WiCareBridge:
     # ============================
     # LINE 推播
     # ============================
-    def send_line_alert(self, score: float, ai_analysis: str = None):
-        """發送 LINE 跌倒警報"""
-        if not HAS_REQUESTS or not self.config["line_token"] or not self.config["line_user_id"]:
+    def _start_alerts(self):
+        """啟動 LINE 警報派送 (outbox + 工作者池)"""
+        recipients = [r.strip() for r in self.config["line_user_id"].split(",") if r.strip()]
+        if not self.config["line_token"] or not recipients:
             return
-
-        now = datetime.now().strftime("%Y/%m/%d %H:%M:%S")
-        text = f"🚨 Wi-Care 跌倒警報\n時間: {now}\n感測分數: {score:.1f}\n設備: {self.config['device_id']}"
-        if ai_analysis:
-            text += f"\nAI 分析: {ai_analysis}"
-
-        try:
-            requests.post(
-                "https://api.line.me/v2/bot/message/push",
-                headers={
-                    "Content-Type": "application/json",
-                    "Authorization": f"Bearer {self.config['line_token']}",
-                },
-                json={
-                    "to": self.config["line_user_id"],
-                    "messages": [{"type": "text", "text": text}],
-                },
-                timeout=5,
-            )
-            print("[LINE] ✅ 推播成功")
-        except Exception as e:
-            print(f"[LINE] ❌ 推播失敗: {e}")
+        self.alerts = AlertDispatcher(
+            self.config["db_path"],
+            self.config["line_token"],
+            recipients,
+            api_base=self.config.get("line_api_base", alerts.LINE_API_BASE),
+            workers=self.config.get("line_workers", 2),
+            min_interval=self.config.get("line_min_interval", 1.0),
+            max_attempts=self.config.get("line_max_attempts", 6),
+            on_send=self._on_line_send,
+        ).start()
+
+    def _on_line_send(self, seconds: float, ok: bool):
+        self.h_line.observe(seconds)
+        self.m_line.labels("ok" if ok else "error").inc()
+
+    def send_line_alert(self, score: float, ai_analysis: str = None, device_id: str = None):
+        """排入 LINE 跌倒警報 (不阻塞；由派送執行緒送出)"""
+        if not self.alerts:
+            return
+        self.alerts.enqueue(device_id or self.config["device_id"], score, ai_analysis)
 
     # ============================
     # 主迴圈
     # ============================
+    def process_sample(self, device_id: str, data: dict):
+        """處理單筆感測數據：緩衝、儲存、推送、跌倒偵測"""
+        if "csi_iq" in data or "raw_csi" in data and (self.dsp or "movement_score" not in data):
+            # 原始 CSI：分數由橋接器計算；未開啟 DSP 時沒有分數可用 (esp-csi 的 CSI_DATA 行、
+            # UDP 批次訊框)，單一訊框只存檔，不當作 movement_score=0 的讀數
+            self.process_csi(device_id, data)
+            return
+        score = data.get("movement_score", 0)
+        motion = data.get("motion_detected")
+        if motion is None:
+            # 範例韌體 (esp32_examples) 只回報 falling / status，與後端輪詢的判定一致
+            motion = bool(data.get("falling")) or data.get("status") == "fall"
+        threshold = data.get("threshold")
+
+        self.m_samples.inc()
+
+        # 加入緩衝區
+        self._buffer(device_id).append(score, motion)
+        if self.live:
+            self.live.publish(device_id, self.clock.time(), score, motion, self.device_state.threshold(device_id))
+
+        # 儲存到 SQLite + 推送到後端
+        self.save_sensor_data(device_id, score, motion, threshold)
+        if "raw_csi" in data or "csi_amplitude" in data:
+            self.save_csi_frame(device_id, data)
+
+        if self.quiet:
+            self._detect(device_id, score, motion)
+            return
+
+        # 狀態輸出
+        status = "🔴 FALL" if motion else "🟢 SAFE"
+        bar = "█" * int(score / 5) + "░" * (20 - int(score / 5))
+        ts = datetime.now().strftime("%H:%M:%S")
+        prefix = f"[{ts}]" if device_id == self.config["device_id"] else f"[{ts}][{device_id}]"
+        print(f"{prefix} {status} score={score:6.2f} [{bar}]", end="")
+
+        # 跌倒偵測
+        self._detect(device_id, score, motion)
+        print()
+
+    def _detect(self, device_id: str, score: float, motion: bool):
+        """跌倒判定：設備端旗標 / 超過閾值一律警報 (底線)；其餘交給本地偵測引擎升級 (模糊時交給 AI 複核)"""
+        if not self._ai_alerts.empty():
+            self._apply_ai_alerts()
+        now = self.clock.time()
+        threshold = self.device_state.observe(device_id, score, now)
+        if now >= self._state_flush_at:
+            self._flush_device_state()
+            self._state_flush_at = now + self.config.get("state_flush_interval", 30)
+        floor = motion or score > threshold
+        if self.shards:
+            # 偵測在分片子程序進行，結果回到事件迴圈後由 _apply_detection 套用；
+            # 已由底線觸發的樣本只累積該設備的偵測視窗
+            ctx = None if floor else (device_id, score, threshold)
+            self.shards.submit(device_id, score, None if floor else threshold, ctx)
+        if floor:
+            self._raise_fall_alert(device_id, score)
+            return
+        if self.detector and not self.shards:
+            buffer = self._buffer(device_id)
+            det = self.detector.evaluate(buffer.last(self.detector.cfg.window), threshold)
+            self._apply_detection(device_id, score, threshold, det)
+
+    def _on_shard_result(self, ctx: tuple, det):
+        self._apply_detection(*ctx, det)
+
+    def _apply_detection(self, device_id: str, score: float, threshold: float, det):
+        """本地偵測結果只會升級：FALL → 警報、AMBIGUOUS → AI 複核；SAFE / 樣本不足 (None) 不動作"""
+        if det is None:
+            return
+        if det.verdict == FALL:
+            self._raise_fall_alert(device_id, det.peak)
+        elif det.verdict == AMBIGUOUS:
+            self._review_with_ai(device_id, det.peak)
+
+    def _review_with_ai(self, device_id: str, peak: float):
+        """模糊案例交給 AI 複核；沒有 AI 時退回閾值判定"""
+        window = self._ai_window(device_id)
+        if not self.ai_worker or not window:
+            if peak > self.device_state.threshold(device_id):
+                self._raise_fall_alert(device_id, peak)
+            return
+
+        def on_result(dev: str, text: str | None):
+            # AI 執行緒：不在這裡發警報 (冷卻狀態與寫入屬於取樣端)，交回擁有者套用
+            if text and ("高" in text or "危險" in text):
+                self._ai_alerts.put((dev, peak, text))
+                loop = self._loop
+                if loop is not None:
+                    try:
+                        loop.call_soon_threadsafe(self._apply_ai_alerts)
+                    except RuntimeError:
+                        pass    # 事件迴圈已結束：由 cleanup 套用
+
+        self.ai_worker.submit(device_id, window, priority=True, callback=on_result)
+
+    def _apply_ai_alerts(self):
+        """在取樣執行緒 / 事件迴圈中套用 AI 複核判定跌倒的結果"""
+        while True:
+            try:
+                dev, peak, text = self._ai_alerts.get_nowait()
+            except queue.Empty:
+                return
+            print(f"[AI] {dev} 複核判定跌倒: {text}")
+            self._raise_fall_alert(dev, peak, ai=text)
+
+    def _raise_fall_alert(self, device_id: str, score: float, ai: str = None):
+        """發出跌倒警報 (受該設備冷卻狀態限制)：LINE 推播 + 寫入事件"""
+        if not self.device_state.try_alert(device_id, self.clock.time()):
+            return
+        self.m_fall_alerts.inc()
+        if self.quiet:
+            print(f"[ALERT] {device_id} ⚠️  跌倒警報! score={score:.1f}")
+        else:
+            print(" ⚠️  跌倒警報!", end="")
+
+        # AI 分析：不阻塞取樣，先附上最新結果，背景完成後回填事件
+        reviewed = ai is not None
+        if not reviewed and self.ai_worker:
+            ai = self.ai_worker.latest(device_id, max_age=self.config.get("ai_result_ttl"))
+        if ai:
+            print(f"  AI: {ai}" if self.quiet else f"\n  AI: {ai}", end="\n" if self.quiet else "")
+
+        # LINE 推播
+        self.send_line_alert(score, ai, device_id)
+
+        # 儲存事件 (優先通道，不排在批次資料後面；不等待寫入，取樣迴圈 / 事件迴圈不阻塞)
+        saved = self.writer.submit(
+            "INSERT INTO events (device_id,type,severity,message,ai_analysis) VALUES (?,?,?,?,?)",
+            (device_id, "fall_alert", "critical",
+             f"跌倒偵測 score={score:.1f}", ai)
+        )
+        window = self._ai_window(device_id)
+        if self.ai_worker and window and not reviewed:
+            # 事件寫入後 (寫入執行緒) 才排入 AI 複核，分析結果回填到該事件
+            def review(done):
+                if done.exception() is None:
+                    event_id = done.result()
+                    self.ai_worker.submit(device_id, window, priority=True,
+                                          callback=lambda dev, text: self._on_fall_analysis(event_id, dev, text))
+            saved.add_done_callback(review)
+
+    def _flush_device_state(self):
+        """把有變動的設備狀態寫回 SQLite (經批次寫入器)"""
+        for row in self.device_state.dirty_rows():
+            self.writer.write(device_state.UPSERT_SQL, row)
+
+    def _on_fall_analysis(self, event_id: int, device_id: str, text: str | None):
+        """跌倒事件的 AI 分析完成 (背景執行緒)：回填事件"""
+        if not text:
+            return
+        print(f"[AI] {device_id}: {text}")
+        self.writer.submit("UPDATE events SET ai_analysis=? WHERE id=?", (text, event_id))
+
+    def _run_serial_stream(self):
+        """SERIAL-STREAM 模式：背景執行緒整塊讀取，主迴圈直接消化佇列 (不 sleep)"""
+        idle_since = time.monotonic()
+        warned = False
+        while self.running:
+            if not self.serial_stream or not self.serial_stream.alive:
+                if self.serial_stream and self.serial_stream.error:
+                    print(f"[SERIAL] 讀取錯誤: {self.serial_stream.error}，重新連接中...")
+                if self.serial_conn:
+                    self.serial_conn.close()
+                    self.serial_conn = None
+                if not self._open_serial(timeout=0.1):
+                    time.sleep(self.config["poll_interval"])
+                    continue
+                self.serial_stream = SerialStreamReader(self.serial_conn).start()
+
+            items = self.serial_stream.drain(timeout=1.0)
+            if not items:
+                if not warned and time.monotonic() - idle_since > 10 * self.config["poll_interval"]:
+                    print("[WARN] 序列埠超過 10 個輪詢週期沒有數據")
+                    warned = True
+                continue
+            idle_since = time.monotonic()
+            warned = False
+            for data in items:
+                self.process_sample(self.config["device_id"], data)
+
     def run(self):
         """啟動數據收集迴圈"""
         self.running = True
+        if self.mode == "serial-stream":
+            if not HAS_SERIAL:
+                print("[ERROR] 需要 pyserial 套件: pip install pyserial")
+                return
+            self._print_banner()
+            self._start_monitoring()
+            try:
+                self._run_serial_stream()
+            except KeyboardInterrupt:
+                print("\n\n[Bridge] 停止中...")
+            finally:
+                self.cleanup()
+            return
+
+        if self.mode == "http" and self.config.get("stream", "off") != "off":
+            # 串流與輪詢備援的切換由非同步引擎處理
+            self.run_async([{"device_id": self.config["device_id"], "mode": "http"}])
+            return
+
         read_fn = {
             "http": self.read_http,
             "serial": self.read_serial,
@@ -352,90 +969,250 @@ class WiCareBridge:
             print(f"[ERROR] 不支援的模式: {self.mode}")
             return
 
+        self._print_banner()
+        self._start_monitoring()
+
+        # 與多設備引擎相同的排程：失敗退避 + /health 探測、分數升高時加速
+        device_id = self.config["device_id"]
+        health = DeviceHealth(self.config["poll_interval"], self.config["poll_jitter"], self._poll_policy())
+        probe = self.probe_http if self.mode == "http" and HAS_REQUESTS else None
+        try:
+            while self.running:
+                if health.backing_off and probe and not probe():
+                    health.record_failure()
+                    self.read_failures = health.failures
+                    self._on_read_failure(device_id, health.failures)
+                    time.sleep(health.next_delay(time.monotonic()))
+                    continue
+
+                started = time.monotonic()
+                data = read_fn()
+                now = time.monotonic()
+                self.h_read.observe(now - started)
+
+                if data is None:
+                    health.record_failure()
+                    self.read_failures = health.failures
+                    self._on_read_failure(device_id, health.failures)
+                else:
+                    health.record_success()
+                    self.read_failures = 0
+                    if self._is_elevated(device_id, data):
+                        health.mark_elevated(now)
+                    self.process_sample(device_id, data)
+                time.sleep(health.next_delay(now))
+
+        except KeyboardInterrupt:
+            print("\n\n[Bridge] 停止中...")
+        finally:
+            self.cleanup()
+
+    def _print_banner(self):
         print(f"\n{'='*50}")
         print(f"  Wi-Care Bridge v1.0")
         print(f"  模式: {self.mode.upper()}")
         print(f"  設備: {self.config['device_id']}")
         if self.mode == "http":
             print(f"  ESP32: {self.config['esp32_ip']}:{self.config['esp32_port']}")
-        elif self.mode == "serial":
+        elif self.mode in ("serial", "serial-stream"):
             print(f"  序列: {self.config['serial_port'] or 'AUTO'}")
         print(f"  輪詢: {self.config['poll_interval']}s")
-        print(f"  閾值: {self.config['fall_threshold']}")
-        print(f"  AI:   {'✅ Gemini' if self.gemini_model else '❌'}")
-        print(f"  LINE: {'✅' if self.config['line_token'] else '❌'}")
+        print(f"  閾值: {self.config['fall_threshold']}{' (每設備自適應)' if self.device_state.adaptive else ''}")
+        print(f"  偵測: {'本地引擎' if self.detector else '閾值'}")
+        if self.dsp:
+            print(f"  CSI:  橋接器端 DSP ({self.dsp.cfg.rate:g} Hz → 每秒 {self.dsp.cfg.score_hz:g} 筆分數)")
+        ai = "✅ Gemini" if self.gemini_model else "⏳ Gemini (背景初始化中)" if self.gemini_thread else "❌"
+        print(f"  AI:   {ai}")
+        print(f"  LINE: {'✅' if self.alerts else '❌'}")
         print(f"  DB:   {self.config['db_path']}")
         print(f"{'='*50}\n")
 
-        consecutive_failures = 0
+    # ============================
+    # 多設備非同步模式
+    # ============================
+    def build_device_specs(self, devices: list[dict]) -> list["ingest.DeviceSpec"]:
+        """
+        依設備清單建立輪詢規格
+
+        每筆設備可覆寫 mode / esp32_ip / esp32_port / esp32_path / interval / jitter / timeout /
+        stream / stream_path，未指定者沿用全域設定。HTTP 設備開啟串流時，輪詢讀取器作為備援。
+        """
+        specs = []
+        for d in devices:
+            mode = d.get("mode", self.mode)
+            stream = None
+            if mode == "http":
+                host = d.get("esp32_ip", self.config["esp32_ip"])
+                port = d.get("esp32_port", self.config["esp32_port"])
+                reader = ingest.HttpStatusReader(host, port, d.get("esp32_path", "/status"))
+                kind = d.get("stream", self.config.get("stream", "off"))
+                if kind == "sse":
+                    stream = ingest.SseStreamReader(host, port, d.get("stream_path", self.config["stream_path"]))
+                elif kind == "udp":
+                    if self.udp_hub is None:
+                        self.udp_hub = ingest.UdpHub(self.config["udp_host"], self.config["udp_port"])
+                    stream = self.udp_hub.subscribe(d["device_id"])
+                elif kind != "off":
+                    raise ValueError(f"不支援的串流: {kind}")
+            elif mode == "serial":
+                reader = ingest.CallableReader(self.read_serial, blocking=True)
+            elif mode == "sim":
+                reader = ingest.CallableReader(self.read_simulation, blocking=False)
+            else:
+                raise ValueError(f"不支援的模式: {mode}")
+            specs.append(ingest.DeviceSpec(
+                device_id=d["device_id"],
+                reader=reader,
+                interval=float(d.get("interval", self.config["poll_interval"])),
+                jitter=float(d.get("jitter", self.config["poll_jitter"])),
+                timeout=float(d.get("timeout", self.config["poll_timeout"])),
+                stream=stream,
+                stream_idle=self.config.get("stream_idle", 5.0),
+                stream_retry=self.config.get("stream_retry", 30.0),
+            ))
+        return specs
+
+    def _poll_policy(self) -> PollPolicy:
+        c = self.config
+        return PollPolicy(
+            backoff_after=c.get("poll_backoff_after", 3),
+            backoff_max=c.get("poll_backoff_max", 60.0),
+            probe_timeout=c.get("probe_timeout", 1.0),
+            fast_factor=c.get("poll_fast_factor", 0.25),
+            min_interval=c.get("poll_min_interval", 0.2),
+            boost_hold=c.get("poll_boost_hold", 10.0),
+        )
 
-        try:
-            while self.running:
-                data = read_fn()
+    def _is_elevated(self, device_id: str, data: dict) -> bool:
+        """讀數接近該設備的閾值 (或設備端已判定跌倒)：加速輪詢，不錯過撞擊峰值"""
+        if data.get("motion_detected") or data.get("falling"):
+            return True
+        score = data.get("movement_score", 0)
+        return score >= self.config.get("poll_elevated_ratio", 0.7) * self.device_state.threshold(device_id)
+
+    def _on_read_failure(self, device_id: str, failures: int):
+        self.m_read_failures.inc()
+        if failures == self._backoff_after and not self.quiet:
+            print(f"[WARN] {device_id} 連續 {failures} 次讀取失敗，改為退避並以 /health 探測")
+        elif failures > 10 and failures % 10 == 1:
+            print(f"[WARN] {device_id} 連續 {failures} 次讀取失敗")
+
+    def _on_stream_fallback(self, device_id: str, reason: str):
+        self.m_stream_fallbacks.inc()
+        if not self.quiet:
+            print(f"[STREAM] {device_id} {reason}，改用輪詢 {self.config.get('stream_retry', 30):g}s 後重試")
+
+    def run_async(self, devices: list[dict], duration: float = None):
+        """以單一事件迴圈同時輪詢多台設備"""
+        self.running = True
+        engine = self.engine = ingest.AsyncIngestionEngine(
+            on_sample=self.process_sample, on_failure=self._on_read_failure, on_read=self.h_read.observe,
+            on_fallback=self._on_stream_fallback, policy=self._poll_policy(), elevated=self._is_elevated)
+        for spec in self.build_device_specs(devices):
+            engine.add_device(spec)
+        workers = self.config.get("detector_workers", 0)
+        if workers > 0 and self.detector:
+            self.shards = shards.ShardPool(workers, self.detector.cfg, self.detector.model,
+                                           batch_size=self.config.get("detector_batch", 256),
+                                           on_result=self._on_shard_result).start()
+        elif workers > 0:
+            print("[WARN] 分片偵測需要本地偵測引擎 (numpy)，改在主程序以閾值判定")
 
-                if data is None:
-                    consecutive_failures += 1
-                    if consecutive_failures > 10 and self.mode != "sim":
-                        print(f"[WARN] 連續 {consecutive_failures} 次讀取失敗")
-                    time.sleep(self.config["poll_interval"])
-                    continue
+        print(f"\n{'='*50}")
+        print(f"  Wi-Care Bridge v1.0 (多設備)")
+        print(f"  模式: {self.mode.upper()}")
+        print(f"  設備數: {len(engine.devices)}")
+        print(f"  輪詢: {self.config['poll_interval']}s ±{self.config['poll_jitter']*100:.0f}%")
+        streaming = sum(1 for spec in engine.devices.values() if spec.stream)
+        if streaming:
+            where = f"UDP {self.config['udp_host']}:{self.config['udp_port']}" if self.udp_hub else "SSE"
+            print(f"  串流: {streaming} 台 ({where}，中斷時改用輪詢)")
+        print(f"  閾值: {self.config['fall_threshold']}{' (每設備自適應)' if self.device_state.adaptive else ''}")
+        print(f"  DB:   {self.config['db_path']}")
+        if self.shards:
+            print(f"  偵測: {workers} 個分片子程序")
+        print(f"{'='*50}\n")
+        self._start_monitoring()
 
-                consecutive_failures = 0
-                score = data.get("movement_score", 0)
-                motion = data.get("motion_detected", False)
-                threshold = data.get("threshold")
-
-                # 加入緩衝區
-                self.data_buffer.append(data)
-                if len(self.data_buffer) > self.buffer_size:
-                    self.data_buffer.pop(0)
-
-                # 儲存到 SQLite + 推送到後端
-                self.save_sensor_data(self.config["device_id"], score, motion, threshold)
-
-                # 狀態輸出
-                status = "🔴 FALL" if motion else "🟢 SAFE"
-                bar = "█" * int(score / 5) + "░" * (20 - int(score / 5))
-                ts = datetime.now().strftime("%H:%M:%S")
-                print(f"[{ts}] {status} score={score:6.2f} [{bar}]", end="")
-
-                # 跌倒偵測
-                if motion or score > self.config["fall_threshold"]:
-                    now = time.time()
-                    if now - self.last_fall_time > self.fall_cooldown:
-                        self.last_fall_time = now
-                        print(" ⚠️  跌倒警報!", end="")
-
-                        # AI 分析
-                        ai = self.analyze_with_ai()
-                        if ai:
-                            print(f"\n  AI: {ai}", end="")
-
-                        # LINE 推播
-                        self.send_line_alert(score, ai)
-
-                        # 儲存事件
-                        self.db.execute(
-                            "INSERT INTO events (device_id,type,severity,message,ai_analysis) VALUES (?,?,?,?,?)",
-                            (self.config["device_id"], "fall_alert", "critical",
-                             f"跌倒偵測 score={score:.1f}", ai)
-                        )
-                        self.db.commit()
-
-                print()
-                time.sleep(self.config["poll_interval"])
+        async def poll_all():
+            self._loop = asyncio.get_running_loop()
+            if self.shards:
+                self.shards.attach(self._loop)
+            try:
+                await engine.run(duration)
+            finally:
+                self._loop = None
+                if self.shards:
+                    self.shards.detach()
+                if self.udp_hub:
+                    self.udp_hub.close()
+                    self.udp_hub = None
 
+        try:
+            asyncio.run(poll_all())
         except KeyboardInterrupt:
             print("\n\n[Bridge] 停止中...")
         finally:
+            st = engine.stats
+            print(f"[Bridge] 樣本={st.samples} (串流 {st.streamed}) 失敗={st.failures} 逾時={st.timeouts} "
+                  f"落後={st.late_ticks} 最大延遲={st.max_lag*1000:.0f}ms 改用輪詢={st.stream_fallbacks} "
+                  f"探測={st.probes} 加速={st.boosted_polls}")
             self.cleanup()
 
     def cleanup(self):
         """清理資源"""
         self.running = False
+        if self.shards:
+            # 先收回分片在途的偵測結果 (可能還會寫入警報事件)，再關閉寫入器
+            pool, self.shards = self.shards, None
+            pool.close()
+        if self.live:
+            live, self.live = self.live, None
+            live.close()
+        if self.summary:
+            self.summary.stop()
+        if self.metrics_thread:
+            self.metrics_thread.join(timeout=1.0)
+        if self.metrics_server:
+            self.metrics_server.stop()
+        if self.gemini_thread:
+            self.gemini_thread.join(timeout=1.0)
+        if self.ai_worker:
+            self.ai_worker.close()
+            self._apply_ai_alerts()     # 關閉前已完成的複核結果 (警報與寫入器仍可用)
+            cs = self.ai_cache.stats
+            print(f"[AI] 快取 命中={cs.hits} 未命中={cs.misses} 淘汰={cs.evictions} 過期={cs.expirations}")
+        if self.alerts:
+            self.alerts.close()
+            st = self.alerts.stats
+            print(f"[LINE] 警報 排入={st.enqueued} 送達={st.delivered} 訊息={st.messages} "
+                  f"合併={st.coalesced} 重試={st.retries} 放棄={st.failed}")
+        if self.serial_stream:
+            self.serial_stream.stop()
         if self.serial_conn:
             self.serial_conn.close()
             print("[SERIAL] 序列埠已關閉")
+        if self.pusher:
+            # 先提交已排入的讀數，推送執行緒才看得到
+            if self.writer:
+                self.writer.flush()
+            self.pusher.close()
+            ps = self.pusher.stats
+            print(f"[HTTP] 推送完成: 送出={ps.sent} 補送={ps.replayed} 重複={ps.duplicates} "
+                  f"拒收={ps.rejected} 未確認={self.pusher.queue_depth}")
+        if self.csi_store:
+            self.csi_store.close()
+        if self.retention:
+            self.retention.stop()
+        if self.rollup and self.writer:
+            self.rollup.flush()
+            self._flush_device_state()
+        if self.writer:
+            self.writer.close()
+            st = self.writer.stats
+            print(f"[DB] 批次寫入完成: {st.rows_written} 筆 / {st.batches} 批")
+        if self.sequences:
+            self.sequences.close()
         if self.db:
             self.db.close()
             print("[DB] 資料庫連線已關閉")
@@ -446,6 +1223,7 @@ def auto_detect_serial_ports():
     if not HAS_SERIAL:
         print("需要安裝 pyserial: pip install pyserial")
         return
+    import serial.tools.list_ports
     ports = serial.tools.list_ports.comports()
     if not ports:
         print("找不到任何序列埠")
@@ -457,7 +1235,7 @@ def auto_detect_serial_ports():
 
 def main():
     parser = argparse.ArgumentParser(description="Wi-Care ESP32 Bridge")
-    parser.add_argument("--mode", choices=["http", "serial", "sim"], default="http", help="資料讀取模式")
+    parser.add_argument("--mode", choices=["http", "serial", "serial-stream", "sim"], default="http", help="資料讀取模式")
     parser.add_argument("--esp32-ip", default=None, help="ESP32 IP 位址")
     parser.add_argument("--esp32-port", type=int, default=None, help="ESP32 連接埠")
     parser.add_argument("--serial-port", default=None, help="序列埠 (例: COM3, /dev/ttyUSB0)")
@@ -465,6 +1243,22 @@ def main():
     parser.add_argument("--interval", type=float, default=None, help="輪詢間隔 (秒)")
     parser.add_argument("--threshold", type=float, default=None, help="跌倒閾值")
     parser.add_argument("--backend", default=None, help="後端 URL")
+    parser.add_argument("--devices", default=None, help="多設備清單 JSON 檔")
+    parser.add_argument("--sim-devices", type=int, default=0, help="模擬設備數量 (搭配 --mode sim)")
+    parser.add_argument("--jitter", type=float, default=None, help="輪詢間隔抖動比例 (例: 0.1)")
+    parser.add_argument("--timeout", type=float, default=None, help="單次讀取逾時 (秒)")
+    parser.add_argument("--stream", choices=["off", "sse", "udp"], default=None,
+                        help="設備推送串流 (HTTP 模式；中斷時改用輪詢)")
+    parser.add_argument("--udp-port", type=int, default=None, help="UDP 訊框接收埠 (搭配 --stream udp)")
+    parser.add_argument("--seed", type=int, default=None, help="模擬亂數種子 (可重現)")
+    parser.add_argument("--quiet", action="store_true", help="不逐筆輸出，改為定期摘要")
+    parser.add_argument("--metrics-port", type=int, default=None, help="/metrics 監控埠 (0 = 停用)")
+    parser.add_argument("--live-ring", nargs="?", const=live_ring.DEFAULT_PATH, default=None,
+                        help=f"發布即時讀數到共享記憶體環 (預設路徑 {live_ring.DEFAULT_PATH})")
+    parser.add_argument("--detector-workers", type=int, default=None,
+                        help="多設備模式以 N 個子程序分片偵測 (0 = 主程序)")
+    parser.add_argument("--csi-dsp", action="store_true", help="由原始 CSI 計算 movement_score (需要 numpy)")
+    parser.add_argument("--csi-rate", type=float, default=None, help="原始 CSI 取樣率 (Hz)")
     parser.add_argument("--list-ports", action="store_true", help="列出序列埠")
     args = parser.parse_args()
 
@@ -480,9 +1274,26 @@ def main():
     if args.interval: config["poll_interval"] = args.interval
     if args.threshold: config["fall_threshold"] = args.threshold
     if args.backend: config["backend_url"] = args.backend
+    if args.jitter is not None: config["poll_jitter"] = args.jitter
+    if args.timeout: config["poll_timeout"] = args.timeout
+    if args.stream: config["stream"] = args.stream
+    if args.udp_port is not None: config["udp_port"] = args.udp_port
+    if args.seed is not None: config["sim_seed"] = args.seed
+    if args.quiet: config["quiet"] = True
+    if args.metrics_port is not None: config["metrics_port"] = args.metrics_port
+    if args.live_ring: config["live_ring"] = args.live_ring
+    if args.detector_workers is not None: config["detector_workers"] = args.detector_workers
+    if args.csi_dsp: config["csi_dsp"] = True
+    if args.csi_rate: config["csi_rate"] = args.csi_rate
 
     bridge = WiCareBridge(config, mode=args.mode)
-    bridge.run()
+    if args.devices:
+        bridge.run_async(ingest.load_device_specs(args.devices))
+    elif args.sim_devices:
+        devices = [{"device_id": f"SIM-{i:04d}", "mode": "sim"} for i in range(args.sim_devices)]
+        bridge.run_async(devices)
+    else:
+        bridge.run()
 
 
 if __name__ == "__main__":
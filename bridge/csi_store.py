@@ -0,0 +1,310 @@
+"""
+Wi-Care 原始 CSI 訊框二進位儲存
+
+sensor_data.raw_csi 以 JSON 文字儲存每個子載波陣列會讓資料庫暴增，
+改為 append-only 分段檔 + SQLite 索引：
+
+  分段檔 (data/csi/seg-00000001.wcsi)
+    檔頭 16 bytes：b"WCSI" + u16 版本 + 保留
+    每個訊框：<d H B x> (timestamp f64, 子載波數 u16, 格式 u8, 填充) 12 bytes + 資料
+      FMT_IQ_INT8         ESP-IDF 原生 I/Q (每子載波 imag, real 各 int8)，2 bytes/子載波，無損
+      FMT_AMP_PHASE_F16   振幅 float16 + 相位 int16 (±π 量化)，4 bytes/子載波
+
+  SQLite csi_frames 只存 (device_id, timestamp, segment, offset, n_sub, format)
+
+  64 子載波：JSON 振幅/相位約 2.4 KB，FMT_IQ_INT8 約 140 bytes + 索引列
+  讀取端以 mmap 映射分段檔，np.frombuffer 直接回傳 NumPy view (零複製)。
+  保留期限：prune() 由 rollup.RetentionJob 定期呼叫，依分段檔的最後寫入時間與總大小上限
+  淘汰最舊的分段 (先分批刪除索引列，再刪檔案；寫入中的最新分段永不刪除)。
+"""
+
+import math
+import mmap
+import os
+import sqlite3
+import struct
+import time
+from dataclasses import dataclass
+
+from lazy import available, lazy_import
+
+# numpy 載入約需 100+ ms：第一次用到時才載入 (第一個 CSI 訊框)
+HAS_NUMPY = available("numpy")
+np = lazy_import("numpy")
+
+MAGIC = b"WCSI"
+VERSION = 1
+FILE_HEADER = struct.Struct("<4sH10x")
+FRAME_HEADER = struct.Struct("<dHBx")
+
+FMT_IQ_INT8 = 1
+FMT_AMP_PHASE_F16 = 2
+_BYTES_PER_SUB = {FMT_IQ_INT8: 2, FMT_AMP_PHASE_F16: 4}
+PHASE_SCALE = 32767 / math.pi
+
+CREATE_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS csi_frames (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        device_id TEXT NOT NULL,
+        timestamp REAL NOT NULL,
+        segment INTEGER NOT NULL,
+        offset INTEGER NOT NULL,
+        n_sub INTEGER NOT NULL,
+        format INTEGER NOT NULL
+    )
+"""
+CREATE_INDEX_SQL = "CREATE INDEX IF NOT EXISTS idx_csi_frames_device ON csi_frames(device_id, timestamp)"
+INSERT_SQL = "INSERT INTO csi_frames (device_id, timestamp, segment, offset, n_sub, format) VALUES (?,?,?,?,?,?)"
+
+
+def init_schema(db: sqlite3.Connection):
+    db.execute(CREATE_TABLE_SQL)
+    db.execute(CREATE_INDEX_SQL)
+
+
+def _segment_name(segment: int) -> str:
+    return f"seg-{segment:08d}.wcsi"
+
+
+def _segments(directory: str) -> list[tuple[int, str, int, float]]:
+    """目錄中的分段檔 (編號, 路徑, 大小, 最後修改時間)，依編號排序"""
+    out = []
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return out
+    for name in names:
+        if name.startswith("seg-") and name.endswith(".wcsi") and name[4:12].isdigit():
+            path = os.path.join(directory, name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            out.append((int(name[4:12]), path, st.st_size, st.st_mtime))
+    return sorted(out)
+
+
+def prune(conn: sqlite3.Connection, directory: str, before: float | None = None, max_bytes: int = 0,
+          chunk_size: int = 2000, pause: float = 0.05, stop=None) -> tuple[int, int]:
+    """
+    淘汰舊分段檔；回傳 (刪除的分段數, 刪除的索引列數)
+
+    before：最後寫入時間 (epoch 秒) 早於此值的分段整個過期；max_bytes：所有分段的總大小上限。
+    從最舊的分段依序判斷，最新分段 (寫入端正在附加) 一律保留。
+    分段編號隨 csi_frames.id 遞增，索引列從 id 最小處分批刪除 (每批 O(chunk))，刪完才刪檔案；
+    stop (threading.Event) 被設定時中止，檔案留到下一輪。
+    """
+    segments = _segments(directory)
+    total = sum(size for _, _, size, _ in segments)
+    doomed = []
+    for number, path, size, mtime in segments[:-1]:
+        if not ((before is not None and mtime < before) or (max_bytes and total > max_bytes)):
+            break
+        doomed.append(path)
+        total -= size
+        last = number
+    if not doomed:
+        return 0, 0
+
+    rows = 0
+    while True:
+        if stop is not None and stop.is_set():
+            return 0, rows
+        with conn:
+            n = conn.execute("DELETE FROM csi_frames WHERE id IN (SELECT id FROM csi_frames ORDER BY id LIMIT ?) "
+                             "AND segment <= ?", (chunk_size, last)).rowcount
+        rows += n
+        if n < chunk_size:
+            break
+        time.sleep(pause)
+    for path in doomed:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+    return len(doomed), rows
+
+
+class CsiStore:
+    """
+    CSI 訊框寫入端 (單一寫入者)
+
+    index_write(sql, params) 用來寫入索引列，通常是 BatchWriter.write，
+    讓索引跟著 sensor_data 一起群組提交。
+    """
+
+    def __init__(self, directory: str, index_write, segment_bytes: int = 64 * 1024 * 1024,
+                 flush_bytes: int = 64 * 1024, flush_interval: float = 0.25):
+        if not HAS_NUMPY:
+            raise RuntimeError("CSI 儲存需要 numpy: pip install numpy")
+        self.directory = directory
+        self.index_write = index_write
+        self.segment_bytes = segment_bytes
+        self.flush_bytes = flush_bytes
+        self.flush_interval = flush_interval
+        self.frames_written = 0
+        self.bytes_written = 0
+        os.makedirs(directory, exist_ok=True)
+
+        existing = [n for n in os.listdir(directory) if n.startswith("seg-") and n.endswith(".wcsi")]
+        self.segment = max((int(n[4:12]) for n in existing), default=0)
+        self._file = None
+        self._offset = 0
+        self._unflushed = 0
+        self._last_flush = time.monotonic()
+        self._open_segment(new=self.segment == 0)
+
+    def _open_segment(self, new: bool):
+        if self._file:
+            self._file.close()
+        if new:
+            self.segment += 1
+        path = os.path.join(self.directory, _segment_name(self.segment))
+        self._file = open(path, "ab")
+        self._offset = self._file.tell()
+        if self._offset == 0:
+            self._file.write(FILE_HEADER.pack(MAGIC, VERSION))
+            self._offset = FILE_HEADER.size
+
+    def append_iq(self, device_id: str, timestamp: float, iq) -> int:
+        """寫入 ESP-IDF 原生 I/Q 訊框 (int8，imag/real 交錯)"""
+        buf = np.asarray(iq, dtype=np.int8)
+        return self._append(device_id, timestamp, buf.size // 2, FMT_IQ_INT8, buf.tobytes())
+
+    def append_amp_phase(self, device_id: str, timestamp: float, amplitude, phase) -> int:
+        """寫入振幅/相位訊框 (振幅 float16，相位量化為 int16)"""
+        amp = np.asarray(amplitude, dtype=np.float16)
+        ph = np.round(np.asarray(phase, dtype=np.float64) * PHASE_SCALE).astype(np.int16)
+        return self._append(device_id, timestamp, amp.size, FMT_AMP_PHASE_F16, amp.tobytes() + ph.tobytes())
+
+    def _append(self, device_id: str, timestamp: float, n_sub: int, fmt: int, payload: bytes) -> int:
+        if self._offset >= self.segment_bytes:
+            self._file.flush()
+            self._open_segment(new=True)
+        offset = self._offset
+        self._file.write(FRAME_HEADER.pack(timestamp, n_sub, fmt))
+        self._file.write(payload)
+        size = FRAME_HEADER.size + len(payload)
+        self._offset += size
+        self._unflushed += size
+        self.frames_written += 1
+        self.bytes_written += size
+        self.index_write(INSERT_SQL, (device_id, timestamp, self.segment, offset, n_sub, fmt))
+
+        now = time.monotonic()
+        if self._unflushed >= self.flush_bytes or now - self._last_flush >= self.flush_interval:
+            self.flush()
+        return offset
+
+    def flush(self):
+        if self._file:
+            self._file.flush()
+        self._unflushed = 0
+        self._last_flush = time.monotonic()
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+
+@dataclass
+class CsiFrame:
+    device_id: str
+    timestamp: float
+    format: int
+    data: "np.ndarray"             # IQ: (n_sub, 2) int8 view；AMP_PHASE: (n_sub,) float16 view
+    phase_raw: "np.ndarray | None" = None  # AMP_PHASE: (n_sub,) int16 view
+
+    @property
+    def amplitude(self) -> "np.ndarray":
+        if self.format == FMT_IQ_INT8:
+            iq = self.data.astype(np.float32)
+            return np.hypot(iq[:, 1], iq[:, 0])
+        return self.data.astype(np.float32)
+
+    @property
+    def phase(self) -> "np.ndarray":
+        if self.format == FMT_IQ_INT8:
+            iq = self.data.astype(np.float32)
+            return np.arctan2(iq[:, 0], iq[:, 1])
+        return self.phase_raw.astype(np.float32) / PHASE_SCALE
+
+
+class CsiReader:
+    """離線分析用讀取端：SQLite 查索引，mmap 分段檔回傳零複製 NumPy view"""
+
+    def __init__(self, db_path: str, directory: str):
+        if not HAS_NUMPY:
+            raise RuntimeError("CSI 讀取需要 numpy: pip install numpy")
+        self.db = sqlite3.connect(db_path)
+        self.directory = directory
+        self._maps: dict[int, mmap.mmap] = {}
+
+    def _map(self, segment: int, needed: int) -> mmap.mmap | None:
+        mm = self._maps.get(segment)
+        if mm is None or len(mm) < needed:
+            # 寫入端仍在附加資料：檔案長大後重新映射
+            # (舊映射可能仍被回傳過的 view 引用，交給 GC 釋放)
+            path = os.path.join(self.directory, _segment_name(segment))
+            try:
+                f = open(path, "rb")
+            except FileNotFoundError:
+                return None  # 已被保留期限淘汰 (索引列稍後刪除)
+            with f:
+                size = os.fstat(f.fileno()).st_size
+                if size < needed:
+                    return None
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            if mm[:4] != MAGIC:
+                raise ValueError(f"不是 CSI 分段檔: {path}")
+            self._maps[segment] = mm
+        return mm
+
+    def frames(self, device_id: str, since: float | None = None, until: float | None = None,
+               limit: int | None = None) -> list[CsiFrame]:
+        q = "SELECT timestamp, segment, offset, n_sub, format FROM csi_frames WHERE device_id=?"
+        params: list = [device_id]
+        if since is not None:
+            q += " AND timestamp>=?"
+            params.append(since)
+        if until is not None:
+            q += " AND timestamp<?"
+            params.append(until)
+        q += " ORDER BY timestamp"
+        if limit:
+            q += " LIMIT ?"
+            params.append(limit)
+
+        out = []
+        for ts, segment, offset, n_sub, fmt in self.db.execute(q, params):
+            start = offset + FRAME_HEADER.size
+            end = start + n_sub * _BYTES_PER_SUB[fmt]
+            mm = self._map(segment, end)
+            if mm is None:
+                continue  # 尚未刷新到磁碟 (或被截斷 / 已淘汰) 的訊框
+            if fmt == FMT_IQ_INT8:
+                data = np.frombuffer(mm, dtype=np.int8, count=n_sub * 2, offset=start).reshape(n_sub, 2)
+                out.append(CsiFrame(device_id, ts, fmt, data))
+            else:
+                amp = np.frombuffer(mm, dtype=np.float16, count=n_sub, offset=start)
+                ph = np.frombuffer(mm, dtype=np.int16, count=n_sub, offset=start + n_sub * 2)
+                out.append(CsiFrame(device_id, ts, fmt, amp, ph))
+        return out
+
+    def amplitude_matrix(self, device_id: str, **kwargs) -> "np.ndarray":
+        """(訊框數, 子載波數) 振幅矩陣 (子載波數不一致的訊框會被略過)"""
+        frames = self.frames(device_id, **kwargs)
+        if not frames:
+            return np.empty((0, 0), dtype=np.float32)
+        n = len(frames[0].data)
+        return np.stack([f.amplitude for f in frames if len(f.data) == n])
+
+    def close(self):
+        for mm in self._maps.values():
+            try:
+                mm.close()
+            except BufferError:
+                pass  # 仍有 view 引用，交給 GC 釋放
+        self._maps.clear()
+        self.db.close()
@@ -0,0 +1,210 @@
+"""
+Wi-Care 本地跌倒偵測引擎
+
+以 NumPy 向量化計算 movement_score 滑動視窗特徵，取代單純的 score > threshold：
+
+  視窗配置 (由舊到新)：[ 基線 baseline | 撞擊 impact | 撞擊後 post ]
+
+  特徵：
+    slope        撞擊區最大單步上升 / 基線標準差 (突發程度)
+    peak_ratio   撞擊峰值 / 基線平均
+    peak_z       (撞擊峰值 - 基線平均) / 基線標準差
+    stillness    1 - 撞擊後平均 / 撞擊峰值 (撞擊後是否趨於靜止)
+    var_drop     log((基線變異 + 1) / (撞擊後變異 + 1)) (變異是否驟降)
+    peak_excess  (撞擊峰值 - 跌倒閾值) / 10
+
+  評分模型可插拔 (score(features) -> 機率，可另提供純量版 score_one)，預設為手調權重的邏輯迴歸。
+  機率 >= fall_prob 判定跌倒；介於 ambiguous_prob 與 fall_prob 之間為模糊，交給 AI 複核。
+
+  extract_features() / score_series() 可一次處理整批視窗 (離線重新評分用)；
+  線上逐筆評估的視窗只有十數筆，NumPy 小陣列的呼叫成本反而高，
+  改用等價的純量版本 features_one() (數微秒)。
+"""
+
+import math
+from dataclasses import dataclass
+
+from lazy import available, lazy_import
+
+# numpy 載入約需 100+ ms：第一次用到時才載入 (線上逐筆評估用純量版本，不需要 numpy)
+HAS_NUMPY = available("numpy")
+np = lazy_import("numpy")
+
+FEATURE_NAMES = ("slope", "peak_ratio", "peak_z", "stillness", "var_drop", "peak_excess")
+
+# 判定結果
+SAFE = "safe"
+AMBIGUOUS = "ambiguous"
+FALL = "fall"
+
+
+@dataclass
+class DetectorConfig:
+    baseline: int = 10       # 基線樣本數
+    impact: int = 3          # 撞擊區樣本數
+    post: int = 2            # 撞擊後樣本數 (確認延遲 = post 個取樣週期)
+    fall_prob: float = 0.85
+    ambiguous_prob: float = 0.5
+
+    @property
+    def window(self) -> int:
+        return self.baseline + self.impact + self.post
+
+
+@dataclass
+class Detection:
+    verdict: str
+    probability: float
+    peak: float
+    features: dict | None = None
+
+
+class LogisticModel:
+    """邏輯迴歸評分模型：sigmoid(bias + features · weights)"""
+
+    DEFAULT_WEIGHTS = {
+        "slope": 0.2,
+        "peak_ratio": 0.3,
+        "peak_z": 0.4,
+        "stillness": 1.5,
+        "var_drop": 0.3,
+        "peak_excess": 1.5,
+    }
+    DEFAULT_BIAS = -3.0
+
+    def __init__(self, weights: dict | None = None, bias: float | None = None):
+        w = dict(self.DEFAULT_WEIGHTS, **(weights or {}))
+        self._weights = [w[name] for name in FEATURE_NAMES]
+        self._weights_np = None
+        self.bias = self.DEFAULT_BIAS if bias is None else bias
+
+    @property
+    def weights(self) -> "np.ndarray":
+        if self._weights_np is None:
+            self._weights_np = np.array(self._weights)
+        return self._weights_np
+
+    def score(self, features: "np.ndarray") -> "np.ndarray":
+        """features: (n, F) → 機率 (n,)"""
+        z = features @ self.weights + self.bias
+        return 1.0 / (1.0 + np.exp(-np.clip(z, -50, 50)))
+
+    def score_one(self, features: list[float]) -> float:
+        """單一樣本的純量版本 (線上逐筆評估用)"""
+        z = self.bias + sum(f * w for f, w in zip(features, self._weights))
+        return 1.0 / (1.0 + math.exp(-max(-50.0, min(50.0, z))))
+
+
+def extract_features(windows: "np.ndarray", threshold, cfg: DetectorConfig) -> "np.ndarray":
+    """
+    批次計算視窗特徵
+
+    windows: (n, cfg.window) 的 movement_score 視窗
+    threshold: 純量或 (n,) 的跌倒閾值
+    回傳 (n, len(FEATURE_NAMES))
+    """
+    b, i = cfg.baseline, cfg.impact
+    base = windows[:, :b]
+    impact = windows[:, b:b + i]
+    post = windows[:, b + i:]
+
+    base_mean = base.mean(axis=1)
+    base_std = base.std(axis=1) + 1.0
+    peak = impact.max(axis=1)
+    # 含基線最後一筆，才量得到進入撞擊區的那一步
+    rise = np.diff(windows[:, b - 1:b + i], axis=1).max(axis=1)
+
+    if post.shape[1]:
+        post_mean = post.mean(axis=1)
+        post_var = post.var(axis=1)
+    else:
+        post_mean = peak
+        post_var = base.var(axis=1)
+
+    feats = np.empty((windows.shape[0], len(FEATURE_NAMES)))
+    feats[:, 0] = rise / base_std
+    feats[:, 1] = peak / (base_mean + 1.0)
+    feats[:, 2] = (peak - base_mean) / base_std
+    feats[:, 3] = 1.0 - post_mean / (peak + 1.0)
+    feats[:, 4] = np.log((base.var(axis=1) + 1.0) / (post_var + 1.0))
+    feats[:, 5] = (peak - threshold) / 10.0
+    return feats
+
+
+def features_one(window, threshold: float, cfg: DetectorConfig) -> list[float]:
+    """單一視窗的特徵 (與 extract_features 等價的純量版本)"""
+    b, i = cfg.baseline, cfg.impact
+    base = window[:b]
+    base_mean = sum(base) / b
+    base_var = sum((x - base_mean) ** 2 for x in base) / b
+    base_std = math.sqrt(base_var) + 1.0
+    peak = max(window[b:b + i])
+    rise = max(window[k + 1] - window[k] for k in range(b - 1, b + i - 1))
+
+    post = window[b + i:]
+    if post:
+        post_mean = sum(post) / len(post)
+        post_var = sum((x - post_mean) ** 2 for x in post) / len(post)
+    else:
+        post_mean = peak
+        post_var = base_var
+
+    return [
+        rise / base_std,
+        peak / (base_mean + 1.0),
+        (peak - base_mean) / base_std,
+        1.0 - post_mean / (peak + 1.0),
+        math.log((base_var + 1.0) / (post_var + 1.0)),
+        (peak - threshold) / 10.0,
+    ]
+
+
+class FallDetector:
+    """本地跌倒偵測：特徵萃取 + 可插拔評分模型"""
+
+    def __init__(self, cfg: DetectorConfig | None = None, model=None):
+        if not HAS_NUMPY:
+            raise RuntimeError("本地偵測需要 numpy: pip install numpy")
+        self.cfg = cfg or DetectorConfig()
+        self.model = model or LogisticModel()
+
+    def _verdict(self, prob: float) -> str:
+        if prob >= self.cfg.fall_prob:
+            return FALL
+        if prob >= self.cfg.ambiguous_prob:
+            return AMBIGUOUS
+        return SAFE
+
+    def evaluate(self, scores, threshold: float) -> Detection | None:
+        """評估單一視窗 (最近 cfg.window 筆，由舊到新)；樣本不足回傳 None"""
+        if len(scores) < self.cfg.window:
+            return None
+        window = scores[-self.cfg.window:]
+        feats = features_one(window, threshold, self.cfg)
+        score_one = getattr(self.model, "score_one", None)
+        prob = score_one(feats) if score_one else float(self.model.score(np.array([feats]))[0])
+        peak = max(window[self.cfg.baseline:self.cfg.baseline + self.cfg.impact])
+        return Detection(self._verdict(prob), prob, peak, dict(zip(FEATURE_NAMES, feats)))
+
+    def score_series(self, scores: "np.ndarray", threshold) -> "np.ndarray":
+        """
+        對整段序列的每個位置評分 (向量化)
+
+        回傳長度與 scores 相同的機率陣列；第 k 筆為「以 k 結尾的視窗」的機率，
+        前 cfg.window - 1 筆樣本不足，設為 0。
+        """
+        scores = np.asarray(scores, dtype=np.float64)
+        probs = np.zeros(len(scores))
+        w = self.cfg.window
+        if len(scores) < w:
+            return probs
+        windows = np.lib.stride_tricks.sliding_window_view(scores, w)
+        if not np.isscalar(threshold):
+            threshold = np.asarray(threshold, dtype=np.float64)[w - 1:]
+        probs[w - 1:] = self.model.score(extract_features(windows, threshold, self.cfg))
+        return probs
+
+    def classify_series(self, scores, threshold) -> "np.ndarray":
+        """score_series 的判定版本：回傳 0=safe / 1=ambiguous / 2=fall"""
+        probs = self.score_series(scores, threshold)
+        return (probs >= self.cfg.ambiguous_prob).astype(np.int8) + (probs >= self.cfg.fall_prob)
@@ -0,0 +1,175 @@
+"""
+Wi-Care 每設備偵測狀態
+
+取代全域 fall_threshold / fall_cooldown / last_fall_time (一台設備跌倒會壓下所有設備的警報)：
+  - 以 struct-of-arrays 保存 (device_id → slot，每個欄位一條 array('d'))，每筆樣本 O(1) 更新
+  - 自適應閾值：EWMA 追蹤每台設備的噪音底 (平均與變異)，
+    threshold = clamp(mean + k·std, threshold_min, threshold_max)；暖機樣本不足時沿用預設閾值
+    超過閾值的樣本只以 1/10 權重更新噪音底，避免跌倒把基線拉高
+  - 每台設備獨立的冷卻狀態機：
+
+      ARMED ──警報──▶ TRIGGERED ──冷卻結束──▶ ARMED (分數已回落)
+                                        └──▶ HOLD  (仍在閾值以上，回落後才重新武裝)
+
+  - dirty() / rows() 供定期寫回 SQLite device_state 表，重啟時 load() 還原，不必重新校準
+"""
+
+import math
+import sqlite3
+from array import array
+
+ARMED = 0
+TRIGGERED = 1
+HOLD = 2
+STATE_NAMES = {ARMED: "armed", TRIGGERED: "triggered", HOLD: "hold"}
+
+CREATE_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS device_state (
+        device_id TEXT PRIMARY KEY,
+        mean REAL NOT NULL,
+        var REAL NOT NULL,
+        samples INTEGER NOT NULL,
+        state INTEGER NOT NULL,
+        until REAL NOT NULL,
+        last_alert REAL NOT NULL,
+        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+UPSERT_SQL = """
+    INSERT INTO device_state (device_id, mean, var, samples, state, until, last_alert, updated_at)
+    VALUES (?,?,?,?,?,?,?,CURRENT_TIMESTAMP)
+    ON CONFLICT(device_id) DO UPDATE SET
+        mean=excluded.mean, var=excluded.var, samples=excluded.samples, state=excluded.state,
+        until=excluded.until, last_alert=excluded.last_alert, updated_at=CURRENT_TIMESTAMP
+"""
+
+
+def init_schema(db: sqlite3.Connection):
+    db.execute(CREATE_TABLE_SQL)
+
+
+class DeviceStateStore:
+    """每設備自適應閾值 + 冷卻狀態機"""
+
+    def __init__(self, default_threshold: float = 70.0, cooldown: float = 30.0, k: float = 3.0,
+                 window: int = 300, warmup: int = 30, threshold_min: float = 40.0,
+                 threshold_max: float = 95.0, adaptive: bool = True):
+        self.default_threshold = default_threshold
+        self.cooldown = cooldown
+        self.k = k
+        self.alpha = 2.0 / (window + 1)
+        self.warmup = warmup
+        self.threshold_min = threshold_min
+        self.threshold_max = threshold_max
+        self.adaptive = adaptive
+
+        self.slots: dict[str, int] = {}
+        self.ids: list[str] = []
+        self.mean = array("d")
+        self.var = array("d")
+        self.samples = array("q")
+        self.thresholds = array("d")
+        self.state = array("b")
+        self.until = array("d")
+        self.last_alert = array("d")
+        self._dirty: set[int] = set()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def slot(self, device_id: str) -> int:
+        i = self.slots.get(device_id)
+        if i is None:
+            i = self.slots[device_id] = len(self.ids)
+            self.ids.append(device_id)
+            self.mean.append(0.0)
+            self.var.append(0.0)
+            self.samples.append(0)
+            self.thresholds.append(self.default_threshold)
+            self.state.append(ARMED)
+            self.until.append(0.0)
+            self.last_alert.append(0.0)
+        return i
+
+    def _recompute(self, i: int):
+        if not self.adaptive or self.samples[i] < self.warmup:
+            self.thresholds[i] = self.default_threshold
+        else:
+            t = self.mean[i] + self.k * math.sqrt(self.var[i])
+            self.thresholds[i] = min(self.threshold_max, max(self.threshold_min, t))
+
+    def observe(self, device_id: str, score: float, now: float) -> float:
+        """更新噪音底與狀態機；回傳此設備目前的閾值"""
+        i = self.slot(device_id)
+        threshold = self.thresholds[i]
+        elevated = score >= threshold
+
+        # EWMA 平均與變異 (首筆直接作為起點)
+        n = self.samples[i]
+        if n == 0:
+            self.mean[i] = score
+        else:
+            a = self.alpha * 0.1 if elevated else self.alpha
+            diff = score - self.mean[i]
+            self.mean[i] += a * diff
+            self.var[i] = (1.0 - a) * (self.var[i] + a * diff * diff)
+        self.samples[i] = n + 1
+        self._recompute(i)
+
+        state = self.state[i]
+        if state == TRIGGERED:
+            if now >= self.until[i]:
+                self.state[i] = HOLD if elevated else ARMED
+        elif state == HOLD and not elevated:
+            self.state[i] = ARMED
+        self._dirty.add(i)
+        return self.thresholds[i]
+
+    def threshold(self, device_id: str) -> float:
+        i = self.slots.get(device_id)
+        return self.default_threshold if i is None else self.thresholds[i]
+
+    def try_alert(self, device_id: str, now: float) -> bool:
+        """ARMED 才能發出警報 (並進入冷卻)；其他狀態回傳 False"""
+        i = self.slot(device_id)
+        if self.state[i] != ARMED:
+            # 冷卻已過但尚未收到新樣本推進狀態機 (例如 AI 複核回呼)
+            if self.state[i] == TRIGGERED and now >= self.until[i]:
+                self.state[i] = ARMED
+            else:
+                return False
+        self.state[i] = TRIGGERED
+        self.until[i] = now + self.cooldown
+        self.last_alert[i] = now
+        self._dirty.add(i)
+        return True
+
+    def describe(self, device_id: str) -> dict | None:
+        i = self.slots.get(device_id)
+        if i is None:
+            return None
+        return {
+            "threshold": self.thresholds[i], "mean": self.mean[i], "std": math.sqrt(self.var[i]),
+            "samples": self.samples[i], "state": STATE_NAMES[self.state[i]],
+            "until": self.until[i], "last_alert": self.last_alert[i],
+        }
+
+    # ---------- 持久化 ----------
+    def dirty_rows(self) -> list[tuple]:
+        """取出自上次呼叫後有變動的設備 (UPSERT_SQL 參數)"""
+        rows = [(self.ids[i], self.mean[i], self.var[i], self.samples[i], self.state[i],
+                 self.until[i], self.last_alert[i]) for i in self._dirty]
+        self._dirty.clear()
+        return rows
+
+    def load(self, db: sqlite3.Connection) -> int:
+        """從 SQLite 還原狀態；回傳設備數"""
+        count = 0
+        for device_id, mean, var, samples, state, until, last_alert in db.execute(
+                "SELECT device_id, mean, var, samples, state, until, last_alert FROM device_state"):
+            i = self.slot(device_id)
+            self.mean[i], self.var[i], self.samples[i] = mean, var, samples
+            self.state[i], self.until[i], self.last_alert[i] = state, until, last_alert
+            self._recompute(i)
+            count += 1
+        return count
@@ -0,0 +1,620 @@
+"""
+Wi-Care ESP32 設備模擬器 (免硬體測試)
+
+單一 asyncio 程序模擬數千台 ESP32，提供與範例韌體 (esp32_examples) 相同的 HTTP 介面：
+  GET  /status        跌倒狀態 + 加速度計 / 陀螺儀 / movement_score (可選 raw_csi)
+  GET  /health        伺服器狀態
+  POST /trigger-fall  立即進入跌倒 (撞擊波形)
+  POST /clear-fall    清除跌倒
+  GET  /stream        SSE 推送串流 (?hz=20)，每次取樣送出一筆 /status 讀數
+以及模擬器專用的控制介面：
+  POST /scenario      {"kind": "forward", "delay": 2, "hold": 10} 播放完整跌倒波形
+  POST /offline       {"seconds": 30} 模擬斷線 (期間直接中斷連線)
+
+兩種佈署方式：
+  - 每台設備一個埠 (--base-port)：與實體設備相同，/status 路徑不變
+  - 共用單一埠 (--port)：以 /d/<device_id>/status 區分設備，適合數千台 (不受檔案描述元上限影響)
+
+每台設備有獨立的延遲 / 抖動 / 故障設定檔 (Profile)，可用 --profile wifi 或 lan:0.8,flaky:0.2 混合。
+--udp 讓所有設備以 UDP 二進位訊框 (ingest.encode_frame) 推送到橋接器；--no-stream 模擬不支援 /stream 的舊韌體。
+--write-devices 輸出 bridge.py --devices 可直接使用的設備清單。
+
+使用範例：
+  python emulator.py --devices 1000 --port 18080 --write-devices fleet.json
+  python bridge.py --devices fleet.json --quiet
+  python emulator.py --devices 50 --base-port 18100 --profile lan:0.9,flaky:0.1 --fall-rate 6
+  python bench.py fleet --devices 1000 --duration 30     # HTTP 擷取基準測試
+  python emulator.py --devices 1 --port 18080 --udp 127.0.0.1:9109 --udp-hz 50
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import math
+import random
+import resource
+import threading
+import time
+from dataclasses import dataclass, field
+from urllib.parse import parse_qs
+
+from ingest import encode_frame
+
+HANG_SECONDS = 30.0            # 「不回應」故障持續的時間 (超過讀取端逾時即可)
+DEFAULT_THRESHOLD = 70.0
+DEFAULT_STREAM_HZ = 20.0       # /stream 預設取樣率 (韌體 loop 約 50 ms 一次)
+SHARED_PREFIX = "/d/"
+
+
+# ============================
+# 故障設定檔
+# ============================
+@dataclass(frozen=True)
+class Profile:
+    """單一設備的網路行為"""
+    latency: float = 0.005       # 平均回應延遲 (秒)
+    jitter: float = 0.002        # 延遲標準差 (秒)
+    error_rate: float = 0.0      # 回應 500 的機率
+    hang_rate: float = 0.0       # 不回應 (讀取端逾時) 的機率
+    reset_rate: float = 0.0      # 直接中斷連線的機率
+    keep_alive: bool = True      # False：每次回應後關閉連線 (如 ESP32 WebServer)
+
+
+PROFILES = {
+    "ideal": Profile(latency=0.0, jitter=0.0),
+    "lan": Profile(),
+    "esp32": Profile(latency=0.015, jitter=0.01, keep_alive=False),
+    "wifi": Profile(latency=0.03, jitter=0.02, error_rate=0.005, hang_rate=0.002, reset_rate=0.002),
+    "flaky": Profile(latency=0.08, jitter=0.06, error_rate=0.05, hang_rate=0.02, reset_rate=0.02),
+}
+
+
+def parse_profile_mix(spec: str) -> list[tuple[Profile, float]]:
+    """'lan:0.8,flaky:0.2' → [(Profile, 權重)]；單一名稱權重為 1"""
+    mix = []
+    for part in spec.split(","):
+        name, _, weight = part.strip().partition(":")
+        if name not in PROFILES:
+            raise ValueError(f"未知的設定檔: {name} (可用: {', '.join(PROFILES)})")
+        mix.append((PROFILES[name], float(weight or 1)))
+    return mix
+
+
+# ============================
+# 波形
+# ============================
+# 跌倒劇本各階段 (相對開始時間，秒)：失衡 → 自由落體 → 撞擊 → 躺地
+PRE_FALL, FREE_FALL, IMPACT = 0.3, 0.4, 0.15
+IMPACT_AT = PRE_FALL + FREE_FALL
+SCENARIOS = {
+    # kind: (躺地時重力所在軸, 撞擊方向, 是否真的跌倒)
+    "forward": ((1.0, 0.0, 0.0), (1.0, 0.2, -0.4), True),
+    "backward": ((-1.0, 0.0, 0.0), (-1.0, 0.1, -0.5), True),
+    "side": ((0.0, 1.0, 0.0), (0.2, 1.0, -0.3), True),
+    "near_fall": ((0.0, 0.0, 1.0), (0.4, 0.3, 0.2), False),   # 絆倒但站穩：不應觸發警報
+}
+
+
+@dataclass
+class Scenario:
+    kind: str
+    impact: float                 # 撞擊時間點 (monotonic)；劇本從 impact - IMPACT_AT 開始，可在未來
+    hold: float | None = None     # 撞擊後多久自動清除 (None = 等 /clear-fall)
+
+
+class EmulatedDevice:
+    """
+    單一虛擬 ESP32
+
+    波形是時間的函式 (而非逐次呼叫累積)，不論輪詢頻率為何都得到一致的讀數。
+    平常：重力在 Z 軸，加上步行 (約 2 Hz) 與雜訊；movement_score 與 read_simulation 同分布。
+    跌倒：失衡晃動 → 自由落體 (~0.3 G) → 撞擊 (2.5-4 G、分數 75-98) → 躺地 (重力換軸、幾乎靜止)。
+    """
+
+    def __init__(self, device_id: str, seed: int = 0, profile: Profile = PROFILES["lan"],
+                 threshold: float = DEFAULT_THRESHOLD, csi_subcarriers: int = 0):
+        self.device_id = device_id
+        self.profile = profile
+        self.threshold = threshold
+        self.csi_subcarriers = csi_subcarriers
+        self.rng = random.Random(f"{seed}:{device_id}")
+        self.booted = time.monotonic()
+        self.phase = self.rng.uniform(0, 2 * math.pi)
+        self.walking_period = self.rng.uniform(40, 120)    # 步行 / 休息交替週期 (秒)
+        self.scenario: Scenario | None = None
+        self.offline_until = 0.0
+        self._csi_base = [20 + 8 * math.cos(2 * math.pi * 3 * k / max(1, csi_subcarriers) + self.phase)
+                          for k in range(csi_subcarriers)]
+
+    # ---------- 狀態 ----------
+    def falling(self, now: float) -> bool:
+        s = self.scenario
+        if s is None or not SCENARIOS[s.kind][2]:
+            return False
+        return now >= s.impact and (s.hold is None or now < s.impact + s.hold)
+
+    def _expire(self, now: float):
+        s = self.scenario
+        if s and s.hold is not None and now >= s.impact + s.hold:
+            self.scenario = None
+
+    def start_scenario(self, kind: str = "forward", delay: float = 0.0, hold: float | None = None,
+                       now: float | None = None):
+        if kind not in SCENARIOS:
+            raise ValueError(f"未知的情境: {kind} (可用: {', '.join(SCENARIOS)})")
+        now = time.monotonic() if now is None else now
+        self.scenario = Scenario(kind, now + delay + IMPACT_AT, hold)
+
+    def trigger_fall(self, now: float | None = None):
+        """與韌體相同：立即進入跌倒 (波形從撞擊開始)"""
+        now = time.monotonic() if now is None else now
+        self.scenario = Scenario("forward", now)
+
+    def clear_fall(self):
+        self.scenario = None
+
+    def go_offline(self, seconds: float, now: float | None = None):
+        self.offline_until = (time.monotonic() if now is None else now) + seconds
+
+    def offline(self, now: float) -> bool:
+        return now < self.offline_until
+
+    # ---------- 讀數 ----------
+    def _waveform(self, now: float) -> tuple[tuple[float, float, float], tuple[float, float, float], float]:
+        """回傳 (加速度 G, 角速度 dps, movement_score)"""
+        g = self.rng.gauss
+        s = self.scenario
+        elapsed = now - s.impact + IMPACT_AT if s else -1.0
+        if s and elapsed >= 0:
+            rest_axis, impact_dir, _ = SCENARIOS[s.kind]
+            if elapsed < PRE_FALL:
+                sway = math.sin(elapsed * 30)
+                accel = (0.3 * sway + g(0, 0.05), 0.2 * sway + g(0, 0.05), 1.0 + g(0, 0.1))
+                return accel, (g(0, 60), g(0, 60), g(0, 30)), 40 + 40 * elapsed + g(0, 3)
+            if elapsed < IMPACT_AT:
+                return (g(0, 0.05), g(0, 0.05), 0.3 + g(0, 0.05)), (g(0, 150), g(0, 150), g(0, 80)), 60 + g(0, 4)
+            if elapsed < IMPACT_AT + IMPACT:
+                if not SCENARIOS[s.kind][2]:
+                    accel = tuple(1.6 * d + g(0, 0.1) for d in impact_dir)
+                    return accel, (g(0, 120), g(0, 120), g(0, 60)), self.rng.uniform(50, 65)
+                peak = 2.5 + 1.5 * math.sin(math.pi * (elapsed - IMPACT_AT) / IMPACT) * self.rng.uniform(0.6, 1.0)
+                accel = tuple(peak * d + g(0, 0.2) for d in impact_dir)
+                return accel, (g(0, 250), g(0, 250), g(0, 120)), self.rng.uniform(75, 98)
+            if SCENARIOS[s.kind][2]:
+                accel = tuple(a + g(0, 0.01) for a in rest_axis)
+                return accel, (g(0, 1), g(0, 1), g(0, 1)), max(0.0, 8 + g(0, 3))
+            # 未跌倒：恢復正常活動
+
+        t = now - self.booted
+        walking = math.sin(2 * math.pi * t / self.walking_period + self.phase) > 0
+        step = math.sin(2 * math.pi * 2.0 * t) * (0.3 if walking else 0.02)
+        accel = (g(0, 0.02) + step * 0.5, g(0, 0.02), 1.0 + step + g(0, 0.02))
+        gyro = (g(0, 15 if walking else 2), g(0, 15 if walking else 2), g(0, 8 if walking else 1))
+        score = math.sin(t * 0.5 + self.phase) * 20 + 30 + g(0, 5)
+        return accel, gyro, score
+
+    def _csi(self, score: float) -> list[int]:
+        """ESP-IDF 格式的 int8 I/Q (imag, real 交錯)；動作越大振幅擾動越大"""
+        out = []
+        spread = 0.05 + score / 100
+        for base in self._csi_base:
+            amp = max(0.0, base * (1 + self.rng.gauss(0, spread)))
+            theta = self.rng.uniform(-math.pi, math.pi)
+            out.append(max(-128, min(127, round(amp * math.sin(theta)))))
+            out.append(max(-128, min(127, round(amp * math.cos(theta)))))
+        return out
+
+    def status(self, now: float | None = None) -> dict:
+        now = time.monotonic() if now is None else now
+        self._expire(now)
+        accel, gyro, score = self._waveform(now)
+        score = round(max(0.0, min(100.0, score)), 2)
+        falling = self.falling(now)
+        data = {
+            "status": "fall" if falling else "safe",
+            "falling": falling,
+            "timestamp": int((now - self.booted) * 1000),
+            "device_id": self.device_id,
+            "accelX": round(accel[0], 3), "accelY": round(accel[1], 3), "accelZ": round(accel[2], 3),
+            "magnitude": round(math.sqrt(sum(a * a for a in accel)), 3),
+            "gyroX": round(gyro[0], 1), "gyroY": round(gyro[1], 1), "gyroZ": round(gyro[2], 1),
+            "movement_score": score,
+            "motion_detected": falling,
+            "threshold": self.threshold,
+        }
+        if self.csi_subcarriers:
+            data["raw_csi"] = self._csi(score)
+        return data
+
+    def health(self, now: float | None = None) -> dict:
+        now = time.monotonic() if now is None else now
+        return {"status": "ok", "wifi_connected": True, "ip": "127.0.0.1",
+                "uptime_ms": int((now - self.booted) * 1000), "wifi_rssi": -55 + round(self.rng.gauss(0, 3))}
+
+
+# ============================
+# HTTP 伺服器
+# ============================
+@dataclass
+class FleetStats:
+    requests: int = 0
+    errors: int = 0          # 注入的 500
+    hangs: int = 0
+    resets: int = 0          # 注入的斷線 (含離線期間)
+    not_found: int = 0
+    connections: int = 0
+    streams: int = 0         # 開啟的 /stream 連線
+    events: int = 0          # SSE 送出的讀數
+    datagrams: int = 0       # UDP 送出的訊框
+    per_path: dict = field(default_factory=dict)
+
+
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 500: "Internal Server Error"}
+
+
+class Fleet:
+    """一群虛擬設備與其 HTTP 伺服器 (單一事件迴圈)"""
+
+    def __init__(self, devices: list[EmulatedDevice], host: str = "127.0.0.1"):
+        self.devices = {d.device_id: d for d in devices}
+        self.host = host
+        self.stats = FleetStats()
+        self.port: int | None = None              # 共用埠模式
+        self.ports: dict[str, int] = {}           # 每設備一埠模式
+        self._servers: list[asyncio.AbstractServer] = []
+        self._tasks: list[asyncio.Task] = []
+        self._writers: set[asyncio.StreamWriter] = set()
+        self._closing: asyncio.Event | None = None
+        self._rng = random.Random(0)
+        self.streaming = True                     # False：/stream 回 404 (舊韌體)
+        self.stream_hz = DEFAULT_STREAM_HZ
+
+    @classmethod
+    def build(cls, count: int, profiles: str = "lan", seed: int = 0, prefix: str = "EMU",
+              threshold: float = DEFAULT_THRESHOLD, csi_subcarriers: int = 0, host: str = "127.0.0.1") -> "Fleet":
+        mix = parse_profile_mix(profiles)
+        rng = random.Random(seed)
+        chosen = rng.choices([p for p, _ in mix], weights=[w for _, w in mix], k=count)
+        return cls([EmulatedDevice(f"{prefix}-{i:04d}", seed, chosen[i], threshold, csi_subcarriers)
+                    for i in range(count)], host)
+
+    # ---------- 啟停 ----------
+    async def start(self, port: int | None = None, base_port: int | None = None):
+        """port：共用埠 (0 = 自動分配)；base_port：每台設備一埠 (base_port + 序號，0 = 自動分配)"""
+        self._closing = asyncio.Event()
+        if base_port is None:
+            server = await asyncio.start_server(self._serve_shared, self.host, port or 0, backlog=1024)
+            self._servers.append(server)
+            self.port = server.sockets[0].getsockname()[1]
+            return
+        _raise_fd_limit(len(self.devices) * 2 + 256)
+        for i, device in enumerate(self.devices.values()):
+            server = await asyncio.start_server(
+                lambda r, w, d=device: self._serve(r, w, d), self.host, base_port + i if base_port else 0)
+            self._servers.append(server)
+            self.ports[device.device_id] = server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._closing.set()
+        for server in self._servers:
+            server.close()
+        # 已建立的 keep-alive 連線不會隨 server.close() 結束，逐一中斷後讓處理常式收尾
+        for writer in list(self._writers):
+            writer.transport.abort()
+        while self._writers:
+            await asyncio.sleep(0)
+        self._servers = []
+
+    def autopilot(self, fall_rate: float, hold: float = 10.0, near_fall_ratio: float = 0.2):
+        """背景隨機跌倒：每台設備每小時平均 fall_rate 次，部分為差點跌倒 (near_fall)"""
+        self._tasks.append(asyncio.create_task(self._autopilot(fall_rate, hold, near_fall_ratio)))
+
+    async def _autopilot(self, fall_rate: float, hold: float, near_fall_ratio: float):
+        p = fall_rate / 3600
+        while True:
+            await asyncio.sleep(1.0)
+            now = time.monotonic()
+            for device in self.devices.values():
+                if device.scenario is None and self._rng.random() < p:
+                    kind = "near_fall" if self._rng.random() < near_fall_ratio else \
+                        self._rng.choice(("forward", "backward", "side"))
+                    device.start_scenario(kind, hold=hold, now=now)
+
+    def push_udp(self, host: str, port: int, hz: float = DEFAULT_STREAM_HZ):
+        """所有設備每 1/hz 秒各送出一個 UDP 訊框到 host:port (離線中的設備不送)"""
+        self._tasks.append(asyncio.create_task(self._push_udp((host, port), hz)))
+
+    async def _push_udp(self, addr: tuple[str, int], hz: float):
+        loop = asyncio.get_running_loop()
+        transport, _ = await loop.create_datagram_endpoint(asyncio.DatagramProtocol, remote_addr=addr)
+        seq, next_at = 0, loop.time()
+        try:
+            while True:
+                now = time.monotonic()
+                seq += 1
+                for device in self.devices.values():
+                    if device.offline(now):
+                        continue
+                    st = device.status(now)
+                    transport.sendto(encode_frame(device.device_id, st["movement_score"], st["threshold"],
+                                                  st["motion_detected"], seq))
+                    self.stats.datagrams += 1
+                next_at += 1.0 / hz
+                await asyncio.sleep(max(0.0, next_at - loop.time()))
+        finally:
+            transport.close()
+
+    def device_list(self) -> list[dict]:
+        """bridge.py --devices 格式的設備清單"""
+        out = []
+        for device_id in self.devices:
+            if self.port is not None:
+                out.append({"device_id": device_id, "esp32_ip": self.host, "esp32_port": self.port,
+                            "esp32_path": f"{SHARED_PREFIX}{device_id}/status",
+                            "stream_path": f"{SHARED_PREFIX}{device_id}/stream"})
+            else:
+                out.append({"device_id": device_id, "esp32_ip": self.host, "esp32_port": self.ports[device_id]})
+        return out
+
+    # ---------- 請求處理 ----------
+    async def _serve_shared(self, reader, writer):
+        await self._serve(reader, writer, None)
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                     device: EmulatedDevice | None):
+        self.stats.connections += 1
+        self._writers.add(writer)
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    return
+                lines = head.decode("latin-1").split("\r\n")
+                try:
+                    method, target, version = lines[0].split(" ", 2)
+                except ValueError:
+                    await self._respond(writer, 400, {"error": "bad request"}, False)
+                    return
+                headers = {}
+                for line in lines[1:]:
+                    if ":" in line:
+                        k, v = line.split(":", 1)
+                        headers[k.strip().lower()] = v.strip().lower()
+                body = b""
+                if "content-length" in headers:
+                    body = await reader.readexactly(int(headers["content-length"]))
+
+                path, _, query = target.partition("?")
+                dev = device
+                if dev is None:
+                    dev, path = self._route(path)
+                self.stats.requests += 1
+                self.stats.per_path[path] = self.stats.per_path.get(path, 0) + 1
+                keep_alive = (version == "HTTP/1.1" and headers.get("connection") != "close"
+                              and (dev is None or dev.profile.keep_alive))
+                if dev is None:
+                    self.stats.not_found += 1
+                    await self._respond(writer, 404, {"error": "not found"}, keep_alive)
+                    if not keep_alive:
+                        return
+                    continue
+
+                # 故障注入
+                now = time.monotonic()
+                profile, roll = dev.profile, dev.rng.random()
+                if dev.offline(now) or roll < profile.reset_rate:
+                    self.stats.resets += 1
+                    writer.transport.abort()
+                    return
+                roll -= profile.reset_rate
+                if roll < profile.hang_rate:
+                    self.stats.hangs += 1
+                    with contextlib.suppress(asyncio.TimeoutError):
+                        await asyncio.wait_for(self._closing.wait(), HANG_SECONDS)
+                    return
+                roll -= profile.hang_rate
+                if profile.latency or profile.jitter:
+                    await asyncio.sleep(max(0.0, dev.rng.gauss(profile.latency, profile.jitter)))
+                if roll < profile.error_rate:
+                    self.stats.errors += 1
+                    await self._respond(writer, 500, {"error": "internal error"}, keep_alive)
+                elif method == "GET" and path == "/stream" and self.streaming:
+                    try:
+                        hz = float(parse_qs(query).get("hz", [self.stream_hz])[0])
+                    except ValueError:
+                        hz = self.stream_hz
+                    await self._stream(writer, dev, max(0.1, hz))
+                    return
+                else:
+                    code, payload = self._handle(dev, method, path, body)
+                    await self._respond(writer, code, payload, keep_alive)
+                if not keep_alive:
+                    return
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    async def _stream(self, writer: asyncio.StreamWriter, dev: EmulatedDevice, hz: float):
+        """SSE：每 1/hz 秒送出一個 data 事件 (chunked)，直到對方斷線、設備離線或模擬器停止"""
+        self.stats.streams += 1
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\n"
+                     b"Transfer-Encoding: chunked\r\n\r\n")
+        loop = asyncio.get_running_loop()
+        next_at = loop.time()
+        while not self._closing.is_set():
+            now = time.monotonic()
+            if dev.offline(now):
+                self.stats.resets += 1
+                writer.transport.abort()
+                return
+            event = b"data: " + json.dumps(dev.status(now), separators=(",", ":")).encode() + b"\n\n"
+            writer.write(b"%x\r\n%s\r\n" % (len(event), event))
+            await writer.drain()
+            self.stats.events += 1
+            next_at += 1.0 / hz
+            await asyncio.sleep(max(0.0, next_at - loop.time()))
+
+    def _route(self, path: str) -> tuple[EmulatedDevice | None, str]:
+        """共用埠：/d/<device_id>/<endpoint>"""
+        if not path.startswith(SHARED_PREFIX):
+            return None, path
+        device_id, _, rest = path[len(SHARED_PREFIX):].partition("/")
+        return self.devices.get(device_id), "/" + rest
+
+    def _handle(self, dev: EmulatedDevice, method: str, path: str, body: bytes) -> tuple[int, dict]:
+        if method == "GET" and path == "/status":
+            return 200, dev.status()
+        if method == "GET" and path == "/health":
+            return 200, dev.health()
+        if method == "POST" and path == "/trigger-fall":
+            dev.trigger_fall()
+            return 200, {"message": "Fall detection triggered", "status": "fall", "falling": True}
+        if method == "POST" and path == "/clear-fall":
+            dev.clear_fall()
+            return 200, {"message": "Fall detection cleared", "status": "safe", "falling": False}
+        if method == "POST" and path in ("/scenario", "/offline"):
+            try:
+                req = json.loads(body or b"{}")
+                if path == "/offline":
+                    dev.go_offline(float(req.get("seconds", 10)))
+                    return 200, {"offline": True}
+                dev.start_scenario(req.get("kind", "forward"), float(req.get("delay", 0)),
+                                   None if req.get("hold") is None else float(req["hold"]))
+            except (ValueError, TypeError, AttributeError) as e:
+                return 400, {"error": str(e)}
+            return 200, {"scenario": dev.scenario.kind}
+        return 404, {"error": "not found"}
+
+    @staticmethod
+    async def _respond(writer: asyncio.StreamWriter, code: int, payload: dict, keep_alive: bool):
+        body = json.dumps(payload, separators=(",", ":")).encode()
+        writer.write(
+            f"HTTP/1.1 {code} {_REASONS.get(code, '')}\r\n"
+            f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("ascii") + body)
+        await writer.drain()
+
+
+def _raise_fd_limit(needed: int):
+    """每設備一埠時每台至少佔用一個檔案描述元，必要時提高軟上限"""
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft >= needed:
+        return
+    target = needed if hard == resource.RLIM_INFINITY else min(needed, hard)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+    if target < needed:
+        print(f"[EMU] ⚠️  檔案描述元上限 {target} 不足 {needed}，請改用共用埠 (--port)")
+
+
+@contextlib.contextmanager
+def running_fleet(fleet: Fleet, port: int | None = None, base_port: int | None = None,
+                  fall_rate: float = 0.0, hold: float = 10.0):
+    """在背景執行緒的事件迴圈中執行模擬器 (供同步程式 / 測試 / bench 使用)"""
+    loop = asyncio.new_event_loop()
+    ready = threading.Event()
+    failure: list[BaseException] = []
+
+    async def boot():
+        try:
+            await fleet.start(port, base_port)
+            if fall_rate:
+                fleet.autopilot(fall_rate, hold)
+        except BaseException as e:  # 交給呼叫端的執行緒拋出
+            failure.append(e)
+        ready.set()
+
+    thread = threading.Thread(target=loop.run_forever, name="esp32-emulator", daemon=True)
+    thread.start()
+    asyncio.run_coroutine_threadsafe(boot(), loop)
+    ready.wait()
+    try:
+        if failure:
+            raise failure[0]
+        yield fleet
+    finally:
+        asyncio.run_coroutine_threadsafe(fleet.stop(), loop).result(5)
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(5)
+        loop.close()
+
+
+# ============================
+# 命令列
+# ============================
+async def _run(args):
+    fleet = Fleet.build(args.devices, args.profile, args.seed, args.prefix, args.threshold, args.csi, args.host)
+    fleet.streaming, fleet.stream_hz = not args.no_stream, args.stream_hz
+    await fleet.start(args.port if args.base_port is None else None, args.base_port)
+    if args.fall_rate:
+        fleet.autopilot(args.fall_rate, args.hold)
+    if args.udp:
+        host, _, port = args.udp.rpartition(":")
+        fleet.push_udp(host or "127.0.0.1", int(port), args.udp_hz)
+    if args.write_devices:
+        with open(args.write_devices, "w", encoding="utf-8") as f:
+            json.dump(fleet.device_list(), f, indent=1)
+
+    where = (f"{args.host}:{fleet.port} ({SHARED_PREFIX}<device_id>/status)" if fleet.port is not None
+             else f"{args.host}:{min(fleet.ports.values())}-{max(fleet.ports.values())}")
+    print(f"\n{'='*50}")
+    print(f"  Wi-Care ESP32 模擬器")
+    print(f"  設備數: {len(fleet.devices)} ({args.profile})")
+    print(f"  位址:   {where}")
+    if args.fall_rate:
+        print(f"  隨機跌倒: 每台每小時 {args.fall_rate} 次 (持續 {args.hold}s)")
+    print(f"  串流:   {'/stream ' + format(args.stream_hz, 'g') + ' Hz' if fleet.streaming else '停用 (舊韌體)'}")
+    if args.udp:
+        print(f"  UDP:    → {args.udp} ({args.udp_hz:g} Hz)")
+    if args.write_devices:
+        print(f"  設備清單: {args.write_devices}")
+    print(f"{'='*50}\n")
+
+    last = 0
+    try:
+        while True:
+            await asyncio.sleep(args.report)
+            st = fleet.stats
+            print(f"[EMU] 請求={st.requests} (+{(st.requests - last) / args.report:.0f}/s) 連線={st.connections} "
+                  f"500={st.errors} 不回應={st.hangs} 斷線={st.resets} 404={st.not_found} "
+                  f"串流={st.streams}/{st.events} UDP={st.datagrams}")
+            last = st.requests
+    finally:
+        await fleet.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Wi-Care ESP32 設備模擬器")
+    parser.add_argument("--devices", type=int, default=10, help="虛擬設備數量")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=18080, help="共用埠 (以 /d/<device_id>/ 區分設備)")
+    parser.add_argument("--base-port", type=int, default=None, help="每台設備一埠，從此埠號開始")
+    parser.add_argument("--profile", default="lan", help=f"故障設定檔或混合 ({', '.join(PROFILES)}；例 lan:0.8,flaky:0.2)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--prefix", default="EMU", help="設備 ID 前綴")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument("--csi", type=int, default=0, help="/status 附帶 raw_csi 的子載波數 (0 = 不附)")
+    parser.add_argument("--fall-rate", type=float, default=0.0, help="每台設備每小時隨機跌倒次數")
+    parser.add_argument("--hold", type=float, default=10.0, help="隨機跌倒持續秒數 (之後自動清除)")
+    parser.add_argument("--stream-hz", type=float, default=DEFAULT_STREAM_HZ, help="/stream 預設取樣率 (Hz)")
+    parser.add_argument("--no-stream", action="store_true", help="/stream 回 404 (模擬舊韌體)")
+    parser.add_argument("--udp", default=None, help="以 UDP 訊框推送到 HOST:PORT (橋接器 --stream udp)")
+    parser.add_argument("--udp-hz", type=float, default=DEFAULT_STREAM_HZ, help="UDP 推送頻率 (Hz)")
+    parser.add_argument("--write-devices", default=None, help="輸出 bridge.py --devices 設備清單 JSON")
+    parser.add_argument("--report", type=float, default=10.0, help="統計輸出間隔 (秒)")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(_run(args))
+    except KeyboardInterrupt:
+        print("\n[EMU] 已停止")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,695 @@
+"""
+Wi-Care 多設備非同步擷取引擎
+
+單一程序以 asyncio 同時輪詢數百台 ESP32：
+  - 每台設備獨立的輪詢間隔 / 抖動 (jitter) / 逾時
+  - 讀取器 (Reader) 介面可插拔，HTTP / Serial / 模擬皆可作為來源
+  - 以排程時間點推進 (而非 sleep(interval))，讀取耗時不會累積成漂移
+  - 設備之間互相隔離：格式錯誤的讀數計為失敗、on_sample 的例外只記錄，
+    設備迴圈本身異常時稍後重啟，不會拖垮其他設備的輪詢
+  - 自適應排程 (DeviceHealth)：連續失敗的設備指數退避並只做 /health 探測，
+    分數升高的設備加速輪詢，輪詢預算集中在最可能跌倒的設備
+  - 推送串流 (SSE 長連線 / UDP 二進位訊框)：讀數到達即處理，不必等下一次輪詢；
+    串流中斷或閒置時自動改用輪詢，稍後再重試串流
+
+使用範例：
+  engine = AsyncIngestionEngine(on_sample=bridge.process_sample)
+  engine.add_device(DeviceSpec("ESP32-001", HttpStatusReader("192.168.1.10", 8080)))
+  asyncio.run(engine.run())
+
+  # 推送串流 + 輪詢備援
+  engine.add_device(DeviceSpec("ESP32-002", HttpStatusReader("192.168.1.11", 8080),
+                               stream=SseStreamReader("192.168.1.11", 8080)))
+"""
+
+import asyncio
+import json
+import math
+import random
+import struct
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Callable
+
+from poll_policy import DeviceHealth, PollPolicy
+
+
+# ============================
+# 讀取器介面
+# ============================
+def valid_reading(data) -> bool:
+    """讀數必須是 dict；有 movement_score 時必須是有限的數值 (韌體錯誤可能送出 null / 字串 / 陣列)"""
+    if not isinstance(data, dict):
+        return False
+    if "movement_score" not in data:
+        return True     # 範例韌體只回報 falling / status；CSI 讀數由橋接器計算分數
+    score = data["movement_score"]
+    return isinstance(score, (int, float)) and not isinstance(score, bool) and math.isfinite(score)
+
+
+class Reader:
+    """讀取器基底：read() 回傳一筆感測數據 dict，失敗回傳 None"""
+
+    async def read(self) -> dict | None:
+        raise NotImplementedError
+
+    async def probe(self) -> bool:
+        """設備是否可用 (退避期間使用)；沒有較輕量的探測方式時直接讀取一次"""
+        return await self.read() is not None
+
+    async def close(self):
+        pass
+
+
+class CallableReader(Reader):
+    """
+    包裝既有的同步讀取函式 (read_http / read_serial / read_simulation)
+
+    blocking=True 時在執行緒池中呼叫，避免阻塞事件迴圈；
+    純計算型來源 (模擬) 可設 blocking=False 直接呼叫。
+    """
+
+    def __init__(self, fn: Callable[[], dict | None], blocking: bool = True):
+        self.fn = fn
+        self.blocking = blocking
+
+    async def read(self) -> dict | None:
+        if self.blocking:
+            return await asyncio.to_thread(self.fn)
+        return self.fn()
+
+
+class HttpStatusReader(Reader):
+    """
+    原生 asyncio HTTP/1.1 GET 讀取器 (ESP32 /status)
+
+    不依賴執行緒，數百台設備共用同一事件迴圈；
+    支援 keep-alive，若設備回應 Connection: close 則每次重新連線。
+    probe() 改打同一路徑前綴下的 /health (回應小、設備端不必取樣)。
+    """
+
+    def __init__(self, host: str, port: int = 8080, path: str = "/status"):
+        self.host = host
+        self.port = port
+        self.path = path
+        self.health_path = path.removesuffix("/status") + "/health"
+        self._reader: asyncio.StreamReader | None = None
+        self._writer: asyncio.StreamWriter | None = None
+        self._request = self._build_request(path)
+        self._probe_request = self._build_request(self.health_path)
+
+    def _build_request(self, path: str) -> bytes:
+        return (
+            f"GET {path} HTTP/1.1\r\n"
+            f"Host: {self.host}:{self.port}\r\n"
+            "Accept: application/json\r\n"
+            "Connection: keep-alive\r\n\r\n"
+        ).encode("ascii")
+
+    async def read(self) -> dict | None:
+        status, body = await self._get(self._request)
+        if status != 200:
+            return None
+        try:
+            data = json.loads(body)
+        except ValueError:
+            return None
+        return data if valid_reading(data) else None
+
+    async def probe(self) -> bool:
+        status, _ = await self._get(self._probe_request)
+        return status == 200
+
+    async def _get(self, request: bytes) -> tuple[int, bytes]:
+        # keep-alive 連線可能已被設備關閉，重新連線再試一次
+        for attempt in range(2):
+            reused = self._writer is not None
+            if not reused:
+                self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+            try:
+                self._writer.write(request)
+                await self._writer.drain()
+                status, body, keep_alive = await self._read_response()
+            except (ConnectionError, asyncio.IncompleteReadError, OSError):
+                await self.close()
+                if reused and attempt == 0:
+                    continue
+                raise
+            if not keep_alive:
+                await self.close()
+            return status, body
+        return 0, b""
+
+    async def _read_response(self) -> tuple[int, bytes, bool]:
+        head = await self._reader.readuntil(b"\r\n\r\n")
+        lines = head.decode("latin-1").split("\r\n")
+        status = int(lines[0].split(" ", 2)[1])
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                k, v = line.split(":", 1)
+                headers[k.strip().lower()] = v.strip().lower()
+
+        keep_alive = headers.get("connection") != "close"
+        if "content-length" in headers:
+            body = await self._reader.readexactly(int(headers["content-length"]))
+        elif headers.get("transfer-encoding") == "chunked":
+            chunks = []
+            while True:
+                size = int((await self._reader.readuntil(b"\r\n")).split(b";")[0], 16)
+                if size == 0:
+                    await self._reader.readuntil(b"\r\n")
+                    break
+                chunks.append(await self._reader.readexactly(size))
+                await self._reader.readexactly(2)
+            body = b"".join(chunks)
+        else:
+            body = await self._reader.read()
+            keep_alive = False
+        return status, body, keep_alive
+
+    async def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except (ConnectionError, OSError):
+                pass
+        self._reader = self._writer = None
+
+
+# ============================
+# 推送串流來源
+# ============================
+class StreamUnavailable(Exception):
+    """設備不支援串流 (舊韌體回 404 等)，引擎直接改用輪詢"""
+
+
+class StreamSource:
+    """
+    推送來源基底：samples() 為非同步產生器，設備每送出一筆讀數就產出一個 dict
+
+    產出 None 表示心跳 (連線仍在、只是沒有新讀數)；產生器結束或拋出例外表示串流中斷，
+    由引擎退回輪詢並在稍後重試。
+    """
+
+    def samples(self) -> AsyncIterator[dict | None]:
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+class SseStreamReader(StreamSource):
+    """
+    Server-Sent Events 讀取器 (ESP32 GET /stream)
+
+    單一長連線，設備每取樣一次送出一個 `data: {...}` 事件，
+    讀數到達即處理，偵測延遲只剩設備取樣週期 + 網路延遲 (不再受輪詢間隔限制)。
+    支援 chunked 與「連線關閉即結束」兩種回應本體；`:` 開頭的註解行視為心跳。
+    """
+
+    def __init__(self, host: str, port: int = 8080, path: str = "/stream"):
+        self.host = host
+        self.port = port
+        self.path = path
+        self._reader: asyncio.StreamReader | None = None
+        self._writer: asyncio.StreamWriter | None = None
+        self._request = (
+            f"GET {path} HTTP/1.1\r\n"
+            f"Host: {host}:{port}\r\n"
+            "Accept: text/event-stream\r\n"
+            "Cache-Control: no-cache\r\n\r\n"
+        ).encode("ascii")
+
+    async def samples(self) -> AsyncIterator[dict | None]:
+        self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+        self._writer.write(self._request)
+        await self._writer.drain()
+        head = await self._reader.readuntil(b"\r\n\r\n")
+        lines = head.decode("latin-1").split("\r\n")
+        status = int(lines[0].split(" ", 2)[1])
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                k, v = line.split(":", 1)
+                headers[k.strip().lower()] = v.strip().lower()
+        if status != 200 or not headers.get("content-type", "").startswith("text/event-stream"):
+            raise StreamUnavailable(f"{self.path} 回應 {status} {headers.get('content-type', '')}")
+
+        pending, data = b"", []
+        async for block in self._body(headers.get("transfer-encoding") == "chunked"):
+            *complete, pending = (pending + block).split(b"\n")
+            for line in complete:
+                line = line.rstrip(b"\r")
+                if not line:                       # 空行：事件結束
+                    if data:
+                        try:
+                            yield json.loads(b"\n".join(data))
+                        except ValueError:
+                            pass
+                        data = []
+                elif line.startswith(b":"):
+                    yield None
+                elif line.startswith(b"data:"):
+                    data.append(line[6:] if line.startswith(b"data: ") else line[5:])
+                # event: / id: / retry: 欄位不使用
+
+    async def _body(self, chunked: bool) -> AsyncIterator[bytes]:
+        if not chunked:
+            while block := await self._reader.read(4096):
+                yield block
+            return
+        while True:
+            size = int((await self._reader.readuntil(b"\r\n")).split(b";")[0], 16)
+            if size == 0:
+                return
+            yield await self._reader.readexactly(size)
+            await self._reader.readexactly(2)
+
+    async def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except (ConnectionError, OSError):
+                pass
+        self._reader = self._writer = None
+
+
+# ---------- UDP 二進位訊框 ----------
+# 小端序：magic "WC"、版本、旗標 (bit0 = motion_detected)、序號 u32、movement_score f32、
+# threshold f32 (NaN = 未提供)，其後為 UTF-8 設備 ID；一筆讀數約 20 bytes (JSON 約 300 bytes)
+FRAME_MAGIC = b"WC"
+FRAME_VERSION = 1
+FRAME_HEADER = struct.Struct("<2sBBIff")
+FLAG_MOTION = 0x01
+
+# CSI 批次訊框 (版本 2)：同一個 magic，標頭後為設備 ID 與 frames × n_sub × 2 個 int8 I/Q (ESP-IDF 格式)；
+# 序號為第一個訊框的序號。1 kHz CSI 建議每包 10 個訊框 (64 子載波約 1.3 KB，不超過 MTU)
+CSI_VERSION = 2
+CSI_HEADER = struct.Struct("<2sBBIHHB")   # magic, 版本, 旗標, 序號 u32, 子載波數 u16, 訊框數 u16, ID 長度 u8
+
+
+def encode_frame(device_id: str, score: float, threshold: float | None = None, motion: bool = False,
+                 seq: int = 0) -> bytes:
+    return FRAME_HEADER.pack(FRAME_MAGIC, FRAME_VERSION, FLAG_MOTION if motion else 0, seq & 0xFFFFFFFF,
+                             score, math.nan if threshold is None else threshold) + device_id.encode()
+
+
+def encode_csi_frame(device_id: str, iq: bytes, n_sub: int, seq: int = 0) -> bytes:
+    """iq 為 frames × n_sub × 2 個 int8 (imag, real 交錯)"""
+    if len(iq) % (2 * n_sub):
+        raise ValueError("I/Q 長度不是子載波數的整數倍")
+    name = device_id.encode()
+    return CSI_HEADER.pack(FRAME_MAGIC, CSI_VERSION, 0, seq & 0xFFFFFFFF, n_sub, len(iq) // (2 * n_sub),
+                           len(name)) + name + iq
+
+
+def decode_frame(frame: bytes) -> tuple[str, int | None, dict]:
+    """
+    解析一個資料包，回傳 (設備 ID, 序號, 讀數)
+
+    CSI 批次訊框的讀數為 {"csi_iq": bytes, "n_sub": ..., "csi_frames": ...}，由 csi_dsp 計算分數。
+    也接受 JSON 資料包 ({"device_id": ..., "movement_score": ..., "seq": ...})，
+    方便韌體先用 JSON 驗證再換成二進位。格式錯誤拋出 ValueError。
+    """
+    if frame[:2] == FRAME_MAGIC and frame[2:3] == bytes([CSI_VERSION]):
+        if len(frame) < CSI_HEADER.size:
+            raise ValueError("訊框過短")
+        _, _, _, seq, n_sub, frames, id_len = CSI_HEADER.unpack_from(frame)
+        iq = frame[CSI_HEADER.size + id_len:]
+        if not id_len or len(iq) != frames * n_sub * 2:
+            raise ValueError("CSI 訊框長度不符")
+        device_id = frame[CSI_HEADER.size:CSI_HEADER.size + id_len].decode()
+        return device_id, seq, {"csi_iq": iq, "n_sub": n_sub, "csi_frames": frames}
+    if frame[:2] == FRAME_MAGIC:
+        if len(frame) <= FRAME_HEADER.size:
+            raise ValueError("訊框過短")
+        _, version, flags, seq, score, threshold = FRAME_HEADER.unpack_from(frame)
+        if version != FRAME_VERSION:
+            raise ValueError(f"不支援的訊框版本: {version}")
+        data = {"movement_score": round(score, 3), "motion_detected": bool(flags & FLAG_MOTION)}
+        if not math.isnan(threshold):
+            data["threshold"] = round(threshold, 3)
+        return frame[FRAME_HEADER.size:].decode(), seq, data
+    data = json.loads(frame)
+    if not isinstance(data, dict) or "device_id" not in data:
+        raise ValueError("JSON 資料包缺少 device_id")
+    seq = data.pop("seq", None)
+    return data.pop("device_id"), seq, data
+
+
+@dataclass
+class UdpStats:
+    frames: int = 0
+    bad: int = 0           # 無法解析
+    unknown: int = 0       # 未訂閱的設備
+    stale: int = 0         # 序號倒退 (亂序 / 重複) 而丟棄
+    dropped: int = 0       # 佇列已滿丟棄最舊的讀數
+
+
+class UdpHub(asyncio.DatagramProtocol):
+    """
+    UDP 資料包接收器：所有設備推送到同一個埠，依設備 ID 分送到各自的佇列
+
+    每台設備以 subscribe() 取得一個 StreamSource；同設備序號倒退的資料包 (網路亂序 / 重送) 丟棄，
+    保持偵測視窗的時間順序。佇列滿時丟棄最舊的讀數 (只關心最新狀態)。
+    """
+
+    def __init__(self, host: str = "0.0.0.0", port: int = 9109, queue_size: int = 256):
+        self.host = host
+        self.port = port
+        self.queue_size = queue_size
+        self.stats = UdpStats()
+        self._queues: dict[str, asyncio.Queue] = {}
+        self._last_seq: dict[str, int] = {}
+        self._transport: asyncio.DatagramTransport | None = None
+        self._starting: asyncio.Lock | None = None
+
+    async def start(self):
+        if self._starting is None:
+            self._starting = asyncio.Lock()
+        async with self._starting:
+            if self._transport is None:
+                loop = asyncio.get_running_loop()
+                self._transport, _ = await loop.create_datagram_endpoint(lambda: self, (self.host, self.port))
+                self.port = self._transport.get_extra_info("sockname")[1]
+        return self
+
+    def close(self):
+        if self._transport is not None:
+            self._transport.close()
+            self._transport = None
+
+    def subscribe(self, device_id: str) -> "UdpStream":
+        return UdpStream(self, device_id)
+
+    def datagram_received(self, frame: bytes, addr):
+        self.stats.frames += 1
+        try:
+            device_id, seq, data = decode_frame(frame)
+        except (ValueError, UnicodeDecodeError, struct.error):
+            self.stats.bad += 1
+            return
+        queue = self._queues.get(device_id)
+        if queue is None:
+            self.stats.unknown += 1
+            return
+        if seq is not None:
+            last = self._last_seq.get(device_id)
+            # 序號為 u32 環繞計數：落後不到半圈視為舊資料包 (設備重開機會從小序號重來，差距超過半圈)
+            if last is not None and 0 <= (last - seq) & 0xFFFFFFFF < 0x80000000:
+                self.stats.stale += 1
+                return
+            self._last_seq[device_id] = seq
+        if queue.full():
+            queue.get_nowait()
+            self.stats.dropped += 1
+        queue.put_nowait(data)
+
+
+class UdpStream(StreamSource):
+    """UdpHub 上單一設備的串流；UDP 沒有連線，斷線由引擎的閒置逾時判斷"""
+
+    def __init__(self, hub: UdpHub, device_id: str):
+        self.hub = hub
+        self.device_id = device_id
+
+    async def samples(self) -> AsyncIterator[dict | None]:
+        await self.hub.start()
+        # 重新訂閱時丟掉輪詢期間累積的舊讀數
+        queue = self.hub._queues[self.device_id] = asyncio.Queue(self.hub.queue_size)
+        self.hub._last_seq.pop(self.device_id, None)
+        while True:
+            yield await queue.get()
+
+    async def close(self):
+        self.hub._queues.pop(self.device_id, None)
+
+
+# ============================
+# 排程引擎
+# ============================
+@dataclass
+class DeviceSpec:
+    """
+    單一設備的輪詢設定
+
+    stream 不為 None 時優先使用推送串流，reader 作為備援：串流無法建立、中斷或
+    超過 stream_idle 秒沒有任何資料 (含心跳) 時改用輪詢，stream_retry 秒後再嘗試串流。
+    """
+    device_id: str
+    reader: Reader
+    interval: float = 2.0
+    jitter: float = 0.1      # 間隔的隨機擾動比例 (0.1 = ±10%)
+    timeout: float = 3.0
+    stream: StreamSource | None = None
+    stream_idle: float = 5.0
+    stream_retry: float = 30.0
+
+
+@dataclass
+class EngineStats:
+    """引擎統計 (用於確認是否跟得上排程)"""
+    samples: int = 0
+    failures: int = 0
+    timeouts: int = 0
+    late_ticks: int = 0      # 排程時間點已過才輪到的次數
+    max_lag: float = 0.0     # 最大排程延遲 (秒)
+    per_device_failures: dict = field(default_factory=dict)
+    probes: int = 0          # 退避期間的健康探測次數
+    boosted_polls: int = 0   # 分數升高而加速的輪詢次數
+    streamed: int = 0        # 經推送串流收到的樣本 (包含在 samples 內)
+    stream_fallbacks: int = 0  # 串流失敗改用輪詢的次數
+    invalid: int = 0         # 格式錯誤而丟棄的讀數 (輪詢時計為失敗)
+    errors: int = 0          # on_sample 處理時拋出例外的讀數
+    per_device_errors: dict = field(default_factory=dict)
+    restarts: int = 0        # 設備迴圈異常後重新啟動的次數
+
+
+class AsyncIngestionEngine:
+    """多設備非同步擷取引擎：每台設備一個 task (推送串流或輪詢)，共用單一事件迴圈"""
+
+    def __init__(
+        self,
+        on_sample: Callable[[str, dict], None],
+        on_failure: Callable[[str, int], None] | None = None,
+        on_read: Callable[[float], None] | None = None,
+        on_fallback: Callable[[str, str], None] | None = None,
+        policy: PollPolicy | None = None,
+        elevated: Callable[[str, dict], bool] | None = None,
+    ):
+        self.on_sample = on_sample
+        self.on_failure = on_failure
+        self.on_read = on_read  # on_read(seconds)：每次讀取 (含失敗) 的耗時
+        self.on_fallback = on_fallback  # on_fallback(device_id, 原因)：串流中斷改用輪詢
+        self.policy = policy or PollPolicy()
+        self.elevated = elevated  # elevated(device_id, data)：讀數是否值得加速輪詢 (None = 不加速)
+        self.devices: dict[str, DeviceSpec] = {}
+        self.health: dict[str, DeviceHealth] = {}
+        self.stats = EngineStats()
+        self.running = False
+        self._tasks: list[asyncio.Task] = []
+
+    def add_device(self, spec: DeviceSpec):
+        if spec.device_id in self.devices:
+            raise ValueError(f"重複的設備 ID: {spec.device_id}")
+        self.devices[spec.device_id] = spec
+        self.health[spec.device_id] = DeviceHealth(spec.interval, spec.jitter, self.policy)
+
+    @property
+    def backing_off(self) -> int:
+        """目前處於退避 (只做探測) 的設備數"""
+        return sum(1 for h in self.health.values() if h.backing_off)
+
+    async def run(self, duration: float | None = None):
+        """啟動所有設備的輪詢；duration 為 None 時持續執行直到 stop()"""
+        self.running = True
+        self._tasks = [asyncio.create_task(self._device_task(spec)) for spec in self.devices.values()]
+        try:
+            if duration is None:
+                await asyncio.gather(*self._tasks, return_exceptions=True)
+            else:
+                await asyncio.sleep(duration)
+        finally:
+            await self.stop()
+
+    async def stop(self):
+        self.running = False
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        for spec in self.devices.values():
+            await spec.reader.close()
+            if spec.stream:
+                await spec.stream.close()
+
+    async def _device_task(self, spec: DeviceSpec):
+        """單一設備的 task：迴圈異常時記錄並稍後重啟，不影響其他設備"""
+        while self.running:
+            try:
+                await self._device_loop(spec)
+                return
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.stats.restarts += 1
+                print(f"[INGEST] {spec.device_id} 擷取迴圈異常 ({type(e).__name__}: {e})，"
+                      f"{spec.interval:g}s 後重新啟動")
+                await spec.reader.close()
+                await asyncio.sleep(spec.interval)
+
+    async def _device_loop(self, spec: DeviceSpec):
+        if spec.stream is None:
+            await self._poll_loop(spec)
+            return
+        loop = asyncio.get_running_loop()
+        while self.running:
+            reason = await self._stream_loop(spec)
+            self.stats.stream_fallbacks += 1
+            if self.on_fallback:
+                self.on_fallback(spec.device_id, reason)
+            await self._poll_loop(spec, until=loop.time() + spec.stream_retry, stagger=False)
+
+    async def _stream_loop(self, spec: DeviceSpec) -> str:
+        """接收推送串流直到中斷；回傳中斷原因"""
+        samples = spec.stream.samples()
+        try:
+            while self.running:
+                try:
+                    data = await asyncio.wait_for(anext(samples), spec.stream_idle)
+                except StopAsyncIteration:
+                    return "串流結束"
+                except asyncio.TimeoutError:
+                    self.stats.timeouts += 1
+                    return f"{spec.stream_idle:g}s 沒有資料"
+                if data is None:
+                    continue
+                if not valid_reading(data):
+                    self.stats.invalid += 1
+                    continue
+                self._record_success(spec, self.health[spec.device_id])
+                self.stats.samples += 1
+                self.stats.streamed += 1
+                self._deliver(spec, data)
+            return "已停止"
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            return f"{type(e).__name__}: {e}"
+        finally:
+            await samples.aclose()
+            await spec.stream.close()
+
+    async def _poll_loop(self, spec: DeviceSpec, until: float | None = None, stagger: bool = True):
+        """依設備健康狀態輪詢；until 為事件迴圈時間，None 表示持續到停止"""
+        loop = asyncio.get_running_loop()
+        health = self.health[spec.device_id]
+        # 啟動時錯開各設備的第一次輪詢，避免同時湧入；串流中斷改輪詢時立即補讀
+        next_at = loop.time() + (random.uniform(0, spec.interval) if stagger else 0.0)
+
+        while self.running and (until is None or next_at < until):
+            delay = next_at - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            else:
+                lag = -delay
+                if lag > spec.interval * 0.5:
+                    self.stats.late_ticks += 1
+                self.stats.max_lag = max(self.stats.max_lag, lag)
+
+            # 退避中：先以輕量探測確認設備回來了，成功才讀取
+            if health.backing_off and not await self._probe(spec):
+                self._record_failure(spec, health)
+                next_at = loop.time() + health.next_delay(loop.time())
+                continue
+
+            data = None
+            read_started = loop.time()
+            try:
+                data = await asyncio.wait_for(spec.reader.read(), spec.timeout)
+            except asyncio.TimeoutError:
+                self.stats.timeouts += 1
+                await spec.reader.close()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                await spec.reader.close()
+            now = loop.time()
+            if self.on_read:
+                self.on_read(now - read_started)
+
+            if data is not None and not valid_reading(data):
+                self.stats.invalid += 1
+                data = None
+            if data is None:
+                self._record_failure(spec, health)
+            else:
+                self._record_success(spec, health)
+                self.stats.samples += 1
+                self._deliver(spec, data, now)
+
+            if health.boosted(now):
+                self.stats.boosted_polls += 1
+            next_at += health.next_delay(now)
+            # 落後超過一個週期：放棄補追，從現在重新排程
+            if next_at < now - spec.interval:
+                next_at = now
+
+    async def _probe(self, spec: DeviceSpec) -> bool:
+        self.stats.probes += 1
+        try:
+            return await asyncio.wait_for(spec.reader.probe(), self.policy.probe_timeout)
+        except asyncio.TimeoutError:
+            self.stats.timeouts += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            pass
+        await spec.reader.close()
+        return False
+
+    def _deliver(self, spec: DeviceSpec, data: dict, now: float | None = None):
+        """交給 on_sample；處理單筆讀數的例外只記錄，不中斷該設備 (或其他設備) 的擷取"""
+        try:
+            if now is not None and self.elevated and self.elevated(spec.device_id, data):
+                self.health[spec.device_id].mark_elevated(now)
+            self.on_sample(spec.device_id, data)
+        except Exception as e:
+            self.stats.errors += 1
+            count = self.stats.per_device_errors.get(spec.device_id, 0) + 1
+            self.stats.per_device_errors[spec.device_id] = count
+            if count & (count - 1) == 0:    # 第 1, 2, 4, 8... 次才輸出，避免洗版
+                print(f"[INGEST] {spec.device_id} 讀數處理失敗 (第 {count} 次): {type(e).__name__}: {e}")
+
+    def _record_failure(self, spec: DeviceSpec, health: DeviceHealth):
+        health.record_failure()
+        self.stats.failures += 1
+        self.stats.per_device_failures[spec.device_id] = health.failures
+        if self.on_failure:
+            self.on_failure(spec.device_id, health.failures)
+
+    def _record_success(self, spec: DeviceSpec, health: DeviceHealth):
+        if health.failures:
+            health.record_success()
+            self.stats.per_device_failures[spec.device_id] = 0
+
+
+def load_device_specs(path: str) -> list[dict]:
+    """
+    讀取設備清單 JSON 檔
+
+    格式：[{"device_id": "ESP32-001", "esp32_ip": "192.168.1.10", "esp32_port": 8080,
+            "mode": "http", "interval": 2.0, "jitter": 0.1, "timeout": 3.0}, ...]
+    esp32_path 可覆寫狀態路徑 (預設 /status；模擬器共用埠時為 /d/<device_id>/status)；
+    stream (off / sse / udp) 與 stream_path 可逐台覆寫推送串流設定。
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        devices = json.load(f)
+    if not isinstance(devices, list):
+        raise ValueError("設備清單必須為 JSON 陣列")
+    for d in devices:
+        if "device_id" not in d:
+            raise ValueError(f"設備缺少 device_id: {d}")
+    return devices
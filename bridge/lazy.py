@@ -0,0 +1,71 @@
+"""
+Wi-Care 可選依賴的延遲載入
+
+requests / pyserial / numpy / google.generativeai 在小型閘道器上載入要數百毫秒甚至數秒，
+而 sim 模式或未設定 API key 時根本用不到。
+
+  HAS_X = available("x")     # 只查找套件位置，不執行套件程式碼
+  x = lazy_import("x")       # 第一次存取屬性時才真正載入
+
+未安裝的套件 lazy_import() 回傳 None，呼叫端仍以 HAS_X 判斷。
+第一次載入以鎖串行化，多個執行緒同時觸發載入也安全。
+"""
+
+import importlib.util
+import sys
+import threading
+import types
+
+_LOAD_LOCK = threading.RLock()
+_loading: set[int] = set()
+
+
+class _LazyModule(types.ModuleType):
+    """
+    第一次存取屬性時才執行套件程式碼的模組
+
+    不使用 importlib.util.LazyLoader：它 (Python 3.12 之前) 在執行套件程式碼之前就把模組類別換回
+    ModuleType，同時存取的其他執行緒 (推送 / 警報 / 主迴圈) 會看到尚未初始化完成的模組
+    (AttributeError)。這裡在鎖內載入完成後才換回類別，其他執行緒等待載入結束。
+    """
+
+    def __getattribute__(self, attr):
+        with _LOAD_LOCK:
+            # 載入中的同一執行緒 (套件程式碼存取自身屬性) 直接讀取
+            if type(self) is _LazyModule and id(self) not in _loading:
+                _loading.add(id(self))
+                try:
+                    spec = types.ModuleType.__getattribute__(self, "__spec__")
+                    spec.loader.exec_module(self)
+                finally:
+                    _loading.discard(id(self))
+                self.__class__ = types.ModuleType
+        return types.ModuleType.__getattribute__(self, attr)
+
+
+def available(name: str) -> bool:
+    """套件是否已安裝 (不載入)"""
+    # find_spec 會讀取已登記模組的 __spec__，對延遲模組而言等於觸發載入
+    if sys.modules.get(name) is not None:
+        return True
+    try:
+        return importlib.util.find_spec(name) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+def lazy_import(name: str):
+    """回傳延遲載入的模組；已載入時直接回傳，未安裝回傳 None"""
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    try:
+        spec = importlib.util.find_spec(name)
+    except (ImportError, ValueError):
+        return None
+    if spec is None or not hasattr(spec.loader, "exec_module"):
+        return None
+    module = importlib.util.module_from_spec(spec)
+    module.__class__ = _LazyModule
+    sys.modules[name] = module
+    return module
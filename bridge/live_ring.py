@@ -0,0 +1,325 @@
+"""
+Wi-Care 即時讀數共享記憶體環
+
+本機其他程序 (Node 伺服器、儀表板) 原本只能等 HTTP 推送或輪詢 SQLite 才看得到即時讀數。
+橋接器改把每台設備的最新讀數與最近 capacity 筆寫進一個固定格式的 mmap 檔
+(預設放在 /dev/shm)，同主機的讀取端直接映射，次毫秒即可看到新數據，不經 SQLite 或 HTTP。
+
+  檔案格式 (little-endian，所有 8 位元組欄位皆 8 對齊)：
+    檔頭 64 B   magic "WCLV" | version u16 | record_size u16 | slots u32 | capacity u32
+                | devices u32 | writer_pid u32 | generation u64 | created f64 | 保留
+    設備槽 × slots，每槽 48 B 槽頭 + capacity 筆紀錄
+      槽頭      device_id 32s (UTF-8，補 0，超過 32 位元組截斷) | count u64 (累計寫入筆數) | 保留
+      紀錄 24 B  timestamp f64 | movement_score f64 | threshold f32 | flags u32 (bit0 = motion)
+
+  單一寫入端、不加鎖：
+    - 寫入端先寫紀錄 (位置 count % capacity)，再遞增槽的 count，最後遞增檔頭 generation
+    - 讀取端先讀 count，複製紀錄後再讀一次 count；若期間寫入端已繞回覆寫到讀過的位置，
+      丟棄該筆 (或整段重試)。8 位元組對齊的計數器寫入在 64 位元平台上不會被撕裂
+    - 新設備：先寫槽頭的 device_id，再遞增檔頭 devices
+    - generation 讓讀取端只需盯一個數字就知道「有任何新讀數」
+
+  writer = LiveRingWriter("/dev/shm/wicare-live.ring").open()
+  writer.publish("ESP32-001", time.time(), 42.5, False, 70.0)
+
+  reader = LiveRingReader("/dev/shm/wicare-live.ring")
+  reader.latest("ESP32-001")                  # Reading(seq, timestamp, score, motion, threshold)
+  for device_id, r in reader.follow(): ...    # 持續取得新讀數
+
+  python live_ring.py [路徑]                  # 在終端機即時顯示讀數
+"""
+
+import mmap
+import os
+import struct
+import sys
+import time
+from typing import NamedTuple
+
+MAGIC = b"WCLV"
+VERSION = 1
+HEADER = struct.Struct("<4sHHIIIIQd24x")
+SLOT_HEADER = struct.Struct("<32sQ8x")
+RECORD = struct.Struct("<ddfI")
+COUNT = struct.Struct("<Q")
+U32 = struct.Struct("<I")
+
+DEVICES_OFFSET = 16
+WRITER_PID_OFFSET = 20
+GENERATION_OFFSET = 24
+SLOT_COUNT_OFFSET = 32
+FLAG_MOTION = 1
+
+DEFAULT_PATH = "/dev/shm/wicare-live.ring" if os.path.isdir("/dev/shm") else os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "data", "wicare-live.ring")
+
+
+class Reading(NamedTuple):
+    seq: int            # 該設備的累計序號 (0 起算)
+    timestamp: float
+    score: float
+    motion: bool
+    threshold: float
+
+
+def _slot_size(capacity: int) -> int:
+    return SLOT_HEADER.size + capacity * RECORD.size
+
+
+def file_size(slots: int, capacity: int) -> int:
+    return HEADER.size + slots * _slot_size(capacity)
+
+
+class LiveRingWriter:
+    """單一寫入端 (橋接器取樣執行緒)"""
+
+    def __init__(self, path: str = DEFAULT_PATH, slots: int = 256, capacity: int = 1024):
+        self.path = path
+        self.slots = slots
+        self.capacity = capacity
+        self.slot_size = _slot_size(capacity)
+        self.dropped = 0  # 槽位用盡而未發布的讀數
+        self._index: dict[str, int] = {}
+        self._counts: list[int] = []
+        self._generation = 0
+        self._mm = None
+
+    def open(self):
+        """建立 (或沿用格式相同的) 環形檔；格式不同時以新檔原子替換"""
+        size = file_size(self.slots, self.capacity)
+        reuse = self._reusable(size)
+        if not reuse:
+            tmp = f"{self.path}.{os.getpid()}.tmp"
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(tmp, "wb") as f:
+                f.truncate(size)
+                f.write(HEADER.pack(MAGIC, VERSION, RECORD.size, self.slots, self.capacity,
+                                    0, os.getpid() & 0xFFFFFFFF, 0, time.time()))
+            os.replace(tmp, self.path)
+        with open(self.path, "r+b") as f:
+            self._mm = mmap.mmap(f.fileno(), size)
+        if reuse:
+            self._restore()
+        U32.pack_into(self._mm, WRITER_PID_OFFSET, os.getpid() & 0xFFFFFFFF)
+        return self
+
+    def _reusable(self, size: int) -> bool:
+        try:
+            with open(self.path, "rb") as f:
+                head = f.read(HEADER.size)
+                if os.fstat(f.fileno()).st_size != size or len(head) < HEADER.size:
+                    return False
+        except OSError:
+            return False
+        return HEADER.unpack(head)[:5] == (MAGIC, VERSION, RECORD.size, self.slots, self.capacity)
+
+    def _restore(self):
+        """重啟後沿用既有槽位與序號，讀取端不必重新對應"""
+        devices = U32.unpack_from(self._mm, DEVICES_OFFSET)[0]
+        for i in range(min(devices, self.slots)):
+            raw, count = SLOT_HEADER.unpack_from(self._mm, HEADER.size + i * self.slot_size)
+            self._index[raw.rstrip(b"\0").decode("utf-8", errors="replace")] = i
+            self._counts.append(count)
+        self._generation = COUNT.unpack_from(self._mm, GENERATION_OFFSET)[0]
+
+    def _slot(self, device_id: str) -> int | None:
+        i = self._index.get(device_id)
+        if i is not None:
+            return i
+        i = len(self._counts)
+        if i >= self.slots:
+            return None
+        base = HEADER.size + i * self.slot_size
+        SLOT_HEADER.pack_into(self._mm, base, device_id.encode("utf-8")[:32], 0)
+        self._index[device_id] = i
+        self._counts.append(0)
+        U32.pack_into(self._mm, DEVICES_OFFSET, i + 1)  # 槽頭寫好後才公開
+        return i
+
+    def publish(self, device_id: str, timestamp: float, score: float, motion: bool = False,
+                threshold: float | None = None):
+        i = self._slot(device_id)
+        if i is None:
+            self.dropped += 1
+            return
+        count = self._counts[i]
+        base = HEADER.size + i * self.slot_size
+        RECORD.pack_into(self._mm, base + SLOT_HEADER.size + (count % self.capacity) * RECORD.size,
+                         timestamp, score, threshold if threshold is not None else float("nan"),
+                         FLAG_MOTION if motion else 0)
+        self._counts[i] = count + 1
+        COUNT.pack_into(self._mm, base + SLOT_COUNT_OFFSET, count + 1)
+        self._generation += 1
+        COUNT.pack_into(self._mm, GENERATION_OFFSET, self._generation)
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+
+
+class LiveRingReader:
+    """讀取端 (任意數量的本機程序)；不會寫入映射"""
+
+    def __init__(self, path: str = DEFAULT_PATH):
+        self.path = path
+        self._mm = None
+        self._ino = None
+        self._index: dict[str, int] = {}
+        self._names: list[str] = []
+        self._map()
+
+    def _map(self):
+        with open(self.path, "rb") as f:
+            st = os.fstat(f.fileno())
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, record_size, slots, capacity = HEADER.unpack_from(mm, 0)[:5]
+        if magic != MAGIC or version != VERSION or record_size != RECORD.size:
+            mm.close()
+            raise ValueError(f"不是 Wi-Care 即時環形檔 (或版本不符): {self.path}")
+        if self._mm is not None:
+            self._mm.close()
+        self._mm = mm
+        self._ino = st.st_ino
+        self.slots = slots
+        self.capacity = capacity
+        self.slot_size = _slot_size(capacity)
+        self._index = {}
+        self._names = []
+
+    def reopen_if_replaced(self) -> bool:
+        """寫入端以不同格式重建檔案時重新映射；回傳是否已重新映射"""
+        try:
+            if os.stat(self.path).st_ino == self._ino:
+                return False
+        except OSError:
+            return False
+        self._map()
+        return True
+
+    @property
+    def generation(self) -> int:
+        return COUNT.unpack_from(self._mm, GENERATION_OFFSET)[0]
+
+    @property
+    def writer_pid(self) -> int:
+        return U32.unpack_from(self._mm, WRITER_PID_OFFSET)[0]
+
+    def devices(self) -> list[str]:
+        n = min(U32.unpack_from(self._mm, DEVICES_OFFSET)[0], self.slots)
+        for i in range(len(self._names), n):
+            raw = SLOT_HEADER.unpack_from(self._mm, HEADER.size + i * self.slot_size)[0]
+            name = raw.rstrip(b"\0").decode("utf-8", errors="replace")
+            self._names.append(name)
+            self._index.setdefault(name, i)
+        return list(self._names)
+
+    def _slot(self, device_id: str) -> int | None:
+        i = self._index.get(device_id)
+        if i is None:
+            self.devices()
+            i = self._index.get(device_id)
+        return i
+
+    def _count(self, base: int) -> int:
+        return COUNT.unpack_from(self._mm, base + SLOT_COUNT_OFFSET)[0]
+
+    def _records(self, base: int, start: int, end: int) -> list[Reading]:
+        out = []
+        for seq in range(start, end):
+            ts, score, threshold, flags = RECORD.unpack_from(
+                self._mm, base + SLOT_HEADER.size + (seq % self.capacity) * RECORD.size)
+            out.append(Reading(seq, ts, score, bool(flags & FLAG_MOTION), threshold))
+        return out
+
+    def read_since(self, device_id: str, seq: int = 0, limit: int | None = None) -> list[Reading]:
+        """
+        取得序號 >= seq 的讀數 (由舊到新)
+
+        讀取端落後超過 capacity 筆時，較舊的讀數已被覆寫，從仍有效的最舊一筆開始。
+        """
+        i = self._slot(device_id)
+        if i is None:
+            return []
+        base = HEADER.size + i * self.slot_size
+        end = self._count(base)
+        start = max(seq, end - self.capacity + 1, 0)
+        if limit is not None:
+            start = max(start, end - limit)
+        if start >= end:
+            return []
+        records = self._records(base, start, end)
+        # 複製期間被寫入端繞回覆寫的讀數丟棄 (序號 < after - capacity + 1)
+        after = self._count(base)
+        valid_from = after - self.capacity + 1
+        if valid_from > start:
+            records = records[valid_from - start:]
+        return records
+
+    def latest(self, device_id: str) -> Reading | None:
+        records = self.read_since(device_id, limit=1)
+        return records[-1] if records else None
+
+    def window(self, device_id: str, n: int | None = None) -> list[Reading]:
+        """最近 n 筆 (預設為整個環，capacity - 1 筆)"""
+        return self.read_since(device_id, limit=n or self.capacity - 1)
+
+    def wait(self, generation: int, timeout: float | None = None, poll: float = 0.0002) -> int:
+        """等到 generation 改變 (有任何新讀數) 或逾時；回傳目前的 generation"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            current = self.generation
+            if current != generation:
+                return current
+            if deadline is not None and time.monotonic() >= deadline:
+                return current
+            time.sleep(poll)
+
+    def follow(self, devices: list[str] | None = None, from_start: bool = False, poll: float = 0.0002):
+        """持續產生 (device_id, Reading)；預設只看開始之後的新讀數"""
+        cursors: dict[str, int] = {}
+        generation = -1
+        while True:
+            generation = self.wait(generation, timeout=1.0, poll=poll)
+            if self.reopen_if_replaced():
+                cursors.clear()
+            for device_id in devices or self.devices():
+                i = self._slot(device_id)
+                if i is None:
+                    continue
+                seq = cursors.get(device_id)
+                if seq is None:
+                    seq = 0 if from_start else self._count(HEADER.size + i * self.slot_size)
+                records = self.read_since(device_id, seq)
+                for r in records:
+                    yield device_id, r
+                cursors[device_id] = records[-1].seq + 1 if records else seq
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+
+
+def main(argv=None) -> int:
+    path = (argv if argv is not None else sys.argv[1:]) or [DEFAULT_PATH]
+    try:
+        reader = LiveRingReader(path[0])
+    except (OSError, ValueError) as e:
+        print(f"[LIVE] 無法開啟 {path[0]}: {e}")
+        return 1
+    print(f"[LIVE] {path[0]} (寫入端 pid {reader.writer_pid}，{reader.slots} 槽 × {reader.capacity} 筆)")
+    try:
+        for device_id, r in reader.follow():
+            lag = (time.time() - r.timestamp) * 1000
+            print(f"[{device_id}] #{r.seq} score={r.score:6.2f} motion={int(r.motion)} "
+                  f"threshold={r.threshold:.1f} 延遲={lag:.2f}ms")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        reader.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
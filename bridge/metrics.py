@@ -0,0 +1,286 @@
+"""
+Wi-Care Bridge 監控指標
+
+取代到處 print() 的狀態回報：
+  - Counter / Gauge / Histogram，可帶標籤 (例如 stage="db_commit")
+  - Gauge 可綁定回呼，於抓取時才讀取佇列深度等狀態，不佔用熱路徑
+  - MetricsServer：本機 HTTP /metrics 端點，輸出 Prometheus 文字格式
+  - SummaryReporter：安靜模式下定期印出一行摘要，取代每筆取樣的狀態列
+
+  registry = Registry()
+  stage = registry.histogram("wicare_stage_seconds", "各階段耗時", ["stage"])
+  stage.labels("read").observe(0.012)
+  MetricsServer(registry, port=9108).start()   # curl http://127.0.0.1:9108/metrics
+"""
+
+import bisect
+import math
+import socketserver
+import threading
+
+from lazy import lazy_import
+
+# http.server (含 email / mimetypes) 載入約 40 ms：建立 MetricsServer 時才載入
+http_server = lazy_import("http.server")
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _fmt(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children: dict[tuple, "_Metric"] = {}
+
+    def labels(self, *values):
+        """取得 (或建立) 指定標籤值的子指標"""
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} 需要標籤 {self.labelnames}")
+            with self._lock:
+                child = self._children.get(key)
+                if child is None:
+                    child = self._children[key] = self._new_child()
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _series(self):
+        """(標籤字串, 子指標)；沒有標籤時為自身"""
+        if not self.labelnames:
+            yield "", self
+            return
+        for key, child in sorted(self._children.items()):
+            yield ",".join(f'{n}="{_escape(v)}"' for n, v in zip(self.labelnames, key)), child
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for labels, child in self._series():
+            lines.extend(child._samples(labels))
+        return lines
+
+
+class Counter(_Metric):
+    """只增不減的計數"""
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: tuple = ()):
+        super().__init__(name, help, labelnames)
+        self.value = 0.0
+
+    def _new_child(self):
+        return Counter(self.name, self.help)
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+    def _samples(self, labels: str):
+        return [f"{self.name}{{{labels}}} {_fmt(self.value)}" if labels else f"{self.name} {_fmt(self.value)}"]
+
+
+class Gauge(_Metric):
+    """可增可減的數值；指定 fn 時於抓取時呼叫 fn() 取值"""
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labelnames: tuple = (), fn=None):
+        super().__init__(name, help, labelnames)
+        self.value = 0.0
+        self.fn = fn
+
+    def _new_child(self):
+        return Gauge(self.name, self.help)
+
+    def set(self, value: float):
+        self.value = value
+
+    def set_function(self, fn):
+        self.fn = fn
+
+    def get(self) -> float:
+        if self.fn is not None:
+            try:
+                return float(self.fn())
+            except Exception:
+                return math.nan
+        return self.value
+
+    def _samples(self, labels: str):
+        v = self.get()
+        text = "NaN" if math.isnan(v) else _fmt(v)
+        return [f"{self.name}{{{labels}}} {text}" if labels else f"{self.name} {text}"]
+
+
+class Histogram(_Metric):
+    """延遲分布 (累積桶 + 總和 + 次數)"""
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: tuple = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def _new_child(self):
+        return Histogram(self.name, self.help, buckets=self.buckets)
+
+    def observe(self, value: float):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """以桶上界估計分位數 (摘要輸出用)"""
+        with self._lock:
+            counts, total = list(self.counts), self.count
+        if not total:
+            return 0.0
+        rank = q * total
+        running = 0
+        for bound, n in zip(self.buckets + (math.inf,), counts):
+            running += n
+            if running >= rank:
+                return bound if bound != math.inf else self.buckets[-1]
+        return self.buckets[-1]
+
+    def _samples(self, labels: str):
+        with self._lock:
+            counts, total, s = list(self.counts), self.count, self.sum
+        sep = "," if labels else ""
+        lines = []
+        running = 0
+        for bound, n in zip(self.buckets + (math.inf,), counts):
+            running += n
+            lines.append(f'{self.name}_bucket{{{labels}{sep}le="{_fmt(bound)}"}} {running}')
+        suffix = f"{{{labels}}}" if labels else ""
+        lines.append(f"{self.name}_sum{suffix} {repr(s)}")
+        lines.append(f"{self.name}_count{suffix} {total}")
+        return lines
+
+
+class Registry:
+    """指標登錄處 (同名重複註冊時回傳既有指標)"""
+
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name: str, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"指標 {name} 已註冊為 {metric.kind}")
+            return metric
+
+    def counter(self, name: str, help: str, labelnames: tuple = ()) -> Counter:
+        return self._register(Counter, name, help, labelnames)
+
+    def gauge(self, name: str, help: str, labelnames: tuple = (), fn=None) -> Gauge:
+        return self._register(Gauge, name, help, labelnames, fn=fn)
+
+    def histogram(self, name: str, help: str, labelnames: tuple = (), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram, name, help, labelnames, buckets=buckets)
+
+    def get(self, name: str) -> _Metric | None:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    """等同 ThreadingHTTPServer，但不在綁定時做反向 DNS (getfqdn 在無 DNS 的閘道器上會卡數秒)"""
+
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class MetricsServer:
+    """本機 HTTP /metrics 端點 (背景執行緒)"""
+
+    def __init__(self, registry: Registry, host: str = "127.0.0.1", port: int = 9108):
+        self.registry = registry
+
+        class Handler(http_server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/metrics", "/"):
+                    self.send_error(404)
+                    return
+                body = registry.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = _Server((host, port), Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, name="wicare-metrics", daemon=True)
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class SummaryReporter:
+    """定期呼叫 report() (安靜模式的摘要輸出)"""
+
+    def __init__(self, report, interval: float = 10.0):
+        self.report = report
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="wicare-summary", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join(2.0)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.report()
+            except Exception as e:
+                print(f"[METRICS] 摘要輸出失敗: {e}")
@@ -0,0 +1,67 @@
+"""
+Wi-Care 自適應輪詢排程 (每台設備的退避 / 加速)
+
+多設備非同步引擎 (ingest.AsyncIngestionEngine) 與單設備同步迴圈 (bridge.py run()) 共用；
+本模組不依賴 asyncio，單設備 sim / serial 模式啟動時不必載入整個擷取引擎。
+"""
+
+import random
+from dataclasses import dataclass
+
+
+@dataclass
+class PollPolicy:
+    """自適應輪詢參數 (所有設備共用)"""
+    backoff_after: int = 3        # 連續失敗幾次後改為退避 + 探測
+    backoff_max: float = 60.0     # 退避間隔上限 (秒)
+    probe_timeout: float = 1.0    # 退避期間 /health 探測逾時 (秒)
+    fast_factor: float = 0.25     # 分數升高時輪詢間隔的倍數
+    min_interval: float = 0.2     # 加速後的最短間隔 (秒)
+    boost_hold: float = 10.0      # 分數回落後維持加速的秒數
+
+
+class DeviceHealth:
+    """
+    單一設備的健康狀態，決定下一次輪詢的間隔
+
+    - 正常：interval ± jitter
+    - 分數升高 (mark_elevated)：interval × fast_factor，維持 boost_hold 秒，跌倒最可能發生的設備讀得最勤
+    - 連續失敗 backoff_after 次：指數退避 + 完整抖動 (full jitter)，
+      間隔在 [interval, min(backoff_max, interval × 2^k)] 均勻分布，避免一群設備同時恢復時一起湧入；
+      退避期間只做輕量探測 (probe)，成功後立即恢復正常讀取
+    """
+
+    def __init__(self, interval: float, jitter: float = 0.1, policy: PollPolicy | None = None,
+                 rng: random.Random | None = None):
+        self.interval = interval
+        self.jitter = jitter
+        self.policy = policy or PollPolicy()
+        self.rng = rng or random.Random()
+        self.failures = 0
+        self.boost_until = 0.0
+
+    @property
+    def backing_off(self) -> bool:
+        return self.failures >= self.policy.backoff_after
+
+    def record_success(self):
+        self.failures = 0
+
+    def record_failure(self):
+        self.failures += 1
+
+    def mark_elevated(self, now: float):
+        self.boost_until = now + self.policy.boost_hold
+
+    def boosted(self, now: float) -> bool:
+        return now < self.boost_until
+
+    def next_delay(self, now: float) -> float:
+        p = self.policy
+        if self.backing_off:
+            cap = min(p.backoff_max, self.interval * 2 ** (self.failures - p.backoff_after + 1))
+            return self.rng.uniform(self.interval, max(self.interval, cap))
+        base = self.interval
+        if self.boosted(now):
+            base = min(base, max(p.min_interval, base * p.fast_factor))   # 已比最短間隔快時不放慢
+        return base * (1 + self.rng.uniform(-self.jitter, self.jitter))
@@ -0,0 +1,367 @@
+"""
+Wi-Care 後端推送管線 (exactly-once)
+
+讀數只寫一次：批次寫入器把讀數寫進本機 sensor_data，推送執行緒再從 SQLite 依游標送出。
+SQLite (WAL) 本身就是預寫暫存區，程序當機或後端斷線都不會遺失尚未送出的讀數：
+  - 每筆讀數帶有每設備單調遞增的序號 seq (SequenceAllocator)，與讀數同一交易寫入
+  - delivery_cursor 記錄已被後端確認的最後一筆 sensor_data.id；後端回 2xx 後才前進
+  - 斷線恢復後從游標一次補送大批次 (預設 2000 筆、1 MB / 請求，低於後端 express.json 的 2 MB 上限)，
+    不是按原本的節奏重播
+  - 408 / 429 / 5xx 視為暫時失敗，游標不動、退避後重送；413 (請求過大) 對半拆開重送並縮小之後的請求；
+    其他 4xx 也對半拆開，直到隔離出單筆才略過該筆 (一筆壞資料不會連帶丟掉整批)
+  - 確認回應遺失時會重送，後端以 (device_id, seq) 的高水位去重 → 每筆恰好處理一次
+  - 持久 Session + keep-alive；後端無回應時以指數退避 + 抖動安排下一次嘗試
+  - 舊版後端 (沒有批次端點，回 404) 自動改用逐筆 /api/sensor-data/push
+
+seq 的起點是該設備第一次出現時的毫秒時間戳，之後逐筆 +1；
+即使本機資料庫被清空，新的序號仍大於後端記錄的高水位，不會被誤判為重送。
+"""
+
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+
+from lazy import available, lazy_import
+
+# requests 載入約需 100+ ms：在背景執行緒第一次送出時才載入，不拖慢啟動
+HAS_REQUESTS = available("requests")
+requests = lazy_import("requests")
+
+CURSOR_NAME = "backend"
+CREATE_SEQ_INDEX_SQL = ("CREATE UNIQUE INDEX IF NOT EXISTS idx_sensor_data_seq "
+                        "ON sensor_data(device_id, seq) WHERE seq IS NOT NULL")
+CREATE_CURSOR_SQL = """
+    CREATE TABLE IF NOT EXISTS delivery_cursor (
+        name TEXT PRIMARY KEY,
+        last_id INTEGER NOT NULL,
+        updated_at REAL NOT NULL
+    )
+"""
+JSON_HEADERS = {"Content-Type": "application/json"}
+PENDING_SQL = ("SELECT id, device_id, seq, movement_score, motion_detected, threshold, timestamp "
+               "FROM sensor_data WHERE id > ? AND seq IS NOT NULL ORDER BY id LIMIT ?")
+
+
+def _retryable(status: int) -> bool:
+    """後端暫時無法處理 (逾時 / 限流 / 伺服器錯誤)：稍後整批重送"""
+    return status in (408, 429) or status >= 500
+
+
+def init_schema(db: sqlite3.Connection):
+    """sensor_data.seq 欄位 (舊資料庫補上) + 去重索引 + 推送游標"""
+    columns = {row[1] for row in db.execute("PRAGMA table_info(sensor_data)")}
+    if "seq" not in columns:
+        db.execute("ALTER TABLE sensor_data ADD COLUMN seq INTEGER")
+    db.execute(CREATE_SEQ_INDEX_SQL)
+    db.execute(CREATE_CURSOR_SQL)
+    # 第一次啟用時從目前的最新一筆開始 (不補送啟用前的歷史資料)
+    db.execute("INSERT OR IGNORE INTO delivery_cursor (name, last_id, updated_at) "
+               "SELECT ?, COALESCE(MAX(id), 0), ? FROM sensor_data", (CURSOR_NAME, time.time()))
+
+
+class SequenceAllocator:
+    """
+    每設備單調遞增序號
+
+    設備在本程序第一次出現時，從 max(MAX(seq) (走 idx_sensor_data_seq), 目前毫秒時間戳) 接續；
+    之後只在記憶體中遞增。時鐘倒退時仍以資料庫中的序號為準。
+    """
+
+    def __init__(self, db_path: str, clock=time):
+        self.db_path = db_path
+        self.clock = clock
+        self._last: dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._db: sqlite3.Connection | None = None
+
+    def next(self, device_id: str) -> int:
+        with self._lock:
+            last = self._last.get(device_id)
+            if last is None:
+                last = self._recover(device_id)
+            self._last[device_id] = last + 1
+            return last + 1
+
+    def _recover(self, device_id: str) -> int:
+        if self._db is None:
+            self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+        row = self._db.execute("SELECT MAX(seq) FROM sensor_data WHERE device_id = ? AND seq IS NOT NULL",
+                               (device_id,)).fetchone()
+        floor = int(self.clock.time() * 1000)
+        return row[0] if row and row[0] is not None and row[0] >= floor else floor
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+
+@dataclass
+class PushStats:
+    sent: int = 0             # 已被後端接受的讀數
+    batches: int = 0
+    failures: int = 0         # 失敗的請求次數
+    rejected: int = 0         # 後端拒收 (4xx) 且已隔離到單筆而略過的讀數
+    splits: int = 0           # 413 / 4xx 時對半拆開的次數
+    duplicates: int = 0       # 後端回報已處理過 (重送) 的讀數
+    replayed: int = 0         # 斷線後補送的讀數
+    legacy_replayed: int = 0  # 舊版磁碟暫存 (push_spool) 中重送的讀數
+    last_latency: float = 0.0
+
+
+class PushClient:
+    """從 sensor_data 依游標批次推送到 Node.js 後端 (背景執行緒)"""
+
+    def __init__(self, backend_url: str, db_path: str, batch_size: int = 2000, max_body: int = 1_000_000,
+                 flush_interval: float = 0.5, timeout: float = 10.0,
+                 backoff_base: float = 1.0, backoff_max: float = 60.0, pool_size: int = 4,
+                 legacy_spool_dir: str | None = None, on_post=None):
+        self.backend_url = backend_url.rstrip("/")
+        self.db_path = db_path
+        self.on_post = on_post  # on_post(readings, seconds, ok)：每次 POST 後呼叫 (監控用)
+        self.batch_size = batch_size
+        self.max_body = max_body  # 每次請求的 JSON 大小上限 (bytes)；收到 413 時自動縮小
+        self.flush_interval = flush_interval
+        self.timeout = timeout
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.legacy_spool_dir = legacy_spool_dir
+        self.stats = PushStats()
+        self.pool_size = pool_size
+        self.session = None  # 於推送執行緒內建立 (requests 在此時才載入)
+        self.cursor = 0
+        self.head = 0        # 最近看到的最新 sensor_data.id (估計積壓量)
+        self._extras: dict[tuple[str, int], dict] = {}
+        self._extras_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="wicare-push", daemon=True)
+        self._bulk = True
+        self._failures = 0
+        self._next_attempt = 0.0
+        self._recovering = False      # 斷線後補送中 (送出的讀數計入 replayed)
+        self._backlog = False         # 上一批之後還有待送讀數 (不等 flush_interval)
+        self._drain_deadline = 0.0
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    @property
+    def backend_up(self) -> bool:
+        return self._failures == 0
+
+    @property
+    def queue_depth(self) -> int:
+        """尚未確認的讀數 (約略；以最近一次查詢為準)"""
+        return max(0, self.head - self.cursor)
+
+    @property
+    def consecutive_failures(self) -> int:
+        return self._failures
+
+    def notify(self):
+        """批次寫入器提交後呼叫：喚醒推送執行緒 (不必等 flush_interval)"""
+        self._wake.set()
+
+    def annotate(self, device_id: str, seq: int, extra: dict):
+        """附加不存於 sensor_data 的欄位 (如 ai_analysis)；僅記憶體，盡力而為"""
+        with self._extras_lock:
+            if len(self._extras) >= 10000:
+                self._extras.pop(next(iter(self._extras)))
+            self._extras[(device_id, seq)] = extra
+
+    def close(self, timeout: float = 10.0):
+        """送出已提交的讀數 (最多 timeout 秒)；剩下的留在資料庫，下次啟動接續"""
+        self._drain_deadline = time.monotonic() + timeout
+        self._stop.set()
+        self._wake.set()
+        if self._thread.is_alive():
+            self._thread.join(timeout + self.timeout)
+        if self.session is not None:
+            self.session.close()
+
+    # ---------- 背景執行緒 ----------
+    def _open_session(self):
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _run(self):
+        self._open_session()
+        db = sqlite3.connect(self.db_path)
+        db.execute("PRAGMA busy_timeout=5000")
+        try:
+            row = db.execute("SELECT last_id FROM delivery_cursor WHERE name = ?", (CURSOR_NAME,)).fetchone()
+            self.cursor = row[0] if row else 0
+            if self.legacy_spool_dir:
+                self._replay_legacy_spool()
+
+            while not self._stop.is_set():
+                if not self.backend_up and time.monotonic() < self._next_attempt:
+                    self._stop.wait(min(self.flush_interval, self._next_attempt - time.monotonic()))
+                    continue
+                self._wake.clear()
+                shipped = self._ship(db)
+                if shipped is None or not self._backlog:
+                    self._wake.wait(self.flush_interval)
+
+            # 結束前：後端可用時盡量送完已提交的讀數
+            while self.backend_up and time.monotonic() < self._drain_deadline:
+                if not self._ship(db):
+                    break
+        finally:
+            db.close()
+
+    def _ship(self, db: sqlite3.Connection) -> int | None:
+        """送出游標之後的一批；回傳送出筆數 (0 = 沒有待送)，失敗回傳 None"""
+        rows = db.execute(PENDING_SQL, (self.cursor, self.batch_size)).fetchall()
+        if not rows:
+            return 0
+        self.head = max(self.head, rows[-1][0])
+        readings = []
+        with self._extras_lock:
+            for _, device_id, seq, score, motion, threshold, ts in rows:
+                reading = {"device_id": device_id, "seq": seq, "movement_score": score,
+                           "motion_detected": bool(motion), "threshold": threshold, "timestamp": ts}
+                extra = self._extras.get((device_id, seq))
+                if extra:
+                    reading.update(extra)
+                readings.append(reading)
+        # 依序編碼，超過 max_body 的部分留給下一批 (ai_analysis 等附加欄位會讓單筆變大)
+        encoded, size = [], 0
+        for reading in readings:
+            part = json.dumps(reading, separators=(",", ":"))
+            size += len(part) + 1
+            if encoded and size > self.max_body:
+                break
+            encoded.append(part)
+        full = len(rows) == self.batch_size or len(encoded) < len(rows)
+        rows, readings = rows[:len(encoded)], readings[:len(encoded)]
+        if not self._post(readings, encoded):
+            self._recovering = True
+            return None
+
+        self.cursor = rows[-1][0]
+        with db:
+            db.execute("UPDATE delivery_cursor SET last_id = ?, updated_at = ? WHERE name = ?",
+                       (self.cursor, time.time(), CURSOR_NAME))
+        with self._extras_lock:
+            for r in readings:
+                self._extras.pop((r["device_id"], r["seq"]), None)
+        self._backlog = full
+        if self._recovering or full:
+            self.stats.replayed += len(rows)
+            self._recovering = full
+        return len(rows)
+
+    def _replay_legacy_spool(self):
+        """升級前 push_spool/*.jsonl 中尚未送出的讀數 (無序號)：送出一次後刪除"""
+        try:
+            names = sorted(n for n in os.listdir(self.legacy_spool_dir)
+                           if n.startswith("spool-") and n.endswith(".jsonl"))
+        except FileNotFoundError:
+            return
+        for name in names:
+            path = os.path.join(self.legacy_spool_dir, name)
+            with open(path, "r", encoding="utf-8") as f:
+                readings = []
+                for line in f:
+                    try:
+                        readings.append(json.loads(line))
+                    except ValueError:
+                        pass  # 寫入中斷造成的殘行
+            for i in range(0, len(readings), self.batch_size):
+                if not self._post(readings[i:i + self.batch_size]):
+                    return  # 後端不可用：下次啟動再試
+            os.remove(path)
+            self.stats.legacy_replayed += len(readings)
+            print(f"[HTTP] 已重送舊版暫存數據 {len(readings)} 筆")
+
+    def _post(self, batch: list[dict], encoded: list[str] | None = None) -> bool:
+        """送出一批讀數；回傳是否已被後端處理 (接受，或拒收的讀數已隔離到單筆並略過)"""
+        started = time.monotonic()
+        try:
+            if self._bulk:
+                ok = self._post_bulk(batch, encoded or [json.dumps(r, separators=(",", ":")) for r in batch])
+            else:
+                ok = self._post_each(batch)
+        except requests.RequestException:
+            ok = False
+        if not ok:
+            self._on_failure()
+            self._observe(len(batch), started, False)
+            return False
+
+        self.stats.last_latency = time.monotonic() - started
+        self._observe(len(batch), started, True)
+        if self._failures:
+            print(f"[HTTP] 後端已恢復 (先前連續失敗 {self._failures} 次)，從游標補送")
+        self._failures = 0
+        return True
+
+    def _post_bulk(self, batch: list[dict], encoded: list[str]) -> bool:
+        body = ('{"readings":[' + ",".join(encoded) + "]}").encode()
+        r = self.session.post(f"{self.backend_url}/api/sensor-data/push-batch", data=body,
+                              headers=JSON_HEADERS, timeout=self.timeout)
+        if r.status_code == 404:
+            print("[HTTP] 後端不支援批次端點，改用逐筆推送")
+            self._bulk = False
+            return self._post_each(batch)
+        if _retryable(r.status_code):
+            return False
+        if r.status_code < 300:
+            try:
+                duplicates = int(r.json().get("duplicates", 0))
+            except (ValueError, AttributeError):
+                duplicates = 0
+            self.stats.sent += len(batch) - duplicates
+            self.stats.duplicates += duplicates
+            self.stats.batches += 1
+            return True
+
+        # 413 / 其他 4xx：對半拆開重送，直到隔離出被拒收的單筆
+        if len(batch) == 1:
+            self.stats.rejected += 1
+            print(f"[HTTP] 後端拒收讀數 ({r.status_code})，略過 {batch[0].get('device_id')} "
+                  f"seq={batch[0].get('seq')}")
+            return True
+        if r.status_code == 413 and len(body) // 2 < self.max_body:
+            self.max_body = len(body) // 2
+            print(f"[HTTP] 後端回報請求過大，之後每次最多 {self.max_body} bytes")
+        self.stats.splits += 1
+        mid = len(batch) // 2
+        return (self._post_bulk(batch[:mid], encoded[:mid]) and
+                self._post_bulk(batch[mid:], encoded[mid:]))
+
+    def _post_each(self, batch: list[dict]) -> bool:
+        """舊版後端：逐筆 /api/sensor-data/push"""
+        for reading in batch:
+            r = self.session.post(f"{self.backend_url}/api/sensor-data/push",
+                                  json=reading, timeout=self.timeout)
+            if _retryable(r.status_code):
+                return False
+            if r.status_code >= 400:
+                self.stats.rejected += 1
+            else:
+                self.stats.sent += 1
+        self.stats.batches += 1
+        return True
+
+    def _observe(self, count: int, started: float, ok: bool):
+        if self.on_post:
+            self.on_post(count, time.monotonic() - started, ok)
+
+    def _on_failure(self):
+        self._failures += 1
+        self.stats.failures += 1
+        delay = min(self.backoff_max, self.backoff_base * 2 ** (self._failures - 1))
+        delay *= random.uniform(0.5, 1.0)
+        self._next_attempt = time.monotonic() + delay
+        if self._failures == 1:
+            print("[HTTP] 後端無回應，讀數保留在本機資料庫，恢復後補送")
@@ -0,0 +1,367 @@
+"""
+Wi-Care 離線批次重新評分
+
+以歷史 sensor_data 重播跌倒判定，對照已標記的 events (is_false_alarm) 計算 precision / recall，
+用來調整 fall_threshold 與偵測邏輯 (線上的 _detect 只能處理即時串流)。
+
+  - 每台設備以分段游標 (fetchmany) 依時間讀出 sensor_data，一次累積一個 UTC 日，記憶體固定
+  - 整日一次向量化：滑動視窗特徵只算一次，多個閾值共用 (peak_excess 與閾值為線性關係)
+  - 判定順序與線上相同：設備端旗標 → 本地偵測 (視窗不足時退回 score > 閾值)
+    模糊案例沒有 AI 可複核，預設與線上無 AI 時相同 (峰值 > 閾值 才警報)，可用 --ambiguous 改變
+  - 冷卻狀態機 (ARMED / TRIGGERED / HOLD，見 device_state.py) 只在候選警報上逐一推進
+  - 以 process pool 依設備分工，每個子程序以唯讀模式開啟資料庫
+    (讀取以 sensor_data 的 (device_id, timestamp) 索引為主；沒有索引時每台設備都要全表掃描)
+
+評分：警報與 type='fall_alert' 事件在 ±match_window 秒內配對
+  is_false_alarm = 0 的事件視為真實跌倒 (TP / FN)，未配對的警報為 FP；
+  另回報重現了幾筆已標記為誤報的事件。
+
+使用範例：
+  python rescore.py --thresholds 60,65,70,75,80
+  python rescore.py --db ../data/wicare.db --since 2025-01-01 --until 2026-01-01 --workers 8
+  python rescore.py --devices ESP32-001,ESP32-002 --json sweep.json
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+
+from detector import DetectorConfig, FallDetector, extract_features
+from lazy import available, lazy_import
+import schema
+
+HAS_NUMPY = available("numpy")
+np = lazy_import("numpy")
+
+DAY = 86400
+DEFAULT_DB = os.getenv("DB_PATH", str(Path(__file__).parent.parent / "data" / "wicare.db"))
+AMBIGUOUS_POLICIES = ("threshold", "fall", "safe")
+
+EPOCH_SQL = "CAST(strftime('%s', timestamp) AS INTEGER)"
+SAMPLES_SQL = f"""
+    SELECT {EPOCH_SQL}, movement_score, motion_detected
+    FROM sensor_data
+    WHERE device_id = ? AND timestamp >= ? AND timestamp < ?
+    ORDER BY timestamp, id
+"""
+EVENTS_SQL = f"""
+    SELECT {EPOCH_SQL}, is_false_alarm
+    FROM events
+    WHERE device_id = ? AND type = 'fall_alert' AND timestamp >= ? AND timestamp < ?
+    ORDER BY timestamp
+"""
+
+
+@dataclass
+class RescoreOptions:
+    thresholds: tuple = (70.0,)
+    cooldown: float = 30.0
+    ambiguous: str = "threshold"   # threshold / fall / safe
+    match_window: float = 30.0     # 警報與事件配對的容許秒數
+    since: str = "0000-01-01"
+    until: str = "9999-12-31"
+    chunk_rows: int = 50000        # 每次 fetchmany 的列數
+    detector: DetectorConfig = field(default_factory=DetectorConfig)
+
+
+@dataclass
+class Score:
+    threshold: float
+    alerts: int = 0
+    tp: int = 0
+    fp: int = 0
+    fn: int = 0
+    false_alarms_hit: int = 0      # 重現了已標記為誤報的事件
+
+    @property
+    def precision(self) -> float:
+        return self.tp / self.alerts if self.alerts else 0.0
+
+    @property
+    def recall(self) -> float:
+        return self.tp / (self.tp + self.fn) if self.tp + self.fn else 0.0
+
+    def add(self, other: "Score"):
+        self.alerts += other.alerts
+        self.tp += other.tp
+        self.fp += other.fp
+        self.fn += other.fn
+        self.false_alarms_hit += other.false_alarms_hit
+
+
+# ============================
+# 讀取
+# ============================
+def connect_readonly(db_path: str) -> sqlite3.Connection:
+    return sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+
+
+def list_devices(db_path: str) -> list[str]:
+    db = connect_readonly(db_path)
+    try:
+        return schema.device_ids(db)
+    finally:
+        db.close()
+
+
+def iter_days(db: sqlite3.Connection, device_id: str, since: str, until: str, chunk_rows: int = 50000):
+    """依 UTC 日產生 (ts, scores, motion) 陣列；記憶體上限約為一日的資料量加一個 chunk"""
+    cur = db.execute(SAMPLES_SQL, (device_id, since, until))
+    pending = []
+    while True:
+        rows = cur.fetchmany(chunk_rows)
+        if rows:
+            pending.append(np.array(rows, dtype=np.float64))
+        if not pending:
+            return
+        data = np.concatenate(pending) if len(pending) > 1 else pending[0]
+        days = data[:, 0] // DAY
+        bounds = np.flatnonzero(np.diff(days)) + 1
+        # 最後一日可能未讀完：留到下一個 chunk (讀完時全部送出)
+        edges = [0, *bounds.tolist()] + ([len(data)] if not rows else [])
+        for a, b in zip(edges, edges[1:]):
+            yield data[a:b, 0], data[a:b, 1], data[a:b, 2] != 0
+        if not rows:
+            return
+        pending = [data[edges[-1]:]]
+
+
+# ============================
+# 重新評分
+# ============================
+class _CooldownState:
+    """單一閾值的冷卻狀態機 (與 DeviceStateStore 相同的轉移)，只在候選警報上推進"""
+
+    def __init__(self, cooldown: float):
+        self.cooldown = cooldown
+        self.until = None   # TRIGGERED：冷卻結束時間
+        self.hold = False   # HOLD：冷卻已過但分數仍在閾值以上
+
+    def alerts(self, ts, candidates, elevated) -> list[int]:
+        """回傳本段實際發出警報的樣本索引"""
+        n = len(ts)
+        calm = np.flatnonzero(~elevated)  # 分數回落的樣本 (可重新武裝)
+        fired = []
+        pos = 0
+        while True:
+            if self.until is not None:
+                j = max(pos, int(np.searchsorted(ts, self.until, side="left")))
+                if j >= n:
+                    return fired
+                self.until = None
+                self.hold = True
+                pos = j
+            if self.hold:
+                k = int(np.searchsorted(calm, pos, side="left"))
+                if k >= len(calm):
+                    return fired
+                self.hold = False
+                pos = int(calm[k])
+            c = int(np.searchsorted(candidates, pos, side="left"))
+            if c >= len(candidates):
+                return fired
+            i = int(candidates[c])
+            fired.append(i)
+            self.until = ts[i] + self.cooldown
+            pos = i + 1
+
+
+class DeviceRescorer:
+    """單台設備的逐日重新評分 (跨日保留視窗尾端與冷卻狀態)"""
+
+    def __init__(self, opts: RescoreOptions):
+        self.opts = opts
+        self.detector = FallDetector(opts.detector)
+        self.thresholds = np.asarray(opts.thresholds, dtype=np.float64)
+        self.states = [_CooldownState(opts.cooldown) for _ in opts.thresholds]
+        self.alert_times: list[list[float]] = [[] for _ in opts.thresholds]
+        self.tail = np.empty(0)
+        self.samples = 0
+
+    def feed(self, ts, scores, motion):
+        cfg = self.detector.cfg
+        w = cfg.window
+        ctx = np.concatenate([self.tail, scores])
+        offset = len(self.tail)  # ctx 中本段第一筆的位置
+        n = len(scores)
+
+        # 以本段樣本結尾的完整視窗 (前 w - 1 筆樣本不足，線上退回閾值判定)
+        first = max(0, w - 1 - self.samples)
+        peaks = None
+        if first < n:
+            start = offset + first - (w - 1)
+            windows = np.lib.stride_tricks.sliding_window_view(ctx[start:], w)
+            feats = extract_features(windows, 0.0, cfg)
+            excess = feats[:, 5].copy()
+            peaks = windows[:, cfg.baseline:cfg.baseline + cfg.impact].max(axis=1)
+
+        for t, threshold in enumerate(self.thresholds):
+            candidate = motion.copy()
+            candidate[:first] |= scores[:first] > threshold
+            if peaks is not None:
+                feats[:, 5] = excess - threshold / 10.0
+                probs = self.detector.model.score(feats)
+                fall = probs >= cfg.fall_prob
+                ambiguous = (probs >= cfg.ambiguous_prob) & ~fall
+                if self.opts.ambiguous == "fall":
+                    fall |= ambiguous
+                elif self.opts.ambiguous == "threshold":
+                    fall |= ambiguous & (peaks > threshold)
+                candidate[first:] |= fall
+            elevated = scores >= threshold
+            fired = self.states[t].alerts(ts, np.flatnonzero(candidate), elevated)
+            self.alert_times[t].extend(ts[fired].tolist())
+
+        self.samples += n
+        self.tail = ctx[-(w - 1):] if w > 1 else np.empty(0)
+
+    def score(self, events: list[tuple[float, int]]) -> list[Score]:
+        window = self.opts.match_window
+        truth = [t for t, false_alarm in events if not false_alarm]
+        false_alarms = [t for t, false_alarm in events if false_alarm]
+        results = []
+        for threshold, times in zip(self.opts.thresholds, self.alert_times):
+            alerts = np.asarray(times)
+            tp = _match(alerts, truth, window)
+            results.append(Score(
+                threshold=float(threshold), alerts=len(times), tp=tp, fp=len(times) - tp,
+                fn=len(truth) - tp, false_alarms_hit=_match(alerts, false_alarms, window),
+            ))
+        return results
+
+
+def _match(alerts, events: list[float], window: float) -> int:
+    """事件與警報一對一配對 (依時間貪婪配對最早的可用警報)；回傳配對數"""
+    matched = 0
+    j = 0
+    for t in events:
+        j = max(j, int(np.searchsorted(alerts, t - window, side="left")))
+        if j < len(alerts) and alerts[j] <= t + window:
+            matched += 1
+            j += 1
+    return matched
+
+
+def rescore_device(db_path: str, device_id: str, opts: RescoreOptions) -> dict:
+    """process pool 工作單元：重新評分一台設備"""
+    started = time.monotonic()
+    db = connect_readonly(db_path)
+    try:
+        scorer = DeviceRescorer(opts)
+        days = 0
+        for ts, scores, motion in iter_days(db, device_id, opts.since, opts.until, opts.chunk_rows):
+            scorer.feed(ts, scores, motion)
+            days += 1
+        events = db.execute(EVENTS_SQL, (device_id, opts.since, opts.until)).fetchall()
+    finally:
+        db.close()
+    return {
+        "device_id": device_id,
+        "samples": scorer.samples,
+        "days": days,
+        "events": len(events),
+        "seconds": time.monotonic() - started,
+        "scores": scorer.score(events),
+    }
+
+
+def rescore(db_path: str, opts: RescoreOptions, devices: list[str] | None = None,
+            workers: int | None = None, progress=None) -> dict:
+    """對所有 (或指定) 設備重新評分並彙總；workers=1 時在本程序內執行"""
+    devices = devices or list_devices(db_path)
+    totals = [Score(threshold=float(t)) for t in opts.thresholds]
+    per_device = []
+
+    def collect(result):
+        per_device.append(result)
+        for total, s in zip(totals, result["scores"]):
+            total.add(s)
+        if progress:
+            progress(result)
+
+    if workers == 1 or len(devices) <= 1:
+        for device_id in devices:
+            collect(rescore_device(db_path, device_id, opts))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(rescore_device, db_path, d, opts) for d in devices]
+            for f in futures:
+                collect(f.result())
+
+    return {"devices": per_device, "totals": totals}
+
+
+# ============================
+# 命令列
+# ============================
+def _report_json(report: dict, opts: RescoreOptions) -> dict:
+    def score_dict(s: Score) -> dict:
+        return dict(asdict(s), precision=s.precision, recall=s.recall)
+    return {
+        "options": asdict(opts),
+        "totals": [score_dict(s) for s in report["totals"]],
+        "devices": [dict(d, scores=[score_dict(s) for s in d["scores"]]) for d in report["devices"]],
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Wi-Care 歷史數據離線重新評分")
+    parser.add_argument("--db", default=DEFAULT_DB, help="SQLite 資料庫路徑")
+    parser.add_argument("--thresholds", default="70", help="要比較的跌倒閾值，以逗號分隔")
+    parser.add_argument("--cooldown", type=float, default=float(os.getenv("FALL_COOLDOWN", "30")), help="警報冷卻 (秒)")
+    parser.add_argument("--ambiguous", choices=AMBIGUOUS_POLICIES, default="threshold",
+                        help="模糊案例：threshold=峰值超過閾值才警報 (同線上無 AI) / fall / safe")
+    parser.add_argument("--match-window", type=float, default=30.0, help="警報與事件配對容許秒數")
+    parser.add_argument("--since", default="0000-01-01", help="起始時間 (UTC，例: 2025-01-01)")
+    parser.add_argument("--until", default="9999-12-31", help="結束時間 (UTC，不含)")
+    parser.add_argument("--devices", default=None, help="只處理指定設備，以逗號分隔")
+    parser.add_argument("--workers", type=int, default=None, help="子程序數 (預設為 CPU 數)")
+    parser.add_argument("--chunk-rows", type=int, default=50000, help="每次讀取的列數")
+    parser.add_argument("--json", default=None, help="結果輸出 JSON 檔")
+    args = parser.parse_args(argv)
+
+    if not HAS_NUMPY:
+        print("[ERROR] 需要 numpy 套件: pip install numpy")
+        return 1
+    if not os.path.exists(args.db):
+        print(f"[ERROR] 找不到資料庫: {args.db}")
+        return 1
+
+    opts = RescoreOptions(
+        thresholds=tuple(float(x) for x in args.thresholds.split(",") if x.strip()),
+        cooldown=args.cooldown, ambiguous=args.ambiguous, match_window=args.match_window,
+        since=args.since, until=args.until, chunk_rows=args.chunk_rows,
+    )
+    devices = [d.strip() for d in args.devices.split(",") if d.strip()] if args.devices else None
+
+    def progress(r: dict):
+        print(f"[RESCORE] {r['device_id']}: {r['samples']} 筆 / {r['days']} 日 / "
+              f"{r['events']} 事件 ({r['seconds']:.1f}s)")
+
+    started = time.monotonic()
+    report = rescore(args.db, opts, devices, args.workers, progress)
+    elapsed = time.monotonic() - started
+    samples = sum(d["samples"] for d in report["devices"])
+
+    print(f"\n[RESCORE] {len(report['devices'])} 台設備 / {samples} 筆，耗時 {elapsed:.1f}s "
+          f"({samples / elapsed if elapsed else 0:,.0f} 筆/s)")
+    print(f"  {'閾值':>6} {'警報':>8} {'TP':>6} {'FP':>8} {'FN':>6} {'Precision':>10} {'Recall':>8} {'重現誤報':>8}")
+    for s in report["totals"]:
+        print(f"  {s.threshold:>6.1f} {s.alerts:>8} {s.tp:>6} {s.fp:>8} {s.fn:>6} "
+              f"{s.precision:>10.3f} {s.recall:>8.3f} {s.false_alarms_hit:>8}")
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(_report_json(report, opts), indent=2, ensure_ascii=False),
+                                   encoding="utf-8")
+        print(f"\n[RESCORE] 結果已寫入 {args.json}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
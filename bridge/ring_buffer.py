@@ -0,0 +1,113 @@
+"""
+Wi-Care 環形緩衝區 + 增量視窗統計
+
+取代 list.append() + pop(0) (O(n))：
+  - 以 array('d') / array('b') 固定容量環形儲存 movement_score 與動作旗標
+  - 對最近 window 筆維護滾動 sum / 平方和 / 動作次數 (O(1))
+  - 最大值以單調佇列 (monotonic deque) 維護，攤銷 O(1)
+  - 容量可放大到數萬筆 (長時間脈絡偵測)，每筆成本不變
+"""
+
+import math
+from array import array
+from collections import deque
+
+
+class RingBuffer:
+    """固定容量的 movement_score 環形緩衝區，附最近 window 筆的增量統計"""
+
+    # 每隔多少次 append 以 fsum 重新計算總和，抑制浮點累積誤差
+    RESYNC_EVERY = 4096
+
+    def __init__(self, capacity: int = 30, window: int = 20):
+        if capacity <= 0:
+            raise ValueError("capacity 必須大於 0")
+        self.capacity = capacity
+        self.window = min(window, capacity)
+        self._scores = array("d", bytes(8 * capacity))
+        self._motions = array("b", bytes(capacity))
+        self._count = 0          # 累計寫入筆數 (序號)
+        self._sum = 0.0
+        self._sumsq = 0.0
+        self._motion_count = 0
+        self._max_q: deque[tuple[int, float]] = deque()
+
+    def __len__(self) -> int:
+        return min(self._count, self.capacity)
+
+    def append(self, score: float, motion: bool = False):
+        seq = self._count
+        pos = seq % self.capacity
+        score = float(score)
+        motion = 1 if motion else 0
+
+        # 移出視窗的樣本 (序號 seq - window)
+        if seq >= self.window:
+            old = (seq - self.window) % self.capacity
+            old_score = self._scores[old]
+            self._sum -= old_score
+            self._sumsq -= old_score * old_score
+            self._motion_count -= self._motions[old]
+
+        self._scores[pos] = score
+        self._motions[pos] = motion
+        self._sum += score
+        self._sumsq += score * score
+        self._motion_count += motion
+        self._count = seq + 1
+
+        q = self._max_q
+        while q and q[-1][1] <= score:
+            q.pop()
+        q.append((seq, score))
+        while q[0][0] <= seq - self.window:
+            q.popleft()
+
+        if self._count % self.RESYNC_EVERY == 0:
+            self._resync()
+
+    def _resync(self):
+        window = self.last(self.window)
+        self._sum = math.fsum(window)
+        self._sumsq = math.fsum(x * x for x in window)
+
+    # ---------- 視窗統計 (最近 window 筆) ----------
+    @property
+    def window_len(self) -> int:
+        return min(self._count, self.window)
+
+    @property
+    def mean(self) -> float:
+        n = self.window_len
+        return self._sum / n if n else 0.0
+
+    @property
+    def variance(self) -> float:
+        n = self.window_len
+        if not n:
+            return 0.0
+        m = self._sum / n
+        return max(0.0, self._sumsq / n - m * m)
+
+    @property
+    def max(self) -> float:
+        return self._max_q[0][1] if self._max_q else 0.0
+
+    @property
+    def motion_count(self) -> int:
+        return self._motion_count
+
+    # ---------- 原始數據 ----------
+    def last(self, n: int) -> list[float]:
+        """最近 n 筆 movement_score (由舊到新)"""
+        n = min(n, len(self))
+        end = self._count % self.capacity
+        start = end - n
+        if start >= 0:
+            return self._scores[start:end].tolist()
+        return self._scores[start:].tolist() + self._scores[:end].tolist()
+
+    def latest(self) -> float | None:
+        if not self._count:
+            return None
+        return self._scores[(self._count - 1) % self.capacity]
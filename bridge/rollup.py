@@ -0,0 +1,244 @@
+"""
+Wi-Care 時間分桶彙總與資料保留
+
+sensor_data 每個取樣一列、永久增長；跨天的歷史查詢只能掃描原始資料。
+  - RollupAggregator：資料進來時在記憶體累積 1 分鐘桶，桶關閉時以 upsert 合併進
+    sensor_rollup_1m 與 sensor_rollup_1h (min / max / sum / count / motion_count)
+  - RetentionJob：背景執行緒依排程以小批次 DELETE 淘汰過期原始資料與彙總，
+    每批之間讓出寫入鎖，不會卡住批次寫入器；指定 csi_dir 時一併淘汰原始 CSI 分段檔與
+    csi_frames 索引 (csi_store.prune)
+  - query_history()：依查詢範圍自動選擇原始 / 1 分鐘 / 1 小時資料層
+
+桶時間為 UTC 'YYYY-MM-DD HH:MM:00'，與 sensor_data.timestamp (CURRENT_TIMESTAMP) 同格式。
+"""
+
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+
+import csi_store
+
+TIERS = {"1m": 60, "1h": 3600}
+
+CREATE_SQL = [
+    f"""
+    CREATE TABLE IF NOT EXISTS sensor_rollup_{tier} (
+        device_id TEXT NOT NULL,
+        bucket TEXT NOT NULL,
+        min_score REAL NOT NULL,
+        max_score REAL NOT NULL,
+        sum_score REAL NOT NULL,
+        count INTEGER NOT NULL,
+        motion_count INTEGER NOT NULL,
+        PRIMARY KEY (device_id, bucket)
+    ) WITHOUT ROWID
+    """
+    for tier in TIERS
+]
+
+UPSERT_SQL = {
+    tier: f"""
+    INSERT INTO sensor_rollup_{tier} (device_id, bucket, min_score, max_score, sum_score, count, motion_count)
+    VALUES (?,?,?,?,?,?,?)
+    ON CONFLICT(device_id, bucket) DO UPDATE SET
+        min_score = MIN(min_score, excluded.min_score),
+        max_score = MAX(max_score, excluded.max_score),
+        sum_score = sum_score + excluded.sum_score,
+        count = count + excluded.count,
+        motion_count = motion_count + excluded.motion_count
+    """
+    for tier in TIERS
+}
+
+
+def init_schema(db: sqlite3.Connection):
+    for sql in CREATE_SQL:
+        db.execute(sql)
+
+
+def bucket_label(epoch: float, seconds: int) -> str:
+    """UTC 桶起始時間字串"""
+    start = int(epoch // seconds * seconds)
+    return time.strftime("%Y-%m-%d %H:%M:00", time.gmtime(start))
+
+
+class _Acc:
+    __slots__ = ("start", "min", "max", "sum", "count", "motions")
+
+    def __init__(self, start: int, score: float, motion: int):
+        self.start = start
+        self.min = self.max = self.sum = score
+        self.count = 1
+        self.motions = motion
+
+
+class RollupAggregator:
+    """
+    增量維護 1 分鐘 / 1 小時彙總
+
+    write(sql, params) 通常是 BatchWriter.write，彙總 upsert 與原始資料一起群組提交。
+    每個 1 分鐘桶關閉時同時 upsert 進 1m 與 1h 表 (1h 由多個 1m 桶合併)。
+    """
+
+    def __init__(self, write, stale_after: float = 90.0):
+        self.write = write
+        self.stale_after = stale_after
+        self._open: dict[str, _Acc] = {}
+        self._last_sweep = time.monotonic()
+        self.buckets_flushed = 0
+
+    def add(self, device_id: str, epoch: float, score: float, motion: bool):
+        start = int(epoch // 60 * 60)
+        motion = 1 if motion else 0
+        acc = self._open.get(device_id)
+        if acc is None or acc.start != start:
+            if acc is not None:
+                self._flush(device_id, acc)
+            self._open[device_id] = _Acc(start, score, motion)
+        else:
+            if score < acc.min:
+                acc.min = score
+            if score > acc.max:
+                acc.max = score
+            acc.sum += score
+            acc.count += 1
+            acc.motions += motion
+
+        # 停止回報的設備：定期把仍開著的舊桶寫出
+        now = time.monotonic()
+        if now - self._last_sweep >= self.stale_after:
+            self._last_sweep = now
+            self.flush_stale(epoch)
+
+    def _flush(self, device_id: str, acc: _Acc):
+        row = (acc.min, acc.max, acc.sum, acc.count, acc.motions)
+        self.write(UPSERT_SQL["1m"], (device_id, bucket_label(acc.start, 60), *row))
+        self.write(UPSERT_SQL["1h"], (device_id, bucket_label(acc.start, 3600), *row))
+        self.buckets_flushed += 1
+
+    def flush_stale(self, epoch: float):
+        current = int(epoch // 60 * 60)
+        for device_id, acc in list(self._open.items()):
+            if acc.start < current:
+                self._flush(device_id, acc)
+                del self._open[device_id]
+
+    def flush(self):
+        """寫出所有開啟中的桶 (關閉時呼叫；upsert 合併，不會重複計數)"""
+        for device_id, acc in self._open.items():
+            self._flush(device_id, acc)
+        self._open.clear()
+
+
+@dataclass
+class RetentionPolicy:
+    raw_days: float = 30.0
+    rollup_1m_days: float = 90.0
+    rollup_1h_days: float = 730.0
+    csi_days: float = 7.0        # 原始 CSI 分段檔保留天數 (依分段最後寫入時間)
+    csi_max_bytes: int = 0       # 原始 CSI 分段檔總大小上限 (0 = 不限)
+    chunk_size: int = 2000       # 每次 DELETE 的列數
+    pause: float = 0.05          # 每批之間讓出寫入鎖 (秒)
+    interval: float = 3600.0     # 執行間隔 (秒)
+
+
+class RetentionJob:
+    """背景分批淘汰過期資料"""
+
+    def __init__(self, db_path: str, policy: RetentionPolicy | None = None, csi_dir: str | None = None):
+        self.db_path = db_path
+        self.policy = policy or RetentionPolicy()
+        self.csi_dir = csi_dir
+        self.deleted = {"sensor_data": 0, "sensor_rollup_1m": 0, "sensor_rollup_1h": 0,
+                        "csi_frames": 0, "csi_segments": 0}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="wicare-retention", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        self._thread.join(timeout)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except sqlite3.Error as e:
+                print(f"[DB] 資料保留清理失敗: {e}")
+            self._stop.wait(self.policy.interval)
+
+    def run_once(self, now: float | None = None) -> dict:
+        """執行一輪清理；回傳本輪各表刪除列數"""
+        now = now or time.time()
+        p = self.policy
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("PRAGMA busy_timeout=5000")
+        removed = {}
+        try:
+            cutoff = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(now - p.raw_days * 86400))
+            removed["sensor_data"] = self._chunked_delete(
+                conn, "DELETE FROM sensor_data WHERE rowid IN "
+                      "(SELECT rowid FROM sensor_data WHERE timestamp < ? LIMIT ?)", cutoff)
+            for tier, days in (("1m", p.rollup_1m_days), ("1h", p.rollup_1h_days)):
+                cutoff = time.strftime("%Y-%m-%d %H:%M:00", time.gmtime(now - days * 86400))
+                # 彙總表為 WITHOUT ROWID，以主鍵 row value 分批
+                removed[f"sensor_rollup_{tier}"] = self._chunked_delete(
+                    conn, f"DELETE FROM sensor_rollup_{tier} WHERE (device_id, bucket) IN "
+                          f"(SELECT device_id, bucket FROM sensor_rollup_{tier} WHERE bucket < ? LIMIT ?)",
+                    cutoff)
+            if self.csi_dir:
+                removed["csi_segments"], removed["csi_frames"] = csi_store.prune(
+                    conn, self.csi_dir, before=now - p.csi_days * 86400, max_bytes=p.csi_max_bytes,
+                    chunk_size=p.chunk_size, pause=p.pause, stop=self._stop)
+        finally:
+            conn.close()
+        for table, n in removed.items():
+            self.deleted[table] += n
+        if removed["sensor_data"]:
+            print(f"[DB] 清理 {removed['sensor_data']} 筆過期原始數據")
+        if removed.get("csi_segments"):
+            print(f"[CSI] 清理 {removed['csi_segments']} 個過期分段檔 ({removed['csi_frames']} 筆索引)")
+        return removed
+
+    def _chunked_delete(self, conn: sqlite3.Connection, sql: str, cutoff: str) -> int:
+        total = 0
+        while not self._stop.is_set():
+            with conn:
+                n = conn.execute(sql, (cutoff, self.policy.chunk_size)).rowcount
+            total += n
+            if n < self.policy.chunk_size:
+                break
+            time.sleep(self.policy.pause)
+        return total
+
+
+def query_history(db: sqlite3.Connection, device_id: str, since: str, until: str | None = None,
+                  resolution: str | None = None) -> tuple[str, list[tuple]]:
+    """
+    歷史查詢：依範圍自動選擇資料層 (≤ 6 小時原始、≤ 7 天 1 分鐘、其餘 1 小時)
+
+    since / until 為 UTC 'YYYY-MM-DD HH:MM:SS'；回傳 (resolution, rows)，
+    rows 為 (時間, 平均, 最小, 最大, 筆數, 動作次數)。
+    """
+    if resolution is None:
+        fmt = "%Y-%m-%d %H:%M:%S"
+        end = time.mktime(time.strptime(until, fmt)) if until else time.mktime(time.gmtime())
+        span = end - time.mktime(time.strptime(since, fmt))
+        resolution = "raw" if span <= 6 * 3600 else "1m" if span <= 7 * 86400 else "1h"
+
+    until = until or "9999-12-31 23:59:59"
+    if resolution == "raw":
+        rows = db.execute(
+            "SELECT timestamp, movement_score, movement_score, movement_score, 1, motion_detected "
+            "FROM sensor_data WHERE device_id=? AND timestamp>=? AND timestamp<? ORDER BY timestamp",
+            (device_id, since, until)).fetchall()
+    else:
+        rows = db.execute(
+            f"SELECT bucket, sum_score / count, min_score, max_score, count, motion_count "
+            f"FROM sensor_rollup_{resolution} WHERE device_id=? AND bucket>=? AND bucket<? ORDER BY bucket",
+            (device_id, since, until)).fetchall()
+    return resolution, rows
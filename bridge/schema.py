@@ -0,0 +1,216 @@
+"""
+Wi-Care 資料庫結構與常用讀取
+
+橋接器與後端共用同一個 SQLite 檔案，誰先建立資料庫，誰的 CREATE TABLE 就是最終結構；
+另一方的 CREATE ... IF NOT EXISTS 不會再修正它。因此索引以宣告式清單 (INDEXES) 維護：
+  - ensure_indexes()：啟動時逐一比對實際索引 (欄位、排序方向、部分索引條件)，
+    缺少的建立、定義不同的 (例如舊版後端建立的較窄索引) 重建
+  - verify()：只檢查不修改，回傳不符合的項目
+  - sensor_data 的 (device_id, timestamp, seq, ...) 為覆蓋索引：最新讀數 / 時間窗查詢
+    只讀索引、不回表，查詢成本只跟 B-tree 深度有關 (與資料量幾乎無關)
+  - 未解除的事件以部分索引 (WHERE resolved_at IS NULL) 維護，索引大小只跟未解除的事件數有關
+
+讀取 API：device_ids() / latest() / history() / open_events()，皆只走上述索引。
+server/db.js 建立相同名稱與定義的索引，兩邊啟動順序不影響最終結構。
+"""
+
+import re
+import sqlite3
+from typing import NamedTuple
+
+# ============================
+# 資料表
+# ============================
+CREATE_SQL = [
+    """
+    CREATE TABLE IF NOT EXISTS sensor_data (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        device_id TEXT NOT NULL,
+        movement_score REAL NOT NULL,
+        motion_detected INTEGER DEFAULT 0,
+        threshold REAL,
+        raw_csi TEXT,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+        seq INTEGER
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        elderly_id INTEGER,
+        device_id TEXT,
+        type TEXT NOT NULL,
+        severity TEXT DEFAULT 'info',
+        message TEXT,
+        ai_analysis TEXT,
+        data TEXT DEFAULT '{}',
+        is_false_alarm INTEGER DEFAULT 0,
+        resolved_at DATETIME,
+        resolved_by INTEGER,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+]
+
+
+def init_schema(db: sqlite3.Connection):
+    for sql in CREATE_SQL:
+        db.execute(sql)
+
+
+# ============================
+# 索引
+# ============================
+class Index(NamedTuple):
+    name: str
+    table: str
+    columns: tuple   # "欄位" 或 "欄位 DESC"
+    where: str = ""  # 部分索引條件
+
+
+# 讀數欄位順序與 READING_COLUMNS 相同，最新 / 時間窗查詢為覆蓋索引
+READING_COLUMNS = "device_id, timestamp, seq, movement_score, motion_detected, threshold"
+
+INDEXES = (
+    Index("idx_sensor_data_device", "sensor_data",
+          ("device_id", "timestamp", "seq", "movement_score", "motion_detected", "threshold")),
+    Index("idx_sensor_data_time", "sensor_data", ("timestamp DESC",)),
+    Index("idx_events_type", "events", ("type", "timestamp DESC")),
+    Index("idx_events_elderly", "events", ("elderly_id", "timestamp DESC")),
+    Index("idx_events_device", "events", ("device_id", "type", "timestamp")),
+    Index("idx_events_open", "events", ("type", "timestamp DESC"), "resolved_at IS NULL"),
+)
+
+
+def _create_sql(ix: Index) -> str:
+    sql = f"CREATE INDEX {ix.name} ON {ix.table}({', '.join(ix.columns)})"
+    return f"{sql} WHERE {ix.where}" if ix.where else sql
+
+
+def _normalize(sql: str) -> str:
+    return re.sub(r"\s+", " ", sql).strip().lower()
+
+
+def _describe(db: sqlite3.Connection, name: str) -> tuple | None:
+    """實際索引的 (表, 欄位, 條件)；不存在時回傳 None"""
+    row = db.execute("SELECT tbl_name, sql FROM sqlite_master WHERE type='index' AND name=?", (name,)).fetchone()
+    if row is None:
+        return None
+    table, sql = row
+    columns = tuple(f"{r[2]} DESC" if r[3] else r[2]
+                    for r in db.execute(f"PRAGMA index_xinfo({name})") if r[5])
+    _, _, where = (sql or "").partition(" WHERE ")
+    return table, columns, _normalize(where)
+
+
+def _matches(db: sqlite3.Connection, ix: Index) -> bool | None:
+    actual = _describe(db, ix.name)
+    if actual is None:
+        return None
+    return actual == (ix.table, ix.columns, _normalize(ix.where))
+
+
+def verify(db: sqlite3.Connection) -> list[str]:
+    """回傳缺少或定義不同的索引名稱 (空清單表示結構正確)"""
+    return [ix.name for ix in INDEXES if not _matches(db, ix)]
+
+
+def ensure_indexes(db: sqlite3.Connection) -> list[str]:
+    """
+    建立缺少的索引、重建定義不同的索引，並更新查詢規劃統計
+
+    回傳變更說明 (例如 "建立 idx_events_open")；大型資料表建索引需要數秒，呼叫端自行提交。
+    """
+    changes = []
+    for ix in INDEXES:
+        state = _matches(db, ix)
+        if state:
+            continue
+        if state is False:
+            db.execute(f"DROP INDEX {ix.name}")
+        db.execute(_create_sql(ix))
+        changes.append(f"{'重建' if state is False else '建立'} {ix.name}")
+    if changes:
+        db.execute("PRAGMA optimize")
+    return changes
+
+
+# ============================
+# 讀取 API
+# ============================
+class StoredReading(NamedTuple):
+    device_id: str
+    timestamp: str     # UTC 'YYYY-MM-DD HH:MM:SS'
+    seq: int | None    # 舊資料沒有序號
+    movement_score: float
+    motion_detected: bool
+    threshold: float | None
+
+
+LATEST_SQL = (f"SELECT {READING_COLUMNS} FROM sensor_data WHERE device_id = ? "
+              "ORDER BY timestamp DESC, seq DESC LIMIT 1")
+NEXT_DEVICE_SQL = "SELECT MIN(device_id) FROM sensor_data WHERE device_id > ?"
+OPEN_EVENTS_SQL = ("SELECT id, device_id, type, severity, message, timestamp FROM events "
+                   "WHERE type = ? AND resolved_at IS NULL")
+
+
+def _reading(row: tuple) -> StoredReading:
+    return StoredReading(row[0], row[1], row[2], row[3], bool(row[4]), row[5])
+
+
+def device_ids(db: sqlite3.Connection) -> list[str]:
+    """
+    有讀數的設備 (依名稱排序)
+
+    以索引逐台跳躍 (loose index scan)：每台設備一次 O(log n) 查找，
+    不像 SELECT DISTINCT 要走過整個索引。
+    """
+    out = []
+    row = db.execute(NEXT_DEVICE_SQL, ("",)).fetchone()
+    while row[0] is not None:
+        out.append(row[0])
+        row = db.execute(NEXT_DEVICE_SQL, (row[0],)).fetchone()
+    return out
+
+
+def latest(db: sqlite3.Connection, devices: list[str] | None = None) -> dict[str, StoredReading]:
+    """每台設備的最新讀數；devices 省略時為所有設備"""
+    out = {}
+    for device_id in device_ids(db) if devices is None else devices:
+        row = db.execute(LATEST_SQL, (device_id,)).fetchone()
+        if row:
+            out[device_id] = _reading(row)
+    return out
+
+
+def history(db: sqlite3.Connection, device_id: str, since: str | None = None, until: str | None = None,
+            limit: int | None = None) -> list[StoredReading]:
+    """
+    單一設備的時間窗讀數，依時間由舊到新
+
+    since / until 為 UTC 'YYYY-MM-DD HH:MM:SS' (含 since、不含 until)；
+    給定 limit 時取時間窗內最新的 limit 筆 (只讀這幾筆，不掃過整個時間窗)。
+    """
+    sql = f"SELECT {READING_COLUMNS} FROM sensor_data WHERE device_id = ?"
+    params = [device_id]
+    if since:
+        sql += " AND timestamp >= ?"
+        params.append(since)
+    if until:
+        sql += " AND timestamp < ?"
+        params.append(until)
+    if limit is None:
+        return [_reading(r) for r in db.execute(sql + " ORDER BY timestamp, seq", params)]
+    rows = db.execute(sql + " ORDER BY timestamp DESC, seq DESC LIMIT ?", (*params, limit)).fetchall()
+    return [_reading(r) for r in reversed(rows)]
+
+
+def open_events(db: sqlite3.Connection, device_id: str | None = None, type: str = "fall_alert") -> list[dict]:
+    """尚未解除的事件 (新到舊)；只讀未解除事件的部分索引"""
+    sql, params = OPEN_EVENTS_SQL, [type]
+    if device_id:
+        sql += " AND +device_id = ?"   # 一元 + 讓規劃器不改用 idx_events_device (會讀到已解除的事件)
+        params.append(device_id)
+    cur = db.execute(sql + " ORDER BY timestamp DESC", params)
+    names = [c[0] for c in cur.description]
+    return [dict(zip(names, row)) for row in cur]
@@ -0,0 +1,165 @@
+"""
+Wi-Care 高速序列埠讀取器
+
+ESPectre 每秒輸出 100+ 行，逐行 readline() + sleep(poll_interval) 會讓資料堆在 OS 緩衝區而過時：
+  - 專屬讀取執行緒以 read(in_waiting) 整塊讀取，在 bytes 上切行 (不逐行 decode)
+  - 單一預先編譯的解析器同時處理 ESPectre 文字格式與 JSON 行
+  - 解析結果放入有上限的佇列 (滿了丟最舊的)，主迴圈以 drain() 取用，不需 sleep
+
+ESPectre 格式：
+  [timestamp][espectre:045]: Movement: 0.234 | Motion: ON | Threshold: 1.40
+esp-csi 原始 CSI 格式 (解析為 {"raw_csi": [...]}，由橋接器的 csi_dsp 計算分數)：
+  CSI_DATA,1,aa:bb:cc:dd:ee:ff,-45,...,128,0,"[0,0,3,-12,...]"
+"""
+
+import json
+import re
+import threading
+from collections import deque
+from dataclasses import dataclass
+
+_ESPECTRE_RE = re.compile(
+    rb"Movement:\s*([\d.]+)"
+    rb"(?:.*?Motion:\s*(\w+))?"
+    rb"(?:.*?Threshold:\s*([\d.]+))?"
+)
+_MOTION_ON = (b"ON", b"YES")
+
+
+def parse_line(line: bytes) -> dict | None:
+    """解析一行序列輸出 (bytes)；無法辨識時回傳 None"""
+    if line.startswith(b"CSI_DATA"):
+        start, end = line.rfind(b"["), line.rfind(b"]")
+        if start < 0 or end < start:
+            return None
+        try:
+            iq = [int(v) for v in line[start + 1:end].replace(b",", b" ").split()]
+        except ValueError:
+            return None
+        return {"raw_csi": iq} if iq and len(iq) % 2 == 0 else None
+    if line[:1] == b"{":
+        try:
+            data = json.loads(line)
+        except ValueError:
+            return None
+        return data if isinstance(data, dict) else None
+
+    match = _ESPECTRE_RE.search(line)
+    if not match:
+        return None
+    try:
+        score = float(match.group(1))
+        threshold = float(match.group(3)) if match.group(3) else None
+    except ValueError:
+        return None
+    motion = match.group(2) in _MOTION_ON
+    return {
+        "movement_score": score,
+        "motion_detected": motion,
+        "threshold": threshold,
+        "status": "fall" if motion else "safe",
+    }
+
+
+@dataclass
+class SerialStats:
+    bytes_read: int = 0
+    lines: int = 0
+    parsed: int = 0
+    ignored: int = 0        # 非數據行 (開機訊息、日誌等)
+    dropped: int = 0        # 佇列滿時丟棄的最舊資料
+    read_errors: int = 0
+
+
+class SerialStreamReader:
+    """
+    背景執行緒整塊讀取序列埠並解析
+
+    conn 為已開啟的 serial.Serial (或任何具備 read() / in_waiting 的物件)，
+    建議設定 timeout (例如 0.1 秒) 讓執行緒可以定期檢查停止旗標。
+    """
+
+    MAX_LINE = 4096  # 超過此長度仍無換行，視為雜訊丟棄
+
+    def __init__(self, conn, max_queue: int = 10000):
+        self.conn = conn
+        self.stats = SerialStats()
+        self._items: deque = deque(maxlen=max_queue)
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="wicare-serial", daemon=True)
+        self.error: Exception | None = None
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self, timeout: float = 2.0):
+        self._stop.set()
+        self._thread.join(timeout)
+
+    @property
+    def alive(self) -> bool:
+        return self._thread.is_alive()
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._items)
+
+    def drain(self, timeout: float | None = None, max_items: int | None = None) -> list[dict]:
+        """取出所有 (或最多 max_items 筆) 已解析資料；佇列為空時最多等待 timeout 秒"""
+        with self._cond:
+            if not self._items:
+                self._cond.wait_for(lambda: self._items or self._stop.is_set(), timeout)
+            if max_items is None or max_items >= len(self._items):
+                items = list(self._items)
+                self._items.clear()
+            else:
+                items = [self._items.popleft() for _ in range(max_items)]
+        return items
+
+    def _run(self):
+        buf = bytearray()
+        try:
+            while not self._stop.is_set():
+                chunk = self.conn.read(self.conn.in_waiting or 1)
+                if not chunk:
+                    continue
+                self.stats.bytes_read += len(chunk)
+                buf += chunk
+                if b"\n" not in chunk:
+                    if len(buf) > self.MAX_LINE:
+                        buf.clear()
+                    continue
+
+                lines = buf.split(b"\n")
+                buf = bytearray(lines.pop())
+                parsed = []
+                for line in lines:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    data = parse_line(line)
+                    if data is None:
+                        self.stats.ignored += 1
+                    else:
+                        parsed.append(data)
+                self.stats.lines += len(lines)
+                if parsed:
+                    self._publish(parsed)
+        except Exception as e:  # 序列埠拔除等
+            self.error = e
+            self.stats.read_errors += 1
+        finally:
+            with self._cond:
+                self._stop.set()
+                self._cond.notify_all()
+
+    def _publish(self, parsed: list[dict]):
+        with self._cond:
+            overflow = len(self._items) + len(parsed) - self._items.maxlen
+            if overflow > 0:
+                self.stats.dropped += overflow
+            self._items.extend(parsed)
+            self.stats.parsed += len(parsed)
+            self._cond.notify()
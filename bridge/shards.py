@@ -0,0 +1,320 @@
+"""
+Wi-Care 多程序分片偵測
+
+單一 WiCareBridge 事件迴圈受 GIL 限制，設備數與取樣率一高，特徵萃取 + 評分就吃滿一顆核心。
+ShardPool 把偵測移到子程序，I/O (HTTP 輪詢 / 序列埠) 與資料庫寫入仍留在主程序：
+
+  - 設備以 crc32(device_id) % workers 固定分配到一個子程序 (分片)，
+    每台設備的偵測視窗只存在該分片，讀數依到達順序處理
+  - 讀數不經 pickle：每個分片一塊 SharedMemory，切成數個批次槽 (slot)，
+    主程序累積一批 (設備編號, 分數, 閾值) 後整批複製進槽內的陣列，管道上只傳 (slot, 筆數)
+  - 子程序在同一個槽寫回 (判定, 機率, 峰值)，主程序收回結果後以 on_result(ctx, det) 套用，
+    警報與寫入仍走主程序唯一的 BatchWriter；判定為 safe 的讀數 (絕大多數) 預設不回呼，
+    主程序每筆只剩排入的成本，吞吐量才能隨子程序數擴展
+  - 槽滿或每 flush_interval 送出一次；分片的槽全部在途時，submit 等待該分片回覆 (背壓)
+  - attach(loop) 以 add_reader 在事件迴圈上收結果，不另開執行緒
+
+判定與單程序的 FallDetector.evaluate 完全相同 (同一份 DetectorConfig / 評分模型)。
+
+使用範例：
+  pool = ShardPool(4, detector.cfg, detector.model, on_result=apply).start()
+  pool.submit("ESP32-001", 42.0, 70.0, ctx)
+  pool.flush(); pool.poll(0.1)
+  pool.close()
+"""
+
+import math
+import multiprocessing
+import time
+import zlib
+from dataclasses import dataclass, field
+from multiprocessing import shared_memory
+from multiprocessing.connection import wait
+
+from detector import AMBIGUOUS, FALL, SAFE, Detection, DetectorConfig, FallDetector
+from lazy import lazy_import
+
+np = lazy_import("numpy")
+
+# 判定代碼：0 = 未評估 (樣本不足或只累積視窗)
+VERDICTS = (None, SAFE, AMBIGUOUS, FALL)
+CODES = {v: k for k, v in enumerate(VERDICTS) if v}
+SAFE_CODE = CODES[SAFE]
+
+# 每筆讀數在槽內佔用的位元組：score / threshold / prob / peak (f8) + device (i4) + code (i1)
+RECORD_BYTES = 8 * 4 + 4 + 1
+
+
+def _slot_bytes(batch_size: int) -> int:
+    return (batch_size * RECORD_BYTES + 63) // 64 * 64
+
+
+def _slot_views(buf, slot: int, batch_size: int) -> dict:
+    """槽內各欄位的 numpy 檢視 (struct-of-arrays，8 位元組欄位在前以維持對齊)"""
+    offset = slot * _slot_bytes(batch_size)
+    views = {}
+    for name, dtype, size in (("score", "<f8", 8), ("threshold", "<f8", 8), ("prob", "<f8", 8),
+                              ("peak", "<f8", 8), ("device", "<i4", 4), ("code", "i1", 1)):
+        views[name] = np.ndarray((batch_size,), dtype=dtype, buffer=buf, offset=offset)
+        offset += size * batch_size
+    return views
+
+
+# ============================
+# 子程序
+# ============================
+def _worker_main(shm_name: str, batch_size: int, slots: int, cfg: DetectorConfig, model, conn):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    views = [_slot_views(shm.buf, i, batch_size) for i in range(slots)]
+    detector = FallDetector(cfg, model)
+    w = cfg.window
+    windows: dict[int, list[float]] = {}
+    conn.send("ready")
+    try:
+        while True:
+            try:
+                msg = conn.recv()
+            except EOFError:
+                break
+            if msg is None:
+                break
+            slot, n = msg
+            v = views[slot]
+            devices = v["device"][:n].tolist()
+            scores = v["score"][:n].tolist()
+            thresholds = v["threshold"][:n].tolist()
+            codes, probs, peaks = [0] * n, [0.0] * n, [0.0] * n
+            for k in range(n):
+                window = windows.get(devices[k])
+                if window is None:
+                    window = windows[devices[k]] = []
+                window.append(scores[k])
+                if len(window) > w:
+                    del window[0]
+                threshold = thresholds[k]
+                if threshold != threshold:   # NaN：只累積視窗 (設備端旗標已觸發)
+                    continue
+                det = detector.evaluate(window, threshold)
+                if det is not None:
+                    codes[k], probs[k], peaks[k] = CODES[det.verdict], det.probability, det.peak
+            v["code"][:n] = codes
+            v["prob"][:n] = probs
+            v["peak"][:n] = peaks
+            conn.send(slot)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        views.clear()
+        shm.close()
+
+
+# ============================
+# 主程序
+# ============================
+@dataclass
+class ShardStats:
+    samples: int = 0
+    results: int = 0
+    batches: int = 0
+    stalls: int = 0          # 分片的槽全部在途、submit 必須等待的次數
+    per_shard: list = field(default_factory=list)
+
+
+class _Shard:
+    __slots__ = ("index", "shm", "conn", "proc", "views", "free", "contexts",
+                 "devices", "scores", "thresholds", "pending_ctx", "in_flight")
+
+    def __init__(self, index: int):
+        self.index = index
+        self.shm = self.conn = self.proc = None
+        self.views = []
+        self.free = []
+        self.contexts = []   # 每個在途槽的 ctx 清單
+        self.devices, self.scores, self.thresholds, self.pending_ctx = [], [], [], []  # 累積中的批次
+        self.in_flight = 0   # 已送出、尚未收回的讀數
+
+
+class ShardPool:
+    """依設備分片的偵測子程序池"""
+
+    def __init__(self, workers: int, cfg: DetectorConfig | None = None, model=None, batch_size: int = 256,
+                 slots: int = 4, flush_interval: float = 0.005, on_result=None, report_safe: bool = False):
+        if workers < 1:
+            raise ValueError("workers 必須 >= 1")
+        self.workers = workers
+        self.cfg = cfg or DetectorConfig()
+        self.model = model
+        self.batch_size = batch_size
+        self.slots = slots
+        self.flush_interval = flush_interval
+        self.on_result = on_result   # on_result(ctx, Detection | None)
+        self.report_safe = report_safe
+        self.stats = ShardStats(per_shard=[0] * workers)
+        self._shards = [_Shard(i) for i in range(workers)]
+        self._routes: dict[str, tuple[int, _Shard]] = {}   # device_id → (設備編號, 分片)
+        self._loop = None
+        self._timer = None
+
+    # ---------- 生命週期 ----------
+    def start(self, timeout: float = 60.0) -> "ShardPool":
+        # spawn：主程序已有寫入 / 推送等執行緒，fork 可能複製到持有中的鎖
+        ctx = multiprocessing.get_context("spawn")
+        for sh in self._shards:
+            sh.shm = shared_memory.SharedMemory(create=True, size=self.slots * _slot_bytes(self.batch_size))
+            sh.views = [_slot_views(sh.shm.buf, i, self.batch_size) for i in range(self.slots)]
+            sh.free = list(range(self.slots - 1, -1, -1))
+            sh.contexts = [[] for _ in range(self.slots)]
+            sh.conn, child = ctx.Pipe()
+            sh.proc = ctx.Process(target=_worker_main, name=f"wicare-shard-{sh.index}", daemon=True,
+                                  args=(sh.shm.name, self.batch_size, self.slots, self.cfg, self.model, child))
+            sh.proc.start()
+            child.close()
+        deadline = time.monotonic() + timeout
+        for sh in self._shards:
+            try:
+                ready = sh.conn.poll(max(0.0, deadline - time.monotonic())) and sh.conn.recv() == "ready"
+            except EOFError:
+                ready = False
+            if not ready:
+                self.close()
+                raise RuntimeError(f"偵測子程序 {sh.index} 啟動失敗或逾時")
+        return self
+
+    def close(self, timeout: float = 10.0):
+        """送出剩餘讀數、收回所有結果後結束子程序並釋放共享記憶體"""
+        if self._loop:
+            self.detach()
+        if any(sh.proc and sh.proc.is_alive() for sh in self._shards):
+            self.flush()
+            deadline = time.monotonic() + timeout
+            while self.pending and time.monotonic() < deadline:
+                self.poll(0.05)
+        for sh in self._shards:
+            if sh.conn:
+                try:
+                    sh.conn.send(None)
+                except OSError:
+                    pass
+        for sh in self._shards:
+            if sh.proc:
+                sh.proc.join(timeout)
+                if sh.proc.is_alive():
+                    sh.proc.terminate()
+            if sh.conn:
+                sh.conn.close()
+            sh.views.clear()
+            if sh.shm:
+                sh.shm.close()
+                sh.shm.unlink()
+            sh.shm = sh.conn = sh.proc = None
+
+    def attach(self, loop):
+        """在事件迴圈上收結果 (add_reader) 並定期送出未滿的批次"""
+        self._loop = loop
+        for sh in self._shards:
+            loop.add_reader(sh.conn.fileno(), self._collect, sh)
+        self._schedule_flush()
+
+    def detach(self):
+        loop, self._loop = self._loop, None
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        for sh in self._shards:
+            if sh.conn:
+                loop.remove_reader(sh.conn.fileno())
+
+    def _schedule_flush(self):
+        self.flush()
+        if self._loop:
+            self._timer = self._loop.call_later(self.flush_interval, self._schedule_flush)
+
+    # ---------- 送出 / 收回 ----------
+    def shard_of(self, device_id: str) -> int:
+        """固定分片 (不用 hash()，重啟後分配不變)"""
+        return zlib.crc32(device_id.encode("utf-8")) % self.workers
+
+    @property
+    def pending(self) -> int:
+        return sum(sh.in_flight + len(sh.scores) for sh in self._shards)
+
+    def submit(self, device_id: str, score: float, threshold: float | None, ctx=None):
+        """
+        排入一筆讀數
+
+        threshold 為 None 時只累積該設備的偵測視窗、不評估；ctx 為 None 時不回呼。
+        """
+        route = self._routes.get(device_id)
+        if route is None:
+            route = self._routes[device_id] = (len(self._routes), self._shards[self.shard_of(device_id)])
+        index, sh = route
+        sh.devices.append(index)
+        sh.scores.append(score)
+        sh.thresholds.append(math.nan if threshold is None else threshold)
+        sh.pending_ctx.append(ctx)
+        self.stats.samples += 1
+        if len(sh.scores) >= self.batch_size:
+            self._dispatch(sh)
+
+    def flush(self):
+        for sh in self._shards:
+            if sh.scores:
+                self._dispatch(sh)
+
+    def poll(self, timeout: float = 0.0) -> int:
+        """收回已完成的批次並回呼；回傳處理的讀數數"""
+        busy = {sh.conn: sh for sh in self._shards if sh.in_flight}
+        if not busy:
+            return 0
+        before = self.stats.results
+        for conn in wait(list(busy), timeout):
+            self._collect(busy[conn])
+        return self.stats.results - before
+
+    def _dispatch(self, sh: _Shard):
+        devices, scores, thresholds, contexts = sh.devices, sh.scores, sh.thresholds, sh.pending_ctx
+        sh.devices, sh.scores, sh.thresholds, sh.pending_ctx = [], [], [], []
+        n = len(scores)
+        sh.in_flight += n    # 等待空槽期間仍計入 pending
+        slot = self._take_slot(sh)
+        v = sh.views[slot]
+        v["device"][:n] = devices
+        v["score"][:n] = scores
+        v["threshold"][:n] = thresholds
+        sh.contexts[slot] = contexts
+        sh.conn.send((slot, n))
+        self.stats.per_shard[sh.index] += n
+        self.stats.batches += 1
+
+    def _take_slot(self, sh: _Shard) -> int:
+        while not sh.free:
+            self.stats.stalls += 1
+            ready = wait([sh.conn, sh.proc.sentinel], 5.0)
+            if sh.conn in ready:
+                self._collect(sh)
+            elif ready:
+                raise RuntimeError(f"偵測子程序 {sh.index} 已結束 (exitcode={sh.proc.exitcode})")
+        return sh.free.pop()
+
+    def _collect(self, sh: _Shard):
+        while sh.conn.poll():
+            try:
+                slot = sh.conn.recv()
+            except EOFError:
+                if self._loop:
+                    self._loop.remove_reader(sh.conn.fileno())
+                raise RuntimeError(f"偵測子程序 {sh.index} 已結束") from None
+            contexts = sh.contexts[slot]
+            n = len(contexts)
+            v = sh.views[slot]
+            codes = v["code"][:n]
+            hits = range(n) if self.report_safe else np.flatnonzero(codes != SAFE_CODE).tolist()
+            results = [(contexts[k], int(codes[k]), float(v["prob"][k]), float(v["peak"][k]))
+                       for k in hits if contexts[k] is not None] if self.on_result else []
+            # 先釋放槽再回呼：回呼中再 submit 時不會因為槽不足而等待自己
+            sh.contexts[slot] = []
+            sh.free.append(slot)
+            sh.in_flight -= n
+            self.stats.results += n
+            for ctx, code, prob, peak in results:
+                self.on_result(ctx, Detection(VERDICTS[code], prob, peak) if code else None)
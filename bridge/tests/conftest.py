@@ -0,0 +1,7 @@
+"""Wi-Care Bridge 測試共用設定"""
+
+import sys
+from pathlib import Path
+
+# bridge/ 為扁平模組目錄 (python bridge.py 直接執行)，測試時加入匯入路徑
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
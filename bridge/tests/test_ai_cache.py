@@ -0,0 +1,16 @@
+"""AI 判讀快取測試"""
+
+from ai_cache import AnalysisCache
+
+
+def test_cache_reuses_verdict_for_quiet_windows():
+    cache = AnalysisCache(max_size=2, ttl=60, mean_bin=5, max_bin=5)
+    quiet = {"avg": 11.2, "max": 14.0, "motions": 0, "threshold": 70.0}
+    assert cache.get(quiet) is None
+    cache.put(quiet, "低風險")
+    assert cache.get(dict(quiet, avg=12.9, max=13.1)) == "低風險"  # 同一分箱
+    assert cache.get(dict(quiet, max=80.0)) is None
+    cache.put({"avg": 50, "max": 90, "motions": 3, "threshold": 70.0}, "高風險")
+    cache.put({"avg": 30, "max": 40, "motions": 1, "threshold": 70.0}, "中風險")
+    assert cache.stats.evictions == 1
+    assert (cache.stats.hits, cache.stats.misses) == (1, 2)
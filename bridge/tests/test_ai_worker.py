@@ -0,0 +1,99 @@
+"""背景 AI 分析工作者測試 (以假模型代替 Gemini)"""
+
+import sqlite3
+import threading
+import time
+
+import bridge
+from ai_worker import AIAnalysisWorker
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeModel:
+    """模擬 generate_content 的延遲"""
+
+    def __init__(self, delay=0.2, text="低風險 (fake)"):
+        self.delay = delay
+        self.text = text
+        self.calls = 0
+
+    def generate_content(self, prompt):
+        self.calls += 1
+        time.sleep(self.delay)
+        return FakeResponse(self.text)
+
+
+def _wait(pred, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if pred():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_submit_does_not_block_and_fills_latest():
+    w = AIAnalysisWorker(lambda window: time.sleep(0.2) or "ok", min_interval=0).start()
+    started = time.monotonic()
+    assert w.submit("dev-1", {})
+    assert time.monotonic() - started < 0.05
+    assert w.latest("dev-1") is None
+    assert _wait(lambda: w.latest("dev-1") == "ok")
+    w.close()
+
+
+def test_rate_limit_and_coalescing():
+    w = AIAnalysisWorker(lambda window: "ok", min_interval=60).start()
+    assert w.submit("dev-1", {})
+    assert _wait(lambda: w.latest("dev-1") == "ok")
+    assert not w.submit("dev-1", {})
+    assert w.stats.rate_limited == 1
+    assert w.submit("dev-2", {})          # 其他設備不受影響
+    assert w.submit("dev-1", {}, priority=True)  # 跌倒事件略過速率限制
+    w.close()
+
+
+def test_bridge_sampling_independent_of_model_latency(tmp_path):
+    cfg = dict(bridge.DEFAULT_CONFIG, db_path=str(tmp_path / "wicare.db"),
+               csi_dir=str(tmp_path / "csi"), backend_url="http://127.0.0.1:9", ai_rate_limit=0)
+    b = bridge.WiCareBridge(cfg, mode="sim")
+    b.gemini_model = FakeModel(delay=0.5)
+    b._start_ai_worker()
+
+    started = time.monotonic()
+    for i in range(12):
+        b.process_sample("dev-1", {"movement_score": 10.0, "motion_detected": False})
+    b.process_sample("dev-1", {"movement_score": 95.0, "motion_detected": True})
+    assert time.monotonic() - started < 0.5
+
+    # 背景完成後回填跌倒事件的 ai_analysis
+    assert _wait(lambda: b.gemini_model.calls >= 2, timeout=5)
+    b.cleanup()
+    row = sqlite3.connect(cfg["db_path"]).execute(
+        "SELECT ai_analysis FROM events WHERE type='fall_alert'").fetchone()
+    assert row[0] == "低風險 (fake)"
+
+
+
+def test_ai_confirmed_fall_is_raised_on_the_sampling_thread(tmp_path):
+    cfg = dict(bridge.DEFAULT_CONFIG, db_path=str(tmp_path / "wicare.db"), csi_dir=str(tmp_path / "csi"),
+               backend_url="http://127.0.0.1:9", ai_rate_limit=0, quiet=True, metrics_port=0)
+    b = bridge.WiCareBridge(cfg, mode="sim")
+    b.gemini_model = FakeModel(delay=0.05, text="高風險 (fake)")
+    b._start_ai_worker()
+    raised = []
+    original = b._raise_fall_alert
+    b._raise_fall_alert = lambda *a, **kw: raised.append(threading.current_thread()) or original(*a, **kw)
+
+    for _ in range(12):
+        b.process_sample("dev-1", {"movement_score": 10.0, "motion_detected": False})
+    b._review_with_ai("dev-1", 65.0)                    # 模糊案例交給 AI 複核
+    assert _wait(lambda: not b._ai_alerts.empty())
+    assert raised == []                                  # AI 執行緒只排入結果，不直接發警報
+    b.process_sample("dev-1", {"movement_score": 10.0, "motion_detected": False})
+    assert raised == [threading.current_thread()] and b.m_fall_alerts.value == 1
+    b.cleanup()
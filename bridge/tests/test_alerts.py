@@ -0,0 +1,116 @@
+"""LINE 警報派送測試 (本機假 LINE 伺服器)"""
+
+import json
+import sqlite3
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from alerts import AlertDispatcher
+
+
+class FakeLine:
+    """記錄收到的請求；statuses 依序回應 (用完後回 200)"""
+
+    def __init__(self, statuses=()):
+        self.requests = []
+        self.statuses = list(statuses)
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                fake.requests.append((self.path, self.headers["Authorization"], body))
+                status = fake.statuses.pop(0) if fake.statuses else 200
+                self.send_response(status)
+                self.send_header("Content-Length", "2")
+                self.end_headers()
+                self.wfile.write(b"{}")
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def fake_line():
+    servers = []
+
+    def make(statuses=()):
+        servers.append(FakeLine(statuses))
+        return servers[-1]
+    yield make
+    for s in servers:
+        s.close()
+
+
+def _wait(cond, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline and not cond():
+        time.sleep(0.01)
+    return cond()
+
+
+def test_burst_is_coalesced_into_one_multicast(tmp_path, fake_line):
+    line = fake_line()
+    d = AlertDispatcher(str(tmp_path / "a.db"), "tok", ["U1", "U2"], api_base=line.url,
+                        min_interval=0.5).start()
+    d.enqueue("dev-0", 91.0)
+    assert _wait(lambda: len(line.requests) == 1)
+    for i in range(1, 6):
+        d.enqueue(f"dev-{i}", 80.0 + i)
+    assert _wait(lambda: d.stats.delivered == 6)
+    d.close()
+
+    assert len(line.requests) == 2
+    path, auth, body = line.requests[1]
+    assert path == "/v2/bot/message/multicast"
+    assert auth == "Bearer tok"
+    assert body["to"] == ["U1", "U2"]
+    assert "5 台設備" in body["messages"][0]["text"]
+    assert d.stats.coalesced == 4
+
+
+def test_retries_then_survives_restart(tmp_path, fake_line):
+    db = str(tmp_path / "a.db")
+    flaky = fake_line([500, 503])
+    d = AlertDispatcher(db, "tok", ["U1"], api_base=flaky.url, backoff_base=0.05).start()
+    d.enqueue("dev-1", 95.0, "風險: 高")
+    assert _wait(lambda: d.stats.delivered == 1)
+    d.close()
+    assert d.stats.retries == 2
+    assert flaky.requests[-1][0] == "/v2/bot/message/push"
+
+    # LINE 無法連線時關閉：警報留在 outbox，重啟後送出
+    down = AlertDispatcher(db, "tok", ["U1"], api_base="http://127.0.0.1:9", timeout=0.5,
+                           backoff_base=30).start()
+    down.enqueue("dev-2", 88.0)
+    assert _wait(lambda: down.stats.retries == 1)
+    down.close()
+
+    line = fake_line()
+    d2 = AlertDispatcher(db, "tok", ["U1"], api_base=line.url).start()
+    assert _wait(lambda: d2.stats.delivered == 1)
+    d2.close()
+    assert d2.stats.recovered == 1
+    assert "dev-2" in line.requests[0][2]["messages"][0]["text"]
+    rows = sqlite3.connect(db).execute("SELECT status, attempts FROM alert_outbox ORDER BY id").fetchall()
+    assert rows == [("sent", 3), ("sent", 2)]
+
+
+def test_client_error_is_not_retried(tmp_path, fake_line):
+    line = fake_line([400])
+    d = AlertDispatcher(str(tmp_path / "a.db"), "tok", ["U1"], api_base=line.url, backoff_base=0.01).start()
+    d.enqueue("dev-1", 90.0)
+    assert _wait(lambda: d.stats.failed == 1)
+    d.close()
+    assert len(line.requests) == 1
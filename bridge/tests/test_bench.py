@@ -0,0 +1,62 @@
+"""錄製 / 重播基準測試工具測試"""
+
+import json
+
+import bench
+
+
+def test_simulated_frames_are_deterministic():
+    a = bench.simulated_frames(seed=7, count=50, interval=1.0)
+    b = bench.simulated_frames(seed=7, count=50, interval=1.0)
+    c = bench.simulated_frames(seed=8, count=50, interval=1.0)
+    assert a == b
+    assert a != c
+    assert json.loads(a[0][1])["threshold"] == bench.wicare.DEFAULT_CONFIG["fall_threshold"]
+
+
+def test_replay_serial_recording_through_pipeline(tmp_path):
+    path = tmp_path / "rec.jsonl"
+    lines = [json.dumps({"format": bench.RECORD_FORMAT, "version": 1, "kind": "serial", "interval": 0.01})]
+    for k in range(40):
+        raw = f"[{k}][espectre:045]: Movement: {10 + k % 5}.5 | Motion: OFF | Threshold: 70.00"
+        lines.append(json.dumps({"t": k * 0.01, "raw": raw}))
+    lines.append(json.dumps({"t": 0.4, "raw": "boot: rst:0x1 (POWERON)"}))
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+    header, frames = bench.load_recording(str(path))
+    result = bench.run_scenario(3, frames, header["kind"], header["interval"], backend="stub", seed=1)
+
+    assert result["samples"] == 41 * 3
+    assert result["stages"]["parse"]["count"] == 41 * 3
+    assert result["stages"]["buffer"]["count"] == 40 * 3   # 無法解析的行不進入管線
+    assert result["stages"]["detect"]["count"] == 40 * 3
+    assert result["push"]["received"] == 40 * 3
+
+
+def test_startup_reaches_first_sample(tmp_path):
+    env = dict(bench.os.environ, PYTHONUNBUFFERED="1", DB_PATH=str(tmp_path / "w.db"),
+               CSI_DIR=str(tmp_path / "csi"), METRICS_PORT="0")
+    ms = bench.time_to_first_sample(["--mode", "sim", "--backend", "http://127.0.0.1:9"], env)
+    assert ms is not None
+    assert (tmp_path / "w.db").exists()
+
+
+def test_single_device_sim_path_keeps_ingest_lazy(tmp_path):
+    # 單設備 sim 迴圈不應載入多設備擷取引擎 (ingest / asyncio)，否則啟動時間超過目標
+    script = f"""
+import sys, bridge
+cfg = dict(bridge.DEFAULT_CONFIG, db_path={str(tmp_path / "w.db")!r}, csi_dir={str(tmp_path / "csi")!r},
+           backend_url="http://127.0.0.1:9", quiet=True, metrics_port=0, poll_interval=0.01)
+b = bridge.WiCareBridge(cfg, mode="sim")
+process = b.process_sample
+def once(device_id, data):
+    process(device_id, data)
+    b.running = False
+b.process_sample = once
+b.run()
+print(sorted(m for m in ("ingest", "asyncio") if type(sys.modules.get(m)).__name__ == "module"))
+"""
+    out = bench.subprocess.run([bench.sys.executable, "-c", script], cwd=bench.os.path.dirname(bench.BRIDGE_SCRIPT),
+                               capture_output=True, text=True, timeout=60)
+    assert out.returncode == 0, out.stderr
+    assert out.stdout.strip().splitlines()[-1] == "[]"
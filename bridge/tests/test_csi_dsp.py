@@ -0,0 +1,103 @@
+"""橋接器端 CSI 訊號處理測試"""
+
+import sqlite3
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import bridge
+from csi_dsp import BandPass, CsiDsp, CsiPipeline, DspConfig, HampelFilter, _butter2, _polymul, lfilter, synthetic_csi
+from ingest import decode_frame, encode_csi_frame
+from serial_reader import parse_line
+
+
+def test_block_bandpass_matches_scalar_filter():
+    rng = np.random.default_rng(3)
+    x = rng.normal(0, 1, (700, 4))
+    bp = BandPass(0.5, 40.0, 1000.0, max_block=64)
+    got = np.vstack([bp.process(x[i:i + n]) for i, n in zip((0, 50, 113, 400), (50, 63, 287, 300))])
+
+    bh, ah = _butter2("high", 0.5, 1000.0)
+    bl, al = _butter2("low", 40.0, 1000.0)
+    b, a = _polymul(bh, bl), _polymul(ah, al)
+    for col in range(x.shape[1]):
+        expected, _ = lfilter(b, a, x[:, col].tolist())
+        assert np.allclose(got[:, col], expected, atol=1e-8)
+
+
+def test_hampel_replaces_spikes_with_fixed_delay():
+    x = np.tile(np.arange(40, dtype=float)[:, None] % 5, (1, 3))
+    spiked = x.copy()
+    spiked[17, 1] += 100.0
+    h = HampelFilter(k=3, sigmas=3.0)
+    out = np.vstack([h.process(spiked[:20]), h.process(spiked[20:])])
+    assert h.replaced >= 1
+    assert np.abs(out[3:, 1]).max() < 10                       # 尖峰已被中位數取代
+    assert np.array_equal(out[3:, 0], x[:-3, 0])                # 其餘樣本原樣輸出，延遲 k 個訊框
+
+
+def test_pipeline_scores_motion_above_quiet():
+    cfg = DspConfig()
+    amp = synthetic_csi(6000, motion=((4.0, 6.0),), seed=1)
+    pipeline = CsiPipeline(cfg)
+    scores = np.concatenate(list(pipeline.stream(amp[i:i + 50] for i in range(0, len(amp), 50))))
+    # 暖機 2 s 之後每 50 訊框一筆：前 40 筆為靜止 (2-4 s)，後 40 筆為動作 (4-6 s)
+    assert len(scores) == 80
+    quiet, moving = scores[5:35], scores[45:]
+    assert quiet.max() < 10 and moving.min() > 50
+
+
+def test_csi_batches_over_udp_and_serial():
+    iq = bytes(range(0, 128)) * 3
+    frame = encode_csi_frame("ESP32-CSI", iq, n_sub=64, seq=9)
+    assert decode_frame(frame) == ("ESP32-CSI", 9, {"csi_iq": iq, "n_sub": 64, "csi_frames": 3})
+    with pytest.raises(ValueError):
+        decode_frame(frame[:-1])
+    with pytest.raises(ValueError):
+        encode_csi_frame("X", b"\x00" * 5, n_sub=2)
+
+    line = b'CSI_DATA,5,aa:bb:cc:dd:ee:ff,-45,11,1,7,1,0,1,0,0,0,0,-93,0,6,0,1234,0,96,0,4,0,"[3,-4,0,12]"'
+    assert parse_line(line) == {"raw_csi": [3, -4, 0, 12]}
+    assert parse_line(b"CSI_DATA,5,broken") is None
+
+    dsp = CsiDsp(DspConfig(), block=4)
+    assert [dsp.feed("S", {"raw_csi": [3, 4]}) for _ in range(3)] == [[], [], []]
+    dsp.feed("S", {"raw_csi": [3, 4]})
+    assert dsp.frames == 4 and dsp.pipelines["S"].n_sub == 1
+
+
+def test_bridge_scores_raw_csi(tmp_path):
+    amp = synthetic_csi(4000, n_sub=32, motion=((3.0, 4.0),), seed=2)
+    iq = np.zeros((len(amp), 64), dtype=np.int8)
+    iq[:, 1::2] = np.clip(amp.round(), 0, 127)
+    cfg = dict(bridge.DEFAULT_CONFIG, db_path=str(tmp_path / "c.db"), csi_dir=str(tmp_path / "csi"),
+               backend_url="http://127.0.0.1:9", quiet=True, metrics_port=0, csi_dsp=True)
+    b = bridge.WiCareBridge(cfg, mode="sim")
+    for i in range(0, len(iq), 100):
+        b.process_sample("CSI-1", {"csi_iq": iq[i:i + 100].tobytes(), "n_sub": 32})
+    b.cleanup()
+
+    db = sqlite3.connect(cfg["db_path"])
+    scores = [r[0] for r in db.execute("SELECT movement_score FROM sensor_data WHERE device_id='CSI-1' ORDER BY id")]
+    db.close()
+    assert len(scores) == 40 and b.dsp.frames == 4000            # 暖機 2 s 後每秒 20 筆
+    assert max(scores[:15]) < 10 and min(scores[25:]) > 50
+
+
+def test_bridge_without_dsp_archives_csi_only(tmp_path):
+    cfg = dict(bridge.DEFAULT_CONFIG, db_path=str(tmp_path / "n.db"), csi_dir=str(tmp_path / "csi"),
+               backend_url="http://127.0.0.1:9", quiet=True, metrics_port=0, csi_dsp=False)
+    b = bridge.WiCareBridge(cfg, mode="sim")
+    line = b'CSI_DATA,5,aa:bb:cc:dd:ee:ff,-45,11,1,7,1,0,1,0,0,0,0,-93,0,6,0,1234,0,96,0,4,0,"[3,-4,0,12]"'
+    for _ in range(5):
+        b.process_sample("CSI-1", parse_line(line))
+    b.process_sample("CSI-1", {"csi_iq": b"\x01\x02" * 8, "n_sub": 4})
+    b.process_sample("CSI-1", {"raw_csi": [3, -4], "movement_score": 12.5})   # 設備端也回報分數：照常處理
+    b.cleanup()
+
+    db = sqlite3.connect(cfg["db_path"])
+    scores = [r[0] for r in db.execute("SELECT movement_score FROM sensor_data")]
+    frames = db.execute("SELECT COUNT(*) FROM csi_frames").fetchone()[0]
+    db.close()
+    assert b.dsp is None and scores == [12.5] and frames == 6
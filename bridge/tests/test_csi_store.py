@@ -0,0 +1,106 @@
+"""原始 CSI 分段檔儲存測試"""
+
+import os
+import sqlite3
+import time
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import csi_store
+import rollup
+from csi_store import FMT_AMP_PHASE_F16, FMT_IQ_INT8, CsiReader, CsiStore
+from rollup import RetentionJob, RetentionPolicy
+
+
+def _store(tmp_path, **kw):
+    db_path = str(tmp_path / "c.db")
+    db = sqlite3.connect(db_path)
+    db.execute("CREATE TABLE sensor_data (id INTEGER PRIMARY KEY, device_id TEXT, movement_score REAL, "
+               "motion_detected INTEGER, threshold REAL, timestamp DATETIME)")
+    rollup.init_schema(db)
+    csi_store.init_schema(db)
+    store = CsiStore(str(tmp_path / "csi"), lambda sql, params: db.execute(sql, params), **kw)
+    return db, db_path, store
+
+
+def test_roundtrip_across_segments(tmp_path):
+    db, db_path, store = _store(tmp_path, segment_bytes=1024)
+    iq = [[(k + i) % 100 - 50 for i in range(128)] for k in range(20)]
+    for k, frame in enumerate(iq):
+        store.append_iq("A", 1000.0 + k, frame)
+    amp, phase = np.linspace(1, 64, 64), np.linspace(-3.0, 3.0, 64)
+    store.append_amp_phase("B", 2000.0, amp, phase)
+    store.close()
+    db.commit()
+    assert store.segment > 1                                    # 超過分段大小時換新檔
+
+    reader = CsiReader(db_path, str(tmp_path / "csi"))
+    frames = reader.frames("A")
+    assert [f.timestamp for f in frames] == [1000.0 + k for k in range(20)]
+    assert all(f.format == FMT_IQ_INT8 for f in frames)
+    assert np.array_equal(frames[3].data.reshape(-1), np.array(iq[3], dtype=np.int8))
+    assert [f.timestamp for f in reader.frames("A", since=1005.0, until=1008.0)] == [1005.0, 1006.0, 1007.0]
+    assert reader.amplitude_matrix("A", limit=4).shape == (4, 64)
+
+    (b,) = reader.frames("B")
+    assert b.format == FMT_AMP_PHASE_F16
+    assert np.allclose(b.amplitude, amp, rtol=1e-3) and np.allclose(b.phase, phase, atol=1e-4)
+    reader.close()
+
+
+def test_truncated_and_corrupt_segments(tmp_path):
+    db, db_path, store = _store(tmp_path, segment_bytes=1024)
+    for k in range(20):
+        store.append_iq("A", float(k), [1, 2] * 64)
+    store.close()
+    db.commit()
+    segments = sorted(os.listdir(tmp_path / "csi"))
+    last = tmp_path / "csi" / segments[-1]
+    size = last.stat().st_size
+    os.truncate(last, size - 10)                                # 寫入中斷：最後一個訊框不完整
+    os.remove(tmp_path / "csi" / segments[0])                   # 已被淘汰的分段
+
+    reader = CsiReader(db_path, str(tmp_path / "csi"))
+    got = [f.timestamp for f in reader.frames("A")]
+    assert 0.0 not in got and 19.0 not in got and 18.0 in got  # 只略過讀不到的訊框
+    reader.close()
+
+    with open(tmp_path / "csi" / segments[1], "r+b") as f:
+        f.write(b"JUNK")
+    reader = CsiReader(db_path, str(tmp_path / "csi"))
+    with pytest.raises(ValueError):
+        reader.frames("A")
+    reader.close()
+
+
+def test_retention_prunes_old_segments_and_index(tmp_path):
+    db, db_path, store = _store(tmp_path, segment_bytes=2048)
+    for k in range(60):
+        store.append_iq("A", float(k), [k % 7] * 128)
+    store.close()
+    db.commit()
+    directory = tmp_path / "csi"
+    segments = sorted(os.listdir(directory))
+    assert len(segments) >= 4
+    now = time.time()
+    for name in segments[:2]:                                   # 最舊的兩個分段已過期
+        os.utime(directory / name, (now - 10 * 86400, now - 10 * 86400))
+
+    job = RetentionJob(db_path, RetentionPolicy(csi_days=7, chunk_size=5, pause=0), csi_dir=str(directory))
+    removed = job.run_once(now=now)
+    remaining = sorted(os.listdir(directory))
+    assert removed["csi_segments"] == 2 and remaining == segments[2:]
+    first_segment = int(remaining[0][4:12])
+    assert db.execute("SELECT MIN(segment) FROM csi_frames").fetchone()[0] == first_segment
+    assert removed["csi_frames"] == 60 - db.execute("SELECT COUNT(*) FROM csi_frames").fetchone()[0]
+
+    # 總大小上限：從最舊的刪起，寫入中的最新分段一定保留
+    segs, _ = csi_store.prune(db, str(directory), max_bytes=1, chunk_size=5, pause=0)
+    assert os.listdir(directory) == [segments[-1]] and segs == len(remaining) - 1
+    assert db.execute("SELECT COUNT(DISTINCT segment) FROM csi_frames").fetchone()[0] == 1
+
+    reader = CsiReader(db_path, str(directory))
+    assert len(reader.frames("A")) == db.execute("SELECT COUNT(*) FROM csi_frames").fetchone()[0]
+    reader.close()
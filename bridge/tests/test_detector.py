@@ -0,0 +1,56 @@
+"""本地跌倒偵測引擎測試"""
+
+import random
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import bridge
+from detector import FALL, SAFE, FallDetector, extract_features, features_one
+
+
+def _baseline(rng, n=10):
+    return [30 + rng.gauss(0, 5) for _ in range(n)]
+
+
+def test_scalar_and_vectorized_features_agree():
+    rng = random.Random(3)
+    d = FallDetector()
+    for _ in range(50):
+        window = [rng.uniform(0, 100) for _ in range(d.cfg.window)]
+        assert features_one(window, 70.0, d.cfg) == pytest.approx(
+            extract_features(np.array([window]), 70.0, d.cfg)[0].tolist())
+
+
+def test_fall_shape_vs_normal_activity():
+    rng = random.Random(1)
+    d = FallDetector()
+    fall = _baseline(rng) + [40, 88, 60, 12, 10]
+    normal = _baseline(rng) + [35, 42, 38, 33, 31]
+    assert d.evaluate(fall, 70.0).verdict == FALL
+    assert d.evaluate(normal, 70.0).verdict == SAFE
+    assert d.evaluate(fall[:5], 70.0) is None
+
+
+def test_score_series_matches_online_evaluation():
+    rng = random.Random(2)
+    d = FallDetector()
+    series = _baseline(rng, 40) + [40, 90, 70, 15, 12] + _baseline(rng, 10)
+    probs = d.score_series(np.array(series), 70.0)
+    for k in range(d.cfg.window - 1, len(series)):
+        assert probs[k] == pytest.approx(d.evaluate(series[:k + 1], 70.0).probability)
+
+
+def test_bridge_threshold_is_a_floor_under_the_detector(tmp_path):
+    cfg = dict(bridge.DEFAULT_CONFIG, db_path=str(tmp_path / "d.db"), csi_dir=str(tmp_path / "csi"),
+               backend_url="http://127.0.0.1:9", quiet=True, metrics_port=0, detector="local",
+               adaptive_threshold=False, fall_threshold=70.0, fall_cooldown=0)
+    b = bridge.WiCareBridge(cfg, mode="sim")
+    assert b.detector is not None
+    for score in [30] * 20:
+        b.process_sample("D", {"movement_score": score, "motion_detected": False})
+    assert b.m_fall_alerts.value == 0
+    b.process_sample("D", {"movement_score": 96, "motion_detected": False})
+    assert b.m_fall_alerts.value == 1                          # 偵測引擎判定 SAFE 也不能壓下超過閾值的讀數
+    b.cleanup()
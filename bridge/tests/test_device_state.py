@@ -0,0 +1,54 @@
+"""每設備偵測狀態測試"""
+
+import random
+import sqlite3
+
+import device_state
+from device_state import ARMED, TRIGGERED, DeviceStateStore
+
+
+def test_threshold_adapts_per_device():
+    store = DeviceStateStore(default_threshold=70, k=3, window=100, warmup=30, threshold_min=20, threshold_max=95)
+    rng = random.Random(1)
+    assert store.observe("quiet", 5.0, 0) == 70  # 暖機中沿用預設
+    for t in range(1, 500):
+        store.observe("quiet", rng.gauss(5, 1), t)
+        store.observe("busy", rng.gauss(40, 8), t)
+
+    assert store.threshold("quiet") == 20                 # 夾在下限
+    assert 55 < store.threshold("busy") < 75
+    # 單筆突波不會把噪音底拉高
+    before = store.describe("busy")["mean"]
+    store.observe("busy", 99.0, 500)
+    assert store.describe("busy")["mean"] - before < 0.2
+
+
+def test_cooldown_is_independent_per_device():
+    store = DeviceStateStore(cooldown=30, adaptive=False)
+    assert store.try_alert("A", 100)
+    assert not store.try_alert("A", 110)
+    assert store.try_alert("B", 110)                      # 另一台設備不受影響
+
+    store.observe("A", 90.0, 131)                         # 冷卻結束但仍在閾值以上
+    assert store.describe("A")["state"] == "hold"
+    assert not store.try_alert("A", 132)
+    store.observe("A", 10.0, 133)
+    assert store.state[store.slots["A"]] == ARMED
+    assert store.try_alert("A", 134)
+
+
+def test_state_survives_restart(tmp_path):
+    db = sqlite3.connect(str(tmp_path / "s.db"))
+    device_state.init_schema(db)
+    store = DeviceStateStore(warmup=10, threshold_min=0)
+    for t in range(50):
+        store.observe("A", 20.0 + t % 3, t)
+    store.try_alert("A", 50)
+    db.executemany(device_state.UPSERT_SQL, store.dirty_rows())
+    assert store.dirty_rows() == []
+
+    restored = DeviceStateStore(warmup=10, threshold_min=0)
+    assert restored.load(db) == 1
+    assert restored.threshold("A") == store.threshold("A") != restored.default_threshold
+    assert restored.state[restored.slots["A"]] == TRIGGERED
+    assert not restored.try_alert("A", 60)
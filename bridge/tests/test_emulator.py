@@ -0,0 +1,93 @@
+"""ESP32 設備模擬器測試"""
+
+import asyncio
+import json
+
+import bench
+from emulator import IMPACT_AT, EmulatedDevice, Fleet, Profile, running_fleet
+from ingest import HttpStatusReader
+
+
+def test_waveforms_follow_scenarios():
+    dev = EmulatedDevice("A", seed=1, csi_subcarriers=16)
+    t0 = dev.booted + 100
+    idle = dev.status(t0)
+    assert not idle["falling"] and not idle["motion_detected"]
+    assert abs(idle["magnitude"] - 1.0) < 0.5
+    assert len(idle["raw_csi"]) == 32
+
+    dev.start_scenario("backward", delay=1.0, hold=5.0, now=t0)
+    assert not dev.status(t0 + 1.0 + IMPACT_AT - 0.1)["falling"]             # 自由落體中尚未判定
+    impact = dev.status(t0 + 1.0 + IMPACT_AT + 0.07)
+    assert impact["falling"] and impact["movement_score"] >= 75 and impact["magnitude"] > 2
+    lying = dev.status(t0 + 1.0 + IMPACT_AT + 2)
+    assert lying["status"] == "fall" and lying["accelX"] < -0.9             # 重力換到 -X 軸
+    assert not dev.status(t0 + 1.0 + IMPACT_AT + 5.1)["falling"]            # hold 後自動清除
+    assert dev.scenario is None
+
+    dev.start_scenario("near_fall", now=t0)
+    assert not any(dev.status(t0 + k * 0.05)["falling"] for k in range(40))
+    dev.trigger_fall(now=t0)
+    assert dev.status(t0)["falling"]
+    dev.clear_fall()
+    assert not dev.status(t0)["falling"]
+
+
+async def _http(port: int, method: str, path: str, body: bytes = b"") -> tuple[int, dict]:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: x\r\nContent-Length: {len(body)}\r\n"
+                 f"Connection: close\r\n\r\n".encode() + body)
+    raw = await reader.read()
+    writer.close()
+    head, _, payload = raw.partition(b"\r\n\r\n")
+    return int(head.split(b" ")[1]), json.loads(payload)
+
+
+def test_http_api_shared_and_per_port():
+    devices = [EmulatedDevice(f"E{i}", profile=Profile(latency=0, jitter=0)) for i in range(3)]
+    devices.append(EmulatedDevice("BAD", profile=Profile(latency=0, jitter=0, error_rate=1.0)))
+
+    async def scenario(listing):
+        by_id = {d["device_id"]: d for d in listing}
+        readers = {k: HttpStatusReader(d["esp32_ip"], d["esp32_port"], d.get("esp32_path", "/status"))
+                   for k, d in by_id.items()}
+        first = await readers["E1"].read()
+        assert first["device_id"] == "E1" and first["status"] == "safe"
+        assert await readers["BAD"].read() is None                          # 500
+
+        e1 = by_id["E1"]
+        base = e1.get("esp32_path", "/status").removesuffix("/status")
+        assert (await _http(e1["esp32_port"], "POST", base + "/trigger-fall"))[0] == 200
+        assert (await readers["E1"].read())["falling"]
+        assert not (await readers["E0"].read())["falling"]                 # 只影響該設備
+        code, body = await _http(e1["esp32_port"], "POST", base + "/scenario", b'{"kind": "nope"}')
+        assert code == 400 and "nope" in body["error"]
+        assert (await _http(e1["esp32_port"], "GET", base + "/health"))[1]["status"] == "ok"
+
+        await _http(e1["esp32_port"], "POST", base + "/offline", b'{"seconds": 30}')
+        try:
+            await readers["E1"].read()
+            raise AssertionError("離線設備不應回應")
+        except (ConnectionError, asyncio.IncompleteReadError, OSError):
+            pass
+        for r in readers.values():
+            await r.close()
+
+    for mode in ({"port": 0}, {"base_port": 0}):
+        for d in devices:
+            d.clear_fall()
+            d.offline_until = 0.0
+        fleet = Fleet(devices)
+        with running_fleet(fleet, **mode):
+            listing = fleet.device_list()
+            assert len({d["esp32_port"] for d in listing}) == (1 if "port" in mode else 4)
+            asyncio.run(scenario(listing))
+        assert fleet.stats.errors == 1 and fleet.stats.resets >= 1
+
+
+def test_bench_fleet_polls_over_http():
+    r = bench.run_fleet(40, duration=2.0, interval=0.25, profile="ideal", seed=3)
+    assert r["devices"] == 40
+    assert r["coverage"] > 0.8 and r["failures"] == 0
+    assert r["emulator"]["requests"] >= r["samples"]
+    assert r["db_rows"] >= r["samples"]
@@ -0,0 +1,142 @@
+"""多設備擷取引擎測試 (故障隔離、自適應輪詢排程)"""
+
+import asyncio
+import json
+import random
+
+from emulator import EmulatedDevice, Fleet, Profile
+from ingest import (AsyncIngestionEngine, CallableReader, DeviceHealth, DeviceSpec, HttpStatusReader, PollPolicy,
+                    valid_reading)
+
+
+BODIES = {
+    "/good": json.dumps({"movement_score": 5.0}),
+    "/list": json.dumps([1, 2, 3]),
+    "/null": json.dumps({"movement_score": None}),
+    "/text": "<html>busy</html>",
+}
+
+
+async def _serve_bodies(reader, writer):
+    """每個路徑固定回應 BODIES 的內容；/slow 不回應 (逾時)"""
+    try:
+        while True:
+            head = await reader.readuntil(b"\r\n\r\n")
+            path = head.split(b" ", 2)[1].decode()
+            if path == "/slow":
+                await asyncio.sleep(10)
+            body = BODIES[path].encode()
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                         b"Content-Length: %d\r\n\r\n%s" % (len(body), body))
+            await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+def test_valid_reading():
+    assert valid_reading({"movement_score": 3}) and valid_reading({"falling": True})
+    for bad in ([1], None, "x", {"movement_score": None}, {"movement_score": "5"},
+                {"movement_score": float("nan")}, {"movement_score": True}):
+        assert not valid_reading(bad)
+
+
+def test_one_failing_device_does_not_stop_the_others():
+    async def scenario():
+        server = await asyncio.start_server(_serve_bodies, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        got = {}
+
+        def on_sample(dev, data):
+            if dev == "BOOM":
+                raise KeyError("threshold")             # 處理讀數時的程式錯誤
+            got.setdefault(dev, []).append(data)
+
+        def on_failure(dev, failures):
+            if dev == "CRASH":
+                raise RuntimeError("監控回呼失敗")       # 迴圈本身的異常 → 重啟
+
+        engine = AsyncIngestionEngine(on_sample=on_sample, on_failure=on_failure,
+                                      policy=PollPolicy(backoff_after=100))
+        for path in ("/good", "/list", "/null", "/text", "/slow"):
+            engine.add_device(DeviceSpec(path.strip("/"), HttpStatusReader("127.0.0.1", port, path),
+                                         interval=0.05, jitter=0, timeout=0.2))
+        engine.add_device(DeviceSpec("BOOM", CallableReader(lambda: {"movement_score": 1.0}, blocking=False),
+                                     interval=0.05, jitter=0))
+        engine.add_device(DeviceSpec("CRASH", CallableReader(lambda: [], blocking=False),
+                                     interval=0.05, jitter=0))
+        asyncio.get_running_loop().call_later(1.0, lambda: setattr(engine, "running", False))
+        await engine.run()                              # duration=None：等所有設備 task 結束
+        server.close()
+        await server.wait_closed()
+        return engine, got
+
+    engine, got = asyncio.run(scenario())
+    st = engine.stats
+    assert list(got) == ["good"] and len(got["good"]) >= 12
+    for dev in ("list", "null", "text", "slow"):
+        assert st.per_device_failures[dev] >= 2         # 計為讀取失敗，持續重試
+    assert st.timeouts >= 2 and st.invalid >= 1
+    assert st.errors == st.per_device_errors["BOOM"] >= 12
+    assert st.restarts >= 2
+
+
+def test_device_health_backoff_and_boost():
+    policy = PollPolicy(backoff_after=3, backoff_max=16.0, fast_factor=0.25, min_interval=0.2, boost_hold=5.0)
+    h = DeviceHealth(1.0, jitter=0.1, policy=policy, rng=random.Random(1))
+    assert all(0.9 <= h.next_delay(0) <= 1.1 for _ in range(50))
+
+    caps = []
+    for _ in range(8):
+        h.record_failure()
+        if h.backing_off:
+            delays = [h.next_delay(0) for _ in range(200)]
+            assert min(delays) >= 1.0                       # 完整抖動，但不短於正常間隔
+            caps.append(max(delays))
+    assert not DeviceHealth(1.0, policy=policy).backing_off
+    assert caps[0] <= 2.0 and caps[1] <= 4.0 and 8.0 < caps[3] <= 16.0 and caps[-1] <= 16.0
+    h.record_success()
+    assert not h.backing_off and h.next_delay(0) <= 1.1
+
+    h.mark_elevated(100.0)
+    assert all(0.225 <= h.next_delay(104.0) <= 0.275 for _ in range(20))
+    assert h.next_delay(105.5) >= 0.9                       # 維持時間過後恢復
+    fast = DeviceHealth(0.5, jitter=0, policy=policy)
+    fast.mark_elevated(0)
+    assert fast.next_delay(1) == 0.2                        # 不低於最短間隔
+    faster = DeviceHealth(0.1, jitter=0, policy=policy)
+    faster.mark_elevated(0)
+    assert faster.next_delay(1) == 0.1                      # 本來就比最短間隔快：維持原間隔
+
+
+def test_engine_spends_polls_on_live_and_elevated_devices():
+    async def scenario():
+        fleet = Fleet([EmulatedDevice(f"E{i}", profile=Profile(latency=0, jitter=0)) for i in range(3)])
+        await fleet.start(port=0)
+        fleet.devices["E1"].go_offline(1.2)                 # 開始時離線，之後恢復
+        fleet.devices["E2"].start_scenario("forward", hold=None)
+
+        got = {}
+        engine = AsyncIngestionEngine(
+            on_sample=lambda dev, data: got.setdefault(dev, []).append(data),
+            policy=PollPolicy(backoff_after=2, backoff_max=0.8, probe_timeout=0.5, min_interval=0.05,
+                              boost_hold=1.0),
+            elevated=lambda dev, data: data["falling"])
+        for device_id in fleet.devices:
+            engine.add_device(DeviceSpec(device_id, HttpStatusReader(fleet.host, fleet.port,
+                                                                     f"/d/{device_id}/status"),
+                                         interval=0.2, jitter=0, timeout=0.5))
+        run = asyncio.create_task(engine.run(2.5))
+        await asyncio.sleep(1.0)
+        assert engine.health["E1"].backing_off and engine.backing_off == 1
+        await run
+        await fleet.stop()
+        return engine, got, fleet
+
+    engine, got, fleet = asyncio.run(scenario())
+    st = engine.stats
+    # 離線期間 (1.2s) 每 0.2s 輪詢應有 6 次讀取；退避後只剩幾次輕量探測
+    assert 1 <= st.probes <= 5 and fleet.stats.per_path["/health"] == st.probes
+    assert st.per_device_failures["E1"] == 0 and len(got["E1"]) >= 3      # 恢復後照常讀取
+    assert len(got["E2"]) >= 2.5 * len(got["E0"]) and st.boosted_polls > 0
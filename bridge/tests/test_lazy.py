@@ -0,0 +1,42 @@
+"""可選依賴延遲載入測試"""
+
+import sys
+import threading
+
+from lazy import available, lazy_import
+
+
+def test_module_loads_on_first_attribute_access(tmp_path, monkeypatch):
+    mark = tmp_path / "loaded"
+    (tmp_path / "wicare_heavy.py").write_text(f"open({str(mark)!r}, 'w').close()\nVALUE = 42\n",
+                                              encoding="utf-8")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.delitem(sys.modules, "wicare_heavy", raising=False)
+
+    mod = lazy_import("wicare_heavy")
+    assert available("wicare_heavy")
+    assert not mark.exists()                # 尚未執行模組程式碼
+    assert mod.VALUE == 42
+    assert mark.exists()
+    assert lazy_import("wicare_heavy") is sys.modules["wicare_heavy"]
+
+
+def test_missing_package():
+    assert not available("wicare_no_such_package")
+    assert lazy_import("wicare_no_such_package") is None
+    assert not available("wicare_no_such_package.sub")
+
+
+def test_concurrent_first_access(tmp_path, monkeypatch):
+    (tmp_path / "wicare_slow.py").write_text("import time\ntime.sleep(0.2)\nVALUE = 7\n", encoding="utf-8")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.delitem(sys.modules, "wicare_slow", raising=False)
+
+    mod = lazy_import("wicare_slow")
+    got = []
+    threads = [threading.Thread(target=lambda: got.append(getattr(mod, "VALUE", None))) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert got == [7] * 4                   # 不會讀到載入到一半的模組
@@ -0,0 +1,91 @@
+"""即時讀數共享記憶體環測試"""
+
+import math
+import multiprocessing
+import time
+
+from live_ring import LiveRingReader, LiveRingWriter
+
+
+def test_latest_window_and_wraparound(tmp_path):
+    path = str(tmp_path / "live.ring")
+    writer = LiveRingWriter(path, slots=4, capacity=8).open()
+    reader = LiveRingReader(path)
+    assert reader.devices() == []
+    assert reader.latest("A") is None
+
+    for k in range(20):
+        writer.publish("A", 1000.0 + k, float(k), k % 5 == 0, 70.0)
+    writer.publish("B", 2000.0, 55.5)
+
+    assert reader.devices() == ["A", "B"]
+    assert reader.latest("A") == (19, 1019.0, 19.0, False, 70.0)
+    assert [r.seq for r in reader.window("A")] == list(range(13, 20))   # capacity - 1 筆
+    assert [r.score for r in reader.window("A", 3)] == [17.0, 18.0, 19.0]
+    assert reader.read_since("A", 2)[0].seq == 13                        # 落後太多：從最舊的有效讀數開始
+    assert reader.read_since("A", 20) == []
+    assert math.isnan(reader.latest("B").threshold)
+    assert reader.generation == 21
+
+    # 槽位用盡時不發布
+    for d in "CDE":
+        writer.publish(d, 1.0, 1.0)
+    assert writer.dropped == 1 and len(reader.devices()) == 4
+    writer.close()
+    reader.close()
+
+
+def test_restart_reuses_slots_and_sequence(tmp_path):
+    path = str(tmp_path / "live.ring")
+    w1 = LiveRingWriter(path, slots=4, capacity=8).open()
+    w1.publish("A", 1.0, 10.0)
+    w1.publish("A", 2.0, 11.0)
+    w1.close()
+
+    reader = LiveRingReader(path)
+    w2 = LiveRingWriter(path, slots=4, capacity=8).open()
+    w2.publish("B", 3.0, 12.0)
+    w2.publish("A", 4.0, 13.0)
+    assert not reader.reopen_if_replaced()
+    assert reader.latest("A").seq == 2
+    assert reader.devices() == ["A", "B"]
+    w2.close()
+
+    # 格式不同：以新檔替換，讀取端重新映射
+    w3 = LiveRingWriter(path, slots=2, capacity=4).open()
+    assert reader.reopen_if_replaced()
+    assert reader.capacity == 4 and reader.devices() == []
+    w3.close()
+    reader.close()
+
+
+def _produce(path: str, count: int, ready):
+    writer = LiveRingWriter(path, slots=2, capacity=4096).open()
+    ready.wait(5)
+    for k in range(count):
+        writer.publish("ESP32-001", time.time(), float(k % 100), False, 70.0)
+        if k % 50 == 0:
+            time.sleep(0.001)
+    writer.close()
+
+
+def test_follow_across_processes(tmp_path):
+    path = str(tmp_path / "live.ring")
+    LiveRingWriter(path, slots=2, capacity=4096).open().close()
+    reader = LiveRingReader(path)
+    ready = multiprocessing.Event()
+    proc = multiprocessing.Process(target=_produce, args=(path, 2000, ready))
+    proc.start()
+
+    seen, lags = [], []
+    ready.set()
+    for device_id, r in reader.follow(from_start=True):
+        seen.append(r.seq)
+        lags.append(time.time() - r.timestamp)
+        if len(seen) == 2000:
+            break
+    proc.join(5)
+    reader.close()
+
+    assert seen == list(range(2000))
+    assert sorted(lags)[len(lags) // 2] < 0.05
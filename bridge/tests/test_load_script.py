@@ -0,0 +1,106 @@
+"""scripts/test_real_fall_data.py 負載測試的統計與後端輪詢測試"""
+
+import importlib.util
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("requests")
+
+_spec = importlib.util.spec_from_file_location(
+    "fall_load", Path(__file__).resolve().parents[2] / "scripts" / "test_real_fall_data.py")
+fall_load = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(fall_load)
+
+
+class FakeApi(BaseHTTPRequestHandler):
+    """/api/auth/verify 與 /api/sensor-data/latest (rows: device_id → 最新一筆)"""
+
+    def do_GET(self):
+        srv = self.server
+        if self.headers.get("Authorization") != "Bearer good":
+            return self._reply(401, {"success": False})
+        if self.path.startswith("/api/auth/verify"):
+            return self._reply(200, {"success": True})
+        device_id = self.path.rsplit("device_id=", 1)[-1]
+        with srv.lock:
+            srv.polled.append(device_id)
+            row = srv.rows.get(device_id)
+        self._reply(200, {"success": True, "data": row})
+
+    def _reply(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def api():
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), FakeApi)
+    srv.rows, srv.polled, srv.lock = {}, [], threading.Lock()
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    yield srv
+    srv.shutdown()
+    srv.server_close()
+
+
+def test_percentiles_use_nearest_rank():
+    assert fall_load.percentiles([]) == {"count": 0}
+    p = fall_load.percentiles([k / 1000 for k in range(100, 0, -1)])   # 1..100 ms，未排序
+    assert p["count"] == 100 and p["max"] == pytest.approx(100)
+    assert [round(p[k]) for k in ("p50", "p90", "p95", "p99")] == [50, 90, 95, 99]
+    assert fall_load.percentiles([0.25])["p50"] == pytest.approx(250)
+
+
+def test_latencies_pair_each_trigger_with_its_first_detection():
+    test = fall_load.LoadTest([], [], detect_timeout=5)
+    test.session.close()
+    for device_id, sent, ok in (("A", 10.0, True), ("A", 20.0, True), ("B", 10.0, True), ("C", 10.0, False)):
+        test.actions.append({"device_id": device_id, "action": "trigger-fall", "scheduled": sent,
+                             "sent": sent, "acked": sent + 0.01, "ok": ok})
+    test.actions.append({"device_id": "A", "action": "clear-fall", "scheduled": 13.0,
+                         "sent": 13.0, "acked": 13.01, "ok": True})
+    # A：第一次 0.5 s 後偵測 (之後的重複不算)、第二次逾時；B：觸發前的偵測不算，1.0 s 後偵測
+    seen = {"A": [10.5, 11.0, 26.0], "B": [9.0, 11.0], "C": [10.2]}
+    latencies, missed = test._latencies(seen)
+    assert sorted(latencies) == pytest.approx([0.5, 1.0]) and missed == 1
+    assert fall_load.percentiles(latencies)["max"] == pytest.approx(1000)
+
+
+def test_backend_watcher_polls_only_pending_devices(api):
+    base = f"http://127.0.0.1:{api.server_port}"
+    bad = fall_load.BackendWatcher(base, "wrong")
+    assert not bad.check() and "401" in str(bad.error)
+    bad.session.close()
+
+    watcher = fall_load.BackendWatcher(base, "good")
+    assert watcher.check()
+    api.rows["A"] = {"id": 1, "device_id": "A", "motion_detected": 1}
+    api.rows["B"] = {"id": 7, "device_id": "B", "motion_detected": 0}
+    watcher.poll_once()
+    assert api.polled == []                                     # 尚未觸發的設備不輪詢
+
+    watcher.watch("A")
+    watcher.watch("B")
+    watcher.poll_once()
+    assert list(watcher.seen) == ["A"] and sorted(api.polled) == ["A", "B"]
+    watcher.watch("A")
+    watcher.poll_once()
+    assert len(watcher.seen["A"]) == 1                          # 同一筆跌倒讀數不重複計入
+    api.rows["A"] = {"id": 2, "device_id": "A", "motion_detected": 1}
+    api.rows["B"] = {"id": 8, "device_id": "B", "motion_detected": 1}
+    watcher.poll_once()
+    assert len(watcher.seen["A"]) == 2 and len(watcher.seen["B"]) == 1
+    api.polled.clear()
+    watcher.poll_once()
+    assert api.polled == []
+    watcher.session.close()
@@ -0,0 +1,38 @@
+"""監控指標測試"""
+
+import urllib.request
+
+from metrics import MetricsServer, Registry
+
+
+def test_render_prometheus_text():
+    reg = Registry()
+    reg.counter("x_total", "計數", ("result",)).labels("ok").inc(3)
+    depth = {"n": 7}
+    reg.gauge("x_depth", "深度", fn=lambda: depth["n"])
+    h = reg.histogram("x_seconds", "耗時", ("stage",), buckets=(0.01, 0.1))
+    for v in (0.005, 0.05, 0.05, 2.0):
+        h.labels("db").observe(v)
+
+    text = reg.render()
+    assert 'x_total{result="ok"} 3' in text
+    assert "x_depth 7" in text
+    assert 'x_seconds_bucket{stage="db",le="0.01"} 1' in text
+    assert 'x_seconds_bucket{stage="db",le="0.1"} 3' in text
+    assert 'x_seconds_bucket{stage="db",le="+Inf"} 4' in text
+    assert 'x_seconds_count{stage="db"} 4' in text
+    assert h.labels("db").quantile(0.5) == 0.1
+    # 同名重複註冊回傳同一個指標
+    assert reg.counter("x_total", "計數", ("result",)) is reg.get("x_total")
+
+
+def test_metrics_endpoint():
+    reg = Registry()
+    reg.counter("wicare_samples_total", "樣本").inc()
+    server = MetricsServer(reg, port=0).start()
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{server.port}/metrics", timeout=5) as r:
+            assert r.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+            assert "wicare_samples_total 1" in r.read().decode()
+    finally:
+        server.stop()
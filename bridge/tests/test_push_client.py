@@ -0,0 +1,207 @@
+"""推送管線 (游標 + 序號去重) 測試"""
+
+import json
+import sqlite3
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip("requests")
+
+import push_client
+from push_client import PushClient, SequenceAllocator
+from writer import BatchWriter
+
+INSERT_SQL = ("INSERT INTO sensor_data (device_id, movement_score, motion_detected, threshold, timestamp, seq) "
+              "VALUES (?,?,?,?,?,?)")
+
+
+class FakeBackend(BaseHTTPRequestHandler):
+    """與 server/index.js /push-batch 相同的高水位去重；mode 可模擬斷線與確認遺失"""
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        srv = self.server
+        length = int(self.headers["Content-Length"])
+        body = json.loads(self.rfile.read(length))
+        if srv.mode == "down":
+            return self._reply(503, {})
+        if srv.mode == "busy":      # 限流一次
+            srv.mode = "up"
+            return self._reply(429, {})
+        if srv.limit and length > srv.limit:
+            return self._reply(413, {})
+        if any(r["device_id"] == srv.poison for r in body["readings"]):
+            return self._reply(400, {})
+        accepted = duplicates = 0
+        with srv.lock:
+            srv.requests.append(len(body["readings"]))
+            for r in body["readings"]:
+                if r["seq"] <= srv.hwm.get(r["device_id"], -1):
+                    duplicates += 1
+                    continue
+                srv.hwm[r["device_id"]] = r["seq"]
+                srv.rows.append((r["device_id"], r["seq"]))
+                accepted += 1
+        if srv.mode == "lose-ack":   # 已處理，但回應在途中遺失
+            srv.mode = "up"
+            return self._reply(502, {})
+        self._reply(200, {"success": True, "accepted": accepted, "duplicates": duplicates})
+
+    def _reply(self, code, payload):
+        out = json.dumps(payload).encode()
+        self.send_response(code)
+        self.send_header("Content-Length", str(len(out)))
+        self.end_headers()
+        self.wfile.write(out)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def backend():
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), FakeBackend)
+    srv.mode, srv.lock, srv.hwm, srv.rows, srv.requests = "up", threading.Lock(), {}, [], []
+    srv.limit, srv.poison = 0, None
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    yield srv, f"http://127.0.0.1:{srv.server_address[1]}"
+    srv.shutdown()
+    srv.server_close()
+
+
+def _make_db(path) -> str:
+    db = sqlite3.connect(str(path))
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("CREATE TABLE sensor_data (id INTEGER PRIMARY KEY AUTOINCREMENT, device_id TEXT NOT NULL, "
+               "movement_score REAL NOT NULL, motion_detected INTEGER DEFAULT 0, threshold REAL, "
+               "raw_csi TEXT, timestamp DATETIME DEFAULT CURRENT_TIMESTAMP)")
+    db.execute("INSERT INTO sensor_data (device_id, movement_score) VALUES ('OLD', 1.0)")  # 升級前的資料
+    push_client.init_schema(db)
+    db.commit()
+    db.close()
+    return str(path)
+
+
+def _produce(writer, seqs, devices, count):
+    for k in range(count):
+        for d in devices:
+            writer.write(INSERT_SQL, (d, float(k % 90), 0, 70.0, "2026-01-01 00:00:00", seqs.next(d)))
+    writer.flush()
+
+
+def _wait(cond, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline and not cond():
+        time.sleep(0.02)
+    return cond()
+
+
+def test_outage_catch_up_is_exactly_once_and_batched(tmp_path, backend):
+    srv, url = backend
+    path = _make_db(tmp_path / "w.db")
+    seqs = SequenceAllocator(path)
+    client = PushClient(url, path, batch_size=1000, flush_interval=0.05, backoff_base=0.05, backoff_max=0.1)
+    writer = BatchWriter(path, flush_interval=0.01, on_commit=lambda *a: client.notify()).start()
+    client.start()
+    devices = ["A", "B", "C"]
+
+    _produce(writer, seqs, devices, 20)
+    assert _wait(lambda: len(srv.rows) == 60)
+
+    srv.mode = "down"                                   # 後端斷線期間持續寫入
+    _produce(writer, seqs, devices, 1000)
+    assert _wait(lambda: client.stats.failures >= 2)
+    assert client.queue_depth > 0
+    srv.mode = "lose-ack"                               # 恢復時第一批確認遺失 → 重送
+
+    assert _wait(lambda: len(srv.rows) == 3060 and client.queue_depth == 0)
+    client.close()
+    writer.close()
+
+    assert "OLD" not in {d for d, _ in srv.rows}        # 啟用前的歷史資料不補送
+    for d in devices:
+        got = [s for dev, s in srv.rows if dev == d]
+        assert got == list(range(got[0], got[0] + 1020))  # 每台設備恰好一次、連續、依序
+    assert client.stats.duplicates >= 1 and client.stats.replayed >= 3000 - 1000
+    assert max(srv.requests) == 1000                    # 補送使用大批次
+    assert len(srv.requests) < 15
+
+
+def test_restart_resumes_from_cursor(tmp_path, backend):
+    srv, url = backend
+    path = _make_db(tmp_path / "w.db")
+    writer = BatchWriter(path, flush_interval=0.01).start()
+    seqs = SequenceAllocator(path)
+    _produce(writer, seqs, ["A"], 50)
+    first = PushClient(url, path, flush_interval=0.05).start()
+    assert _wait(lambda: len(srv.rows) == 50)
+    first.close()
+    seqs.close()
+
+    # 「重啟」：新的序號配置器接續 MAX(seq)，新的推送器從游標接續
+    seqs = SequenceAllocator(path)
+    srv.mode = "down"
+    _produce(writer, seqs, ["A", "B"], 30)
+    srv.mode = "up"
+    second = PushClient(url, path, flush_interval=0.05).start()
+    assert _wait(lambda: len(srv.rows) == 110)
+    second.close()
+    writer.close()
+
+    a = [s for d, s in srv.rows if d == "A"]
+    assert a == sorted(set(a)) and len(a) == 80
+    assert a[50] > a[49]
+
+
+def test_oversized_and_rejected_batches_are_split_not_dropped(tmp_path, backend):
+    srv, url = backend
+    srv.limit, srv.poison, srv.mode = 20_000, "BAD", "busy"
+    path = _make_db(tmp_path / "w.db")
+    writer = BatchWriter(path, flush_interval=0.01).start()
+    seqs = SequenceAllocator(path)
+    _produce(writer, seqs, ["A", "BAD", "B"], 1)
+    _produce(writer, seqs, ["A", "B"], 199)
+    client = PushClient(url, path, batch_size=1000, max_body=10_000_000, flush_interval=0.05,
+                        backoff_base=0.05, backoff_max=0.1)
+    client.start()
+    assert _wait(lambda: len(srv.rows) == 400 and client.queue_depth == 0)
+    client.close()
+    writer.close()
+
+    for d in ("A", "B"):
+        got = [s for dev, s in srv.rows if dev == d]
+        assert got == list(range(got[0], got[0] + 200))      # 429 / 413 都沒有遺失讀數
+    st = client.stats
+    assert st.failures == 1 and st.rejected == 1 and st.splits > 0   # 只略過被隔離出來的那一筆
+    assert client.max_body <= 20_000 and max(srv.requests) < 400
+
+
+def test_sequence_allocator_survives_clock_going_backwards(tmp_path):
+    path = _make_db(tmp_path / "w.db")
+
+    class Clock:
+        t = 2_000_000_000.0
+
+        def time(self):
+            return self.t
+
+    clock = Clock()
+    seqs = SequenceAllocator(path, clock)
+    assert seqs.next("A") == 2_000_000_000_001
+    assert seqs.next("A") == 2_000_000_000_002
+    db = sqlite3.connect(path)
+    db.execute(INSERT_SQL, ("A", 1.0, 0, None, None, 2_000_000_000_002))
+    db.commit()
+    seqs.close()
+
+    clock.t -= 3600                                     # 時鐘倒退一小時後重啟
+    again = SequenceAllocator(path, clock)
+    assert again.next("A") == 2_000_000_000_003
+    assert again.next("B") == int(clock.t * 1000) + 1
+    with pytest.raises(sqlite3.IntegrityError):         # 同設備同序號只能有一筆
+        db.execute(INSERT_SQL, ("A", 2.0, 0, None, None, 2_000_000_000_002))
+    db.close()
+    again.close()
@@ -0,0 +1,104 @@
+"""離線批次重新評分測試"""
+
+import random
+import sqlite3
+from datetime import datetime, timezone
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from detector import AMBIGUOUS, FALL, FallDetector
+from device_state import DeviceStateStore
+from rescore import DeviceRescorer, RescoreOptions, iter_days, rescore
+
+T0 = 1_735_000_000  # 2024-12-24 00:26:40 UTC
+
+
+def _stamp(t: float) -> str:
+    return datetime.fromtimestamp(t, timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _series(seed: int, n: int, falls=()):
+    rng = random.Random(seed)
+    scores = [max(0.0, 30 + rng.gauss(0, 8)) for _ in range(n)]
+    for k in falls:
+        scores[k:k + 5] = [40, 90, 70, 15, 12]
+    for k in range(0, n, 997):
+        scores[k] = 85.0  # 單筆突波
+    motion = [rng.random() < 0.001 for _ in range(n)]
+    return scores, motion
+
+
+def _make_db(path, devices: dict, events=()):
+    db = sqlite3.connect(str(path))
+    db.execute("CREATE TABLE sensor_data (id INTEGER PRIMARY KEY AUTOINCREMENT, device_id TEXT NOT NULL, "
+               "movement_score REAL NOT NULL, motion_detected INTEGER DEFAULT 0, threshold REAL, "
+               "raw_csi TEXT, timestamp DATETIME DEFAULT CURRENT_TIMESTAMP)")
+    db.execute("CREATE TABLE events (id INTEGER PRIMARY KEY AUTOINCREMENT, device_id TEXT, type TEXT NOT NULL, "
+               "is_false_alarm INTEGER DEFAULT 0, timestamp DATETIME DEFAULT CURRENT_TIMESTAMP)")
+    for device_id, (scores, motion, step) in devices.items():
+        db.executemany("INSERT INTO sensor_data (device_id, movement_score, motion_detected, timestamp) "
+                       "VALUES (?,?,?,?)",
+                       [(device_id, s, int(m), _stamp(T0 + k * step)) for k, (s, m) in enumerate(zip(scores, motion))])
+    db.executemany("INSERT INTO events (device_id, type, is_false_alarm, timestamp) VALUES (?,?,?,?)",
+                   [(d, "fall_alert", fa, _stamp(t)) for d, t, fa in events])
+    db.commit()
+    return db
+
+
+def _live_alerts(scores, motion, step, threshold, cooldown):
+    """與 WiCareBridge._detect 相同的逐筆判定 (無 AI)"""
+    store = DeviceStateStore(default_threshold=threshold, cooldown=cooldown, adaptive=False)
+    detector = FallDetector()
+    alerts = []
+    for k, (score, m) in enumerate(zip(scores, motion)):
+        now = T0 + k * step
+        store.observe("A", score, now)
+        det = detector.evaluate(scores[max(0, k + 1 - detector.cfg.window):k + 1], threshold)
+        if m or (det is None and score > threshold) or (det is not None and (
+                det.verdict == FALL or (det.verdict == AMBIGUOUS and det.peak > threshold))):
+            if store.try_alert("A", now):
+                alerts.append(now)
+    return alerts
+
+
+def test_matches_online_detection_across_day_chunks(tmp_path):
+    step = 7.0  # 約 1.8 日，跨過日界
+    scores, motion = _series(1, 22000, falls=(500, 9000, 9012, 15000, 21000))
+    db = _make_db(tmp_path / "r.db", {"A": (scores, motion, step)})
+
+    opts = RescoreOptions(thresholds=(60.0, 70.0, 80.0), cooldown=30.0)
+    scorer = DeviceRescorer(opts)
+    days = list(iter_days(db, "A", opts.since, opts.until, chunk_rows=1000))
+    assert len(days) == 2
+    for ts, s, m in days:
+        scorer.feed(ts, s, m)
+
+    assert scorer.samples == len(scores)
+    for threshold, got in zip(opts.thresholds, scorer.alert_times):
+        assert got == _live_alerts(scores, motion, step, threshold, 30.0)
+
+
+def test_precision_recall_against_labelled_events(tmp_path):
+    a_scores, a_motion = _series(2, 5000, falls=(1000, 3000))
+    b_scores, b_motion = _series(3, 5000, falls=(2000,))
+    events = [
+        ("A", T0 + 1001, 0),      # 真實跌倒 (撞擊峰值在視窗內)
+        ("A", T0 + 3001, 0),
+        ("A", T0 + 4500, 0),      # 資料中沒有跌倒跡象 → FN
+        ("B", T0 + 2001, 1),      # 已標記誤報
+    ]
+    path = tmp_path / "r.db"
+    _make_db(path, {"A": (a_scores, a_motion, 1.0), "B": (b_scores, b_motion, 1.0)}, events).close()
+
+    opts = RescoreOptions(thresholds=(70.0,), match_window=10.0)
+    serial = rescore(str(path), opts, workers=1)
+    pooled = rescore(str(path), opts, workers=2)
+    total = pooled["totals"][0]
+
+    assert total == serial["totals"][0]
+    assert (total.tp, total.fn, total.false_alarms_hit) == (2, 1, 1)
+    assert total.fp == total.alerts - 2
+    assert total.recall == pytest.approx(2 / 3)
+    assert sorted(d["device_id"] for d in pooled["devices"]) == ["A", "B"]
@@ -0,0 +1,31 @@
+"""RingBuffer 增量統計測試 (與逐筆重算比對)"""
+
+import random
+
+import pytest
+
+from ring_buffer import RingBuffer
+
+
+@pytest.mark.parametrize("capacity,window", [(30, 20), (5, 5), (1000, 200)])
+def test_incremental_stats_match_recompute(capacity, window):
+    rng = random.Random(42)
+    buf = RingBuffer(capacity, window)
+    history = []
+    for _ in range(capacity * 3):
+        score = rng.uniform(0, 100)
+        motion = rng.random() < 0.1
+        buf.append(score, motion)
+        history.append((score, motion))
+
+        recent = history[-window:]
+        scores = [s for s, _ in recent]
+        mean = sum(scores) / len(scores)
+        assert buf.mean == pytest.approx(mean)
+        assert buf.max == max(scores)
+        assert buf.motion_count == sum(1 for _, m in recent if m)
+        assert buf.variance == pytest.approx(sum((s - mean) ** 2 for s in scores) / len(scores), abs=1e-6)
+
+    assert len(buf) == capacity
+    assert buf.last(3) == [s for s, _ in history[-3:]]
+    assert buf.latest() == history[-1][0]
@@ -0,0 +1,73 @@
+"""時間分桶彙總與資料保留測試"""
+
+import sqlite3
+import time
+
+import rollup
+from rollup import RetentionJob, RetentionPolicy, RollupAggregator, query_history
+
+T0 = 1_700_000_000  # 2023-11-14 22:13:20 UTC
+
+
+def _db(tmp_path):
+    path = str(tmp_path / "r.db")
+    conn = sqlite3.connect(path)
+    conn.execute("""
+        CREATE TABLE sensor_data (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            device_id TEXT, movement_score REAL, motion_detected INTEGER, threshold REAL,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    rollup.init_schema(conn)
+    conn.commit()
+    return path, conn
+
+
+def test_aggregates_and_merges_partial_buckets(tmp_path):
+    _, conn = _db(tmp_path)
+    agg = RollupAggregator(lambda sql, params: conn.execute(sql, params))
+
+    # 三個 1 分鐘桶；中途 flush 一次模擬重啟，upsert 必須合併而不是覆蓋
+    for k in range(180):
+        agg.add("A", T0 - T0 % 3600 + k, float(k % 60), k % 10 == 0)
+        if k == 30:
+            agg.flush()
+    agg.flush()
+
+    rows = conn.execute(
+        "SELECT min_score, max_score, sum_score, count, motion_count FROM sensor_rollup_1m ORDER BY bucket"
+    ).fetchall()
+    assert rows == [(0.0, 59.0, 1770.0, 60, 6)] * 3
+    hour = conn.execute("SELECT min_score, max_score, count, motion_count FROM sensor_rollup_1h").fetchall()
+    assert hour == [(0.0, 59.0, 180, 18)]
+
+    resolution, hist = query_history(conn, "A", "2023-11-14 22:00:00", "2023-11-19 00:00:00")
+    assert resolution == "1m"
+    assert [r[1] for r in hist] == [29.5] * 3
+
+
+def test_flush_stale_closes_idle_devices(tmp_path):
+    _, conn = _db(tmp_path)
+    agg = RollupAggregator(lambda sql, params: conn.execute(sql, params))
+    agg.add("A", T0, 1.0, False)
+    agg.flush_stale(T0 + 5)
+    assert conn.execute("SELECT COUNT(*) FROM sensor_rollup_1m").fetchone()[0] == 0
+    agg.flush_stale(T0 + 120)
+    assert conn.execute("SELECT COUNT(*) FROM sensor_rollup_1m").fetchone()[0] == 1
+
+
+def test_retention_deletes_in_chunks(tmp_path):
+    path, conn = _db(tmp_path)
+    old = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(T0 - 40 * 86400))
+    new = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(T0))
+    conn.executemany(
+        "INSERT INTO sensor_data (device_id, movement_score, motion_detected, timestamp) VALUES ('A', 1, 0, ?)",
+        [(old,)] * 2500 + [(new,)] * 10,
+    )
+    conn.commit()
+
+    job = RetentionJob(path, RetentionPolicy(raw_days=30, chunk_size=1000, pause=0))
+    removed = job.run_once(now=T0)
+    assert removed["sensor_data"] == 2500
+    assert conn.execute("SELECT COUNT(*) FROM sensor_data").fetchone()[0] == 10
@@ -0,0 +1,72 @@
+"""資料庫結構 / 索引維護與讀取 API 測試"""
+
+import sqlite3
+
+import push_client
+import schema
+
+
+def _db() -> sqlite3.Connection:
+    db = sqlite3.connect(":memory:")
+    schema.init_schema(db)
+    push_client.init_schema(db)
+    return db
+
+
+def _plan(db, sql, params) -> str:
+    return " | ".join(r[3] for r in db.execute("EXPLAIN QUERY PLAN " + sql, params))
+
+
+def test_ensure_indexes_creates_and_repairs():
+    db = _db()
+    # 舊版後端先建立的資料庫：較窄的 (device_id, timestamp DESC) 索引
+    db.execute("CREATE INDEX idx_sensor_data_device ON sensor_data(device_id, timestamp DESC)")
+    assert "idx_sensor_data_device" in schema.verify(db)
+
+    changes = schema.ensure_indexes(db)
+    assert "重建 idx_sensor_data_device" in changes and "建立 idx_events_open" in changes
+    assert schema.verify(db) == []
+    assert schema.ensure_indexes(db) == []                  # 已正確時不做任何事
+
+    # 部分索引的條件不同也視為不符
+    db.execute("DROP INDEX idx_events_open")
+    db.execute("CREATE INDEX idx_events_open ON events(type, timestamp DESC) WHERE is_false_alarm = 0")
+    assert schema.verify(db) == ["idx_events_open"]
+    assert schema.ensure_indexes(db) == ["重建 idx_events_open"]
+
+    assert "COVERING INDEX idx_sensor_data_device" in _plan(db, schema.LATEST_SQL, ("A",))
+    assert "COVERING INDEX idx_sensor_data_device" in _plan(db, schema.NEXT_DEVICE_SQL, ("",))
+    assert "idx_events_open" in _plan(db, schema.OPEN_EVENTS_SQL + " ORDER BY timestamp DESC", ("fall_alert",))
+    assert "idx_events_open" in _plan(db, schema.OPEN_EVENTS_SQL + " AND +device_id = ?", ("fall_alert", "A"))
+
+
+def test_read_api():
+    db = _db()
+    schema.ensure_indexes(db)
+    rows = [(d, 10.0 + k, k % 2, 70.0, f"2026-03-01 00:00:{k // 2:02d}", 1000 + k)
+            for d in ("B", "A") for k in range(10)]
+    rows.append(("C", 5.0, 0, None, "2026-03-01 00:00:30", None))       # 舊資料沒有序號
+    db.executemany("INSERT INTO sensor_data (device_id, movement_score, motion_detected, threshold, timestamp, seq) "
+                   "VALUES (?,?,?,?,?,?)", rows)
+    db.executemany("INSERT INTO events (device_id, type, resolved_at, timestamp) VALUES (?,?,?,?)", [
+        ("A", "fall_alert", None, "2026-03-01 00:00:01"),
+        ("A", "fall_alert", "2026-03-01 00:01:00", "2026-03-01 00:00:02"),
+        ("B", "fall_alert", None, "2026-03-01 00:00:03"),
+        ("B", "activity", None, "2026-03-01 00:00:04"),
+    ])
+
+    assert schema.device_ids(db) == ["A", "B", "C"]
+    latest = schema.latest(db)
+    assert latest["A"].seq == 1009 and latest["A"].movement_score == 19.0   # 同一秒內以 seq 決定先後
+    assert latest["C"].seq is None and latest["C"].threshold is None
+    assert schema.latest(db, ["B", "nope"]).keys() == {"B"}
+
+    window = schema.history(db, "A", since="2026-03-01 00:00:01", until="2026-03-01 00:00:04")
+    assert [r.seq for r in window] == list(range(1002, 1008))
+    assert window[1].motion_detected is True
+    assert [r.seq for r in schema.history(db, "A", limit=3)] == [1007, 1008, 1009]
+
+    open_all = schema.open_events(db)
+    assert [e["device_id"] for e in open_all] == ["B", "A"]
+    assert [e["device_id"] for e in schema.open_events(db, "A")] == ["A"]
+    assert schema.open_events(db, type="activity")[0]["device_id"] == "B"
@@ -0,0 +1,69 @@
+"""高速序列埠讀取器測試 (pty 迴路)"""
+
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+from serial_reader import SerialStreamReader, parse_line
+
+serial = pytest.importorskip("serial")
+pytestmark = pytest.mark.skipif(sys.platform == "win32", reason="需要 pty")
+
+
+def test_parse_espectre_and_json_lines():
+    d = parse_line(b"[12345][espectre:045]: Movement: 0.234 | Motion: ON | Threshold: 1.40")
+    assert d == {"movement_score": 0.234, "motion_detected": True, "threshold": 1.4, "status": "fall"}
+    d = parse_line(b"[1][espectre:045]: Movement: 5.5 | Motion: OFF")
+    assert d["motion_detected"] is False and d["threshold"] is None
+    assert parse_line(b'{"movement_score": 12.5, "motion_detected": false}')["movement_score"] == 12.5
+    assert parse_line(b"I (123) wifi: connected") is None
+    assert parse_line(b"{broken") is None
+
+
+def test_pty_loopback_high_line_rate():
+    import pty
+
+    master, slave = pty.openpty()
+    # pty 預設會把 \n 轉成 \r\n 並回顯，改成 raw 模式
+    import tty
+    tty.setraw(slave)
+    conn = serial.Serial(os.ttyname(slave), 115200, timeout=0.1)
+    reader = SerialStreamReader(conn, max_queue=100000).start()
+
+    total = 20000
+    lines = [
+        (f"[{i}][espectre:045]: Movement: {i % 100}.5 | Motion: {'ON' if i % 7 == 0 else 'OFF'} | Threshold: 1.40\n"
+         if i % 2 else f'{{"movement_score": {i % 100}.25, "motion_detected": false}}\n').encode()
+        for i in range(total)
+    ]
+    noise = b"I (99) boot: not a data line\n"
+
+    def writer():
+        # 以約 2000 行 / 批寫入，模擬 100+ 行/秒的突發輸出
+        for k in range(0, total, 2000):
+            os.write(master, noise + b"".join(lines[k:k + 2000]))
+
+    started = time.monotonic()
+    t = threading.Thread(target=writer)
+    t.start()
+
+    received = []
+    deadline = time.monotonic() + 20
+    while len(received) < total and time.monotonic() < deadline:
+        received.extend(reader.drain(timeout=0.5))
+    elapsed = time.monotonic() - started
+    t.join()
+    reader.stop()
+    conn.close()
+    os.close(master)
+    os.close(slave)
+
+    assert len(received) == total
+    assert reader.stats.ignored == total // 2000
+    assert reader.stats.dropped == 0
+    assert [d["movement_score"] for d in received[:4]] == [0.25, 1.5, 2.25, 3.5]
+    assert sum(1 for d in received if d["motion_detected"]) == sum(1 for i in range(1, total, 2) if i % 7 == 0)
+    assert total / elapsed > 1000  # 遠高於 ESPectre 的 100+ 行/秒
@@ -0,0 +1,97 @@
+"""多程序分片偵測測試"""
+
+import random
+import sqlite3
+
+import pytest
+
+pytest.importorskip("numpy")
+
+import bridge
+from detector import DetectorConfig, FallDetector
+from shards import ShardPool
+
+
+def _stream(devices: int, samples: int, seed: int = 7) -> list[tuple[str, float]]:
+    rng = random.Random(seed)
+    out = []
+    for _ in range(samples):
+        for i in range(devices):
+            score = rng.uniform(60, 100) if rng.random() < 0.03 else rng.uniform(0, 20)
+            out.append((f"D{i:02d}", score))
+    return out
+
+
+def test_pool_matches_in_process_detector():
+    detector = FallDetector(DetectorConfig())
+    stream = _stream(24, 60)
+
+    expected, windows = [], {}
+    for k, (dev, score) in enumerate(stream):
+        window = windows.setdefault(dev, [])
+        window.append(score)
+        del window[:-detector.cfg.window]
+        if k % 5 == 0:                      # 設備端旗標：只累積視窗、不評估
+            continue
+        det = detector.evaluate(window, 70.0)
+        expected.append((k, None if det is None else (det.verdict, det.probability, det.peak)))
+
+    got = []
+    pool = ShardPool(3, detector.cfg, detector.model, batch_size=16, slots=2, report_safe=True,
+                     on_result=lambda k, det: got.append((k, None if det is None else
+                                                          (det.verdict, det.probability, det.peak))))
+    pool.start()
+    try:
+        for k, (dev, score) in enumerate(stream):
+            skip = k % 5 == 0
+            pool.submit(dev, score, None if skip else 70.0, None if skip else k)
+    finally:
+        pool.close()
+
+    assert sorted(got) == expected
+    # 同一設備的結果依送出順序回來
+    order = {k: i for i, (k, _) in enumerate(got)}
+    for dev in ("D00", "D13"):
+        ks = [k for k, (d, _) in enumerate(stream) if d == dev and k in order]
+        assert [order[k] for k in ks] == sorted(order[k] for k in ks)
+    assert sum(pool.stats.per_shard) == len(stream) and pool.stats.stalls > 0
+    assert pool.pending == 0
+
+
+def _fall_alerts(db_path: str) -> list[str]:
+    db = sqlite3.connect(db_path)
+    rows = [r[0] for r in db.execute("SELECT device_id FROM events WHERE type='fall_alert' ORDER BY device_id")]
+    db.close()
+    return rows
+
+
+def test_bridge_sharded_alerts_match_single_process(tmp_path):
+    stream = []
+    for i in range(6):
+        pattern = [10.0 + (k % 3) for k in range(20)]
+        if i % 2 == 0:                      # 偶數設備：突升後趨於靜止
+            pattern[12:15] = [20.0, 95.0, 90.0]
+            pattern[15:] = [3.0] * 5
+        stream += [(f"S{i}", s) for s in pattern]
+
+    results = {}
+    for workers in (0, 2):
+        cfg = dict(bridge.DEFAULT_CONFIG, db_path=str(tmp_path / f"w{workers}.db"), csi_dir=str(tmp_path / "csi"),
+                   backend_url="http://127.0.0.1:9", quiet=True, metrics_port=0, adaptive_threshold=False)
+        b = bridge.WiCareBridge(cfg, mode="sim")
+        if workers:
+            b.shards = bridge.shards.ShardPool(workers, b.detector.cfg, b.detector.model,
+                                               on_result=b._on_shard_result).start()
+        for dev, score in stream:
+            b.process_sample(dev, {"movement_score": score, "motion_detected": False})
+        b.cleanup()                         # 收回分片結果後才關閉寫入器
+        results[workers] = _fall_alerts(cfg["db_path"])
+    assert results[0] == results[2] == ["S0", "S2", "S4"]
+
+    # 事件迴圈整合：add_reader 收結果、定期送出未滿的批次
+    cfg = dict(bridge.DEFAULT_CONFIG, db_path=str(tmp_path / "loop.db"), csi_dir=str(tmp_path / "csi"),
+               backend_url="http://127.0.0.1:9", quiet=True, metrics_port=0, poll_interval=0.02,
+               detector_workers=2, sim_seed=1)
+    b = bridge.WiCareBridge(cfg, mode="sim")
+    b.run_async([{"device_id": f"SIM-{i}", "mode": "sim"} for i in range(8)], duration=1.0)
+    assert b.shards is None and b.engine.stats.samples > 100
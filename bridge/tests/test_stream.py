@@ -0,0 +1,124 @@
+"""推送串流 (SSE / UDP) 與輪詢備援測試"""
+
+import asyncio
+import math
+import time
+
+import pytest
+
+import bridge
+from emulator import EmulatedDevice, Fleet, Profile, running_fleet
+from ingest import (AsyncIngestionEngine, DeviceSpec, HttpStatusReader, SseStreamReader, UdpHub,
+                    decode_frame, encode_frame)
+
+
+def _fleet(count: int = 1) -> Fleet:
+    return Fleet([EmulatedDevice(f"E{i}", profile=Profile(latency=0, jitter=0)) for i in range(count)])
+
+
+def _spec(fleet: Fleet, device_id: str, stream, **kw) -> DeviceSpec:
+    reader = HttpStatusReader(fleet.host, fleet.port, f"/d/{device_id}/status")
+    return DeviceSpec(device_id, reader, interval=kw.pop("interval", 0.05), jitter=0, timeout=1.0,
+                      stream=stream, **kw)
+
+
+def test_sse_stream_replaces_polling_and_falls_back():
+    latency = []
+
+    async def scenario():
+        fleet = _fleet()
+        await fleet.start(port=0)
+        got = []
+        engine = AsyncIngestionEngine(on_sample=lambda dev, data: got.append((time.monotonic(), data)))
+        engine.add_device(_spec(fleet, "E0", SseStreamReader(fleet.host, fleet.port, "/d/E0/stream?hz=50"),
+                                interval=2.0))
+        run = asyncio.create_task(engine.run(1.0))
+
+        await asyncio.sleep(0.4)
+        triggered = time.monotonic()
+        fleet.devices["E0"].trigger_fall()
+        await run
+        latency.append(min(t for t, d in got if d["falling"]) - triggered)
+        assert engine.stats.streamed == engine.stats.samples >= 35      # 50 Hz，輪詢 2s 只會有 1 筆
+        assert fleet.stats.per_path == {"/stream": 1}                   # 整段只有一個請求
+        assert engine.stats.stream_fallbacks == 0
+
+        # 舊韌體 (/stream 404)：改用輪詢，稍後重試串流
+        fleet.devices["E0"].clear_fall()
+        fleet.streaming = False
+        reasons = []
+        engine = AsyncIngestionEngine(on_sample=lambda dev, data: None,
+                                      on_fallback=lambda dev, why: reasons.append(why))
+        engine.add_device(_spec(fleet, "E0", SseStreamReader(fleet.host, fleet.port, "/d/E0/stream?hz=50"),
+                                stream_retry=0.3))
+        run = asyncio.create_task(engine.run(1.5))
+        await asyncio.sleep(0.5)
+        polled = fleet.stats.per_path.get("/status", 0)
+        fleet.streaming = True
+        await asyncio.sleep(0.4)
+        fleet.devices["E0"].go_offline(0.2)                            # 串流中斷 → 輪詢 → 恢復後再串流
+        await run
+        await fleet.stop()
+
+        assert polled >= 5 and "404" in reasons[0]
+        assert len(reasons) >= 2 and engine.stats.stream_fallbacks == len(reasons)
+        assert engine.stats.streamed > 10 and engine.stats.samples > engine.stats.streamed
+        assert fleet.stats.streams >= 2
+
+    asyncio.run(scenario())
+    assert latency[0] < 0.1
+
+
+def test_udp_frames_and_idle_fallback():
+    frame = encode_frame("ESP32-001", 87.5, None, motion=True, seq=7)
+    assert len(frame) < 32
+    device_id, seq, data = decode_frame(frame)
+    assert (device_id, seq, data) == ("ESP32-001", 7, {"movement_score": 87.5, "motion_detected": True})
+    assert decode_frame(encode_frame("A", 1.0, 70.0))[2]["threshold"] == 70.0
+    assert decode_frame(b'{"device_id": "B", "movement_score": 3, "seq": 2}') == ("B", 2, {"movement_score": 3})
+    for bad in (b"WC", b"WC\x09" + frame[3:], b"[1, 2]"):
+        with pytest.raises(ValueError):
+            decode_frame(bad)
+
+    async def scenario():
+        hub = await UdpHub("127.0.0.1", 0).start()
+        fleet = _fleet(2)
+        await fleet.start(port=0)
+        fleet.push_udp("127.0.0.1", hub.port, hz=50)
+
+        got, reasons = {}, []
+        engine = AsyncIngestionEngine(on_sample=lambda dev, data: got.setdefault(dev, []).append(data),
+                                      on_fallback=lambda dev, why: reasons.append((dev, why)))
+        for device_id in fleet.devices:
+            engine.add_device(_spec(fleet, device_id, hub.subscribe(device_id), stream_idle=0.2,
+                                    stream_retry=0.3))
+        run = asyncio.create_task(engine.run(1.5))
+        await asyncio.sleep(0.5)
+        fleet.devices["E1"].go_offline(0.3)                            # 不再收到訊框 → 閒置逾時
+        await asyncio.sleep(0.2)
+        hub.datagram_received(encode_frame("E0", 1.0, seq=1), None)    # 序號倒退 → 丟棄
+        hub.datagram_received(encode_frame("nobody", 1.0), None)
+        hub.datagram_received(b"junk", None)
+        await run
+        await fleet.stop()
+        hub.close()
+
+        assert [dev for dev, _ in reasons] == ["E1"] and "沒有資料" in reasons[0][1]
+        assert len(got["E0"]) >= 60 and all(math.isfinite(d["movement_score"]) for d in got["E0"])
+        assert len(got["E1"]) >= 30                                     # 恢復後回到串流
+        assert hub.stats.stale >= 1 and hub.stats.unknown >= 1 and hub.stats.bad == 1
+        assert fleet.stats.per_path.get("/status", 0) <= 15             # 只有中斷期間輪詢
+
+    asyncio.run(scenario())
+
+
+def test_bridge_streams_from_device_list(tmp_path):
+    fleet = _fleet(2)
+    with running_fleet(fleet, port=0):
+        cfg = dict(bridge.DEFAULT_CONFIG, db_path=str(tmp_path / "s.db"), csi_dir=str(tmp_path / "csi"),
+                   backend_url="http://127.0.0.1:9", quiet=True, metrics_port=0, stream="sse")
+        b = bridge.WiCareBridge(cfg, mode="http")
+        b.run_async(fleet.device_list(), duration=1.0)
+    st = b.engine.stats
+    assert st.streamed == st.samples > 20 and st.stream_fallbacks == 0
+    assert fleet.stats.per_path == {"/stream": 2}
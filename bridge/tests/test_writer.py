@@ -0,0 +1,118 @@
+"""BatchWriter 批次寫入測試"""
+
+import sqlite3
+import time
+
+from writer import BatchWriter
+
+INSERT = "INSERT INTO t (v) VALUES (?)"
+
+
+def _db(tmp_path):
+    path = str(tmp_path / "w.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE t (id INTEGER PRIMARY KEY, v INTEGER)")
+    conn.commit()
+    return path, conn
+
+
+def test_flushes_on_batch_size(tmp_path):
+    path, conn = _db(tmp_path)
+    w = BatchWriter(path, batch_size=100, flush_interval=60).start()
+    for i in range(250):
+        w.write(INSERT, (i,))
+    w.flush()
+    assert conn.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 250
+    assert w.stats.batches == 3
+    assert w.stats.max_batch == 100
+    w.close()
+
+
+def test_flushes_on_interval(tmp_path):
+    path, conn = _db(tmp_path)
+    w = BatchWriter(path, batch_size=1000, flush_interval=0.05).start()
+    w.write(INSERT, (1,))
+    deadline = time.monotonic() + 2
+    while time.monotonic() < deadline and w.stats.rows_written == 0:
+        time.sleep(0.01)
+    assert conn.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 1
+    w.close()
+
+
+def test_urgent_execute_bypasses_batch_delay(tmp_path):
+    path, conn = _db(tmp_path)
+    w = BatchWriter(path, batch_size=1000, flush_interval=60).start()
+    w.write(INSERT, (1,))
+    rowid = w.execute(INSERT, (2,))
+    assert conn.execute("SELECT v FROM t WHERE id=?", (rowid,)).fetchone() == (2,)
+    w.flush()
+    assert conn.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 2
+    w.close()
+
+
+def test_urgent_write_jumps_the_backlog(tmp_path):
+    path, conn = _db(tmp_path)
+    w = BatchWriter(path, batch_size=10, flush_interval=60, max_queue=20000).start()
+    for i in range(20000):
+        w.write(INSERT, (i,))
+    future = w.submit(INSERT, (-1,))                    # 不阻塞呼叫端
+    rowid = future.result(10)
+    committed = conn.execute("SELECT COUNT(*) FROM t").fetchone()[0]
+    assert committed < 20000                            # 優先通道不排在積壓的批次資料後面
+    assert conn.execute("SELECT v FROM t WHERE id=?", (rowid,)).fetchone() == (-1,)
+    w.close()
+    assert conn.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 20001
+
+
+def test_close_flushes_pending(tmp_path):
+    path, conn = _db(tmp_path)
+    w = BatchWriter(path, batch_size=1000, flush_interval=60, max_queue=10).start()
+    for i in range(50):  # 超過佇列上限 → back-pressure 而非丟資料
+        w.write(INSERT, (i,))
+    w.close()
+    assert conn.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 50
+
+
+def test_failed_batch_retries_and_drops_only_bad_rows(tmp_path):
+    path, conn = _db(tmp_path)
+    conn.execute("CREATE TABLE u (id INTEGER PRIMARY KEY, name TEXT NOT NULL)")
+    conn.commit()
+    commits = []
+    w = BatchWriter(path, batch_size=1000, flush_interval=60,
+                    on_commit=lambda *a: commits.append(a)).start()
+    for i in range(20):
+        w.write(INSERT, (i,))
+        w.write("INSERT INTO u (name) VALUES (?)", (None if i == 7 else f"n{i}",))   # 一筆違反 NOT NULL
+    w.flush()
+    assert conn.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 20      # 其他敘述的資料不受影響
+    assert conn.execute("SELECT COUNT(*) FROM u").fetchone()[0] == 19
+    assert w.stats.dropped_rows == 1 and w.stats.rows_written == 39
+    assert commits[-1][0] == 39 and commits[-1][2:] == (False, 1)
+    w.close()
+
+
+def test_locked_database_is_retried_not_dropped(tmp_path):
+    path, conn = _db(tmp_path)
+    commits = []
+
+    def on_commit(*args):
+        commits.append(args)
+        raise RuntimeError("監控回呼出錯")           # 不能讓寫入執行緒結束
+
+    w = BatchWriter(path, batch_size=10, flush_interval=0.01, busy_timeout=0.01,
+                    max_backoff=0.05, on_commit=on_commit).start()
+    locker = sqlite3.connect(path, isolation_level=None)
+    locker.execute("BEGIN EXCLUSIVE")
+    for i in range(25):
+        w.write(INSERT, (i,))
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline and w.stats.retries < 3:
+        time.sleep(0.01)
+    assert w.stats.retries >= 3 and w.stats.rows_written == 0 and w.stats.dropped_rows == 0
+    locker.execute("COMMIT")
+
+    w.write(INSERT, (25,))
+    w.close()
+    assert conn.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 26
+    assert w.stats.rows_written == 26 and w.stats.dropped_rows == 0
+    assert sum(c[0] for c in commits) == 26
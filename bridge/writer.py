@@ -0,0 +1,311 @@
+"""
+Wi-Care SQLite 批次寫入器
+
+取代「每筆 INSERT + commit」：
+  - 專屬寫入執行緒持有自己的 SQLite 連線
+  - 累積資料列，達到筆數 (預設 500) 或時間 (預設 250ms) 即以 executemany 單一交易寫入
+  - 佇列有上限，滿了 write() 會阻塞呼叫端 (back-pressure)，不會無限吃記憶體
+  - 優先請求 (跌倒事件) 走獨立通道：不排在批次資料後面，寫入執行緒每處理完一筆 / 一次提交就先檢查；
+    submit() 立即回傳 Future (事件迴圈不阻塞)，execute() 為其同步版本
+  - 批次提交失敗時回滾，改為逐組 (同一 SQL) 重試，失敗的組再逐筆寫入；只丟棄違反約束 / 參數錯誤的資料列
+  - 資料庫鎖定、忙碌、I/O 等暫時性錯誤不丟資料：待寫資料留著，指數退避後整批重試
+  - close() 保證清空佇列並提交
+"""
+
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass
+
+
+@dataclass
+class WriterStats:
+    rows_written: int = 0
+    batches: int = 0
+    max_batch: int = 0
+    urgent_writes: int = 0
+    blocked_puts: int = 0     # 因佇列滿而阻塞的次數
+    queue_high_water: int = 0
+    errors: int = 0
+    dropped_rows: int = 0     # 逐筆重試後仍無法寫入而丟棄的資料列
+    retries: int = 0          # 暫時性錯誤 (鎖定 / 忙碌) 後退避重試的次數
+
+
+class _Urgent:
+    """優先寫入請求：立即提交，future 的結果為 lastrowid (sql 為 None 時只是提交標記)"""
+    __slots__ = ("sql", "params", "future")
+
+    def __init__(self, sql: str | None, params: tuple = ()):
+        self.sql = sql
+        self.params = params
+        self.future: Future = Future()
+
+
+_STOP = object()
+_WAKE = object()    # 叫醒閒置的寫入執行緒處理優先通道
+
+# 資料本身的問題 (違反約束、型別 / 參數數量錯誤)：重試也不會成功，只丟棄該筆；
+# 其餘 (OperationalError 的 database is locked / busy、磁碟 I/O 等) 視為暫時性錯誤
+_BAD_ROW = (sqlite3.IntegrityError, sqlite3.DataError, sqlite3.InterfaceError, sqlite3.ProgrammingError)
+
+
+class BatchWriter:
+    """群組提交 (group commit) 的 SQLite 寫入執行緒"""
+
+    def __init__(self, db_path: str, batch_size: int = 500, flush_interval: float = 0.25,
+                 max_queue: int = 20000, on_commit=None, busy_timeout: float = 5.0, max_backoff: float = 2.0,
+                 close_timeout: float = 10.0):
+        self.db_path = db_path
+        self.on_commit = on_commit  # on_commit(寫入筆數, seconds, ok, 丟棄筆數)：每次批次提交後呼叫 (監控用)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_queue
+        self.busy_timeout = busy_timeout
+        self.max_backoff = max_backoff
+        self.close_timeout = close_timeout  # 關閉時暫時性錯誤最多重試多久，之後才丟棄
+        self._backoff = 0.0
+        self._retry_at = 0.0
+        self.stats = WriterStats()
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._urgent: queue.SimpleQueue = queue.SimpleQueue()   # 優先通道 (不受佇列上限阻塞)
+        self._thread = threading.Thread(target=self._run, name="wicare-db-writer", daemon=True)
+        self._closed = False
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    # ---------- 呼叫端 API ----------
+    def write(self, sql: str, params: tuple):
+        """排入一筆待寫資料；佇列滿時阻塞直到寫入執行緒消化"""
+        item = (sql, params)
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            self.stats.blocked_puts += 1
+            self._queue.put(item)
+        depth = self._queue.qsize()
+        if depth > self.stats.queue_high_water:
+            self.stats.queue_high_water = depth
+
+    def submit(self, sql: str, params: tuple = ()) -> Future:
+        """
+        優先寫入 (略過批次延遲與佇列中的批次資料)；不等待，回傳 Future (結果為 lastrowid)
+
+        寫入執行緒已取出的待寫資料會先一起提交；仍在佇列中的批次資料之後才寫入。
+        """
+        req = _Urgent(sql, params)
+        self._urgent.put(req)
+        try:
+            self._queue.put_nowait(_WAKE)
+        except queue.Full:
+            pass    # 佇列滿表示寫入執行緒正忙，處理下一筆前就會看到優先通道
+        return req.future
+
+    def execute(self, sql: str, params: tuple = (), timeout: float = 10.0) -> int | None:
+        """submit() 的同步版本：等待寫入完成並回傳 lastrowid (事件迴圈中請改用 submit)"""
+        try:
+            return self.submit(sql, params).result(timeout)
+        except TimeoutError:
+            raise TimeoutError("SQLite 寫入逾時") from None
+
+    def flush(self, timeout: float = 10.0):
+        """等待目前已排入的資料全部提交 (標記排在批次資料之後)"""
+        req = _Urgent(None)
+        self._queue.put(req)
+        try:
+            req.future.result(timeout)
+        except TimeoutError:
+            pass
+
+    def close(self, timeout: float = 30.0):
+        """清空佇列、提交並結束寫入執行緒"""
+        if self._closed:
+            return
+        self._closed = True
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+
+    # ---------- 寫入執行緒 ----------
+    def _run(self):
+        conn = sqlite3.connect(self.db_path)
+        conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout * 1000)}")
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+        except sqlite3.OperationalError as e:
+            print(f"[DB] 無法切換 WAL 模式 (資料庫被鎖定)，以目前模式寫入: {e}")
+        pending: dict[str, list[tuple]] = {}
+        count = 0
+        deadline = 0.0
+
+        while True:
+            if not self._urgent.empty():
+                count = self._commit(conn, pending, count, self._take_urgent())
+            if count >= self.max_pending and self._retry_at > time.monotonic():
+                # 退避中且待寫資料已達上限：暫停取用佇列，讓 write() 阻塞呼叫端 (back-pressure)
+                time.sleep(max(0.0, self._retry_at - time.monotonic()))
+                count = self._commit(conn, pending, count)
+                continue
+            timeout = max(0.0, max(deadline, self._retry_at) - time.monotonic()) if count else None
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                count = self._commit(conn, pending, count)
+                continue
+
+            if item is _WAKE:
+                continue
+
+            if item is _STOP:
+                self._drain(conn, pending, count)
+                break
+
+            if isinstance(item, _Urgent):
+                count = self._commit(conn, pending, count, [item, *self._take_urgent()])
+                continue
+
+            sql, params = item
+            rows = pending.get(sql)
+            if rows is None:
+                rows = pending[sql] = []
+            rows.append(params)
+            count += 1
+            if count == 1:
+                deadline = time.monotonic() + self.flush_interval
+            if count >= self.batch_size:
+                count = self._commit(conn, pending, count)
+
+        conn.close()
+
+    def _drain(self, conn: sqlite3.Connection, pending: dict, count: int):
+        """關閉前寫出剩餘資料；暫時性錯誤持續超過 close_timeout 才放棄"""
+        give_up = time.monotonic() + self.close_timeout
+        urgent = self._take_urgent()
+        while True:
+            count = self._commit(conn, pending, count, urgent, force=True)
+            urgent = self._take_urgent()
+            if not count and not urgent:
+                return
+            if time.monotonic() >= give_up:
+                break
+            time.sleep(max(0.0, self._retry_at - time.monotonic()))
+        self.stats.dropped_rows += count
+        print(f"[DB] 關閉時資料庫仍無法寫入，丟棄 {count} 筆待寫資料與 {len(urgent)} 筆優先請求")
+        for req in urgent:
+            req.future.set_exception(sqlite3.OperationalError("寫入器已關閉"))
+
+    def _write_pending(self, conn: sqlite3.Connection, pending: dict,
+                       count: int) -> tuple[int, int, sqlite3.Error | None]:
+        """
+        單一交易寫入；失敗時回滾並逐組、逐筆重試。回傳 (寫入筆數, 丟棄筆數, 暫時性錯誤)
+
+        已寫入或已處理完的組會從 pending 移除；遇到暫時性錯誤即停止，其餘組留在 pending 等待重試。
+        """
+        try:
+            with conn:
+                for sql, rows in pending.items():
+                    conn.executemany(sql, rows)
+            pending.clear()
+            return count, 0, None
+        except _BAD_ROW as e:
+            self.stats.errors += 1
+            print(f"[DB] 批次寫入失敗 ({count} 筆)，逐組重試: {e}")
+        except sqlite3.Error as e:
+            self.stats.errors += 1
+            return 0, 0, e
+
+        written = dropped = 0
+        error = None
+        for sql in list(pending):
+            rows = pending[sql]
+            try:
+                with conn:
+                    conn.executemany(sql, rows)
+            except _BAD_ROW:
+                pass
+            except sqlite3.Error as e:
+                return written, dropped, e
+            else:
+                written += len(rows)
+                del pending[sql]
+                continue
+            # 這一組有壞資料：逐筆寫入 (同一交易；違反約束只撤銷該筆敘述，暫時性錯誤則整組回滾)
+            ok = 0
+            try:
+                with conn:
+                    for params in rows:
+                        try:
+                            conn.execute(sql, params)
+                            ok += 1
+                        except _BAD_ROW as e:
+                            error = e
+            except sqlite3.Error as e:
+                return written, dropped, e
+            written += ok
+            dropped += len(rows) - ok
+            del pending[sql]
+        if dropped:
+            print(f"[DB] 丟棄 {dropped} 筆無法寫入的資料: {error}")
+        return written, dropped, None
+
+    def _take_urgent(self) -> list[_Urgent]:
+        items = []
+        while True:
+            try:
+                items.append(self._urgent.get_nowait())
+            except queue.Empty:
+                return items
+
+    def _commit(self, conn: sqlite3.Connection, pending: dict, count: int,
+                urgent: list[_Urgent] = (), force: bool = False) -> int:
+        """
+        以單一交易寫入所有待寫資料，接著處理優先請求；回傳剩餘筆數
+
+        暫時性錯誤時資料留在 pending，退避期間 (force=False) 不重試，回傳未寫入的筆數。
+        """
+        if count and (force or time.monotonic() >= self._retry_at):
+            started = time.monotonic()
+            written, dropped, error = self._write_pending(conn, pending, count)
+            count -= written + dropped
+            self.stats.rows_written += written
+            self.stats.dropped_rows += dropped
+            if written or dropped:
+                self.stats.batches += 1
+                self.stats.max_batch = max(self.stats.max_batch, written + dropped)
+            if error is None:
+                self._backoff = self._retry_at = 0.0
+            else:
+                self.stats.retries += 1
+                self._backoff = min(self.max_backoff, self._backoff * 2 or 0.05)
+                self._retry_at = time.monotonic() + self._backoff
+                if self.stats.retries & (self.stats.retries - 1) == 0:     # 只在第 1、2、4、8... 次輸出
+                    print(f"[DB] 暫時無法寫入 ({count} 筆待寫)，{self._backoff:.2f}s 後重試: {error}")
+            if self.on_commit and (written or dropped):
+                try:
+                    self.on_commit(written, time.monotonic() - started, dropped == 0, dropped)
+                except Exception as e:
+                    print(f"[DB] on_commit 回呼失敗: {e}")
+
+        for req in urgent:
+            # 優先請求獨立提交，避免被批次中的壞資料連累
+            if req.sql is None:
+                req.future.set_result(None)
+                continue
+            try:
+                with conn:
+                    rowid = conn.execute(req.sql, req.params).lastrowid
+            except sqlite3.Error as e:
+                self.stats.errors += 1
+                print(f"[DB] 優先寫入失敗: {e}")
+                req.future.set_exception(e)
+            else:
+                self.stats.urgent_writes += 1
+                req.future.set_result(rowid)
+        return count
@@ -1,11 +1,25 @@
 """
 Wi-Care 真實跌倒數據生成器
 用於模擬真實的加速度計數據模式
+
+負載測試模式：同時對多台 (模擬或真實) ESP32 依排程注入 trigger-fall / clear-fall，
+量測端到端偵測延遲 (觸發 → events 出現 fall_alert、觸發 → 後端收到) 的百分位數。
+  python test_real_fall_data.py load --targets devices.json --falls 3 --interval 40
+  python test_real_fall_data.py load --targets devices.json --script schedule.json --json result.json
 """
 
+import argparse
+import heapq
 import json
+import os
+import random
+import sqlite3
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
+from requests.adapters import HTTPAdapter
 from typing import Dict, List
 import math
 
@@ -15,15 +29,20 @@ class FallDataSimulator:
     基於實際人體跌倒的物理特性
     """
     
-    def __init__(self, esp32_host: str = "172.20.10.9", esp32_port: int = 8080):
+    def __init__(self, esp32_host: str = "172.20.10.9", esp32_port: int = 8080,
+                 session: requests.Session = None, timeout: float = 5, base_path: str = ""):
         self.host = esp32_host
         self.port = esp32_port
-        self.base_url = f"http://{self.host}:{self.port}"
+        # base_path：模擬器共用埠時的設備前綴 (/d/<device_id>)
+        self.base_url = f"http://{self.host}:{self.port}{base_path}"
+        # 共用連線池 (負載測試時多台模擬器共用同一個 Session)
+        self.session = session or requests.Session()
+        self.timeout = timeout
         
     def test_connection(self) -> bool:
         """測試 ESP32 連接"""
         try:
-            response = requests.get(f"{self.base_url}/health", timeout=5)
+            response = self.session.get(f"{self.base_url}/health", timeout=self.timeout)
             return response.status_code == 200
         except Exception as e:
             print(f"❌ 連接失敗: {e}")
@@ -32,7 +51,7 @@ class FallDataSimulator:
     def get_status(self) -> Dict:
         """獲取當前設備狀態"""
         try:
-            response = requests.get(f"{self.base_url}/status", timeout=5)
+            response = self.session.get(f"{self.base_url}/status", timeout=self.timeout)
             return response.json()
         except Exception as e:
             print(f"❌ 獲取狀態失敗: {e}")
@@ -41,7 +60,7 @@ class FallDataSimulator:
     def trigger_fall(self) -> bool:
         """觸發跌倒檢測"""
         try:
-            response = requests.post(f"{self.base_url}/trigger-fall", timeout=5)
+            response = self.session.post(f"{self.base_url}/trigger-fall", timeout=self.timeout)
             return response.status_code == 200
         except Exception as e:
             print(f"❌ 觸發失敗: {e}")
@@ -50,7 +69,7 @@ class FallDataSimulator:
     def clear_fall(self) -> bool:
         """清除跌倒狀態"""
         try:
-            response = requests.post(f"{self.base_url}/clear-fall", timeout=5)
+            response = self.session.post(f"{self.base_url}/clear-fall", timeout=self.timeout)
             return response.status_code == 200
         except Exception as e:
             print(f"❌ 清除失敗: {e}")
@@ -238,9 +257,339 @@ class FallDataSimulator:
         return True
 
 
+# ==================== 並行負載測試 ====================
+
+def make_pooled_session(pool_size: int = 64) -> requests.Session:
+    """所有模擬器共用的 keep-alive 連線池"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def percentiles(values: List[float]) -> Dict:
+    """p50 / p90 / p95 / p99 / max (nearest-rank，單位毫秒)"""
+    if not values:
+        return {"count": 0}
+    ordered = sorted(values)
+
+    def rank(p):
+        return ordered[min(len(ordered) - 1, max(0, math.ceil(p / 100 * len(ordered)) - 1))] * 1000
+
+    return {"count": len(ordered), "p50": rank(50), "p90": rank(90), "p95": rank(95),
+            "p99": rank(99), "max": ordered[-1] * 1000}
+
+
+class EventWatcher(threading.Thread):
+    """輪詢 SQLite events 表，記錄每台設備 fall_alert 出現的時間 (解析度 = poll 間隔)"""
+
+    def __init__(self, db_path: str, poll: float = 0.01):
+        super().__init__(name="events-watcher", daemon=True)
+        self.db_path = db_path
+        self.poll = poll
+        self.seen: Dict[str, List[float]] = {}
+        self._halt = threading.Event()
+        db = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+        self.last_id = db.execute("SELECT COALESCE(MAX(id), 0) FROM events").fetchone()[0]
+        db.close()
+
+    def run(self):
+        db = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True)
+        try:
+            while not self._halt.is_set():
+                try:
+                    rows = db.execute("SELECT id, device_id FROM events WHERE id > ? AND type = 'fall_alert' "
+                                      "ORDER BY id", (self.last_id,)).fetchall()
+                except sqlite3.OperationalError:
+                    rows = []  # 寫入端鎖定中，下一輪再讀
+                now = time.monotonic()
+                for event_id, device_id in rows:
+                    self.last_id = event_id
+                    self.seen.setdefault(str(device_id), []).append(now)
+                self._halt.wait(self.poll)
+        finally:
+            db.close()
+
+    def stop(self):
+        self._halt.set()
+        self.join(2)
+
+
+class BackendWatcher(threading.Thread):
+    """
+    輪詢後端 REST (/api/sensor-data/latest)，記錄後端收到跌倒讀數的時間 (解析度 = poll 間隔)
+
+    只輪詢已觸發、尚未看到跌倒讀數的設備 (watch())；該設備最新一筆為新的 motion_detected 讀數即視為收到。
+    端點需要登入 Token (POST /api/auth/login 取得)。
+    """
+
+    def __init__(self, base_url: str, token: str, poll: float = 0.05, timeout: float = 2):
+        super().__init__(name="backend-watcher", daemon=True)
+        self.base_url = base_url.rstrip("/")
+        self.poll = poll
+        self.timeout = timeout
+        self.seen: Dict[str, List[float]] = {}
+        self.error = None
+        self.session = make_pooled_session(4)
+        self.session.headers["Authorization"] = f"Bearer {token}"
+        self._watching: set = set()
+        self._last_id: Dict[str, object] = {}   # 每台設備已計入的最後一筆跌倒讀數 id
+        self._lock = threading.Lock()
+        self._halt = threading.Event()
+
+    def check(self) -> bool:
+        """確認後端可連線且 Token 有效；失敗時記在 error"""
+        try:
+            response = self.session.get(f"{self.base_url}/api/auth/verify", timeout=self.timeout)
+            if response.status_code != 200:
+                self.error = f"HTTP {response.status_code}"
+        except requests.RequestException as e:
+            self.error = e
+        return self.error is None
+
+    def watch(self, device_id: str):
+        with self._lock:
+            self._watching.add(device_id)
+
+    def poll_once(self):
+        with self._lock:
+            devices = list(self._watching)
+        for device_id in devices:
+            try:
+                response = self.session.get(f"{self.base_url}/api/sensor-data/latest",
+                                            params={"device_id": device_id}, timeout=self.timeout)
+                row = response.json().get("data") if response.status_code == 200 else None
+            except (requests.RequestException, ValueError):
+                continue  # 後端暫時無回應，下一輪再查
+            if not row or not row.get("motion_detected") or row.get("id") == self._last_id.get(device_id):
+                continue
+            self._last_id[device_id] = row.get("id")
+            self.seen.setdefault(device_id, []).append(time.monotonic())
+            with self._lock:
+                self._watching.discard(device_id)
+
+    def run(self):
+        while not self._halt.is_set():
+            self.poll_once()
+            self._halt.wait(self.poll)
+
+    def stop(self):
+        self._halt.set()
+        self.join(2)
+        self.session.close()
+
+
+class LoadTest:
+    """
+    並行負載測試：多台 ESP32 共用連線池，依排程注入 trigger-fall / clear-fall
+
+    targets: [{"device_id", "esp32_ip", "esp32_port", "esp32_path"?}] (與 bridge.py --devices 相同格式)
+    schedule: [(at 秒, device_id, "trigger-fall" | "clear-fall")]
+    同一台設備兩次跌倒需間隔超過橋接器的警報冷卻 (FALL_COOLDOWN，預設 30 秒)，否則會被視為漏報。
+    """
+
+    def __init__(self, targets: List[Dict], schedule: List, concurrency: int = 32, timeout: float = 5,
+                 db_path: str = None, backend_url: str = None, backend_token: str = None,
+                 detect_timeout: float = 30, db_poll: float = 0.01):
+        self.session = make_pooled_session(concurrency)
+        self.simulators = {
+            str(t["device_id"]): FallDataSimulator(t.get("esp32_ip", "127.0.0.1"), int(t.get("esp32_port", 8080)),
+                                                   session=self.session, timeout=timeout,
+                                                   base_path=t.get("esp32_path", "/status").removesuffix("/status"))
+            for t in targets
+        }
+        self.schedule = sorted(schedule, key=lambda a: a[0])
+        self.concurrency = concurrency
+        self.detect_timeout = detect_timeout
+        self.db_watcher = EventWatcher(db_path, db_poll) if db_path else None
+        self.backend_watcher = BackendWatcher(backend_url, backend_token) if backend_url and backend_token else None
+        self.actions: List[Dict] = []
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def build_schedule(device_ids: List[str], falls: int, interval: float, hold: float,
+                       spread: float, seed: int = 0) -> List:
+        """每台設備 falls 次跌倒，間隔 interval 秒；起始時間在 spread 秒內隨機錯開"""
+        rng = random.Random(seed)
+        schedule = []
+        for device_id in device_ids:
+            offset = rng.uniform(0, spread)
+            for k in range(falls):
+                at = offset + k * interval
+                schedule.append((at, device_id, "trigger-fall"))
+                schedule.append((at + hold, device_id, "clear-fall"))
+        return schedule
+
+    def _fire(self, device_id: str, action: str, scheduled: float):
+        sim = self.simulators[device_id]
+        sent = time.monotonic()
+        ok = sim.trigger_fall() if action == "trigger-fall" else sim.clear_fall()
+        acked = time.monotonic()
+        if ok and action == "trigger-fall" and self.backend_watcher:
+            self.backend_watcher.watch(device_id)
+        with self._lock:
+            self.actions.append({"device_id": device_id, "action": action, "scheduled": scheduled,
+                                 "sent": sent, "acked": acked, "ok": ok})
+
+    def run(self) -> Dict:
+        if self.backend_watcher and not self.backend_watcher.check():
+            print(f"⚠️  後端無法連線或 Token 無效，不量測後端延遲: {self.backend_watcher.error}")
+            self.backend_watcher = None
+        for watcher in (self.db_watcher, self.backend_watcher):
+            if watcher:
+                watcher.start()
+
+        print(f"🚀 負載測試：{len(self.simulators)} 台設備 / {len(self.schedule)} 個動作 / 並行 {self.concurrency}")
+        start = time.monotonic() + 1.0
+        queue = [(start + at, i, device_id, action) for i, (at, device_id, action) in enumerate(self.schedule)]
+        heapq.heapify(queue)
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            while queue:
+                due, _, device_id, action = heapq.heappop(queue)
+                delay = due - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                pool.submit(self._fire, device_id, action, due)
+
+        # 等最後一次觸發的偵測結果
+        deadline = time.monotonic() + self.detect_timeout
+        while time.monotonic() < deadline and not self._all_detected():
+            time.sleep(0.1)
+        for watcher in (self.db_watcher, self.backend_watcher):
+            if watcher:
+                watcher.stop()
+        self.session.close()
+        return self.report()
+
+    def _triggers(self) -> List[Dict]:
+        return sorted((a for a in self.actions if a["action"] == "trigger-fall" and a["ok"]),
+                      key=lambda a: a["sent"])
+
+    def _latencies(self, seen: Dict[str, List[float]]) -> tuple:
+        """每次觸發配對該設備在下一次觸發 (或逾時) 之前的第一個偵測"""
+        latencies, missed = [], 0
+        by_device: Dict[str, List[Dict]] = {}
+        for a in self._triggers():
+            by_device.setdefault(a["device_id"], []).append(a)
+        for device_id, triggers in by_device.items():
+            times = sorted(seen.get(device_id, []))
+            for k, a in enumerate(triggers):
+                limit = a["sent"] + self.detect_timeout
+                if k + 1 < len(triggers):
+                    limit = min(limit, triggers[k + 1]["sent"])
+                hit = next((t for t in times if a["sent"] <= t < limit), None)
+                if hit is None:
+                    missed += 1
+                else:
+                    latencies.append(hit - a["sent"])
+        return latencies, missed
+
+    def _all_detected(self) -> bool:
+        for watcher in (self.db_watcher, self.backend_watcher):
+            if watcher and self._latencies(watcher.seen)[1]:
+                return False
+        return True
+
+    def report(self) -> Dict:
+        triggers = [a for a in self.actions if a["action"] == "trigger-fall"]
+        result = {
+            "devices": len(self.simulators),
+            "triggers": len(triggers),
+            "failed_requests": sum(1 for a in self.actions if not a["ok"]),
+            "request_rtt": percentiles([a["acked"] - a["sent"] for a in self.actions if a["ok"]]),
+            "schedule_lag": percentiles([max(0.0, a["sent"] - a["scheduled"]) for a in self.actions]),
+        }
+        if self.db_watcher:
+            latencies, missed = self._latencies(self.db_watcher.seen)
+            result["trigger_to_event"] = dict(percentiles(latencies), missed=missed)
+        if self.backend_watcher:
+            latencies, missed = self._latencies(self.backend_watcher.seen)
+            result["trigger_to_backend"] = dict(percentiles(latencies), missed=missed)
+        return result
+
+
+def print_load_report(result: Dict):
+    print("\n" + "=" * 60)
+    print(f"📊 負載測試結果：{result['devices']} 台設備 / {result['triggers']} 次跌倒 / "
+          f"請求失敗 {result['failed_requests']}")
+    print("=" * 60)
+    rows = [("ESP32 請求 RTT", "request_rtt"), ("排程延遲", "schedule_lag"),
+            ("觸發 → events", "trigger_to_event"), ("觸發 → 後端", "trigger_to_backend")]
+    print(f"  {'':<16}{'筆數':>6}{'p50':>9}{'p90':>9}{'p95':>9}{'p99':>9}{'max':>9}{'漏報':>6}")
+    for label, key in rows:
+        p = result.get(key)
+        if not p:
+            continue
+        if not p["count"]:
+            print(f"  {label:<16}{0:>6}{'-':>9}{'-':>9}{'-':>9}{'-':>9}{'-':>9}{p.get('missed', ''):>6}")
+            continue
+        print(f"  {label:<16}{p['count']:>6}" + "".join(f"{p[k]:>7.0f}ms" for k in ("p50", "p90", "p95", "p99", "max"))
+              + f"{p.get('missed', ''):>6}")
+
+
+def run_load_test(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(prog="test_real_fall_data.py load", description="並行跌倒注入負載測試")
+    parser.add_argument("--targets", help="設備清單 JSON (與 bridge.py --devices 相同格式)")
+    parser.add_argument("--host", default="172.20.10.9", help="單一 ESP32 (未指定 --targets 時)")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--device-id", default="ESP32-001", help="單一 ESP32 在橋接器中的設備 ID")
+    parser.add_argument("--script", help="排程 JSON：[{\"at\": 秒, \"device\": ID, \"action\": \"trigger-fall\"}]")
+    parser.add_argument("--falls", type=int, default=3, help="每台設備跌倒次數 (未指定 --script 時)")
+    parser.add_argument("--interval", type=float, default=40, help="同一台設備兩次跌倒的間隔 (秒)")
+    parser.add_argument("--hold", type=float, default=3, help="觸發後多久 clear-fall (秒)")
+    parser.add_argument("--spread", type=float, default=10, help="各設備起始時間錯開範圍 (秒)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--concurrency", type=int, default=32, help="並行請求數 (連線池大小)")
+    parser.add_argument("--timeout", type=float, default=5, help="單次請求逾時 (秒)")
+    parser.add_argument("--db", default=os.path.join(os.path.dirname(__file__), "..", "data", "wicare.db"),
+                        help="量測 events 的 SQLite 路徑 (空字串 = 不量測)")
+    parser.add_argument("--backend", default="http://localhost:3001", help="後端 API (空字串 = 不量測)")
+    parser.add_argument("--backend-token", default=os.getenv("WICARE_TOKEN", ""),
+                        help="後端登入 Token (預設讀 WICARE_TOKEN；未提供則不量測後端延遲)")
+    parser.add_argument("--detect-timeout", type=float, default=30, help="超過此秒數未偵測到視為漏報")
+    parser.add_argument("--json", help="結果輸出 JSON 檔")
+    args = parser.parse_args(argv)
+
+    if args.targets:
+        with open(args.targets, encoding="utf-8") as f:
+            targets = json.load(f)
+        targets = targets.get("devices", targets) if isinstance(targets, dict) else targets
+    else:
+        targets = [{"device_id": args.device_id, "esp32_ip": args.host, "esp32_port": args.port}]
+
+    if args.script:
+        with open(args.script, encoding="utf-8") as f:
+            schedule = [(float(a["at"]), str(a["device"]), a["action"]) for a in json.load(f)]
+    else:
+        schedule = LoadTest.build_schedule([str(t["device_id"]) for t in targets], args.falls,
+                                           args.interval, args.hold, args.spread, args.seed)
+
+    db_path = args.db if args.db and os.path.exists(args.db) else None
+    if args.db and not db_path:
+        print(f"⚠️  找不到資料庫 {args.db}，不量測 events 延遲")
+
+    if args.backend and not args.backend_token:
+        print("⚠️  未提供 --backend-token / WICARE_TOKEN，不量測後端延遲")
+
+    test = LoadTest(targets, schedule, concurrency=args.concurrency, timeout=args.timeout, db_path=db_path,
+                    backend_url=args.backend or None, backend_token=args.backend_token or None,
+                    detect_timeout=args.detect_timeout)
+    result = test.run()
+    print_load_report(result)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+        print(f"\n💾 結果已寫入 {args.json}")
+    return 0
+
+
 def main():
     """主程序 - 交互式測試菜單"""
     import sys
+
+    if len(sys.argv) > 1 and sys.argv[1] == "load":
+        sys.exit(run_load_test(sys.argv[2:]))
     
     print("\n" + "=" * 60)
     print("🏥 Wi-Care 真實跌倒檢測數據模擬器")
@@ -268,6 +617,7 @@ def main():
     print("4. 絆倒")
     print("5. 連續監測 (60秒)")
     print("6. 自動運行所有場景")
+    print("   (負載測試: python test_real_fall_data.py load --help)")
     print("0. 退出")
     print("=" * 60)
     
@@ -88,6 +88,29 @@ db.exec(`
     timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
   );
 
+  -- 時間分桶彙總 (由 Python Bridge 與後端寫入 sensor_data 時增量維護)
+  CREATE TABLE IF NOT EXISTS sensor_rollup_1m (
+    device_id TEXT NOT NULL,
+    bucket TEXT NOT NULL,
+    min_score REAL NOT NULL,
+    max_score REAL NOT NULL,
+    sum_score REAL NOT NULL,
+    count INTEGER NOT NULL,
+    motion_count INTEGER NOT NULL,
+    PRIMARY KEY (device_id, bucket)
+  ) WITHOUT ROWID;
+
+  CREATE TABLE IF NOT EXISTS sensor_rollup_1h (
+    device_id TEXT NOT NULL,
+    bucket TEXT NOT NULL,
+    min_score REAL NOT NULL,
+    max_score REAL NOT NULL,
+    sum_score REAL NOT NULL,
+    count INTEGER NOT NULL,
+    motion_count INTEGER NOT NULL,
+    PRIMARY KEY (device_id, bucket)
+  ) WITHOUT ROWID;
+
   CREATE TABLE IF NOT EXISTS events (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     elderly_id INTEGER REFERENCES elderly(id) ON DELETE SET NULL,
@@ -121,13 +144,46 @@ db.exec(`
     updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
   );
 
-  CREATE INDEX IF NOT EXISTS idx_sensor_data_device ON sensor_data(device_id, timestamp DESC);
   CREATE INDEX IF NOT EXISTS idx_sensor_data_time ON sensor_data(timestamp DESC);
   CREATE INDEX IF NOT EXISTS idx_events_type ON events(type, timestamp DESC);
   CREATE INDEX IF NOT EXISTS idx_events_elderly ON events(elderly_id, timestamp DESC);
+  CREATE INDEX IF NOT EXISTS idx_events_device ON events(device_id, type, timestamp);
+  -- 未解除的警報：部分索引只包含 resolved_at IS NULL 的事件
+  CREATE INDEX IF NOT EXISTS idx_events_open ON events(type, timestamp DESC) WHERE resolved_at IS NULL;
   CREATE INDEX IF NOT EXISTS idx_shifts_date ON shifts(shift_date, user_id);
 `);
 
+// ========================================
+// 推送去重 (Python Bridge 每設備序號)
+// ========================================
+// 舊資料庫補上 seq 欄位；橋接器與後端共用資料庫時，同一筆讀數以 (device_id, seq) 唯一
+const sensorColumns = db.prepare('PRAGMA table_info(sensor_data)').all().map((c) => c.name);
+if (!sensorColumns.includes('seq')) {
+  db.exec('ALTER TABLE sensor_data ADD COLUMN seq INTEGER');
+}
+db.exec(`
+  CREATE UNIQUE INDEX IF NOT EXISTS idx_sensor_data_seq ON sensor_data(device_id, seq) WHERE seq IS NOT NULL;
+
+  -- 每設備已處理的最大序號：重送 / 斷線補送時 seq <= last_seq 的讀數直接略過
+  CREATE TABLE IF NOT EXISTS ingest_hwm (
+    device_id TEXT PRIMARY KEY,
+    last_seq INTEGER NOT NULL,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+  ) WITHOUT ROWID;
+`);
+
+// ========================================
+// 讀數覆蓋索引 (定義與 bridge/schema.py 相同)
+// ========================================
+// 最新讀數 / 時間窗查詢只讀索引；舊版建立的 (device_id, timestamp DESC) 窄索引在此重建
+const SENSOR_INDEX_COLUMNS = ['device_id', 'timestamp', 'seq', 'movement_score', 'motion_detected', 'threshold'];
+const sensorIndex = db.prepare('PRAGMA index_info(idx_sensor_data_device)').all().map((c) => c.name);
+if (sensorIndex.length && sensorIndex.join() !== SENSOR_INDEX_COLUMNS.join()) {
+  console.log('[DB] 重建 idx_sensor_data_device (覆蓋索引)...');
+  db.exec('DROP INDEX idx_sensor_data_device');
+}
+db.exec(`CREATE INDEX IF NOT EXISTS idx_sensor_data_device ON sensor_data(${SENSOR_INDEX_COLUMNS.join(', ')})`);
+
 // ========================================
 // 種子數據 (首次啟動時寫入)
 // ========================================
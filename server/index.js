@@ -27,7 +27,7 @@ const SALT_ROUNDS = 10;
 // Middleware
 // ========================================
 app.use(cors());
-app.use(express.json());
+app.use(express.json({ limit: '2mb' })); // Python Bridge 批次推送可達數百筆
 
 /** JWT 認證中介層 */
 const authenticate = (req, res, next) => {
@@ -84,6 +84,23 @@ function broadcast(data) {
   }
 }
 
+// ========================================
+// 時間分桶彙總 (與 bridge/rollup.py 相同的表與桶標籤)
+// ========================================
+const ROLLUP_SQL = ['1m', '1h'].map((tier) => db.prepare(`
+  INSERT INTO sensor_rollup_${tier} (device_id,bucket,min_score,max_score,sum_score,count,motion_count)
+  VALUES (?,?,?,?,?,1,?)
+  ON CONFLICT(device_id,bucket) DO UPDATE SET
+    min_score=MIN(min_score,excluded.min_score), max_score=MAX(max_score,excluded.max_score),
+    sum_score=sum_score+excluded.sum_score, count=count+1, motion_count=motion_count+excluded.motion_count`));
+
+/** 後端自行寫入 sensor_data 的每一筆同步累加進 1m / 1h 彙總 (ms 為讀數時間) */
+function rollupReading(deviceId, score, motion, ms) {
+  const minute = new Date(Math.floor(ms / 60000) * 60000).toISOString();
+  const labels = [minute.slice(0, 16), minute.slice(0, 13) + ':00'];
+  ROLLUP_SQL.forEach((stmt, i) => stmt.run(deviceId, labels[i].replace('T', ' ') + ':00', score, score, score, motion ? 1 : 0));
+}
+
 // ========================================
 // ESP32 後端輪詢
 // ========================================
@@ -111,6 +128,7 @@ async function pollESP32() {
       const motion = data.status === 'fall' || data.falling ? 1 : 0;
       db.prepare(`INSERT INTO sensor_data (device_id, movement_score, motion_detected, threshold) VALUES (?,?,?,?)`)
         .run(device.id, score, motion, data.threshold ?? null);
+      rollupReading(device.id, score, motion, Date.now());
 
       // WebSocket 推送
       broadcast({
@@ -143,6 +161,8 @@ function markOffline(id) {
 // ========================================
 let lastAlertTime = 0;
 const ALERT_COOLDOWN = 30000;
+// 讀數本身的時間超過此值 (斷線後補送) 不再即時警報，只記錄為歷史跌倒事件
+const ALERT_MAX_AGE = parseInt(process.env.ALERT_MAX_AGE_MS || '120000');
 
 async function handleFallAlert(device, data) {
   if (Date.now() - lastAlertTime < ALERT_COOLDOWN) return;
@@ -171,6 +191,43 @@ async function handleFallAlert(device, data) {
   await sendLineNotification(device, elderly);
 }
 
+/** 補送的舊讀數：以讀數自己的時間記錄跌倒事件，不廣播警報、不發 LINE、不影響冷卻 */
+function recordHistoricalFall(device, data, occurredAt) {
+  const elderly = db.prepare('SELECT * FROM elderly WHERE room = ?').get(device.location?.split(' ')[0]);
+  const at = new Date(occurredAt);
+  const result = db.prepare(`
+    INSERT INTO events (elderly_id, device_id, type, severity, message, data, timestamp)
+    VALUES (?, ?, 'fall_alert', 'warning', ?, ?, ?)
+  `).run(
+    elderly?.id || null, device.id,
+    `補送的跌倒紀錄 - ${device.location || '未知'}${elderly ? ` - ${elderly.name}` : ''} ` +
+      `(發生於 ${at.toLocaleString('zh-TW', { hour12: false })})`,
+    JSON.stringify({ movement_score: data.movement_score, historical: true, raw: data }),
+    at.toISOString().replace('T', ' ').slice(0, 19)
+  );
+  broadcast({
+    type: 'fall_history', event_id: result.lastInsertRowid, device_id: device.id,
+    location: device.location, timestamp: at.toISOString()
+  });
+}
+
+/** 讀數時間 (Bridge 送出 UTC 'YYYY-MM-DD HH:MM:SS')；沒有或無法解析時視為現在 */
+function readingTime(ts) {
+  if (ts == null) return Date.now();
+  const s = String(ts);
+  const t = Date.parse(/(Z|[+-]\d\d:?\d\d)$/i.test(s) ? s : s.replace(' ', 'T') + 'Z');
+  return Number.isNaN(t) ? Date.now() : t;
+}
+
+/** Bridge 推送的跌倒讀數：新的即時警報，超過 ALERT_MAX_AGE 的只記錄 */
+function alertFromReading(r) {
+  const d = db.prepare('SELECT * FROM devices WHERE id=?').get(r.device_id);
+  if (!d) return;
+  const at = readingTime(r.timestamp);
+  if (Date.now() - at > ALERT_MAX_AGE) recordHistoricalFall(d, { movement_score: r.movement_score, status: 'fall' }, at);
+  else handleFallAlert(d, { movement_score: r.movement_score, status: 'fall' });
+}
+
 async function sendLineNotification(device, elderly) {
   const token = db.prepare("SELECT value FROM settings WHERE key='line_channel_token'").get()?.value;
   const userId = db.prepare("SELECT value FROM settings WHERE key='line_user_id'").get()?.value;
@@ -487,8 +544,28 @@ app.get('/api/sensor-data/latest', authenticate, (req, res) => {
   res.json({ success: true, data: q || null });
 });
 
+// 彙總層級：≤ 6 小時讀原始數據、≤ 7 天讀 1 分鐘彙總、其餘讀 1 小時彙總
+function rollupTier(hours) {
+  if (hours <= 6) return null;
+  return hours <= 168 ? '1m' : '1h';
+}
+const sqlTime = (ms) => new Date(ms).toISOString().slice(0, 19).replace('T', ' ');
+
 app.get('/api/sensor-data/history', authenticate, (req, res) => {
   const { device_id, limit = 200, hours = 1 } = req.query;
+  const tier = rollupTier(parseInt(hours));
+  if (tier) {
+    // 欄位與原始數據相同 (每桶一列)，另附 min/max/data_points；該區間沒有彙總 (例如升級前的舊數據) 時改讀原始數據
+    let q = `SELECT NULL as id, device_id, sum_score / count as movement_score, motion_count > 0 as motion_detected,
+      NULL as threshold, NULL as raw_csi, bucket as timestamp, min_score, max_score, motion_count, count as data_points
+      FROM sensor_rollup_${tier} WHERE bucket > ?`;
+    const p = [sqlTime(Date.now() - parseInt(hours) * 3600000)];
+    if (device_id) { q += ' AND device_id=?'; p.push(device_id); }
+    q += ' ORDER BY bucket DESC LIMIT ?';
+    p.push(parseInt(limit));
+    const rows = db.prepare(q).all(...p);
+    if (rows.length) return res.json({ success: true, resolution: tier, data: rows.reverse() });
+  }
   const since = new Date(Date.now() - parseInt(hours) * 3600000).toISOString();
   let q = 'SELECT * FROM sensor_data WHERE timestamp > ?';
   const p = [since];
@@ -498,15 +575,49 @@ app.get('/api/sensor-data/history', authenticate, (req, res) => {
   res.json({ success: true, data: db.prepare(q).all(...p).reverse() });
 });
 
+// Python Bridge 推送去重：讀數帶每設備遞增的 seq，不大於高水位者為重送 (已處理過)
+const hwmGet = db.prepare('SELECT last_seq FROM ingest_hwm WHERE device_id=?');
+const hwmSet = db.prepare(`INSERT INTO ingest_hwm (device_id,last_seq,updated_at) VALUES (?,?,CURRENT_TIMESTAMP)
+  ON CONFLICT(device_id) DO UPDATE SET last_seq=excluded.last_seq, updated_at=excluded.updated_at
+  WHERE excluded.last_seq > ingest_hwm.last_seq`);
+// 橋接器與後端共用資料庫時該筆已存在：OR IGNORE 只略過寫入 (也不重複累加彙總)，照常廣播
+const insertReading = db.prepare(
+  'INSERT OR IGNORE INTO sensor_data (device_id,movement_score,motion_detected,threshold,raw_csi,timestamp,seq) VALUES (?,?,?,?,?,COALESCE(?,CURRENT_TIMESTAMP),?)'
+);
+
+class SeqFilter {
+  constructor() { this.last = new Map(); this.changed = new Set(); }
+  accept(deviceId, seq) {
+    if (seq == null) return true;
+    if (!this.last.has(deviceId)) this.last.set(deviceId, hwmGet.get(deviceId)?.last_seq ?? -Infinity);
+    if (seq <= this.last.get(deviceId)) return false;
+    this.last.set(deviceId, seq);
+    this.changed.add(deviceId);
+    return true;
+  }
+  commit() { for (const id of this.changed) hwmSet.run(id, this.last.get(id)); }
+}
+
 // Python Bridge 推送端點
 app.post('/api/sensor-data/push', (req, res) => {
-  const { device_id, movement_score, motion_detected, threshold, raw_csi, ai_analysis } = req.body;
+  const { device_id, movement_score, motion_detected, threshold, raw_csi, ai_analysis, timestamp, seq } = req.body;
   if (device_id == null || movement_score == null) {
     return res.status(400).json({ success: false, message: '缺少必要欄位' });
   }
 
-  db.prepare('INSERT INTO sensor_data (device_id,movement_score,motion_detected,threshold,raw_csi) VALUES (?,?,?,?,?)')
-    .run(device_id, movement_score, motion_detected ? 1 : 0, threshold, raw_csi ? JSON.stringify(raw_csi) : null);
+  const seqs = new SeqFilter();
+  if (!seqs.accept(device_id, seq)) return res.json({ success: true, duplicates: 1 });
+  db.exec('BEGIN');
+  try {
+    const { changes } = insertReading.run(device_id, movement_score, motion_detected ? 1 : 0, threshold ?? null,
+      raw_csi ? JSON.stringify(raw_csi) : null, timestamp ?? null, seq ?? null);
+    if (changes) rollupReading(device_id, movement_score, motion_detected, readingTime(timestamp));
+    seqs.commit();
+    db.exec('COMMIT');
+  } catch (err) {
+    db.exec('ROLLBACK');
+    return res.status(500).json({ success: false, message: err.message });
+  }
 
   broadcast({
     type: 'sensor_update', device_id, movement_score,
@@ -514,13 +625,52 @@ app.post('/api/sensor-data/push', (req, res) => {
     timestamp: new Date().toISOString()
   });
 
-  if (motion_detected) {
-    const d = db.prepare('SELECT * FROM devices WHERE id=?').get(device_id);
-    if (d) handleFallAlert(d, { movement_score, status: 'fall' });
-  }
+  if (motion_detected) alertFromReading({ device_id, movement_score, timestamp });
   res.json({ success: true });
 });
 
+// Python Bridge 批次推送端點 (單一請求多筆讀數，單一交易寫入)
+app.post('/api/sensor-data/push-batch', (req, res) => {
+  const { readings } = req.body;
+  if (!Array.isArray(readings)) {
+    return res.status(400).json({ success: false, message: '缺少 readings 陣列' });
+  }
+
+  const seqs = new SeqFilter();
+  const latest = new Map();
+  const falls = new Map();  // 每台設備最近一筆跌倒讀數 (已被 SeqFilter 擋下的重送不會再警報)
+  let accepted = 0, duplicates = 0;
+  db.exec('BEGIN');
+  try {
+    for (const r of readings) {
+      if (r?.device_id == null || r.movement_score == null) continue;
+      if (!seqs.accept(r.device_id, r.seq)) { duplicates++; continue; }
+      const { changes } = insertReading.run(r.device_id, r.movement_score, r.motion_detected ? 1 : 0, r.threshold ?? null,
+        r.raw_csi ? JSON.stringify(r.raw_csi) : null, r.timestamp ?? null, r.seq ?? null);
+      if (changes) rollupReading(r.device_id, r.movement_score, r.motion_detected, readingTime(r.timestamp));
+      accepted++;
+      latest.set(r.device_id, r);
+      if (r.motion_detected) falls.set(r.device_id, r);
+    }
+    seqs.commit();
+    db.exec('COMMIT');
+  } catch (err) {
+    db.exec('ROLLBACK');
+    return res.status(500).json({ success: false, message: err.message });
+  }
+
+  // 每台設備只廣播最新一筆，避免批次湧入 WebSocket
+  for (const r of latest.values()) {
+    broadcast({
+      type: 'sensor_update', device_id: r.device_id, movement_score: r.movement_score,
+      motion_detected: !!r.motion_detected || falls.has(r.device_id), ai_analysis: r.ai_analysis,
+      timestamp: new Date().toISOString()
+    });
+  }
+  for (const r of falls.values()) alertFromReading(r);
+  res.json({ success: true, accepted, duplicates });
+});
+
 // ========================================
 // 事件紀錄 API
 // ========================================
@@ -671,6 +821,15 @@ app.get('/api/stats/dashboard', authenticate, (req, res) => {
 
 app.get('/api/stats/activity-trend', authenticate, (req, res) => {
   const { device_id, hours = 24 } = req.query;
+  if (rollupTier(parseInt(hours))) {
+    let q = `SELECT substr(bucket,1,16) as hour, SUM(sum_score) / SUM(count) as avg_score, MAX(max_score) as max_score,
+      SUM(motion_count) as motion_count, SUM(count) as data_points FROM sensor_rollup_1h WHERE bucket>?`;
+    const p = [sqlTime(Date.now() - parseInt(hours) * 3600000)];
+    if (device_id) { q += ' AND device_id=?'; p.push(device_id); }
+    q += ' GROUP BY hour ORDER BY hour';
+    const rows = db.prepare(q).all(...p);
+    if (rows.length) return res.json({ success: true, data: rows });
+  }
   const since = new Date(Date.now() - parseInt(hours) * 3600000).toISOString();
   let q = `SELECT strftime('%Y-%m-%d %H:00',timestamp) as hour, AVG(movement_score) as avg_score,
     MAX(movement_score) as max_score, SUM(motion_detected) as motion_count, COUNT(*) as data_points
@@ -703,8 +862,16 @@ app.put('/api/settings', authenticate, requireRole('admin'), (req, res) => {
 function cleanOldData() {
   const days = parseInt(db.prepare("SELECT value FROM settings WHERE key='data_retention_days'").get()?.value || '90');
   const cutoff = new Date(Date.now() - days * 86400000).toISOString();
-  const r = db.prepare('DELETE FROM sensor_data WHERE timestamp<?').run(cutoff);
-  if (r.changes > 0) console.log(`[DB] 清理 ${r.changes} 筆過期數據`);
+  // 分批刪除，批次之間讓出事件迴圈與寫入鎖
+  const del = db.prepare('DELETE FROM sensor_data WHERE rowid IN (SELECT rowid FROM sensor_data WHERE timestamp<? LIMIT 2000)');
+  let total = 0;
+  const step = () => {
+    const n = Number(del.run(cutoff).changes);
+    total += n;
+    if (n === 2000) return setTimeout(step, 50);
+    if (total > 0) console.log(`[DB] 清理 ${total} 筆過期數據`);
+  };
+  step();
 }
 setInterval(cleanOldData, 3600000);
 